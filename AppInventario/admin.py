@@ -1,23 +1,71 @@
 from django.contrib import admin
+from django.db.models import Exists, F, OuterRef, Q
 from .models import Producto, Proveedores, ServicioRealizado, Compras, Servicio
 from .models import Empleado, Especialidad, Cargo, AuditoriaInventario, DetalleAuditoria
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as DefaultUserAdmin
+from . import busqueda, contadores
+from .busqueda import BusquedaAdminMixin
+
+
+class RangoListFilter(admin.SimpleListFilter):
+    """
+    Filtro por tramos fijos (clave, etiqueta, Q). A diferencia de un
+    list_filter sobre el campo, no arma las opciones con un SELECT DISTINCT
+    de la columna sobre la tabla completa.
+    """
+    rangos = ()
+
+    def lookups(self, request, model_admin):
+        return [(clave, etiqueta) for clave, etiqueta, _ in self.rangos]
+
+    def queryset(self, request, queryset):
+        for clave, _, condicion in self.rangos:
+            if self.value() == clave:
+                return queryset.filter(condicion)
+        return queryset
+
+
+class PrecioFilter(RangoListFilter):
+    title = 'precio'
+    parameter_name = 'rango_precio'
+    rangos = (
+        ('hasta_1000', 'Menos de $1.000', Q(precio__lt=1000)),
+        ('1000_5000', '$1.000 a $4.999', Q(precio__gte=1000, precio__lt=5000)),
+        ('5000_20000', '$5.000 a $19.999', Q(precio__gte=5000, precio__lt=20000)),
+        ('desde_20000', '$20.000 o más', Q(precio__gte=20000)),
+    )
+
 
+class StockFilter(RangoListFilter):
+    title = 'stock'
+    parameter_name = 'stock'
+    rangos = (
+        ('agotado', 'Agotado', Q(cantidad__lte=0)),
+        ('bajo', 'Bajo el mínimo', Q(cantidad__gt=0, cantidad__lt=F('stock_minimo'))),
+        ('disponible', 'Sobre el mínimo', Q(cantidad__gt=0, cantidad__gte=F('stock_minimo'))),
+    )
 
-class ProductoAdmin(admin.ModelAdmin):
+
+class ProductoAdmin(BusquedaAdminMixin, admin.ModelAdmin):
     list_display = ('nombre', 'cantidad', 'precio', 'descripcion')
     search_fields = ('nombre', 'descripcion')
-    list_filter = ('precio', 'cantidad')
+    list_filter = (PrecioFilter, StockFilter)
     ordering = ('nombre',)
+    # Sin el COUNT(*) de la tabla completa en cada página del listado
+    show_full_result_count = False
+    autocomplete_fields = ('proveedor_habitual',)
+    # ProductoProveedor no está registrado en el admin: se ingresa por id
+    raw_id_fields = ('producto_proveedor',)
 
 
-class ProveedoresAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'contacto', 'telefono', 'email', 'ciudad', 'fecha_registro')
+class ProveedoresAdmin(BusquedaAdminMixin, admin.ModelAdmin):
+    list_display = ('nombre', 'contacto', 'telefono', 'email', 'ciudad', 'cantidad_productos', 'fecha_registro')
     search_fields = ('nombre', 'email', 'telefono')
     list_filter = ('ciudad', 'fecha_registro')
     ordering = ('-fecha_registro',)
-    readonly_fields = ('fecha_registro',)
+    readonly_fields = ('fecha_registro', 'cantidad_productos', 'cantidad_solicitudes')
+    show_full_result_count = False
     
     fieldsets = (
         ('Información General', {
@@ -26,6 +74,10 @@ class ProveedoresAdmin(admin.ModelAdmin):
         ('Ubicación', {
             'fields': ('direccion', 'ciudad')
         }),
+        ('Estadísticas', {
+            'fields': ('cantidad_productos', 'cantidad_solicitudes'),
+            'classes': ('collapse',)
+        }),
         ('Registro', {
             'fields': ('fecha_registro',),
             'classes': ('collapse',)
@@ -33,12 +85,15 @@ class ProveedoresAdmin(admin.ModelAdmin):
     )
 
 
-class ServicioRealizadoAdmin(admin.ModelAdmin):
+class ServicioRealizadoAdmin(BusquedaAdminMixin, admin.ModelAdmin):
     list_display = ('servicio', 'proveedor', 'producto', 'fecha_servicio', 'costo', 'estado')
     search_fields = ('servicio__nombre', 'proveedor__nombre', 'producto__nombre')
     list_filter = ('estado', 'fecha_servicio', 'proveedor')
     ordering = ('-fecha_servicio',)
     readonly_fields = ('fecha_registro',)
+    list_select_related = ('servicio', 'proveedor', 'producto')
+    show_full_result_count = False
+    autocomplete_fields = ('servicio', 'proveedor', 'producto')
     
     fieldsets = (
         ('Información del Servicio', {
@@ -54,12 +109,16 @@ class ServicioRealizadoAdmin(admin.ModelAdmin):
     )
 
 
-class ComprasAdmin(admin.ModelAdmin):
+class ComprasAdmin(BusquedaAdminMixin, admin.ModelAdmin):
     list_display = ('nombre_cliente', 'producto', 'cantidad', 'email_cliente', 'telefono_cliente', 'fecha_compra')
     search_fields = ('nombre_cliente', 'email_cliente', 'producto__nombre')
-    list_filter = ('fecha_compra', 'ciudad_cliente')
+    # Sin ciudad_cliente: es texto libre y sus opciones salían de un SELECT DISTINCT sobre todas las compras
+    list_filter = ('fecha_compra',)
     ordering = ('-fecha_compra',)
     readonly_fields = ('fecha_compra',)
+    list_select_related = ('producto',)
+    show_full_result_count = False
+    autocomplete_fields = ('producto', 'proveedor')
     
     fieldsets = (
         ('Información de la Compra', {
@@ -80,7 +139,7 @@ admin.site.register(ServicioRealizado, ServicioRealizadoAdmin)
 admin.site.register(Compras, ComprasAdmin)
 
 
-class ServicioAdmin(admin.ModelAdmin):
+class ServicioAdmin(BusquedaAdminMixin, admin.ModelAdmin):
     list_display = ('nombre', 'precio', 'duracion_minutos', 'activo')
     search_fields = ('nombre', 'descripcion')
     list_filter = ('activo',)
@@ -90,7 +149,7 @@ class ServicioAdmin(admin.ModelAdmin):
 admin.site.register(Servicio, ServicioAdmin)
 
 
-class EspecialidadAdmin(admin.ModelAdmin):
+class EspecialidadAdmin(BusquedaAdminMixin, admin.ModelAdmin):
     list_display = ('nombre', 'descripcion_corta', 'cantidad_empleados', 'fecha_creacion')
     search_fields = ('nombre', 'descripcion')
     list_filter = ('fecha_creacion',)
@@ -119,24 +178,22 @@ class EspecialidadAdmin(admin.ModelAdmin):
         return '-'
     descripcion_corta.short_description = 'Descripción'
     
-    def cantidad_empleados(self, obj):
-        """Muestra la cantidad de empleados con esta especialidad."""
-        if obj.pk:
-            return obj.empleado_set.count()
-        return 0
-    cantidad_empleados.short_description = 'Empleados'
 
 
 # Registrar Especialidad antes que Empleado para mejor organización
 admin.site.register(Especialidad, EspecialidadAdmin)
 
 
-class EmpleadoAdmin(admin.ModelAdmin):
+class EmpleadoAdmin(BusquedaAdminMixin, admin.ModelAdmin):
     list_display = ('nombre', 'apellido', 'cargo', 'experiencia_anos', 'email', 'activo')
-    search_fields = ('nombre', 'apellido', 'email', 'cargo__nombre', 'especialidades__nombre')
+    # Las especialidades se buscan aparte en get_search_results
+    search_fields = ('nombre', 'apellido', 'email', 'cargo__nombre')
     list_filter = ('activo', 'cargo', 'especialidades')
     ordering = ('nombre',)
     filter_horizontal = ('especialidades',)  # Mejora la interfaz para seleccionar especialidades
+    list_select_related = ('cargo',)
+    show_full_result_count = False
+    autocomplete_fields = ('cargo',)
     
     fieldsets = (
         ('Información Personal', {
@@ -154,6 +211,22 @@ class EmpleadoAdmin(admin.ModelAdmin):
         }),
     )
     readonly_fields = ('fecha_creacion', 'fecha_actualizacion')
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Agrega los empleados con alguna especialidad que coincide. Con EXISTS en
+        lugar de un join por especialidades__nombre no hay filas repetidas que
+        obliguen a un DISTINCT sobre todo el listado.
+        """
+        resultados, duplicados = super().get_search_results(request, queryset, search_term)
+        texto = search_term.strip()
+        if not texto:
+            return resultados, duplicados
+        especialidades = busqueda.filtrar(Especialidad.objects.all(), ['nombre'], texto, ordenar=False)
+        con_especialidad = Empleado.especialidades.through.objects.filter(
+            empleado_id=OuterRef('pk'), especialidad__in=especialidades
+        )
+        return queryset.filter(Q(pk__in=resultados.values('pk')) | Q(Exists(con_especialidad))), duplicados
 
 admin.site.register(Empleado, EmpleadoAdmin)
 
@@ -168,8 +241,8 @@ admin.site.register(User, DefaultUserAdmin)
 
 
 @admin.register(Cargo)
-class CargoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'activo', 'puede_agendar', 'puede_gestionar_inventario', 'puede_ver_compras', 'puede_gestionar_empleados_servicios_proveedores')
+class CargoAdmin(BusquedaAdminMixin, admin.ModelAdmin):
+    list_display = ('nombre', 'activo', 'cantidad_empleados', 'puede_agendar', 'puede_gestionar_inventario', 'puede_ver_compras', 'puede_gestionar_empleados_servicios_proveedores')
     list_filter = ('activo', 'puede_agendar', 'puede_gestionar_inventario', 'puede_ver_compras', 'puede_gestionar_empleados_servicios_proveedores')
     search_fields = ('nombre',)
     list_editable = ('activo', 'puede_agendar', 'puede_gestionar_inventario', 'puede_ver_compras', 'puede_gestionar_empleados_servicios_proveedores')
@@ -179,6 +252,7 @@ class DetalleAuditoriaInline(admin.TabularInline):
     model = DetalleAuditoria
     extra = 0
     readonly_fields = ('cantidad_sistema', 'diferencia', 'fecha_revision')
+    autocomplete_fields = ('producto',)
     fields = ('producto', 'cantidad_sistema', 'conteo_fisico', 'diferencia', 'tipo_discrepancia', 'revisado', 'fecha_revision', 'observaciones')
 
 
@@ -190,6 +264,9 @@ class AuditoriaInventarioAdmin(admin.ModelAdmin):
     ordering = ('-fecha_creacion',)
     readonly_fields = ('fecha_creacion', 'fecha_actualizacion', 'fecha_completada')
     inlines = [DetalleAuditoriaInline]
+    list_select_related = ('usuario',)
+    show_full_result_count = False
+    autocomplete_fields = ('usuario',)
     
     fieldsets = (
         ('Información General', {
@@ -204,13 +281,26 @@ class AuditoriaInventarioAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        # Conteos de detalles solo para el listado (las propiedades del modelo hacen una consulta por fila).
+        # Subconsultas correlacionadas: cuentan los detalles de las filas de la página, sin JOIN ni GROUP BY
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.annotate(
+                total_detalles=contadores.conteo(DetalleAuditoria, 'auditoria'),
+                detalles_revisados=contadores.conteo(DetalleAuditoria, 'auditoria', revisado=True),
+            )
+        return queryset
+    
     def total_productos(self, obj):
-        return obj.total_productos
+        return obj.total_detalles
     total_productos.short_description = 'Total Productos'
+    total_productos.admin_order_field = 'total_detalles'
     
     def productos_revisados(self, obj):
-        return f"{obj.productos_revisados}/{obj.total_productos}"
+        return f"{obj.detalles_revisados}/{obj.total_detalles}"
     productos_revisados.short_description = 'Revisados'
+    productos_revisados.admin_order_field = 'detalles_revisados'
 
 
 @admin.register(DetalleAuditoria)
@@ -220,6 +310,9 @@ class DetalleAuditoriaAdmin(admin.ModelAdmin):
     search_fields = ('producto__nombre', 'auditoria__id', 'observaciones')
     ordering = ('-auditoria__fecha_creacion', 'producto__nombre')
     readonly_fields = ('cantidad_sistema', 'diferencia', 'fecha_revision')
+    list_select_related = ('auditoria', 'producto')
+    show_full_result_count = False
+    autocomplete_fields = ('auditoria', 'producto')
     
     fieldsets = (
         ('Información', {
@@ -0,0 +1,41 @@
+"""
+Bloqueos entre procesos con un archivo de bloqueo (flock).
+
+Sirven para secciones cortas sobre archivos compartidos por todos los workers
+(media por contenido, métricas de Prometheus). En sistemas sin fcntl (Windows)
+solo se excluyen los hilos del mismo proceso, que basta para el servidor de
+desarrollo.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_locks = {}
+_lock_locks = threading.Lock()
+
+
+def _lock_hilos(ruta):
+    with _lock_locks:
+        return _locks.setdefault(ruta, threading.Lock())
+
+
+@contextmanager
+def archivo(ruta):
+    """Sección exclusiva entre hilos y procesos que usan el mismo archivo de bloqueo `ruta`"""
+    ruta = os.path.abspath(ruta)
+    with _lock_hilos(ruta):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'a') as descriptor:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(descriptor, fcntl.LOCK_UN)
@@ -0,0 +1,193 @@
+"""
+Búsqueda por texto para los filtros de nombre de los listados y del admin.
+
+Conserva la semántica que tenían los filtros con __icontains (el texto buscado
+aparece dentro del campo), pero en PostgreSQL:
+
+  - no distingue acentos ni mayúsculas: se compara UPPER(f_unaccent(campo))
+    con UPPER(f_unaccent(texto)). f_unaccent es un envoltorio IMMUTABLE de
+    unaccent() creado en la migración 0054, necesario para poder indexarlo;
+  - usa los índices GIN con gin_trgm_ops sobre esa misma expresión (migración
+    0054), por lo que LIKE '%texto%' deja de recorrer la tabla completa;
+  - ordena los resultados por word_similarity() entre el texto y el campo, de
+    modo que las coincidencias más parecidas aparezcan primero.
+
+En otros motores (SQLite en desarrollo) se usa __icontains sin ranking.
+
+Si se agrega un campo a CAMPOS_INDEXADOS, debe agregarse también su índice en
+una migración (ver 0054_busqueda_trigramas).
+
+También define las fuentes de /api/autocompletar/<modelo>/ (búsqueda por
+prefijo, paginada), que usa widgets.AutocompleteSelect.
+"""
+from django.contrib.admin.utils import lookup_spawns_duplicates
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections, models
+from django.db.models import F, Func, Q, Value
+from django.db.models.functions import Greatest, Upper
+
+# Columnas con índice trigram, por tabla. Referencia para mantener la migración al día
+CAMPOS_INDEXADOS = {
+    'producto': ('nombre', 'descripcion'),
+    'proveedores': ('nombre', 'contacto', 'email', 'ciudad', 'telefono'),
+    'productoproveedor': ('nombre', 'codigo_producto'),
+    'empleado': ('nombre', 'apellido', 'email'),
+    'cargo': ('nombre',),
+    'especialidad': ('nombre',),
+    'servicio': ('nombre',),
+    'compras': ('nombre_cliente', 'email_cliente'),
+}
+
+_CAMPOS_TEXTO = (models.CharField, models.TextField)
+
+
+class SinAcentos(Func):
+    """f_unaccent(texto): unaccent() con el diccionario fijo, declarado IMMUTABLE"""
+    function = 'f_unaccent'
+    output_field = models.TextField()
+
+
+def normalizada(expresion):
+    """UPPER(f_unaccent(expresion)), la misma expresión que usan los índices"""
+    return Upper(SinAcentos(expresion))
+
+
+def usa_postgres(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def filtrar(queryset, campos, texto, ordenar=True):
+    """
+    Filtra `queryset` a las filas en que alguno de `campos` contiene `texto`.
+    Con `ordenar`, en PostgreSQL los resultados quedan ordenados por relevancia
+    y luego por el orden que ya tenía el queryset.
+    """
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset
+
+    if not usa_postgres(queryset):
+        condicion = Q()
+        for campo in campos:
+            condicion |= Q(**{f'{campo}__icontains': texto})
+        return queryset.filter(condicion)
+
+    # Nombres únicos por si se llama varias veces sobre el mismo queryset
+    prefijo = f'_busqueda_{len(queryset.query.annotations)}'
+    alias = {f'{prefijo}_{indice}': normalizada(F(campo)) for indice, campo in enumerate(campos)}
+    buscado = normalizada(Value(texto))
+    condicion = Q()
+    for nombre in alias:
+        condicion |= Q(**{f'{nombre}__contains': buscado})
+    queryset = queryset.alias(**alias).filter(condicion)
+
+    if ordenar:
+        similitudes = [TrigramWordSimilarity(buscado, F(nombre)) for nombre in alias]
+        relevancia = similitudes[0] if len(similitudes) == 1 else Greatest(*similitudes)
+        orden_previo = queryset.query.order_by or queryset.model._meta.ordering
+        queryset = queryset.alias(**{f'{prefijo}_relevancia': relevancia}).order_by(
+            f'-{prefijo}_relevancia', *orden_previo
+        )
+    return queryset
+
+
+def _es_campo_texto(opts, ruta):
+    """True si `ruta` (p. ej. 'cargo__nombre') termina en un CharField o TextField"""
+    campo = None
+    for parte in ruta.split('__'):
+        campo = opts.get_field(parte)
+        if campo.is_relation:
+            opts = campo.related_model._meta
+    return isinstance(campo, _CAMPOS_TEXTO)
+
+
+class BusquedaAdminMixin:
+    """
+    ModelAdmin con la misma búsqueda que los listados.
+
+    Solo se usa cuando todos los search_fields son de texto y sin prefijos
+    ('^', '=', '@'); en otro caso se mantiene la búsqueda estándar del admin.
+    El orden de la lista lo sigue definiendo el admin (ordering / columnas).
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        campos = self.get_search_fields(request)
+        if not search_term.strip() or not campos or not usa_postgres(queryset):
+            return super().get_search_results(request, queryset, search_term)
+        if any(campo[0] in '^=@' or not _es_campo_texto(self.opts, campo) for campo in campos):
+            return super().get_search_results(request, queryset, search_term)
+        queryset = filtrar(queryset, campos, search_term, ordenar=False)
+        duplicados = any(lookup_spawns_duplicates(self.opts, campo) for campo in campos)
+        return queryset, duplicados
+
+
+def filtrar_prefijo(queryset, campos, texto):
+    """Filas en que alguno de `campos` empieza con `texto` (sin acentos ni mayúsculas en PostgreSQL)"""
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset
+    if not usa_postgres(queryset):
+        condicion = Q()
+        for campo in campos:
+            condicion |= Q(**{f'{campo}__istartswith': texto})
+        return queryset.filter(condicion)
+    prefijo = f'_prefijo_{len(queryset.query.annotations)}'
+    alias = {f'{prefijo}_{indice}': normalizada(F(campo)) for indice, campo in enumerate(campos)}
+    buscado = normalizada(Value(texto))
+    condicion = Q()
+    for nombre in alias:
+        condicion |= Q(**{f'{nombre}__startswith': buscado})
+    return queryset.alias(**alias).filter(condicion)
+
+
+# ========== AUTOCOMPLETADO ==========
+
+def fuentes_autocompletar():
+    """
+    modelo -> configuración de /api/autocompletar/<modelo>/ y de AutocompleteSelect:
+    queryset base, campos de búsqueda por prefijo, orden, etiqueta de cada opción
+    y filtros aceptados por GET (parámetro -> lookup).
+    """
+    from .models import Producto, ProductoProveedor, Proveedores
+
+    return {
+        'producto': {
+            'queryset': lambda: Producto.objects.filter(activo=True),
+            'campos': ['nombre'],
+            'orden': ['nombre', 'id'],
+            'etiqueta': lambda producto: producto.nombre,
+            'filtros': {'proveedor': 'proveedor_habitual_id'},
+        },
+        'producto_proveedor': {
+            'queryset': lambda: ProductoProveedor.objects.filter(activo=True).select_related('proveedor'),
+            'campos': ['nombre', 'codigo_producto'],
+            'orden': ['nombre', 'id'],
+            'etiqueta': str,
+            'filtros': {'proveedor': 'proveedor_id'},
+        },
+        'proveedor': {
+            'queryset': lambda: Proveedores.objects.all(),
+            'campos': ['nombre'],
+            'orden': ['nombre', 'id'],
+            'etiqueta': lambda proveedor: proveedor.nombre,
+            'filtros': {},
+        },
+    }
+
+
+def autocompletar(modelo, texto, pagina=1, filtros=None, por_pagina=20):
+    """
+    Una página de opciones [(id, etiqueta)] y si hay más. Se pide una fila
+    extra en lugar de contar el total.
+    """
+    fuente = fuentes_autocompletar()[modelo]
+    queryset = fuente['queryset']()
+    for parametro, valor in (filtros or {}).items():
+        lookup = fuente['filtros'].get(parametro)
+        if lookup and str(valor).isdigit():
+            queryset = queryset.filter(**{lookup: int(valor)})
+    queryset = filtrar_prefijo(queryset, fuente['campos'], texto).order_by(*fuente['orden'])
+    inicio = (pagina - 1) * por_pagina
+    filas = list(queryset[inicio:inicio + por_pagina + 1])
+    opciones = [(fila.pk, fuente['etiqueta'](fila)) for fila in filas[:por_pagina]]
+    return opciones, len(filas) > por_pagina
@@ -0,0 +1,87 @@
+"""
+Caché en memoria del proceso para los catálogos chicos (zonas, cargos,
+especialidades, servicios y proveedores).
+
+Cada worker guarda las filas de cada catálogo junto con la versión de datos
+(VersionDatos, ver versiones.py) con la que las leyó. Antes de usarlas se
+compara esa versión con la de la base: si cambió (un save/delete en cualquier
+worker la incrementa al confirmar) se vuelven a leer. Las versiones de todos
+los catálogos se consultan juntas, una vez por petición (CatalogosMiddleware);
+fuera de una petición se consultan en cada llamada.
+
+Dentro de una transacción que modificó un catálogo todavía no confirmado
+(versiones_pendientes de la conexión) se lee directo de la base, y cualquier
+save/delete de un catálogo descarta las versiones ya leídas en la petición, así
+que una vista ve sus propios cambios.
+
+Las funciones retornan copias de las filas: la vista puede agregarles
+atributos (p. ej. conteos) sin afectar a otras peticiones.
+"""
+import copy
+from contextvars import ContextVar
+
+from django.db import router, transaction
+
+from . import versiones
+from .models import Cargo, Especialidad, Proveedores, Servicio, Zona
+
+MODELOS = (Zona, Cargo, Especialidad, Servicio, Proveedores)
+ORDEN = ('nombre', 'id')
+
+ETIQUETAS = tuple(versiones.etiqueta_modelo(modelo) for modelo in MODELOS)
+
+# (alias de base, etiqueta) -> (versión, filas)
+_memoria = {}
+
+# Versiones leídas en la petición actual; None fuera de una petición
+_versiones_peticion = ContextVar('versiones_catalogos', default=None)
+
+
+def iniciar_peticion():
+    """Abre el contexto de una petición; retorna el token para cerrarlo"""
+    return _versiones_peticion.set({})
+
+
+def terminar_peticion(token):
+    _versiones_peticion.reset(token)
+
+
+def descartar_versiones():
+    """Obliga a la próxima lectura de la petición a consultar de nuevo las versiones"""
+    versiones_peticion = _versiones_peticion.get()
+    if versiones_peticion is not None:
+        versiones_peticion.clear()
+
+
+def limpiar():
+    """Vacía la memoria del proceso (tests)"""
+    _memoria.clear()
+
+
+def _version(etiqueta):
+    versiones_peticion = _versiones_peticion.get()
+    if versiones_peticion is None:
+        return versiones.obtener_versiones(ETIQUETAS)[etiqueta]
+    if not versiones_peticion:
+        versiones_peticion.update(versiones.obtener_versiones(ETIQUETAS))
+    return versiones_peticion[etiqueta]
+
+
+def obtener(modelo):
+    """Todas las filas de `modelo` ordenadas por nombre"""
+    etiqueta = versiones.etiqueta_modelo(modelo)
+    pendientes = getattr(transaction.get_connection(), 'versiones_pendientes', None) or ()
+    if etiqueta in pendientes:
+        return list(modelo.objects.order_by(*ORDEN))
+
+    clave = (router.db_for_read(modelo), etiqueta)
+    version = _version(etiqueta)
+    guardado = _memoria.get(clave)
+    if guardado is None or guardado[0] != version:
+        guardado = _memoria[clave] = (version, list(modelo.objects.order_by(*ORDEN)))
+    return [copy.copy(fila) for fila in guardado[1]]
+
+
+def activos(modelo):
+    """Filas de `modelo` con activo=True"""
+    return [fila for fila in obtener(modelo) if fila.activo]
@@ -0,0 +1,172 @@
+"""
+Registro de consultas lentas con su plan de ejecución.
+
+ConsultasLentasMiddleware (middleware.py) instala `registrar_consulta` como
+execute_wrapper en todas las conexiones durante la petición. Las consultas que
+superan CONSULTAS_LENTAS_UMBRAL_MS se anotan con la vista y el punto del código
+de la aplicación que las originó (archivo:línea). Al terminar la respuesta:
+
+  - a una fracción (CONSULTAS_LENTAS_EXPLAIN_MUESTREO) de los SELECT lentos se
+    le ejecuta EXPLAIN (ANALYZE, BUFFERS) en la misma conexión, dentro de una
+    transacción READ ONLY con statement_timeout, de modo que no pueda escribir
+    ni quedarse colgado (en SQLite, para desarrollo, EXPLAIN QUERY PLAN);
+  - se guardan en ConsultaLenta, que funciona como buffer circular: se
+    conservan las últimas CONSULTAS_LENTAS_MAXIMO filas.
+
+Todo eso ocurre fuera de las transacciones de la vista: si la vista hace
+rollback el registro igual queda. Los parámetros no se guardan (pueden traer
+datos personales); solo se usan para el EXPLAIN.
+
+En /panel-admin/consultas-lentas/ se agrupan por huella (la sentencia
+normalizada) y se ordenan por tiempo total.
+"""
+import hashlib
+import logging
+import os
+import random
+import re
+import sys
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Consultas lentas de la petición en curso (None fuera de una petición)
+_pendientes = ContextVar('consultas_lentas_pendientes', default=None)
+_vista_actual = ContextVar('consultas_lentas_vista', default='')
+
+_RE_LISTA_IN = re.compile(r'IN \((?:%s(?:, )?)+\)')
+_CARPETA_APP = os.path.dirname(os.path.abspath(__file__))
+# Módulos de instrumentación que envuelven las consultas; el origen es lo que está debajo
+_ENVOLTURAS = {
+    os.path.join(_CARPETA_APP, nombre)
+    for nombre in ('consultas_lentas.py', 'metricas.py', 'perfilador.py', 'middleware.py', 'decorators.py')
+}
+
+
+def normalizar(sql):
+    """Sentencia sin espacios repetidos y con las listas IN (%s, %s, ...) colapsadas"""
+    return _RE_LISTA_IN.sub('IN (...)', ' '.join(sql.split()))
+
+
+def huella(sql_normalizado):
+    return hashlib.sha1(sql_normalizado.encode('utf-8')).hexdigest()
+
+
+def origen_en_codigo():
+    """archivo:línea (función) del primer frame de la aplicación que llevó a la consulta"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        archivo = frame.f_code.co_filename
+        if archivo.startswith(_CARPETA_APP) and archivo not in _ENVOLTURAS:
+            ruta = os.path.relpath(archivo, settings.BASE_DIR)
+            return f'{ruta}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return ''
+
+
+def iniciar(vista=''):
+    return _pendientes.set([]), _vista_actual.set(vista)
+
+
+def asignar_vista(vista):
+    _vista_actual.set(vista)
+
+
+def finalizar(tokens):
+    """Retorna las consultas lentas anotadas y limpia el contexto"""
+    pendientes = _pendientes.get() or []
+    token_pendientes, token_vista = tokens
+    _pendientes.reset(token_pendientes)
+    _vista_actual.reset(token_vista)
+    return pendientes
+
+
+def registrar_consulta(execute, sql, params, many, context):
+    """execute_wrapper: anota las consultas que superan el umbral"""
+    pendientes = _pendientes.get()
+    if pendientes is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        if duracion_ms >= getattr(settings, 'CONSULTAS_LENTAS_UMBRAL_MS', 200):
+            pendientes.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': None if many else params,
+                'duracion_ms': duracion_ms,
+                'vista': _vista_actual.get(),
+                'origen': origen_en_codigo(),
+            })
+
+
+def explicar(alias, sql, params):
+    """
+    EXPLAIN (ANALYZE, BUFFERS) de un SELECT en una transacción de solo lectura.
+    Retorna el plan en texto o None si no corresponde o falla.
+    """
+    conexion = connections[alias]
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')) or conexion.in_atomic_block:
+        return None
+    if conexion.vendor == 'sqlite':
+        # En desarrollo: SQLite solo entrega el plan estimado
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                return '\n'.join(str(fila[-1]) for fila in cursor.fetchall())
+        except Exception as error:
+            logger.info('No se pudo obtener el plan de una consulta lenta: %s', error)
+            return None
+    if conexion.vendor != 'postgresql':
+        return None
+    timeout_ms = int(getattr(settings, 'CONSULTAS_LENTAS_EXPLAIN_TIMEOUT_MS', 5000))
+    try:
+        with transaction.atomic(using=alias):
+            with conexion.cursor() as cursor:
+                # Debe ser lo primero de la transacción; ANALYZE ejecuta la consulta de verdad
+                cursor.execute('SET TRANSACTION READ ONLY')
+                cursor.execute(f'SET LOCAL statement_timeout = {timeout_ms}')
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+                return '\n'.join(fila[0] for fila in cursor.fetchall())
+    except Exception as error:
+        logger.info('No se pudo obtener el plan de una consulta lenta: %s', error)
+        return None
+
+
+def guardar(pendientes):
+    """Obtiene planes de una muestra de `pendientes` y los guarda en el buffer circular"""
+    from .models import ConsultaLenta
+
+    if not pendientes:
+        return
+    muestreo = getattr(settings, 'CONSULTAS_LENTAS_EXPLAIN_MUESTREO', 0.1)
+    registros = []
+    for consulta in pendientes:
+        plan = None
+        if consulta['params'] is not None and random.random() < muestreo:
+            plan = explicar(consulta['alias'], consulta['sql'], consulta['params'])
+        sql = normalizar(consulta['sql'])
+        registros.append(ConsultaLenta(
+            huella=huella(sql),
+            sql=sql,
+            duracion_ms=round(consulta['duracion_ms'], 2),
+            vista=consulta['vista'][:200],
+            origen=consulta['origen'][:300],
+            alias=consulta['alias'],
+            plan=plan,
+        ))
+    creados = ConsultaLenta.objects.bulk_create(registros)
+
+    # Buffer circular: se descartan las filas más antiguas que exceden el máximo
+    maximo = getattr(settings, 'CONSULTAS_LENTAS_MAXIMO', 5000)
+    ultimo_id = creados[-1].id if creados and creados[-1].id else None
+    if ultimo_id is None:
+        ultimo_id = ConsultaLenta.objects.order_by('-id').values_list('id', flat=True).first()
+    if ultimo_id and ultimo_id > maximo:
+        ConsultaLenta.objects.filter(id__lte=ultimo_id - maximo).delete()
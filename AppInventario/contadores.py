@@ -0,0 +1,114 @@
+"""
+Contadores de relaciones guardados como columnas de los catálogos, para que
+los listados y las validaciones antes de eliminar no cuenten filas:
+
+  - Especialidad.cantidad_empleados: empleados con la especialidad (M2M)
+  - Cargo.cantidad_empleados: empleados con el cargo
+  - Proveedores.cantidad_productos: productos del proveedor (ProductoProveedor)
+  - Proveedores.cantidad_solicitudes: solicitudes de compra al proveedor
+
+Las señales de signals.py los ajustan en la misma transacción que el cambio
+con UPDATE ... SET contador = contador + n, que en PostgreSQL se aplica sobre
+la última versión de la fila y no pierde incrementos concurrentes.
+
+Un save() del catálogo no escribe los contadores (ConContadores en models.py
+pasa update_fields sin ellos), así que una instancia leída antes de un ajuste
+no los pisa con valores viejos.
+
+Los cambios que no envían señales (QuerySet.update() sobre la relación,
+bulk_create, loaddata, SQL directo) dejan los contadores desfasados.
+`manage.py recontar_contadores` los recalcula todos.
+
+Los ajustes no incrementan la versión de datos del catálogo (versiones.py):
+las vistas cacheadas que muestran un contador ya dependen de la versión del
+modelo relacionado, y las copias en memoria de catalogos.py no deben usarse
+para leer contadores.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def definiciones():
+    """
+    (modelo, contador, modelo relacionado, campo del relacionado que apunta al
+    modelo) de cada contador.
+    """
+    from .models import Cargo, Empleado, Especialidad, ProductoProveedor, Proveedores, SolicitudCompra
+
+    return (
+        (Especialidad, 'cantidad_empleados', Empleado.especialidades.through, 'especialidad'),
+        (Cargo, 'cantidad_empleados', Empleado, 'cargo'),
+        (Proveedores, 'cantidad_productos', ProductoProveedor, 'proveedor'),
+        (Proveedores, 'cantidad_solicitudes', SolicitudCompra, 'proveedor'),
+    )
+
+
+def contadores_de(modelo):
+    """Nombres de las columnas contador de `modelo`"""
+    return {contador for definido, contador, _, _ in definiciones() if definido is modelo}
+
+
+def campos_sin_contadores(instancia, update_fields=None, force_insert=False):
+    """
+    update_fields con el que guardar `instancia`: los campos concretos cargados
+    salvo los contadores si es una fila existente y no se indicaron campos; si
+    no, `update_fields` tal como viene (un insert usa los valores por defecto).
+    Los campos diferidos quedan fuera, como en un save() normal, para no
+    cargarlos uno por uno.
+    """
+    if update_fields is not None or force_insert or instancia._state.adding:
+        return update_fields
+    excluir = contadores_de(type(instancia))
+    diferidos = instancia.get_deferred_fields()
+    return [
+        campo.name for campo in instancia._meta.concrete_fields
+        if not campo.primary_key and campo.name not in excluir and campo.attname not in diferidos
+    ]
+
+
+def sumar(modelo, contador, cambios):
+    """
+    Suma a `contador` de cada fila de `modelo` su valor en `cambios`
+    (Counter o dict id -> cantidad, negativa para restar). Un UPDATE por
+    cantidad distinta; nunca baja de cero.
+    """
+    por_cantidad = {}
+    for pk, cantidad in cambios.items():
+        if pk is not None and cantidad:
+            por_cantidad.setdefault(cantidad, []).append(pk)
+    for cantidad, ids in por_cantidad.items():
+        modelo.objects.filter(pk__in=ids).update(
+            **{contador: Greatest(F(contador) + cantidad, Value(0))}
+        )
+
+
+def ajustar_fk(modelo, contador, anterior, actual):
+    """Un registro relacionado pasó de apuntar a `anterior` a `actual` (ids o None)"""
+    if anterior != actual:
+        sumar(modelo, contador, Counter({anterior: -1, actual: 1}))
+
+
+def conteo(relacionado, campo, **filtros):
+    """
+    Subconsulta con la cantidad de filas de `relacionado` que apuntan a la fila
+    externa (y cumplen `filtros`, si se indican)
+    """
+    filas = (
+        relacionado.objects.filter(**{campo: OuterRef('pk')}, **filtros)
+        .order_by().values(campo).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(filas, output_field=IntegerField()), Value(0))
+
+
+def recontar(modelos=None):
+    """
+    Recalcula los contadores de `modelos` (todos si es None) con un UPDATE por
+    modelo. Retorna {modelo: filas actualizadas}.
+    """
+    por_modelo = {}
+    for modelo, contador, relacionado, campo in definiciones():
+        if modelos is None or modelo in modelos:
+            por_modelo.setdefault(modelo, {})[contador] = conteo(relacionado, campo)
+    return {modelo: modelo.objects.update(**valores) for modelo, valores in por_modelo.items()}
@@ -0,0 +1,128 @@
+"""
+Decoradores de vistas de AppInventario.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
+from . import routers, versiones
+
+# Cookie que fija las lecturas a la primaria tras una escritura (ver middleware.py)
+COOKIE_PRIMARIA = 'bd_primaria'
+
+# Modelos que afectan a cualquier fragmento del panel (permisos por cargo). Los
+# permisos propios del usuario van en la firma; los fragmentos que muestran
+# datos de otros usuarios declaran User entre sus modelos.
+MODELOS_BASE = ('AppInventario.empleado', 'AppInventario.cargo')
+
+
+def _firma_fragmento(request, etiquetas):
+    """Hash de todo lo que determina el HTML de un fragmento"""
+    versiones_datos = versiones.obtener_versiones(etiquetas)
+    partes = [
+        request.path,
+        '&'.join(f'{clave}={valor}' for clave, valores in sorted(request.GET.lists()) for valor in valores),
+        str(request.user.pk),
+        f'{request.user.is_active:d}{request.user.is_staff:d}{request.user.is_superuser:d}',
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        timezone.localdate().isoformat(),
+    ]
+    partes += [f'{etiqueta}:{versiones_datos[etiqueta]}' for etiqueta in sorted(etiquetas)]
+    return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()
+
+
+def fragmento_cacheado(*modelos, timeout=DEFAULT_TIMEOUT):
+    """
+    Cachea el HTML de las listas que se cargan por AJAX (los *_fragment.html).
+
+    La clave y el ETag se derivan de la ruta, los filtros GET, el usuario y la
+    versión de datos (VersionDatos) de los modelos indicados, así que cualquier
+    save/delete sobre ellos invalida el fragmento sin borrar nada a mano. Si el
+    navegador envía If-None-Match con el mismo ETag se responde 304 sin ejecutar
+    la vista; si no, se sirve el HTML cacheado o se renderiza y se guarda.
+
+    Las peticiones no AJAX, las que no son GET y las que tienen mensajes
+    pendientes (que el fragmento mostraría una sola vez) pasan directo a la vista.
+    """
+    etiquetas = tuple(sorted({m._meta.label_lower for m in modelos} | set(MODELOS_BASE)))
+
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if (
+                request.method != 'GET'
+                or request.headers.get('X-Requested-With') != 'XMLHttpRequest'
+                or settings.CSRF_COOKIE_NAME not in request.COOKIES
+                or len(messages.get_messages(request))
+            ):
+                return vista(request, *args, **kwargs)
+
+            firma = _firma_fragmento(request, etiquetas)
+            etag = f'"{firma}"'
+            clave = f'fragmento:{firma}'
+
+            if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                respuesta = HttpResponseNotModified()
+            else:
+                contenido = cache.get(clave)
+                if contenido is not None:
+                    respuesta = HttpResponse(contenido)
+                else:
+                    respuesta = vista(request, *args, **kwargs)
+                    if respuesta.status_code != 200 or getattr(respuesta, 'streaming', False):
+                        return respuesta
+                    cache.set(clave, respuesta.content, timeout)
+
+            respuesta['ETag'] = etag
+            patch_cache_control(respuesta, private=True, no_cache=True)
+            patch_vary_headers(respuesta, ('X-Requested-With', 'Cookie'))
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def usar_replica(vista):
+    """
+    Ejecuta una vista de solo lectura (listado, reporte o exportación) contra la
+    réplica. Las peticiones que no son GET/HEAD y las de un usuario que escribió
+    hace menos de REPLICA_PIN_SEGUNDOS (cookie puesta por
+    PrimariaTrasEscrituraMiddleware) siguen en la primaria para que vea sus
+    propios cambios. En las respuestas en streaming la réplica se mantiene
+    mientras se genera el contenido.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or COOKIE_PRIMARIA in request.COOKIES:
+            return vista(request, *args, **kwargs)
+
+        token = routers.activar_replica()
+        try:
+            respuesta = vista(request, *args, **kwargs)
+        finally:
+            routers.restaurar_replica(token)
+
+        if getattr(respuesta, 'streaming', False):
+            respuesta.streaming_content = _iterar_en_replica(respuesta.streaming_content)
+        return respuesta
+    return envoltura
+
+
+def _iterar_en_replica(contenido):
+    iterador = iter(contenido)
+    while True:
+        token = routers.activar_replica()
+        try:
+            parte = next(iterador, None)
+        finally:
+            routers.restaurar_replica(token)
+        if parte is None:
+            return
+        yield parte
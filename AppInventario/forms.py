@@ -4,10 +4,39 @@ from .models import Empleado, Servicio, AuditoriaInventario, DetalleAuditoria
 from django.contrib.auth.models import User
 from django import forms as django_forms
 from django.core.exceptions import ValidationError
+from django.db.models import Model, Q
 
+from . import catalogos
+from .widgets import AutocompleteSelect, SelectSoloSeleccion
 
 
-class ProductoForm(forms.ModelForm):
+def opciones_de_catalogo(campo, modelo):
+    """
+    Carga las opciones de un ModelChoiceField con las filas activas del
+    catálogo en memoria (catalogos.py) en lugar de recorrer su queryset en cada
+    formulario. La validación sigue usando el queryset del campo, que debe
+    asignarse antes y filtrar igual (activo=True).
+    """
+    vacia = [('', campo.empty_label)] if getattr(campo, 'empty_label', None) is not None else []
+    campo.choices = vacia + [(obj.pk, campo.label_from_instance(obj)) for obj in catalogos.activos(modelo)]
+
+
+class RelacionesValidadasMixin:
+    """
+    Los ModelChoiceField ya obtuvieron de la base el objeto elegido; se omite la
+    validación de esos ForeignKey en el modelo, que repetiría la consulta.
+    """
+
+    def _get_validation_exclusions(self):
+        exclusiones = super()._get_validation_exclusions()
+        for nombre in self.fields:
+            if isinstance(self.cleaned_data.get(nombre), Model):
+                exclusiones.add(nombre)
+        return exclusiones
+
+
+
+class ProductoForm(RelacionesValidadasMixin, forms.ModelForm):
     tipo_producto = forms.ChoiceField(
         choices=[
             ('propio', 'Producto Propio (Producido por la empresa)'),
@@ -23,7 +52,7 @@ class ProductoForm(forms.ModelForm):
         queryset=None,
         required=False,
         empty_label='-- Seleccione un proveedor --',
-        widget=forms.Select(attrs={'class': 'form-control', 'id': 'id_proveedor_seleccionado'}),
+        widget=AutocompleteSelect('proveedor', attrs={'class': 'form-control', 'id': 'id_proveedor_seleccionado'}),
         label='Proveedor',
         help_text='Primero seleccione el proveedor'
     )
@@ -46,7 +75,7 @@ class ProductoForm(forms.ModelForm):
             'precio': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '0', 'min': '0', 'step': '1'}),
             'stock_minimo': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '10', 'min': '0'}),
             'costo_promedio_actual': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '0.00', 'min': '0', 'step': '0.01'}),
-            'proveedor_habitual': forms.Select(attrs={'class': 'form-control'}),
+            'proveedor_habitual': AutocompleteSelect('proveedor', attrs={'class': 'form-control'}),
             'descripcion': forms.Textarea(attrs={'class': 'form-control', 'rows': 4, 'placeholder': 'Descripción del producto'}),
             'imagen': forms.FileInput(attrs={'class': 'form-control', 'accept': 'image/*'}),
             'zona': forms.Select(attrs={'class': 'form-control', 'id': 'id_zona_select'}),
@@ -70,59 +99,29 @@ class ProductoForm(forms.ModelForm):
         from .models import Proveedores, ProductoProveedor
         self.fields['proveedor_seleccionado'].queryset = Proveedores.objects.all().order_by('nombre')
         
-        # Cargar zonas activas
+        # Cargar zonas activas (opciones desde el catálogo en memoria)
         self.fields['zona'].queryset = Zona.objects.filter(activo=True).order_by('nombre')
         self.fields['zona'].empty_label = '-- Seleccione una zona --'
         self.fields['zona'].required = False
+        opciones_de_catalogo(self.fields['zona'], Zona)
         
-        # Si es un POST, cargar productos del proveedor seleccionado o incluir el producto seleccionado
+        # Productos del proveedor: el queryset queda sin evaluar (se consulta una vez
+        # al validar o renderizar). En un POST se incluye además el producto enviado,
+        # aunque no pertenezca al proveedor
+        productos_proveedor = ProductoProveedor.objects.select_related('proveedor').order_by('nombre')
         if self.data:
-            proveedor_id = self.data.get('proveedor_seleccionado')
-            producto_proveedor_id = self.data.get('producto_proveedor')
+            proveedor_id = str(self.data.get('proveedor_seleccionado') or '')
+            producto_proveedor_id = str(self.data.get('producto_proveedor') or '')
+            condicion = None
+            if proveedor_id.isdigit():
+                condicion = Q(proveedor_id=proveedor_id, activo=True)
+                if producto_proveedor_id.isdigit():
+                    condicion |= Q(id=producto_proveedor_id)
+            elif producto_proveedor_id.isdigit():
+                condicion = Q(id=producto_proveedor_id, activo=True)
             
-            if proveedor_id:
-                try:
-                    proveedor = Proveedores.objects.get(id=proveedor_id)
-                    # Cargar productos del proveedor seleccionado
-                    queryset = ProductoProveedor.objects.filter(
-                        proveedor=proveedor,
-                        activo=True
-                    ).order_by('nombre')
-                    
-                    # Si hay un producto_proveedor seleccionado, asegurarse de que esté en el queryset
-                    if producto_proveedor_id:
-                        try:
-                            producto_seleccionado = ProductoProveedor.objects.get(id=producto_proveedor_id)
-                            # Si el producto no está en el queryset, agregarlo
-                            if producto_seleccionado not in queryset:
-                                queryset = ProductoProveedor.objects.filter(
-                                    id=producto_proveedor_id
-                                ) | queryset
-                        except ProductoProveedor.DoesNotExist:
-                            pass
-                    
-                    self.fields['producto_proveedor'].queryset = queryset
-                except Proveedores.DoesNotExist:
-                    # Si el proveedor no existe pero hay un producto_proveedor, cargar solo ese producto
-                    if producto_proveedor_id:
-                        try:
-                            self.fields['producto_proveedor'].queryset = ProductoProveedor.objects.filter(
-                                id=producto_proveedor_id,
-                                activo=True
-                            )
-                        except:
-                            self.fields['producto_proveedor'].queryset = ProductoProveedor.objects.none()
-                    else:
-                        self.fields['producto_proveedor'].queryset = ProductoProveedor.objects.none()
-            elif producto_proveedor_id:
-                # Si hay un producto_proveedor seleccionado pero no hay proveedor, cargar solo ese producto
-                try:
-                    self.fields['producto_proveedor'].queryset = ProductoProveedor.objects.filter(
-                        id=producto_proveedor_id,
-                        activo=True
-                    )
-                except:
-                    self.fields['producto_proveedor'].queryset = ProductoProveedor.objects.none()
+            if condicion is not None:
+                self.fields['producto_proveedor'].queryset = productos_proveedor.filter(condicion)
             else:
                 # Inicialmente no hay productos (se cargarán según el proveedor seleccionado)
                 self.fields['producto_proveedor'].queryset = ProductoProveedor.objects.none()
@@ -133,15 +132,16 @@ class ProductoForm(forms.ModelForm):
         # Si es una instancia existente, determinar el tipo de producto
         if self.instance and self.instance.pk:
             # Usar los nuevos campos del modelo
-            if self.instance.tipo_producto == 'proveedor' and self.instance.producto_proveedor:
+            if self.instance.tipo_producto == 'proveedor' and self.instance.producto_proveedor_id:
+                producto_proveedor = self.instance.producto_proveedor
                 self.fields['tipo_producto'].initial = 'proveedor'
-                self.fields['proveedor_seleccionado'].initial = self.instance.producto_proveedor.proveedor.id
+                self.fields['proveedor_seleccionado'].initial = producto_proveedor.proveedor_id
                 # Cargar productos del proveedor
-                self.fields['producto_proveedor'].queryset = ProductoProveedor.objects.filter(
-                    proveedor=self.instance.producto_proveedor.proveedor, 
+                self.fields['producto_proveedor'].queryset = productos_proveedor.filter(
+                    proveedor_id=producto_proveedor.proveedor_id,
                     activo=True
-                ).order_by('nombre')
-                self.fields['producto_proveedor'].initial = self.instance.producto_proveedor.id
+                )
+                self.fields['producto_proveedor'].initial = producto_proveedor.id
                 self.fields['producto_proveedor'].widget.attrs['disabled'] = False
             else:
                 self.fields['tipo_producto'].initial = 'propio'
@@ -328,8 +328,9 @@ class EntradaInventarioForm(forms.ModelForm):
         model = EntradaInventario
         fields = ['producto', 'proveedor', 'cantidad', 'precio_unitario', 'numero_factura', 'observaciones']
         widgets = {
-            'producto': forms.Select(attrs={'class': 'form-control', 'id': 'id_producto_entrada'}),
-            'proveedor': forms.Select(attrs={'class': 'form-control', 'id': 'id_proveedor_entrada'}),
+            # Las opciones las carga lista_fragment.html desde entradas_productos_por_proveedor_ajax
+            'producto': SelectSoloSeleccion(attrs={'class': 'form-control', 'id': 'id_producto_entrada'}),
+            'proveedor': AutocompleteSelect('proveedor', attrs={'class': 'form-control', 'id': 'id_proveedor_entrada'}),
             'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'placeholder': 'Cantidad'}),
             'precio_unitario': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'min': '0', 'placeholder': '0.00', 'id': 'id_precio_unitario_entrada'}),
             'numero_factura': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Número de factura (opcional)'}),
@@ -372,7 +373,7 @@ class ComprasForm(forms.ModelForm):
         queryset=None,
         required=False,
         empty_label="Seleccione un proveedor",
-        widget=forms.Select(attrs={
+        widget=AutocompleteSelect('proveedor', attrs={
             'class': 'form-control',
             'id': 'id_proveedor_compra'
         }),
@@ -383,7 +384,7 @@ class ComprasForm(forms.ModelForm):
         queryset=None,
         required=False,
         empty_label="Seleccione un producto",
-        widget=forms.Select(attrs={
+        widget=AutocompleteSelect('producto', attrs={
             'class': 'form-control',
             'id': 'id_producto_compra'
         }),
@@ -394,10 +395,10 @@ class ComprasForm(forms.ModelForm):
         queryset=None,
         required=False,
         empty_label="Seleccione un producto de proveedor",
-        widget=forms.Select(attrs={
+        widget=AutocompleteSelect('producto_proveedor', attrs={
             'class': 'form-control',
             'id': 'id_producto_proveedor_compra'
-        }),
+        }, depende_de={'proveedor': 'id_proveedor_compra'}),
         label='Producto de Proveedor'
     )
     
@@ -495,7 +496,7 @@ class ComprasForm(forms.ModelForm):
         self.fields['proveedor'].queryset = Proveedores.objects.all().order_by('nombre')
 
 
-class EmpleadoForm(forms.ModelForm):
+class EmpleadoForm(RelacionesValidadasMixin, forms.ModelForm):
     # nuevo campo cargo como ModelChoice
     cargo = forms.ModelChoiceField(queryset=None, required=False, empty_label="-- Sin cargo --")
     
@@ -529,6 +530,7 @@ class EmpleadoForm(forms.ModelForm):
         try:
             from .models import Cargo
             self.fields['cargo'].queryset = Cargo.objects.filter(activo=True)
+            opciones_de_catalogo(self.fields['cargo'], Cargo)
         except Exception:
             if 'cargo' in self.fields:
                 self.fields['cargo'].widget = forms.HiddenInput()
@@ -583,44 +585,32 @@ class EmpleadoForm(forms.ModelForm):
             if not username or not username.strip():
                 raise forms.ValidationError('El nombre de usuario es obligatorio si deseas crear un usuario')
             
-            from django.contrib.auth.models import User
-            
             # En modo edición, si el usuario ya existe, la contraseña es opcional
-            if self.instance.pk and hasattr(self.instance, 'user') and self.instance.user:
+            usuario_id = self.instance.user_id if self.instance.pk else None
+            if usuario_id:
                 # Modo edición con usuario existente: contraseña opcional
                 if password:
                     if len(password) < 8:
                         raise forms.ValidationError('La contraseña debe tener al menos 8 caracteres')
                     if password != password_confirm:
                         raise forms.ValidationError('Las contraseñas no coinciden')
-                # Verificar si otro usuario tiene ese username
-                if User.objects.filter(username=username).exclude(id=self.instance.user.id).exists():
-                    raise forms.ValidationError('Este nombre de usuario ya está en uso')
             else:
                 # Modo creación o edición sin usuario existente: contraseña obligatoria
                 if not password or len(password) < 8:
                     raise forms.ValidationError('La contraseña es obligatoria y debe tener al menos 8 caracteres')
                 if password != password_confirm:
                     raise forms.ValidationError('Las contraseñas no coinciden')
-                
-                # Verificar si el username ya existe
-                if self.instance.pk:
-                    # Modo edición sin usuario: verificar si otro usuario tiene ese username
-                    if User.objects.filter(username=username).exists():
-                        raise forms.ValidationError('Este nombre de usuario ya está en uso')
-                else:
-                    # Modo creación: verificar si el username existe
-                    if User.objects.filter(username=username).exists():
-                        raise forms.ValidationError('Este nombre de usuario ya está en uso')
             
-            # Verificar si el email ya está en uso por otro usuario de Django
-            # (esto es adicional a la validación de clean_email que verifica Empleado)
+            # Username y email en uso por otro usuario de Django, en una sola consulta
+            # (el email es adicional a la validación de clean_email que verifica Empleado)
+            condicion = Q(username=username)
             if email:
-                user_id_to_exclude = None
-                if self.instance.pk and hasattr(self.instance, 'user') and self.instance.user:
-                    user_id_to_exclude = self.instance.user.id
-                if User.objects.filter(email=email).exclude(id=user_id_to_exclude).exists():
-                    raise forms.ValidationError('Este correo electrónico ya está registrado como usuario en el sistema')
+                condicion |= Q(email=email)
+            en_uso = list(User.objects.filter(condicion).exclude(id=usuario_id).values_list('username', 'email'))
+            if any(otro_username == username for otro_username, _otro_email in en_uso):
+                raise forms.ValidationError('Este nombre de usuario ya está en uso')
+            if email and any(otro_email == email for _otro_username, otro_email in en_uso):
+                raise forms.ValidationError('Este correo electrónico ya está registrado como usuario en el sistema')
         
         return cleaned_data
     
@@ -676,6 +666,7 @@ class ServicioForm(forms.ModelForm):
         try:
             from .models import Especialidad
             self.fields['especialidades_requeridas'].queryset = Especialidad.objects.filter(activo=True).order_by('nombre')
+            opciones_de_catalogo(self.fields['especialidades_requeridas'], Especialidad)
             # Si estamos editando, establecer las especialidades seleccionadas
             if self.instance and self.instance.pk:
                 self.fields['especialidades_requeridas'].initial = self.instance.especialidades_requeridas.all()
@@ -688,8 +679,8 @@ class SolicitudCompraForm(forms.ModelForm):
         model = SolicitudCompra
         fields = ['producto', 'proveedor', 'cantidad', 'precio_unitario', 'observaciones']
         widgets = {
-            'producto': forms.Select(attrs={'class': 'form-control', 'id': 'id_producto_solicitud'}),
-            'proveedor': forms.Select(attrs={'class': 'form-control', 'id': 'id_proveedor_solicitud'}),
+            'producto': AutocompleteSelect('producto', attrs={'class': 'form-control', 'id': 'id_producto_solicitud'}),
+            'proveedor': AutocompleteSelect('proveedor', attrs={'class': 'form-control', 'id': 'id_proveedor_solicitud'}),
             'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'placeholder': 'Cantidad a solicitar'}),
             'precio_unitario': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'min': '0', 'placeholder': '0.00', 'id': 'id_precio_unitario'}),
             'observaciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Observaciones (opcional)'}),
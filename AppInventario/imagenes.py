@@ -0,0 +1,170 @@
+"""
+Variantes redimensionadas (WebP) de las imágenes de Producto, Servicio y Empleado.
+
+Al guardar una imagen nueva se programa, fuera del ciclo de la petición, la
+generación de tres tamaños (miniatura de listado, tarjeta y detalle). Las rutas
+resultantes se guardan en el campo JSON de variantes del mismo registro y las
+plantillas las usan con srcset mediante el tag {% imagen_responsive %}.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Producto, Servicio, Empleado
+from . import versiones
+
+logger = logging.getLogger(__name__)
+
+# (nombre, lado máximo en píxeles)
+VARIANTES = (
+    ('thumb', 96),
+    ('card', 320),
+    ('detail', 800),
+)
+CALIDAD_WEBP = 80
+CARPETA_VARIANTES = 'variantes'
+
+# Modelo -> (campo de imagen, campo JSON de variantes)
+CAMPOS_IMAGEN = {
+    Producto: ('imagen', 'imagen_variantes'),
+    Servicio: ('imagen', 'imagen_variantes'),
+    Empleado: ('foto', 'foto_variantes'),
+}
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGENES_VARIANTES_WORKERS', 2),
+    thread_name_prefix='variantes-imagen',
+)
+# Lo modifican el hilo de la petición (al confirmar) y los hilos del pool
+_lock = threading.Lock()
+_pendientes = 0
+
+
+def _sumar_pendientes(cantidad):
+    global _pendientes
+    with _lock:
+        _pendientes += cantidad
+
+
+def tareas_pendientes():
+    """Cantidad de variantes en cola o en proceso en este proceso"""
+    with _lock:
+        return _pendientes
+
+
+def generar_variantes(archivo):
+    """
+    Genera las variantes WebP de `archivo` (un FieldFile) en su mismo storage.
+
+    Returns:
+        dict con 'origen' (nombre del original) y una entrada por variante con
+        ruta, ancho y alto. Vacío si la imagen no se pudo leer.
+    """
+    storage = archivo.storage
+    try:
+        with storage.open(archivo.name, 'rb') as original:
+            imagen = Image.open(original)
+            imagen = ImageOps.exif_transpose(imagen)
+            imagen.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as e:
+        logger.warning('No se pudieron generar variantes de %s: %s', archivo.name, e)
+        return {}
+
+    if imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if 'transparency' in imagen.info or imagen.mode in ('LA', 'PA') else 'RGB')
+
+    base = os.path.splitext(archivo.name)[0]
+    variantes = {'origen': archivo.name}
+    ancho_anterior = None
+    for nombre, lado in VARIANTES:
+        copia = imagen.copy()
+        copia.thumbnail((lado, lado), Image.LANCZOS)
+        # Si el original es más chico que el tamaño pedido no se duplica la variante
+        if copia.width == ancho_anterior:
+            continue
+        ancho_anterior = copia.width
+
+        buffer = BytesIO()
+        copia.save(buffer, 'WEBP', quality=CALIDAD_WEBP, method=4)
+        ruta = f'{CARPETA_VARIANTES}/{base}_{nombre}.webp'
+        if storage.exists(ruta):
+            storage.delete(ruta)
+        ruta = storage.save(ruta, ContentFile(buffer.getvalue()))
+        variantes[nombre] = {'ruta': ruta, 'ancho': copia.width, 'alto': copia.height}
+    return variantes
+
+
+def procesar_variantes(modelo, pk):
+    """Genera y guarda las variantes de un registro (se ejecuta en segundo plano)"""
+    campo, campo_variantes = CAMPOS_IMAGEN[modelo]
+    try:
+        instancia = modelo.objects.filter(pk=pk).first()
+        if instancia is None:
+            return
+        archivo = getattr(instancia, campo)
+        anteriores = getattr(instancia, campo_variantes) or {}
+        variantes = generar_variantes(archivo) if archivo else {}
+
+        # Solo se actualiza si la imagen no cambió mientras se procesaba;
+        # update() evita disparar save() y las señales del modelo
+        if archivo:
+            misma_imagen = Q(**{campo: archivo.name})
+        else:
+            misma_imagen = Q(**{campo: ''}) | Q(**{f'{campo}__isnull': True})
+        if modelo.objects.filter(misma_imagen, pk=pk).update(**{campo_variantes: variantes}):
+            versiones.marcar_cambio(modelo)
+
+        rutas_nuevas = {v['ruta'] for v in variantes.values() if isinstance(v, dict)}
+        for variante in anteriores.values():
+            if isinstance(variante, dict) and variante.get('ruta') not in rutas_nuevas:
+                archivo.storage.delete(variante['ruta'])
+    except Exception:
+        logger.exception('Error al procesar variantes de %s #%s', modelo.__name__, pk)
+
+
+def _ejecutar(modelo, pk):
+    """Tarea del pool: cierra las conexiones del hilo al terminar"""
+    try:
+        procesar_variantes(modelo, pk)
+    finally:
+        _sumar_pendientes(-1)
+        connections.close_all()
+
+
+def programar_variantes(instancia):
+    """
+    Programa la generación de variantes para cuando la transacción actual se
+    confirme. Con IMAGENES_VARIANTES_SINCRONO=True se ejecuta en línea.
+    """
+    modelo = type(instancia)
+    pk = instancia.pk
+
+    def encolar():
+        if getattr(settings, 'IMAGENES_VARIANTES_SINCRONO', False):
+            procesar_variantes(modelo, pk)
+            return
+        _sumar_pendientes(1)
+        try:
+            _executor.submit(_ejecutar, modelo, pk)
+        except RuntimeError:
+            # Pool cerrado (el intérprete está terminando): la tarea nunca correrá
+            _sumar_pendientes(-1)
+            raise
+
+    transaction.on_commit(encolar)
+
+
+def variantes_desactualizadas(instancia):
+    """Indica si las variantes guardadas no corresponden a la imagen actual"""
+    campo, campo_variantes = CAMPOS_IMAGEN[type(instancia)]
+    archivo = getattr(instancia, campo)
+    variantes = getattr(instancia, campo_variantes) or {}
+    return variantes.get('origen', '') != (archivo.name if archivo else '')
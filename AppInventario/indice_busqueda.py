@@ -0,0 +1,253 @@
+"""
+Índice de búsqueda global (productos, productos de proveedor, proveedores,
+empleados y servicios).
+
+Cada registro indexado tiene un DocumentoBusqueda con su título, un detalle
+corto y el texto buscable. Las señales (signals.py) mantienen el documento al
+día cuando se guarda o elimina el registro, y también cuando cambia un dato de
+otro modelo que aparece en él (nombre del proveedor en sus productos; cargo y
+especialidades en los empleados); `manage.py reindexar_busqueda` reconstruye la
+tabla completa. Un save que no cambia el contenido del documento no lo escribe.
+
+En PostgreSQL el documento lleva un tsvector (título con peso A, detalle B,
+resto C) en la configuración es_sin_acentos: español con unaccent, creada en la
+migración 0055 junto con el índice GIN. La búsqueda trata cada palabra como
+prefijo ("sham" encuentra "Shampoo") y entrega los mejores resultados por tipo
+en una sola consulta (ROW_NUMBER() por tipo, ordenado por ts_rank).
+
+En otros motores (SQLite en desarrollo) se filtra con __icontains por palabra y
+sin ranking.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value, Window
+from django.db.models.functions import RowNumber
+
+CONFIGURACION = 'es_sin_acentos'
+MAX_PALABRAS = 8
+
+_RE_PALABRA = re.compile(r'\w+')
+
+# Campos que aparecen en el documento de cada tipo; un save() con update_fields
+# que no toca ninguno (p. ej. solo la cantidad en stock) no reindexa
+CAMPOS_DOCUMENTO = {
+    'producto': {'nombre', 'categoria', 'zona', 'descripcion', 'unidad_medida', 'activo'},
+    'producto_proveedor': {'nombre', 'proveedor', 'codigo_producto', 'descripcion', 'unidad_medida', 'activo'},
+    'proveedor': {'nombre', 'contacto', 'ciudad', 'email', 'telefono', 'direccion'},
+    'empleado': {'nombre', 'apellido', 'cargo', 'especialidad', 'email', 'telefono', 'activo'},
+    'servicio': {'nombre', 'descripcion', 'activo'},
+}
+
+# Relaciones ManyToMany que usa el documento de cada tipo (prefetch_related)
+PRECARGA_DOCUMENTO = {
+    'empleado': ('especialidades',),
+}
+
+
+def _texto(*partes):
+    return ' '.join(str(parte) for parte in partes if parte)
+
+
+def _documento_producto(producto):
+    return {
+        'titulo': producto.nombre,
+        'detalle': _texto(producto.get_categoria_display() if producto.categoria else '', producto.zona.nombre if producto.zona else ''),
+        'texto': _texto(producto.descripcion, producto.unidad_medida),
+        'activo': producto.activo,
+    }
+
+
+def _documento_producto_proveedor(producto_proveedor):
+    return {
+        'titulo': producto_proveedor.nombre,
+        'detalle': _texto(producto_proveedor.proveedor.nombre, producto_proveedor.codigo_producto),
+        'texto': _texto(producto_proveedor.descripcion, producto_proveedor.unidad_medida),
+        'activo': producto_proveedor.activo,
+    }
+
+
+def _documento_proveedor(proveedor):
+    return {
+        'titulo': proveedor.nombre,
+        'detalle': _texto(proveedor.contacto, proveedor.ciudad),
+        'texto': _texto(proveedor.email, proveedor.telefono, proveedor.direccion),
+        'activo': True,
+    }
+
+
+def _documento_empleado(empleado):
+    especialidades = sorted(especialidad.nombre for especialidad in empleado.especialidades.all()) if empleado.pk else []
+    return {
+        'titulo': _texto(empleado.nombre, empleado.apellido),
+        'detalle': _texto(empleado.cargo.nombre if empleado.cargo else '', ', '.join(especialidades) or empleado.especialidad),
+        'texto': _texto(empleado.email, empleado.telefono),
+        'activo': empleado.activo,
+    }
+
+
+def _documento_servicio(servicio):
+    return {
+        'titulo': servicio.nombre,
+        'detalle': '',
+        'texto': _texto(servicio.descripcion),
+        'activo': servicio.activo,
+    }
+
+
+def tipos():
+    """tipo -> (modelo, función que arma el documento, select_related, vista de edición)"""
+    from .models import Producto, ProductoProveedor, Proveedores, Empleado, Servicio
+
+    return {
+        'producto': (Producto, _documento_producto, ('zona',), 'inventario_editar'),
+        'producto_proveedor': (ProductoProveedor, _documento_producto_proveedor, ('proveedor',), 'productos_proveedor_editar'),
+        'proveedor': (Proveedores, _documento_proveedor, (), 'proveedores_editar'),
+        'empleado': (Empleado, _documento_empleado, ('cargo',), 'empleados_editar'),
+        'servicio': (Servicio, _documento_servicio, (), 'servicios_ofrecidos_editar'),
+    }
+
+
+def tipo_de_modelo(modelo):
+    for tipo, (modelo_tipo, *_resto) in tipos().items():
+        if modelo is modelo_tipo:
+            return tipo
+    return None
+
+
+def requiere_reindexar(tipo, update_fields):
+    return update_fields is None or bool(CAMPOS_DOCUMENTO[tipo] & set(update_fields))
+
+
+def _usa_postgres():
+    from .models import DocumentoBusqueda
+
+    return connections[DocumentoBusqueda.objects.db].vendor == 'postgresql'
+
+
+def vector():
+    return (
+        SearchVector('titulo', weight='A', config=CONFIGURACION)
+        + SearchVector('detalle', weight='B', config=CONFIGURACION)
+        + SearchVector('texto', weight='C', config=CONFIGURACION)
+    )
+
+
+def _datos(tipo, instancia):
+    datos = tipos()[tipo][1](instancia)
+    datos['titulo'] = datos['titulo'][:300]
+    datos['detalle'] = datos['detalle'][:300]
+    return datos
+
+
+def indexar(instancia):
+    """
+    Crea o actualiza el documento de `instancia`. Retorna el título que tenía el
+    documento (None si no existía).
+    """
+    from .models import DocumentoBusqueda
+
+    tipo = tipo_de_modelo(type(instancia))
+    if tipo is None:
+        return None
+    datos = _datos(tipo, instancia)
+    documento = DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id=instancia.pk).defer('vector').first()
+    titulo_anterior = documento.titulo if documento is not None else None
+    if documento is not None and all(getattr(documento, campo) == valor for campo, valor in datos.items()):
+        return titulo_anterior
+    if documento is None:
+        documento = DocumentoBusqueda(tipo=tipo, objeto_id=instancia.pk)
+    for campo, valor in datos.items():
+        setattr(documento, campo, valor)
+    documento.save()
+    if _usa_postgres():
+        DocumentoBusqueda.objects.filter(pk=documento.pk).update(vector=vector())
+    return titulo_anterior
+
+
+def indexar_varios(tipo, queryset, lote=500):
+    """
+    Reconstruye los documentos de las filas de `queryset` (del modelo de
+    `tipo`) con una cantidad fija de consultas: lectura, borrado, inserción y,
+    en PostgreSQL, el vector.
+    """
+    from .models import DocumentoBusqueda
+
+    _modelo, _armar, relacionados, _vista = tipos()[tipo]
+    filas = queryset.select_related(*relacionados).prefetch_related(*PRECARGA_DOCUMENTO.get(tipo, ()))
+    documentos = [DocumentoBusqueda(tipo=tipo, objeto_id=fila.pk, **_datos(tipo, fila)) for fila in filas]
+    if not documentos:
+        return 0
+    ids = [documento.objeto_id for documento in documentos]
+    DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id__in=ids).delete()
+    DocumentoBusqueda.objects.bulk_create(documentos, batch_size=lote)
+    if _usa_postgres():
+        DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id__in=ids).update(vector=vector())
+    return len(documentos)
+
+
+def indexar_proveedor(proveedor):
+    """El nombre del proveedor aparece en el detalle de sus productos: si cambió se reindexan juntos"""
+    if indexar(proveedor) != proveedor.nombre[:300]:
+        indexar_varios('producto_proveedor', proveedor.productos.all())
+
+
+def desindexar(instancia):
+    from .models import DocumentoBusqueda
+
+    tipo = tipo_de_modelo(type(instancia))
+    if tipo is not None:
+        DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id=instancia.pk).delete()
+
+
+def reindexar(tipos_a_indexar=None, lote=500):
+    """Reconstruye los documentos de los tipos indicados (todos por defecto). Retorna {tipo: cantidad}"""
+    from .models import DocumentoBusqueda
+
+    totales = {}
+    for tipo, (modelo, _armar, relacionados, _vista) in tipos().items():
+        if tipos_a_indexar and tipo not in tipos_a_indexar:
+            continue
+        DocumentoBusqueda.objects.filter(tipo=tipo).delete()
+        filas = modelo.objects.select_related(*relacionados).prefetch_related(*PRECARGA_DOCUMENTO.get(tipo, ()))
+        documentos = [
+            DocumentoBusqueda(tipo=tipo, objeto_id=instancia.pk, **_datos(tipo, instancia))
+            for instancia in filas.iterator(chunk_size=lote)
+        ]
+        DocumentoBusqueda.objects.bulk_create(documentos, batch_size=lote)
+        if _usa_postgres():
+            DocumentoBusqueda.objects.filter(tipo=tipo).update(vector=vector())
+        totales[tipo] = len(documentos)
+    return totales
+
+
+def palabras(texto):
+    return _RE_PALABRA.findall(texto or '')[:MAX_PALABRAS]
+
+
+def buscar(texto, por_tipo=5):
+    """
+    Mejores `por_tipo` documentos activos de cada tipo para `texto`, en una
+    sola consulta. Retorna una lista de dicts ordenada por tipo y relevancia.
+    """
+    from .models import DocumentoBusqueda
+
+    terminos = palabras(texto)
+    if not terminos:
+        return []
+    documentos = DocumentoBusqueda.objects.filter(activo=True)
+    if _usa_postgres():
+        # Solo caracteres de palabra: no hay sintaxis de tsquery que escapar
+        consulta = SearchQuery(' & '.join(f'{termino}:*' for termino in terminos), search_type='raw', config=CONFIGURACION)
+        documentos = documentos.filter(vector=consulta).annotate(relevancia=SearchRank(F('vector'), consulta))
+    else:
+        for termino in terminos:
+            documentos = documentos.filter(
+                Q(titulo__icontains=termino) | Q(detalle__icontains=termino) | Q(texto__icontains=termino)
+            )
+        documentos = documentos.annotate(relevancia=Value(0.0, output_field=FloatField()))
+    documentos = documentos.annotate(
+        posicion=Window(RowNumber(), partition_by=[F('tipo')], order_by=[F('relevancia').desc(), F('titulo').asc()])
+    ).filter(posicion__lte=por_tipo).order_by('tipo', 'posicion')
+    return list(documentos.values('tipo', 'objeto_id', 'titulo', 'detalle', 'relevancia'))
@@ -0,0 +1,267 @@
+"""
+Mide las vistas y endpoints AJAX principales contra la base de datos actual.
+
+    python manage.py benchmark_vistas --salida benchmarks/actual.json --base benchmarks/base.json
+
+Cada vista se pide con el cliente de pruebas de Django, autenticado como un
+usuario staff, y se registra la cantidad de consultas, la latencia
+(p50/p95/máx.) y el pico de memoria asignada durante la petición (tracemalloc,
+en una pasada aparte para no distorsionar la latencia). La caché se vacía
+antes de cada petición para medir el costo real de la vista.
+
+Con --tamanos 1000,10000,100000 se mide a varias escalas: antes de cada
+medición se completa el catálogo hasta esa cantidad de productos con
+seed_scale (los datos se agregan a la base actual, úsese una base de pruebas).
+
+Las peticiones van a 'localhost' (permitido por Django con DEBUG y
+ALLOWED_HOSTS vacío; en otro caso debe estar en ALLOWED_HOSTS). Una respuesta
+que no sea 2xx detiene el comando: no es una medición válida.
+
+La línea base del repositorio es benchmarks/base.json: una corrida de humo en
+SQLite sobre los datos de seed (ver su campo "nota"); para decidir sobre
+PostgreSQL hay que generar una línea base propia en ese motor. El resultado se
+escribe en JSON. Si se indica --base, se compara con esa
+medición y el comando falla cuando alguna vista empeora más allá de
+--tolerancia (latencia p50 o cantidad de consultas), para poder usarlo en CI.
+"""
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from AppInventario.models import Producto, Zona, Empleado, EntradaInventario, Compras, ServicioRealizado, SnapshotInventario
+from AppInventario.metricas import percentil
+from AppInventario.paginacion import PARAMETRO, codificar
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+def ultimo_cierre_de_mes():
+    """Último fin de mes con snapshot de inventario, o None"""
+    fechas = SnapshotInventario.objects.filter(fecha__day__gte=28).order_by('-fecha').values_list('fecha', flat=True).distinct()
+    for fecha in fechas[:12]:
+        if (fecha + timedelta(days=1)).day == 1:
+            return fecha
+    return None
+
+
+def escenarios():
+    """(nombre, url, cabeceras) de las vistas a medir"""
+    producto = Producto.objects.order_by('-id').values_list('id', flat=True).first()
+    zona = Zona.objects.values_list('id', flat=True).first()
+    empleado = Empleado.objects.filter(activo=True).values_list('id', flat=True).first()
+    cierre = ultimo_cierre_de_mes()
+    hoy = timezone.localdate()
+    rango = f'?fecha_desde={(hoy - timedelta(days=30)).isoformat()}&fecha_hasta={hoy.isoformat()}'
+    # La última página se pide con el mismo cursor que arma el enlace «Última» de la lista
+    ultima = '?' + urlencode({PARAMETRO: codificar({'u': 1})})
+    lista = [
+        ('admin_panel', reverse('admin_panel'), {}),
+        ('inventario_lista', reverse('inventario_lista'), {}),
+        ('inventario_lista.ajax', reverse('inventario_lista'), AJAX),
+        ('inventario_lista.ajax.filtro', reverse('inventario_lista') + '?estado=bajo_stock&nombre=man', AJAX),
+        ('inventario_lista.ajax.pagina_final', reverse('inventario_lista') + ultima, AJAX),
+        ('entradas_lista.ajax', reverse('entradas_lista'), AJAX),
+        ('entradas_lista.ajax.rango', reverse('entradas_lista') + rango, AJAX),
+        ('proveedores_lista.ajax', reverse('proveedores_lista'), AJAX),
+        ('productos_proveedor_lista.ajax', reverse('productos_proveedor_lista'), AJAX),
+        ('empleados_lista.ajax', reverse('empleados_lista'), AJAX),
+        ('auditoria_lista.ajax', reverse('auditoria_lista'), AJAX),
+        ('historial_completo.ajax', reverse('historial_completo'), AJAX),
+        ('historial_completo.ajax.rango', reverse('historial_completo') + rango, AJAX),
+        ('api_stock_a_fecha', reverse('api_stock_a_fecha') + f'?fecha={(hoy.replace(day=1)).isoformat()}', {}),
+    ]
+    if cierre:
+        lista.append(('api_valorizacion_mensual', reverse('api_valorizacion_mensual') + f'?anio={cierre.year}&mes={cierre.month}', {}))
+    if empleado:
+        lista.append(('horas_ocupadas', reverse('obtener_horas_ocupadas') + f'?empleado_id={empleado}&fecha={hoy.isoformat()}', AJAX))
+    if producto:
+        lista.append(('kardex.producto', reverse('kardex') + f'?producto={producto}', AJAX))
+    if zona:
+        lista.append(('kardex.zona', reverse('kardex') + f'?zona={zona}', AJAX))
+    return lista
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas, latencia y memoria de las vistas principales y compara con una línea base'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=10, help='Peticiones medidas por vista')
+        parser.add_argument('--calentamiento', type=int, default=2, help='Peticiones previas no medidas')
+        parser.add_argument('--tamanos', help='Lista de cantidades de productos a medir, separadas por coma')
+        parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto benchmarks/<fecha>.json)')
+        parser.add_argument('--base', help='Archivo JSON de línea base con el que comparar')
+        parser.add_argument('--tolerancia', type=float, default=0.2, help='Empeoramiento relativo permitido (0.2 = 20%%)')
+        parser.add_argument('--usuario', help='Usuario staff con el que autenticar (por defecto el primer superusuario)')
+        parser.add_argument('--filtro', help='Medir solo los escenarios cuyo nombre contenga este texto')
+        parser.add_argument('--nota', help='Texto libre que se guarda en el resultado (origen de los datos, alcance)')
+
+    def handle(self, *args, **options):
+        usuario = self._usuario(options['usuario'])
+        # Una vista rota responde 500 en lugar de lanzar la excepción; _pedir la rechaza
+        self.cliente = Client(SERVER_NAME='localhost', raise_request_exception=False)
+        self.cliente.force_login(usuario)
+
+        # Las líneas de métricas y las trazas de las vistas rotas solo ensucian la salida
+        loggers = {nombre: logging.getLogger(nombre) for nombre in ('AppInventario.metricas', 'django.request')}
+        niveles = {nombre: logger.level for nombre, logger in loggers.items()}
+        for logger in loggers.values():
+            logger.setLevel(logging.CRITICAL)
+        try:
+            corridas = []
+            tamanos = [int(t) for t in options['tamanos'].split(',')] if options['tamanos'] else [None]
+            for tamano in tamanos:
+                if tamano is not None:
+                    faltantes = tamano - Producto.objects.count()
+                    if faltantes > 0:
+                        self.stdout.write(f'Generando {faltantes} productos para llegar a {tamano}...')
+                        call_command('seed_scale', productos=faltantes, stdout=self.stdout)
+                corridas.append(self._medir(options))
+        finally:
+            for nombre, logger in loggers.items():
+                logger.setLevel(niveles[nombre])
+
+        resultado = {
+            'fecha': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'python': platform.python_version(),
+            'repeticiones': options['repeticiones'],
+            'corridas': corridas,
+        }
+        if options['nota']:
+            resultado['nota'] = options['nota']
+        salida = options['salida'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', f'{timezone.localtime().strftime("%Y%m%d-%H%M%S")}.json'
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Resultados escritos en {salida}'))
+
+        if options['base']:
+            self._comparar(options['base'], resultado, options['tolerancia'])
+
+    def _usuario(self, username):
+        usuarios = User.objects.filter(is_staff=True, is_active=True)
+        usuario = usuarios.filter(username=username).first() if username else (
+            usuarios.filter(is_superuser=True).first() or usuarios.first()
+        )
+        if usuario is None:
+            raise CommandError('Se necesita un usuario staff activo (use --usuario)')
+        return usuario
+
+    def _volumen(self):
+        return {
+            'productos': Producto.objects.count(),
+            'entradas': EntradaInventario.objects.count(),
+            'compras': Compras.objects.count(),
+            'servicios_realizados': ServicioRealizado.objects.count(),
+        }
+
+    def _pedir(self, nombre, url, cabeceras):
+        cache.clear()
+        respuesta = self.cliente.get(url, **cabeceras)
+        if getattr(respuesta, 'streaming', False):
+            b''.join(respuesta.streaming_content)
+        if not 200 <= respuesta.status_code < 300:
+            pista = ' (¿localhost fuera de ALLOWED_HOSTS?)' if respuesta.status_code == 400 else ''
+            raise CommandError(f'{nombre} respondió {respuesta.status_code} en {url}{pista}: la medición no es válida')
+        return respuesta
+
+    def _medir(self, options):
+        volumen = self._volumen()
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            'Volumen: ' + ', '.join(f'{clave}={valor}' for clave, valor in volumen.items())
+        ))
+        vistas = {}
+        for nombre, url, cabeceras in escenarios():
+            if options['filtro'] and options['filtro'] not in nombre:
+                continue
+            for _ in range(options['calentamiento']):
+                self._pedir(nombre, url, cabeceras)
+
+            latencias = []
+            consultas = []
+            estado = None
+            for _ in range(options['repeticiones']):
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    estado = self._pedir(nombre, url, cabeceras).status_code
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                consultas.append(len(capturadas))
+
+            tracemalloc.start()
+            self._pedir(nombre, url, cabeceras)
+            _actual, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            vistas[nombre] = {
+                'url': url,
+                'estado': estado,
+                'consultas': max(consultas),
+                'p50_ms': round(statistics.median(latencias), 2),
+                'p95_ms': round(percentil(sorted(latencias), 95), 2),
+                'max_ms': round(max(latencias), 2),
+                'memoria_pico_kb': round(pico / 1024, 1),
+            }
+            self.stdout.write(
+                f'  {nombre:40} {estado}  {vistas[nombre]["consultas"]:4d} consultas  '
+                f'p50 {vistas[nombre]["p50_ms"]:8.1f} ms  p95 {vistas[nombre]["p95_ms"]:8.1f} ms  '
+                f'{vistas[nombre]["memoria_pico_kb"]:9.1f} KB'
+            )
+        return {'volumen': volumen, 'vistas': vistas}
+
+    def _comparar(self, ruta_base, actual, tolerancia):
+        try:
+            with open(ruta_base, encoding='utf-8') as archivo:
+                base = json.load(archivo)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'No se pudo leer la línea base {ruta_base}: {error}')
+
+        if base.get('motor') != actual['motor']:
+            self.stdout.write(self.style.WARNING(
+                f'La línea base se midió en {base.get("motor")} y esta corrida en {actual["motor"]}: las latencias no son comparables'
+            ))
+        # Se comparan las corridas con el mismo volumen de productos
+        base_por_volumen = {c['volumen']['productos']: c['vistas'] for c in base.get('corridas', [])}
+        regresiones = []
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Comparación con {ruta_base}'))
+        for corrida in actual['corridas']:
+            vistas_base = base_por_volumen.get(corrida['volumen']['productos'])
+            if vistas_base is None:
+                self.stdout.write(f'  Sin línea base para {corrida["volumen"]["productos"]} productos')
+                continue
+            for nombre, medicion in corrida['vistas'].items():
+                anterior = vistas_base.get(nombre)
+                if not anterior:
+                    continue
+                delta_ms = (medicion['p50_ms'] - anterior['p50_ms']) / anterior['p50_ms'] if anterior['p50_ms'] else 0
+                delta_consultas = medicion['consultas'] - anterior['consultas']
+                empeora = delta_ms > tolerancia or delta_consultas > max(1, anterior['consultas'] * tolerancia)
+                linea = (f'  {nombre:40} p50 {anterior["p50_ms"]:.1f} -> {medicion["p50_ms"]:.1f} ms ({delta_ms:+.0%})  '
+                         f'consultas {anterior["consultas"]} -> {medicion["consultas"]}')
+                if empeora:
+                    regresiones.append(nombre)
+                    self.stdout.write(self.style.ERROR(linea))
+                else:
+                    self.stdout.write(linea)
+
+        if regresiones:
+            raise CommandError(f'{len(regresiones)} vista(s) empeoraron más de {tolerancia:.0%}: {", ".join(sorted(set(regresiones)))}')
+        self.stdout.write(self.style.SUCCESS('Sin regresiones respecto de la línea base'))
@@ -0,0 +1,627 @@
+"""
+Prueba de carga concurrente sobre los flujos que escriben.
+
+    python manage.py carga_concurrente --escenarios reservas,entradas,auditorias --hilos 16 --peticiones 50
+    python manage.py carga_concurrente --procesos 8 --url http://127.0.0.1:8000 --usuario adm --clave ...
+
+Varios trabajadores (hilos, o procesos con --procesos) envían peticiones en
+paralelo, cada uno con su propia sesión. Sin --url usan el cliente de pruebas
+de Django contra la base configurada; con --url hablan HTTP con un servidor
+local (runserver, gunicorn), iniciando sesión por el formulario de login.
+
+Escenarios:
+
+  reservas    POST a servicios_crear sobre pocas franjas (estilista, fecha,
+              hora) para que las reservas choquen. Al final se cuentan las
+              franjas con más de una cita activa (reservas dobles).
+  entradas    POST a entradas_crear sobre unos pocos productos propios. Al
+              final se compara el stock con el inicial más las entradas
+              creadas (actualizaciones perdidas).
+  auditorias  Cada detalle de una auditoría de prueba tiene un único
+              trabajador que le envía conteos crecientes, mientras el resto
+              lo marca como revisado. Si el conteo final no es el último que
+              envió su dueño, una escritura pisó a la otra.
+
+Se reporta el rendimiento (peticiones/s), los percentiles de latencia por
+escenario, los errores por tipo y, en PostgreSQL, las esperas por locks
+(muestreo de pg_stat_activity) y los deadlocks del periodo. En SQLite las
+escrituras se serializan en un único lock de base y los choques aparecen como
+errores "database is locked": se cuentan aparte como peticiones bloqueadas
+(contención esperable en ese motor, no fallas). Con --url el servidor solo
+devuelve un 500 y no se pueden distinguir.
+
+El cliente de pruebas pide a 'localhost' (permitido por Django con DEBUG y
+ALLOWED_HOSTS vacío; en otro caso debe estar en ALLOWED_HOSTS). Si alguna
+petición termina en error (sin contar las bloqueadas de SQLite) el comando sale
+con error después del reporte: las anomalías medidas sobre peticiones fallidas
+no prueban nada.
+
+Los escenarios crean citas, entradas y una auditoría: úsese una base de pruebas.
+"""
+import http.cookiejar
+import json
+import logging
+import multiprocessing
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count, Max, Q, Sum
+from django.http.request import validate_host
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from AppInventario.models import (
+    Producto, Empleado, Servicio, ServicioRealizado, EntradaInventario,
+    AuditoriaInventario, DetalleAuditoria,
+)
+from AppInventario.metricas import percentil
+
+ESCENARIOS = ('reservas', 'entradas', 'auditorias')
+ESTADOS_ACTIVOS = ['pendiente', 'en_progreso']
+# Horas de lunes a viernes dentro del horario de atención (ver validar_horario_atencion)
+HORAS = [f'{h:02d}:{m:02d}' for h in range(10, 18) for m in (0, 30)]
+
+
+class _ClienteDjango:
+    """Sesión con el cliente de pruebas de Django; conserva la excepción de los 500"""
+
+    def __init__(self, config):
+        self.cliente = Client(SERVER_NAME='localhost', raise_request_exception=False)
+        self.cliente.force_login(User.objects.get(pk=config['usuario_id']))
+
+    def post(self, url, datos, ajax=False):
+        cabeceras = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'} if ajax else {}
+        respuesta = self.cliente.post(url, datos, **cabeceras)
+        error = None
+        # exc_info llega por una señal global: solo es de esta petición si respondió 500
+        if respuesta.status_code >= 500 and getattr(respuesta, 'exc_info', None):
+            error = respuesta.exc_info[0].__name__ + ': ' + str(respuesta.exc_info[1])[:80]
+        return respuesta.status_code, respuesta.content, error
+
+    def cerrar(self):
+        # Cada hilo abre sus propias conexiones
+        connections.close_all()
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    """El 302 tras un POST exitoso es el resultado que interesa, no la página siguiente"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class _ClienteHTTP:
+    """Sesión HTTP contra un servidor en marcha, autenticada por el formulario de login"""
+
+    def __init__(self, config):
+        self.base = config['url'].rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _SinRedirecciones()
+        )
+        url_login = self.base + config['url_login']
+        self._pedir(urllib.request.Request(url_login))
+        estado, _cuerpo, _error = self.post(config['url_login'], {
+            'real_username': config['usuario'], 'real_password': config['clave'],
+        })
+        if estado != 302:
+            raise RuntimeError(f'No se pudo iniciar sesión en {url_login} (estado {estado})')
+
+    def _csrf(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+    def _pedir(self, peticion):
+        try:
+            with self.abridor.open(peticion, timeout=60) as respuesta:
+                return respuesta.status, respuesta.read(), None
+        except urllib.error.HTTPError as error:
+            return error.code, error.read(), None if error.code < 500 else f'HTTP {error.code}'
+        except OSError as error:
+            return 0, b'', type(error).__name__ + ': ' + str(error)[:80]
+
+    def post(self, url, datos, ajax=False):
+        token = self._csrf()
+        cuerpo = urllib.parse.urlencode(dict(datos, csrfmiddlewaretoken=token)).encode()
+        cabeceras = {'X-CSRFToken': token, 'Referer': self.base + url}
+        if ajax:
+            cabeceras['X-Requested-With'] = 'XMLHttpRequest'
+        return self._pedir(urllib.request.Request(self.base + url, data=cuerpo, headers=cabeceras, method='POST'))
+
+    def cerrar(self):
+        pass
+
+
+def _reserva(sesion, config, azar, _estado):
+    plan = config['reservas']
+    empleado_id, servicio_id = azar.choice(plan['parejas'])
+    fecha, hora = azar.choice(plan['franjas'])
+    estado, _cuerpo, error = sesion.post(plan['url'], {
+        'servicio': servicio_id,
+        'empleado': empleado_id,
+        'fecha_servicio': fecha,
+        'hora': hora,
+        'nombre_cliente': f'Carga {azar.randrange(10 ** 6)}',
+        'email_cliente': 'carga@example.com',
+        'telefono_cliente': '+56900000000',
+    })
+    # 302: cita creada; 200: la vista rechazó la reserva (franja ocupada u otra validación)
+    resultado = 'ok' if estado == 302 else 'rechazada' if estado == 200 else 'error'
+    return resultado, estado, error, None
+
+
+def _entrada(sesion, config, azar, _estado):
+    plan = config['entradas']
+    estado, _cuerpo, error = sesion.post(plan['url'], {
+        'producto': azar.choice(plan['productos']),
+        'cantidad': azar.randint(1, 5),
+        'precio_unitario': '1000.00',
+        'observaciones': 'carga_concurrente',
+    })
+    resultado = 'ok' if estado == 302 else 'rechazada' if estado == 200 else 'error'
+    return resultado, estado, error, None
+
+
+def _auditoria(sesion, config, azar, estado_trabajador):
+    plan = config['auditorias']
+    propios = estado_trabajador['detalles_propios']
+    if propios and azar.random() < 0.5:
+        # Conteo creciente sobre un detalle del que este trabajador es el único que cuenta
+        detalle_id = propios[estado_trabajador['siguiente'] % len(propios)]
+        estado_trabajador['siguiente'] += 1
+        valor = estado_trabajador['conteos'][detalle_id] = estado_trabajador['conteos'].get(detalle_id, 0) + 1
+        estado, _cuerpo, error = sesion.post(
+            plan['url_conteo'].format(detalle_id), {'conteo_fisico': valor}, ajax=True
+        )
+        extra = ('conteo', detalle_id, valor)
+    else:
+        detalle_id = azar.choice(plan['detalles'])
+        estado, _cuerpo, error = sesion.post(plan['url_revisado'].format(detalle_id), {}, ajax=True)
+        extra = ('revisado', detalle_id, None)
+    resultado = 'ok' if estado == 200 else 'rechazada' if 400 <= estado < 500 else 'error'
+    return resultado, estado, error, extra
+
+
+ACCIONES = {'reservas': _reserva, 'entradas': _entrada, 'auditorias': _auditoria}
+
+
+def _bloqueo_sqlite(fila):
+    """Convierte en 'bloqueada' una fila con error por base bloqueada de SQLite"""
+    escenario, resultado, estado, error, inicio, fin, extra = fila
+    if resultado == 'error' and error and 'database is locked' in error:
+        resultado = 'bloqueada'
+    return escenario, resultado, estado, error, inicio, fin, extra
+
+
+def _trabajador(indice, config):
+    """
+    Ejecuta las peticiones de un trabajador (hilo o proceso). Retorna la lista de
+    (escenario, resultado, estado, error, inicio, fin, extra), con tiempos de
+    time.time() para poder compararlos entre procesos.
+    """
+    sesion = (_ClienteHTTP if config['url'] else _ClienteDjango)(config)
+    azar = random.Random(config['semilla'] + indice)
+    detalles = config['auditorias']['detalles'] if config.get('auditorias') else []
+    estado_trabajador = {
+        'detalles_propios': [d for posicion, d in enumerate(detalles) if posicion % config['trabajadores'] == indice],
+        'siguiente': 0,
+        'conteos': {},
+    }
+    resultados = []
+    try:
+        # Todos los trabajadores parten a la vez para maximizar la contención
+        espera = config['arranque'] - time.time()
+        if espera > 0:
+            time.sleep(espera)
+        for _ in range(config['peticiones']):
+            escenario = azar.choice(config['escenarios'])
+            inicio = time.time()
+            resultado, estado, error, extra = ACCIONES[escenario](sesion, config, azar, estado_trabajador)
+            resultados.append((escenario, resultado, estado, error, inicio, time.time(), extra))
+            if config['pausa']:
+                time.sleep(config['pausa'])
+    finally:
+        sesion.cerrar()
+    return resultados
+
+
+class _MonitorLocks(threading.Thread):
+    """Muestrea en PostgreSQL cuántas sesiones esperan un lock mientras dura la carga"""
+
+    def __init__(self, intervalo):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.detener = threading.Event()
+        self.muestras = []
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self.detener.is_set():
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+                    )
+                    self.muestras.append(cursor.fetchone()[0])
+                    self.detener.wait(self.intervalo)
+        finally:
+            connection.close()
+
+
+def _deadlocks():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()')
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = 'Genera carga concurrente sobre reservas, entradas y auditorías y detecta actualizaciones perdidas y reservas dobles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escenarios', default=','.join(ESCENARIOS), help='Escenarios separados por coma: ' + ', '.join(ESCENARIOS))
+        parser.add_argument('--hilos', type=int, default=8, help='Trabajadores en hilos')
+        parser.add_argument('--procesos', type=int, default=0, help='Trabajadores en procesos (reemplaza a --hilos)')
+        parser.add_argument('--peticiones', type=int, default=50, help='Peticiones por trabajador')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre peticiones de un trabajador')
+        parser.add_argument('--url', help='URL base de un servidor en marcha; sin ella se usa el cliente de pruebas')
+        parser.add_argument('--usuario', help='Usuario staff (por defecto el primer superusuario)')
+        parser.add_argument('--clave', default=os.environ.get('CARGA_CLAVE', ''), help='Clave del usuario, solo con --url (o variable CARGA_CLAVE)')
+        parser.add_argument('--productos', type=int, default=3, help='Productos sobre los que chocan las entradas y auditorías')
+        parser.add_argument('--estilistas', type=int, default=2, help='Estilistas sobre los que chocan las reservas')
+        parser.add_argument('--franjas', type=int, default=10, help='Franjas (fecha, hora) disponibles para reservar')
+        parser.add_argument('--intervalo-locks', type=float, default=0.05, help='Segundos entre muestras de pg_stat_activity')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', help='Archivo JSON donde guardar el reporte')
+        parser.add_argument('--estricto', action='store_true', help='Fallar si se detectan actualizaciones perdidas o reservas dobles')
+
+    def handle(self, *args, **options):
+        escenarios = [e.strip() for e in options['escenarios'].split(',') if e.strip()]
+        desconocidos = set(escenarios) - set(ESCENARIOS)
+        if desconocidos:
+            raise CommandError(f'Escenarios desconocidos: {", ".join(sorted(desconocidos))}')
+        if options['url'] and not options['clave']:
+            raise CommandError('Con --url se necesita --clave (o la variable CARGA_CLAVE)')
+        # Mismo criterio que HttpRequest.get_host(): un host rechazado responde 400 a todo
+        hosts = settings.ALLOWED_HOSTS or (['.localhost', '127.0.0.1', '[::1]'] if settings.DEBUG else [])
+        if not options['url'] and not validate_host('localhost', hosts):
+            raise CommandError("'localhost' no está en ALLOWED_HOSTS: el cliente de pruebas no podría hacer peticiones")
+
+        trabajadores = options['procesos'] or options['hilos']
+        usuario = self._usuario(options['usuario'])
+        config = {
+            'url': options['url'],
+            'url_login': reverse('login'),
+            'usuario_id': usuario.pk,
+            'usuario': usuario.username,
+            'clave': options['clave'],
+            'escenarios': escenarios,
+            'trabajadores': trabajadores,
+            'peticiones': options['peticiones'],
+            'pausa': options['pausa'],
+            'semilla': options['semilla'],
+        }
+        planes = {}
+        for escenario in escenarios:
+            planes[escenario] = getattr(self, f'_preparar_{escenario}')(options, usuario)
+            config[escenario] = planes[escenario]['config']
+
+        monitor = None
+        deadlocks_antes = None
+        if connection.vendor == 'postgresql':
+            deadlocks_antes = _deadlocks()
+            monitor = _MonitorLocks(options['intervalo_locks'])
+            monitor.start()
+
+        # Las líneas de métricas y las trazas de cada 500 se resumen en el reporte
+        loggers = {nombre: logging.getLogger(nombre) for nombre in ('AppInventario.metricas', 'django.request')}
+        niveles = {nombre: logger.level for nombre, logger in loggers.items()}
+        for logger in loggers.values():
+            logger.setLevel(logging.CRITICAL)
+        self.stdout.write(
+            f'{trabajadores} {"procesos" if options["procesos"] else "hilos"} × {options["peticiones"]} peticiones '
+            f'({", ".join(escenarios)}) contra {options["url"] or "el cliente de pruebas"}'
+        )
+        try:
+            resultados = self._ejecutar(config, trabajadores, bool(options['procesos']))
+            if connection.vendor == 'sqlite':
+                resultados = [_bloqueo_sqlite(fila) for fila in resultados]
+        finally:
+            for nombre, logger in loggers.items():
+                logger.setLevel(niveles[nombre])
+            if monitor:
+                monitor.detener.set()
+                monitor.join()
+
+        reporte = {
+            'fecha': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'modo': 'procesos' if options['procesos'] else 'hilos',
+            'trabajadores': trabajadores,
+            'destino': options['url'] or 'cliente_de_pruebas',
+            'escenarios': self._resumen(resultados),
+            'locks': self._locks(monitor, deadlocks_antes, resultados),
+            'anomalias': {},
+        }
+        for escenario in escenarios:
+            reporte['anomalias'][escenario] = getattr(self, f'_verificar_{escenario}')(planes[escenario], resultados)
+
+        self._imprimir(reporte)
+        if options['salida']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['salida'])), exist_ok=True)
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(reporte, archivo, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Reporte escrito en {options["salida"]}'))
+
+        errores = sum(datos['errores'] for datos in reporte['escenarios'].values())
+        if errores:
+            raise CommandError(f'{errores} petición(es) terminaron en error: el resultado no es concluyente')
+        total_anomalias = sum(a.get('anomalias', 0) for a in reporte['anomalias'].values())
+        if options['estricto'] and total_anomalias:
+            raise CommandError(f'Se detectaron {total_anomalias} anomalías de concurrencia')
+
+    # ------------------------------------------------------------------
+    # Ejecución
+
+    def _ejecutar(self, config, trabajadores, en_procesos):
+        if en_procesos:
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                raise CommandError('--procesos requiere una plataforma con fork; use --hilos')
+            # Los procesos hijos no deben heredar conexiones abiertas
+            connections.close_all()
+            config['arranque'] = time.time() + 1 + 0.05 * trabajadores
+            ejecutor = ProcessPoolExecutor(trabajadores, mp_context=multiprocessing.get_context('fork'))
+        else:
+            config['arranque'] = time.time() + 0.5
+            ejecutor = ThreadPoolExecutor(trabajadores)
+        with ejecutor:
+            futuros = [ejecutor.submit(_trabajador, indice, config) for indice in range(trabajadores)]
+            resultados = []
+            for futuro in futuros:
+                resultados.extend(futuro.result())
+        return resultados
+
+    def _usuario(self, username):
+        usuarios = User.objects.filter(is_staff=True, is_active=True)
+        usuario = usuarios.filter(username=username).first() if username else (
+            usuarios.filter(is_superuser=True).first() or usuarios.first()
+        )
+        if usuario is None:
+            raise CommandError('Se necesita un usuario staff activo (use --usuario)')
+        return usuario
+
+    # ------------------------------------------------------------------
+    # Preparación y verificación por escenario
+
+    def _preparar_reservas(self, options, usuario):
+        parejas = []
+        for empleado in Empleado.objects.filter(activo=True).prefetch_related('especialidades').order_by('id'):
+            especialidades = {e.id for e in empleado.especialidades.all() if e.activo}
+            if not especialidades:
+                continue
+            servicio = Servicio.objects.filter(activo=True).filter(
+                Q(especialidades_requeridas__isnull=True) | Q(especialidades_requeridas__in=especialidades)
+            ).order_by('id').first()
+            if servicio:
+                parejas.append((empleado.id, servicio.id))
+            if len(parejas) >= options['estilistas']:
+                break
+        if not parejas:
+            raise CommandError('El escenario reservas necesita empleados activos con especialidad y un servicio que puedan realizar')
+
+        # Franjas de lunes a viernes desde mañana, libres para los estilistas elegidos
+        estilistas = [empleado_id for empleado_id, _ in parejas]
+        ocupadas = set(
+            ServicioRealizado.objects.filter(estilista_id__in=estilistas, estado__in=ESTADOS_ACTIVOS)
+            .values_list('fecha_servicio', 'hora')
+        )
+        franjas = []
+        dia = timezone.localdate() + timedelta(days=1)
+        limite = timezone.localdate() + timedelta(days=30)
+        while dia <= limite and len(franjas) < options['franjas']:
+            if dia.weekday() < 5:
+                for hora in HORAS:
+                    if (dia, datetime.strptime(hora, '%H:%M').time()) not in ocupadas:
+                        franjas.append((dia.isoformat(), hora))
+                        if len(franjas) >= options['franjas']:
+                            break
+            dia += timedelta(days=1)
+
+        return {
+            'estilistas': estilistas,
+            'fechas': sorted({fecha for fecha, _ in franjas}),
+            'config': {'url': reverse('servicios_crear'), 'parejas': parejas, 'franjas': franjas},
+        }
+
+    def _verificar_reservas(self, plan, resultados):
+        dobles = (
+            ServicioRealizado.objects
+            .filter(estilista_id__in=plan['estilistas'], fecha_servicio__in=plan['fechas'], estado__in=ESTADOS_ACTIVOS)
+            .values('estilista_id', 'fecha_servicio', 'hora')
+            .annotate(citas=Count('id'))
+            .filter(citas__gt=1)
+        )
+        franjas_dobles = [
+            {'estilista': d['estilista_id'], 'fecha': d['fecha_servicio'].isoformat(),
+             'hora': d['hora'].strftime('%H:%M') if d['hora'] else None, 'citas': d['citas']}
+            for d in dobles
+        ]
+        return {
+            'anomalias': sum(d['citas'] - 1 for d in franjas_dobles),
+            'descripcion': 'citas sobrantes en franjas con reserva doble',
+            'franjas_dobles': franjas_dobles,
+        }
+
+    def _preparar_entradas(self, options, usuario):
+        # Solo productos propios: su save() suma sobre el stock leído (lectura-modificación-escritura)
+        productos = list(
+            Producto.objects.filter(activo=True, tipo_producto='propio').order_by('id')
+            .values_list('id', flat=True)[:options['productos']]
+        )
+        if not productos:
+            raise CommandError('El escenario entradas necesita productos propios activos')
+        return {
+            'productos': productos,
+            'stock_inicial': dict(Producto.objects.filter(id__in=productos).values_list('id', 'cantidad')),
+            'ultima_entrada': EntradaInventario.objects.aggregate(maximo=Max('id'))['maximo'] or 0,
+            'config': {'url': reverse('entradas_crear'), 'productos': productos},
+        }
+
+    def _verificar_entradas(self, plan, resultados):
+        ingresado = dict(
+            EntradaInventario.objects
+            .filter(id__gt=plan['ultima_entrada'], producto_id__in=plan['productos'])
+            .values('producto_id').annotate(total=Sum('cantidad'))
+            .values_list('producto_id', 'total')
+        )
+        actual = dict(Producto.objects.filter(id__in=plan['productos']).values_list('id', 'cantidad'))
+        productos = []
+        for producto_id in plan['productos']:
+            esperado = plan['stock_inicial'][producto_id] + ingresado.get(producto_id, 0)
+            productos.append({
+                'producto': producto_id,
+                'esperado': esperado,
+                'actual': actual[producto_id],
+                'perdidas': esperado - actual[producto_id],
+            })
+        return {
+            'anomalias': sum(abs(p['perdidas']) for p in productos),
+            'descripcion': 'unidades de stock perdidas por actualizaciones concurrentes',
+            'productos': productos,
+        }
+
+    def _preparar_auditorias(self, options, usuario):
+        productos = list(Producto.objects.filter(activo=True).order_by('id')[:options['productos'] * 3])
+        if not productos:
+            raise CommandError('El escenario auditorias necesita productos activos')
+        auditoria = AuditoriaInventario.objects.create(
+            fecha_auditoria=timezone.localdate(),
+            estado='en_proceso',
+            observaciones_generales='Auditoría generada por carga_concurrente',
+            usuario=usuario,
+        )
+        detalles = DetalleAuditoria.objects.bulk_create([
+            DetalleAuditoria(auditoria=auditoria, producto=producto, cantidad_sistema=producto.cantidad)
+            for producto in productos
+        ])
+        detalles = [detalle.id for detalle in detalles] or list(auditoria.detalles.values_list('id', flat=True))
+        self.stdout.write(f'Auditoría de prueba #{auditoria.id} con {len(detalles)} detalles')
+        return {
+            'auditoria': auditoria.id,
+            'config': {
+                'url_conteo': reverse('auditoria_actualizar_conteo_ajax', args=[0]).replace('/0/', '/{}/'),
+                'url_revisado': reverse('auditoria_marcar_revisado', args=[0]).replace('/0/', '/{}/'),
+                'detalles': detalles,
+            },
+        }
+
+    def _verificar_auditorias(self, plan, resultados):
+        # Último conteo enviado por el dueño de cada detalle; si falló no se puede saber qué quedó
+        esperado = {}
+        for escenario, resultado, _estado, _error, _inicio, fin, extra in sorted(resultados, key=lambda r: r[5]):
+            if escenario == 'auditorias' and extra and extra[0] == 'conteo':
+                esperado[extra[1]] = extra[2] if resultado == 'ok' else None
+
+        pisados = []
+        inconsistentes = 0
+        for detalle in DetalleAuditoria.objects.filter(auditoria_id=plan['auditoria']):
+            if detalle.diferencia != detalle.conteo_fisico - detalle.cantidad_sistema:
+                inconsistentes += 1
+            valor = esperado.get(detalle.id)
+            if valor is not None and detalle.conteo_fisico != valor:
+                pisados.append({'detalle': detalle.id, 'esperado': valor, 'actual': detalle.conteo_fisico})
+        return {
+            'anomalias': len(pisados) + inconsistentes,
+            'descripcion': 'conteos pisados por un marcado concurrente y detalles con diferencia inconsistente',
+            'auditoria': plan['auditoria'],
+            'conteos_pisados': pisados,
+            'diferencias_inconsistentes': inconsistentes,
+        }
+
+    # ------------------------------------------------------------------
+    # Reporte
+
+    def _resumen(self, resultados):
+        por_escenario = defaultdict(list)
+        for fila in resultados:
+            por_escenario[fila[0]].append(fila)
+
+        resumen = {}
+        for escenario, filas in sorted(por_escenario.items()):
+            latencias = sorted((fin - inicio) * 1000 for _e, _r, _s, _err, inicio, fin, _x in filas)
+            duracion = max(f[5] for f in filas) - min(f[4] for f in filas)
+            resultados_escenario = Counter(f[1] for f in filas)
+            resumen[escenario] = {
+                'peticiones': len(filas),
+                'ok': resultados_escenario['ok'],
+                'rechazadas': resultados_escenario['rechazada'],
+                'errores': resultados_escenario['error'],
+                'bloqueadas': resultados_escenario['bloqueada'],
+                'por_segundo': round(len(filas) / duracion, 1) if duracion > 0 else None,
+                'p50_ms': round(percentil(latencias, 50), 1),
+                'p95_ms': round(percentil(latencias, 95), 1),
+                'p99_ms': round(percentil(latencias, 99), 1),
+                'max_ms': round(latencias[-1], 1),
+                'estados': dict(Counter(str(f[2]) for f in filas)),
+                'tipos_error': dict(Counter(f[3] for f in filas if f[3]).most_common(5)),
+            }
+        return resumen
+
+    def _locks(self, monitor, deadlocks_antes, resultados):
+        # Las peticiones bloqueadas de SQLite son la única señal de contención en ese motor
+        bloqueos = sum(1 for fila in resultados if fila[1] == 'bloqueada')
+        if monitor is None:
+            return {'muestreo': None, 'errores_por_lock': bloqueos}
+        muestras = monitor.muestras or [0]
+        return {
+            'muestreo': {
+                'muestras': len(monitor.muestras),
+                'con_espera': sum(1 for m in muestras if m),
+                'promedio_sesiones_esperando': round(sum(muestras) / len(muestras), 2),
+                'max_sesiones_esperando': max(muestras),
+            },
+            'deadlocks': _deadlocks() - deadlocks_antes,
+            'errores_por_lock': bloqueos,
+        }
+
+    def _imprimir(self, reporte):
+        self.stdout.write(self.style.MIGRATE_HEADING('Rendimiento'))
+        for escenario, datos in reporte['escenarios'].items():
+            self.stdout.write(
+                f'  {escenario:12} {datos["peticiones"]:5d} pet.  ok {datos["ok"]:5d}  rech. {datos["rechazadas"]:5d}  '
+                f'err. {datos["errores"]:4d}  bloq. {datos["bloqueadas"]:4d}  {datos["por_segundo"] or 0:7.1f}/s  '
+                f'p50 {datos["p50_ms"]:7.1f}  p95 {datos["p95_ms"]:7.1f}  p99 {datos["p99_ms"]:7.1f} ms'
+            )
+            for error, veces in datos['tipos_error'].items():
+                self.stdout.write(f'      {veces:4d} × {error}')
+
+        locks = reporte['locks']
+        self.stdout.write(self.style.MIGRATE_HEADING('Locks'))
+        if locks['muestreo']:
+            muestreo = locks['muestreo']
+            self.stdout.write(
+                f'  {muestreo["con_espera"]}/{muestreo["muestras"]} muestras con esperas, '
+                f'promedio {muestreo["promedio_sesiones_esperando"]} y máximo {muestreo["max_sesiones_esperando"]} sesiones; '
+                f'{locks["deadlocks"]} deadlocks'
+            )
+        else:
+            self.stdout.write(f'  Sin muestreo de locks en {reporte["motor"]}; {locks["errores_por_lock"]} peticiones bloqueadas (no cuentan como errores)')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Anomalías'))
+        for escenario, datos in reporte['anomalias'].items():
+            linea = f'  {escenario:12} {datos["anomalias"]:5d} {datos["descripcion"]}'
+            self.stdout.write(self.style.ERROR(linea) if datos['anomalias'] else linea)
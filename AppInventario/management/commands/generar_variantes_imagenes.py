@@ -0,0 +1,25 @@
+"""
+Genera (o regenera) las variantes WebP de las imágenes existentes de productos,
+servicios y empleados. Útil después de desplegar el pipeline de variantes o de
+cambiar los tamaños en AppInventario/imagenes.py.
+"""
+from django.core.management.base import BaseCommand
+
+from AppInventario import imagenes
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes WebP de las imágenes de productos, servicios y empleados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help='Regenerar aunque las variantes estén al día')
+
+    def handle(self, *args, **options):
+        for modelo, (campo, _campo_variantes) in imagenes.CAMPOS_IMAGEN.items():
+            procesados = 0
+            registros = modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            for instancia in registros.iterator(chunk_size=200):
+                if options['forzar'] or imagenes.variantes_desactualizadas(instancia):
+                    imagenes.procesar_variantes(modelo, instancia.pk)
+                    procesados += 1
+            self.stdout.write(self.style.SUCCESS(f'{modelo._meta.verbose_name_plural}: {procesados} imagen(es) procesada(s)'))
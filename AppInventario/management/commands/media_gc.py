@@ -0,0 +1,142 @@
+"""
+Deduplica y limpia la carpeta de media en una sola pasada.
+
+1. Cada archivo referenciado por Producto.imagen, Servicio.imagen o
+   Empleado.foto (y sus variantes WebP) que todavía no está direccionado por
+   contenido se copia a contenido/<aa>/<sha256><ext>. Los duplicados apuntan al
+   mismo archivo y los registros se actualizan con el nuevo nombre en una
+   transacción; los originales se borran solo después de confirmarla.
+2. Todo archivo bajo MEDIA_ROOT que ya no esté referenciado y que no se haya
+   modificado dentro del periodo de gracia (MEDIA_GRACIA_SEGUNDOS o
+   --gracia-minutos) se elimina. Los recientes pueden ser subidas cuyo registro
+   aún no se confirma.
+
+Use --dry-run para ver qué se haría sin tocar archivos ni la base de datos.
+"""
+import os
+import shutil
+import time
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from AppInventario.storage import (
+    ARCHIVO_BLOQUEO, CARPETA_CONTENIDO, REFERENCIAS_MEDIA, gracia_segundos, hash_contenido, nombre_por_hash, reciente,
+)
+
+
+class Command(BaseCommand):
+    help = 'Deduplica la media por hash de contenido y elimina archivos huérfanos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informar, sin modificar archivos ni registros')
+        parser.add_argument(
+            '--gracia-minutos', type=int, default=None,
+            help='No eliminar huérfanos modificados hace menos de estos minutos (por defecto MEDIA_GRACIA_SEGUNDOS)',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.raiz = default_storage.location
+        self.renombrados = {}
+        self.movidos = set()
+        self.bytes_liberados = 0
+        minutos = options['gracia_minutos']
+        self.gracia = minutos * 60 if minutos is not None else gracia_segundos()
+
+        referenciados = set()
+        with transaction.atomic():
+            for etiqueta, campo, campo_variantes in REFERENCIAS_MEDIA:
+                referenciados |= self._deduplicar_modelo(apps.get_model(etiqueta), campo, campo_variantes)
+            if self.dry_run:
+                transaction.set_rollback(True)
+
+        # Los registros ya apuntan a las copias: recién ahora se borran los originales
+        eliminados = 0
+        for nombre in sorted(self.movidos):
+            ruta = default_storage.path(nombre)
+            if os.path.exists(ruta):
+                self.bytes_liberados += os.path.getsize(ruta)
+                self.stdout.write(f'  eliminar {nombre}')
+                if not self.dry_run:
+                    os.remove(ruta)
+                eliminados += 1
+
+        eliminados += self._eliminar_huerfanos(referenciados)
+
+        prefijo = '[dry-run] ' if self.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefijo}{len(self.movidos)} archivo(s) pasados a almacenamiento por contenido, '
+            f'{eliminados} archivo(s) eliminados, {self.bytes_liberados / 1024:.1f} KB liberados'
+        ))
+
+    def _nombre_por_contenido(self, nombre):
+        """Retorna el nombre direccionado por contenido de `nombre`, copiándolo si hace falta"""
+        if nombre in self.renombrados:
+            return self.renombrados[nombre]
+        if nombre.startswith(f'{CARPETA_CONTENIDO}/') or not default_storage.exists(nombre):
+            self.renombrados[nombre] = nombre
+            return nombre
+
+        with default_storage.open(nombre, 'rb') as archivo:
+            destino = nombre_por_hash(hash_contenido(archivo), nombre)
+
+        if not default_storage.exists(destino) and destino not in self.renombrados.values():
+            # Primera copia de este contenido. Se copia y no se mueve: si la
+            # transacción se revierte, los registros siguen apuntando al original
+            if not self.dry_run:
+                ruta_destino = default_storage.path(destino)
+                os.makedirs(os.path.dirname(ruta_destino), exist_ok=True)
+                shutil.copy2(default_storage.path(nombre), ruta_destino)
+        # Todos los originales quedan sin referencias al confirmar
+        self.movidos.add(nombre)
+        self.stdout.write(f'  {nombre} -> {destino}')
+        self.renombrados[nombre] = destino
+        return destino
+
+    def _deduplicar_modelo(self, modelo, campo, campo_variantes):
+        """Actualiza los nombres de un modelo y retorna el conjunto de archivos que usa"""
+        usados = set()
+        registros = modelo.objects.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''})
+        for pk, nombre, variantes in registros.values_list('pk', campo, campo_variantes).iterator():
+            nuevo = self._nombre_por_contenido(nombre)
+            variantes = dict(variantes or {})
+            cambio_variantes = False
+            for clave, variante in variantes.items():
+                if isinstance(variante, dict) and variante.get('ruta'):
+                    ruta = self._nombre_por_contenido(variante['ruta'])
+                    cambio_variantes |= ruta != variante['ruta']
+                    variantes[clave] = {**variante, 'ruta': ruta}
+                    usados.add(ruta)
+            if variantes.get('origen') == nombre and nuevo != nombre:
+                variantes['origen'] = nuevo
+                cambio_variantes = True
+
+            if nuevo != nombre or cambio_variantes:
+                # update() para no disparar save() ni regenerar variantes
+                modelo.objects.filter(pk=pk).update(**{campo: nuevo, campo_variantes: variantes})
+            usados.add(nuevo)
+        return usados
+
+    def _eliminar_huerfanos(self, referenciados):
+        eliminados = 0
+        ahora = time.time()
+        for directorio, _subdirs, archivos in os.walk(self.raiz):
+            for archivo in archivos:
+                ruta = os.path.join(directorio, archivo)
+                nombre = os.path.relpath(ruta, self.raiz).replace(os.sep, '/')
+                # Los originales copiados ya se borraron (o en dry-run se informan por su nombre)
+                if nombre in referenciados or nombre in self.movidos or nombre == ARCHIVO_BLOQUEO:
+                    continue
+                # Mismo bloqueo que el storage: un save() que reutiliza el archivo renueva su fecha
+                with default_storage.bloqueo():
+                    if reciente(ruta, self.gracia, ahora) or not os.path.exists(ruta):
+                        continue
+                    self.bytes_liberados += os.path.getsize(ruta)
+                    self.stdout.write(f'  eliminar {nombre}')
+                    if not self.dry_run:
+                        os.remove(ruta)
+                eliminados += 1
+        return eliminados
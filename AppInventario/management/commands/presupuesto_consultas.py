@@ -0,0 +1,74 @@
+"""
+Verifica el presupuesto de consultas de los listados declarados en
+precarga.POLITICAS contra la base actual (conviene usar los datos de seed_scale).
+
+    python manage.py presupuesto_consultas
+    python manage.py presupuesto_consultas --vista entradas_lista --factor 10
+
+Cada vista se mide dos veces como petición AJAX del usuario indicado: con su
+tamaño de página y con páginas --factor veces más grandes. El comando falla si
+alguna vista supera su presupuesto, si la cantidad de consultas crece con el
+tamaño de la página (consultas por fila) o si la vista lanza una excepción.
+"""
+import logging
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from AppInventario import precarga
+
+
+class Command(BaseCommand):
+    help = 'Verifica que los listados no superen su presupuesto de consultas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vista', action='append', help='Vista a verificar (se puede repetir; por defecto todas)')
+        parser.add_argument('--factor', type=int, default=10, help='Multiplicador del tamaño de página en la segunda medición')
+        parser.add_argument('--usuario', help='Usuario staff con el que ejecutar (por defecto el primer superusuario)')
+
+    def handle(self, *args, **options):
+        usuario = self._usuario(options['usuario'])
+        vistas = options['vista'] or list(precarga.POLITICAS)
+        desconocidas = set(vistas) - set(precarga.POLITICAS)
+        if desconocidas:
+            raise CommandError(f'Vistas sin política declarada: {", ".join(sorted(desconocidas))}')
+
+        # Las líneas de métricas solo ensucian la salida
+        logger = logging.getLogger('AppInventario.metricas')
+        nivel = logger.level
+        logger.setLevel(logging.CRITICAL)
+        fallidas = []
+        try:
+            for vista in vistas:
+                presupuesto = precarga.POLITICAS[vista]['presupuesto']
+                try:
+                    cache.clear()
+                    consultas = precarga.medir(vista, usuario)
+                    cache.clear()
+                    ampliadas = precarga.medir(vista, usuario, factor=options['factor'])
+                except Exception as error:
+                    fallidas.append(vista)
+                    self.stdout.write(self.style.ERROR(f'  {vista:28} error: {type(error).__name__}: {error}'))
+                    continue
+                linea = f'  {vista:28} {consultas:3d} consultas (x{options["factor"]}: {ampliadas:3d})  presupuesto {presupuesto}'
+                if max(consultas, ampliadas) > presupuesto or ampliadas > consultas:
+                    fallidas.append(vista)
+                    self.stdout.write(self.style.ERROR(linea))
+                else:
+                    self.stdout.write(linea)
+        finally:
+            logger.setLevel(nivel)
+
+        if fallidas:
+            raise CommandError(f'{len(fallidas)} vista(s) fuera de presupuesto: {", ".join(fallidas)}')
+        self.stdout.write(self.style.SUCCESS('Todas las vistas dentro de su presupuesto'))
+
+    def _usuario(self, username):
+        usuarios = User.objects.filter(is_staff=True, is_active=True)
+        usuario = usuarios.filter(username=username).first() if username else (
+            usuarios.filter(is_superuser=True).first() or usuarios.first()
+        )
+        if usuario is None:
+            raise CommandError('Se necesita un usuario staff activo (use --usuario)')
+        return usuario
@@ -0,0 +1,29 @@
+"""
+Recalcula los contadores de relaciones de los catálogos (ver
+AppInventario/contadores.py). Las señales los mantienen al día; este comando
+corrige el desfase que dejan los cambios hechos sin señales (QuerySet.update(),
+bulk_create, loaddata, SQL directo).
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from AppInventario import contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de empleados, productos y solicitudes de los catálogos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', action='append', dest='modelos', help='Recontar solo este modelo (repetible)')
+
+    def handle(self, *args, **options):
+        disponibles = {modelo._meta.model_name: modelo for modelo, *_resto in contadores.definiciones()}
+        nombres = {nombre.lower() for nombre in options['modelos'] or ()}
+        desconocidos = nombres - set(disponibles)
+        if desconocidos:
+            raise CommandError(f'Modelos desconocidos: {", ".join(sorted(desconocidos))}')
+        modelos = [disponibles[nombre] for nombre in nombres] or None
+        with transaction.atomic():
+            totales = contadores.recontar(modelos)
+        for modelo, cantidad in totales.items():
+            self.stdout.write(self.style.SUCCESS(f'{modelo._meta.verbose_name_plural}: {cantidad} registro(s)'))
@@ -0,0 +1,28 @@
+"""
+Reconstruye el índice del buscador global (DocumentoBusqueda) a partir de los
+productos, productos de proveedor, proveedores, empleados y servicios. Debe
+ejecutarse una vez después de aplicar la migración 0055 y cada vez que cambie
+el armado de los documentos en AppInventario/indice_busqueda.py.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from AppInventario import indice_busqueda
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice del buscador global'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', action='append', dest='tipos', help='Reindexar solo este tipo (repetible)')
+        parser.add_argument('--lote', type=int, default=500, help='Registros por lote de inserción')
+
+    def handle(self, *args, **options):
+        desconocidos = set(options['tipos'] or ()) - set(indice_busqueda.tipos())
+        if desconocidos:
+            raise CommandError(f'Tipos desconocidos: {", ".join(sorted(desconocidos))}')
+        # En una transacción: las búsquedas no ven el índice a medio reconstruir
+        with transaction.atomic():
+            totales = indice_busqueda.reindexar(options['tipos'], options['lote'])
+        for tipo, cantidad in totales.items():
+            self.stdout.write(self.style.SUCCESS(f'{tipo}: {cantidad} documento(s)'))
@@ -0,0 +1,567 @@
+"""
+Genera un conjunto de datos a escala para medir rendimiento.
+
+    python manage.py seed_scale --productos 100000 --entradas 2000000
+
+Crea zonas, proveedores, productos (propios y de proveedor), empleados con
+especialidades y cargo, servicios, citas, entradas, ventas,
+solicitudes de compra, auditorías e historial, con distribuciones parecidas a
+las reales: unos pocos productos concentran la mayoría de los movimientos
+(Zipf), los movimientos se reparten en horario comercial y con menos actividad
+los domingos, y las cantidades siguen una distribución log-normal. Los
+volúmenes no indicados se derivan de --productos.
+
+Los datos se agregan a los existentes (no se borra nada). En PostgreSQL las
+tablas grandes (entradas, ventas, historial) se cargan con COPY; en otros
+motores se usa bulk_create. Al terminar se recalcula el stock y el costo
+promedio de los productos generados y, como la carga no pasa por las señales,
+se reconstruyen las etiquetas de empleados, los contadores de los catálogos y
+el índice del buscador, y se incrementan las versiones de datos.
+"""
+import csv
+import io
+import math
+import random
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Avg, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from AppInventario.models import (
+    Zona, Proveedores, ProductoProveedor, Producto, Especialidad, Cargo, Empleado,
+    Servicio, ServicioRealizado, EntradaInventario, Compras, SolicitudCompra,
+    AuditoriaInventario, DetalleAuditoria, HistorialAccion,
+)
+from AppInventario import contadores, indice_busqueda, versiones
+from AppInventario.signals import actualizar_etiquetas_empleados
+
+BASES = {
+    'frutas': ['Manzana', 'Pera', 'Plátano', 'Naranja', 'Mandarina', 'Uva', 'Frutilla', 'Kiwi', 'Palta', 'Limón', 'Durazno', 'Ciruela', 'Cereza', 'Arándano', 'Piña', 'Mango', 'Melón', 'Sandía'],
+    'verduras': ['Lechuga', 'Tomate', 'Papa', 'Cebolla', 'Zanahoria', 'Zapallo', 'Pimentón', 'Espinaca', 'Brócoli', 'Coliflor', 'Betarraga', 'Pepino', 'Acelga', 'Apio', 'Ajo', 'Choclo', 'Porotos Verdes'],
+    'frutos_secos': ['Almendra', 'Nuez', 'Maní', 'Castaña de Cajú', 'Pistacho', 'Avellana', 'Pasas', 'Ciruela Seca', 'Dátil', 'Mix Frutos Secos'],
+    'preelaborados': ['Ensalada Lista', 'Sopa de Verduras', 'Puré de Zapallo', 'Jugo Natural', 'Mermelada', 'Compota', 'Verduras Salteadas', 'Guacamole', 'Pebre'],
+}
+VARIEDADES = ['Orgánica', 'Premium', 'Extra', 'Nacional', 'Importada', 'Selección', 'Primera', 'Calibre Grande', 'Calibre Mediano', 'Granel']
+FORMATOS = [('kg', 'kg'), ('500 g', 'unidades'), ('bandeja', 'unidades'), ('malla 2 kg', 'unidades'), ('caja', 'cajas'), ('atado', 'unidades')]
+# Peso relativo de cada categoría en el catálogo
+PESOS_CATEGORIA = {'frutas': 35, 'verduras': 35, 'frutos_secos': 15, 'preelaborados': 15}
+
+NOMBRES = ['Camila', 'Valentina', 'Javiera', 'Catalina', 'Fernanda', 'Constanza', 'Francisca', 'Daniela', 'Sofía', 'Isidora',
+           'Benjamín', 'Matías', 'Vicente', 'Martín', 'Joaquín', 'Tomás', 'Sebastián', 'Diego', 'Nicolás', 'Felipe']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda',
+             'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya', 'Flores', 'Espinoza', 'Valenzuela']
+CIUDADES = ['Santiago', 'Valparaíso', 'Concepción', 'Rancagua', 'Talca', 'La Serena', 'Temuco', 'Chillán', 'Curicó', 'Los Ángeles']
+ESPECIALIDADES = ['Recepción de Mercadería', 'Control de Calidad', 'Bodega', 'Cadena de Frío', 'Atención a Clientes', 'Preparación de Pedidos', 'Caja', 'Despacho']
+CARGOS = [
+    ('Administrador', True, True, True, True),
+    ('Recepcionista', True, False, True, False),
+    ('Bodeguero', False, True, False, False),
+    ('Vendedor', True, False, True, False),
+]
+SERVICIOS = ['Armado de Canasta', 'Despacho a Domicilio', 'Corte y Porcionado', 'Asesoría Nutricional', 'Preparación de Jugos',
+             'Pedido Empresa', 'Degustación', 'Retiro en Tienda', 'Caja Semanal', 'Taller de Conservas']
+
+
+class Command(BaseCommand):
+    help = 'Genera datos a escala (bulk_create/COPY) con distribuciones realistas para pruebas de rendimiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=1000, help='Cantidad de productos a generar')
+        parser.add_argument('--entradas', type=int, help='Entradas de inventario (por defecto 20 por producto)')
+        parser.add_argument('--compras', type=int, help='Ventas/compras de clientes (por defecto 10 por producto)')
+        parser.add_argument('--proveedores', type=int, help='Proveedores (por defecto 1 cada 200 productos, mínimo 5)')
+        parser.add_argument('--zonas', type=int, default=12, help='Zonas de almacenamiento')
+        parser.add_argument('--empleados', type=int, default=40, help='Empleados')
+        parser.add_argument('--servicios', type=int, default=len(SERVICIOS), help='Servicios del catálogo')
+        parser.add_argument('--citas', type=int, help='Servicios realizados/agendados (por defecto 2 por producto)')
+        parser.add_argument('--solicitudes', type=int, help='Solicitudes de compra (por defecto 1 cada 2 productos)')
+        parser.add_argument('--auditorias', type=int, default=24, help='Auditorías de inventario')
+        parser.add_argument('--historial', type=int, help='Registros de historial de acciones (por defecto 2 por producto)')
+        parser.add_argument('--dias', type=int, default=730, help='Días hacia atrás en que se reparten los movimientos')
+        parser.add_argument('--lote', type=int, default=5000, help='Tamaño de lote para bulk_create/COPY')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla aleatoria (resultados reproducibles)')
+
+    def handle(self, *args, **options):
+        n = options['productos']
+        if n <= 0:
+            raise CommandError('--productos debe ser mayor que 0')
+
+        self.lote = options['lote']
+        self.rng = random.Random(options['semilla'])
+        self.dias = options['dias']
+        self.marca = timezone.now().strftime('%Y%m%d%H%M%S')
+        self.usar_copy = connection.vendor == 'postgresql'
+        self._preparar_calendario()
+
+        volumenes = {
+            'entradas': options['entradas'] if options['entradas'] is not None else n * 20,
+            'compras': options['compras'] if options['compras'] is not None else n * 10,
+            'proveedores': options['proveedores'] if options['proveedores'] is not None else max(5, n // 200),
+            'citas': options['citas'] if options['citas'] is not None else n * 2,
+            'solicitudes': options['solicitudes'] if options['solicitudes'] is not None else max(1, n // 2),
+            'historial': options['historial'] if options['historial'] is not None else n * 2,
+        }
+
+        usuarios = self._usuarios_staff()
+        zonas = self._zonas(options['zonas'])
+        proveedores = self._proveedores(volumenes['proveedores'])
+        productos = self._productos(n, zonas, proveedores, usuarios)
+        self._productos_proveedor(productos, proveedores)
+        especialidades, cargos = self._catalogos_personal()
+        empleados = self._empleados(options['empleados'], especialidades, cargos)
+        servicios = self._servicios(options['servicios'], especialidades)
+
+        # Zipf: los productos más "populares" concentran la mayoría de movimientos
+        self.pesos_productos = list(accumulate(1 / (rango ** 1.1) for rango in range(1, len(productos) + 1)))
+        orden_popularidad = productos[:]
+        self.rng.shuffle(orden_popularidad)
+        self.productos_por_popularidad = orden_popularidad
+
+        self._entradas(volumenes['entradas'], proveedores, usuarios)
+        self._compras(volumenes['compras'])
+        self._solicitudes(volumenes['solicitudes'], proveedores, usuarios)
+        self._citas(volumenes['citas'], empleados, servicios)
+        self._auditorias(options['auditorias'], productos, usuarios)
+        self._historial(volumenes['historial'], usuarios)
+        self._recalcular_stock(productos[0].pk, productos[-1].pk)
+        self._datos_derivados()
+
+        versiones.incrementar_versiones([m._meta.label_lower for m in (
+            Zona, Proveedores, ProductoProveedor, Producto, Especialidad, Cargo, Empleado, Servicio,
+            ServicioRealizado, EntradaInventario, Compras, SolicitudCompra, AuditoriaInventario,
+            DetalleAuditoria, HistorialAccion, User,
+        )])
+        self.stdout.write(self.style.SUCCESS('Datos generados: ' + ', '.join(
+            f'{nombre}={cantidad}' for nombre, cantidad in [('productos', n), *volumenes.items()]
+        )))
+
+    def _datos_derivados(self):
+        """Lo que mantienen las señales y bulk_create/COPY se saltan"""
+        self.stdout.write('Reconstruyendo etiquetas, contadores e índice de búsqueda...')
+        with transaction.atomic():
+            actualizar_etiquetas_empleados(Empleado.objects.all())
+            contadores.recontar()
+            indice_busqueda.reindexar(lote=self.lote)
+
+    # ------------------------------------------------------------------
+    # Utilidades
+
+    def _preparar_calendario(self):
+        """Medianoche local de cada día del rango; los domingos pesan menos"""
+        hoy = timezone.localdate()
+        self.medianoches = []
+        pesos = []
+        for atras in range(self.dias, 0, -1):
+            dia = hoy - timedelta(days=atras)
+            self.medianoches.append(timezone.make_aware(datetime.combine(dia, time())))
+            pesos.append(0.3 if dia.weekday() == 6 else 1.2 if dia.weekday() == 5 else 1.0)
+        self.pesos_dias = list(accumulate(pesos))
+
+    def _elegir(self, acumulados):
+        return bisect(acumulados, self.rng.random() * acumulados[-1])
+
+    def _fecha(self):
+        """Instante aleatorio en horario comercial (08:00-20:00, pico a media mañana)"""
+        medianoche = self.medianoches[min(self._elegir(self.pesos_dias), len(self.medianoches) - 1)]
+        return medianoche + timedelta(hours=self.rng.triangular(8, 20, 11))
+
+    def _producto_popular(self):
+        return self.productos_por_popularidad[min(self._elegir(self.pesos_productos), len(self.productos_por_popularidad) - 1)]
+
+    def _cantidad(self, media=20):
+        return max(1, int(self.rng.lognormvariate(math.log(media), 0.8)))
+
+    def _nombre_persona(self):
+        return f'{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)}'
+
+    def _telefono(self):
+        return f'+569{self.rng.randint(10000000, 99999999)}'
+
+    @contextmanager
+    def _fechas_explicitas(self, modelo, objetos):
+        """
+        Desactiva auto_now/auto_now_add para fijar fechas históricas con
+        bulk_create; los objetos sin fecha reciben la fecha actual.
+        """
+        campos = [
+            (campo, campo.auto_now, campo.auto_now_add)
+            for campo in modelo._meta.concrete_fields
+            if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+        ]
+        ahora = timezone.now()
+        for campo, _auto_now, _auto_now_add in campos:
+            campo.auto_now = campo.auto_now_add = False
+            for objeto in objetos:
+                if getattr(objeto, campo.attname) is None:
+                    setattr(objeto, campo.attname, ahora)
+        try:
+            yield
+        finally:
+            for campo, auto_now, auto_now_add in campos:
+                campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+    def _cargar(self, modelo, columnas, filas):
+        """
+        Inserta `filas` (tuplas en el orden de `columnas`, nombres de atributo)
+        por lotes: COPY en PostgreSQL, bulk_create en otros motores.
+        """
+        total = 0
+        filas = iter(filas)
+        while True:
+            bloque = list(islice(filas, self.lote))
+            if not bloque:
+                break
+            if self.usar_copy:
+                self._copy(modelo, columnas, bloque)
+            else:
+                objetos = [modelo(**dict(zip(columnas, fila))) for fila in bloque]
+                with self._fechas_explicitas(modelo, objetos):
+                    modelo.objects.bulk_create(objetos)
+            total += len(bloque)
+            self.stdout.write(f'  {modelo._meta.verbose_name_plural}: {total}', ending='\r')
+        self.stdout.write('')
+        return total
+
+    def _copy(self, modelo, columnas, bloque):
+        nombres_columnas = ', '.join(
+            connection.ops.quote_name(modelo._meta.get_field(columna).column) for columna in columnas
+        )
+        sql = f'COPY {connection.ops.quote_name(modelo._meta.db_table)} ({nombres_columnas}) FROM STDIN'
+        with connection.cursor() as cursor_db:
+            crudo = cursor_db.cursor
+            if hasattr(crudo, 'copy'):
+                # psycopg 3
+                with crudo.copy(sql) as copia:
+                    for fila in bloque:
+                        copia.write_row(fila)
+            else:
+                # psycopg2: CSV, con las cadenas vacías entre comillas para distinguirlas de NULL
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer)
+                for fila in bloque:
+                    escritor.writerow(['' if valor is None else valor for valor in fila])
+                buffer.seek(0)
+                crudo.copy_expert(sql + " WITH (FORMAT csv, NULL '')", buffer)
+
+    def _crear(self, modelo, objetos):
+        with self._fechas_explicitas(modelo, objetos):
+            return modelo.objects.bulk_create(objetos, batch_size=self.lote)
+
+    # ------------------------------------------------------------------
+    # Catálogos
+
+    def _usuarios_staff(self):
+        usuarios = list(User.objects.filter(is_staff=True).order_by('id')[:20])
+        if len(usuarios) < 5:
+            usuarios += self._crear(User, [
+                User(username=f'seed_{self.marca}_{i}', email=f'seed_{self.marca}_{i}@biofresco.cl',
+                     first_name=self.rng.choice(NOMBRES), last_name=self.rng.choice(APELLIDOS),
+                     is_staff=True, password='!')
+                for i in range(5)
+            ])
+        return usuarios
+
+    def _zonas(self, cantidad):
+        existentes = set(Zona.objects.values_list('nombre', flat=True))
+        nuevas = [
+            Zona(nombre=nombre, descripcion='Zona generada para pruebas de rendimiento')
+            for nombre in (f'Bodega {chr(65 + i // 10)}-{i % 10 + 1:02d}' for i in range(cantidad))
+            if nombre not in existentes
+        ]
+        self._crear(Zona, nuevas)
+        return list(Zona.objects.filter(activo=True).values_list('id', flat=True))
+
+    def _proveedores(self, cantidad):
+        proveedores = self._crear(Proveedores, [
+            Proveedores(
+                nombre=f'{self.rng.choice(["Agrícola", "Distribuidora", "Comercial", "Huertos", "Frutícola"])} '
+                       f'{self.rng.choice(APELLIDOS)} {self.marca[-6:]}-{i}',
+                contacto=self._nombre_persona(),
+                telefono=self._telefono(),
+                email=f'ventas{i}.{self.marca}@proveedor.cl',
+                direccion=f'Camino Rural {self.rng.randint(1, 9999)}',
+                ciudad=self.rng.choice(CIUDADES),
+                fecha_registro=self._fecha(),
+            )
+            for i in range(cantidad)
+        ])
+        return [p.pk for p in proveedores]
+
+    def _productos(self, cantidad, zonas, proveedores, usuarios):
+        categorias = list(PESOS_CATEGORIA)
+        pesos = list(accumulate(PESOS_CATEGORIA.values()))
+        objetos = []
+        for i in range(cantidad):
+            categoria = categorias[self._elegir(pesos)]
+            formato, unidad = self.rng.choice(FORMATOS)
+            precio = Decimal(int(self.rng.lognormvariate(math.log(2500), 0.6)) // 10 * 10 + 990)
+            creado = self._fecha()
+            objetos.append(Producto(
+                nombre=f'{self.rng.choice(BASES[categoria])} {self.rng.choice(VARIEDADES)} {formato} #{i + 1}',
+                tipo_producto='proveedor' if self.rng.random() < 0.2 else 'propio',
+                categoria=categoria,
+                cantidad=0,
+                precio=precio,
+                stock_minimo=self.rng.choice([5, 10, 10, 10, 20, 50]),
+                costo_promedio_actual=(precio * Decimal('0.6')).quantize(Decimal('0.01')),
+                descripcion=f'{BASES[categoria][0]} de categoría {categoria.replace("_", " ")}',
+                unidad_medida=unidad,
+                zona_id=self.rng.choice(zonas) if zonas and self.rng.random() < 0.9 else None,
+                proveedor_habitual_id=self.rng.choice(proveedores) if self.rng.random() < 0.7 else None,
+                activo=self.rng.random() < 0.95,
+                usuario_creacion=self.rng.choice(usuarios),
+                fecha_creacion=creado,
+                fecha_modificacion=creado,
+            ))
+        return self._crear(Producto, objetos)
+
+    def _productos_proveedor(self, productos, proveedores):
+        de_proveedor = [p for p in productos if p.tipo_producto == 'proveedor']
+        ofertas = self._crear(ProductoProveedor, [
+            ProductoProveedor(
+                proveedor_id=producto.proveedor_habitual_id or self.rng.choice(proveedores),
+                producto=producto,
+                nombre=producto.nombre,
+                precio_unitario=producto.costo_promedio_actual,
+                precio_compra_actual=producto.costo_promedio_actual,
+                unidad_medida=producto.unidad_medida,
+                codigo_producto=f'SEED-{self.marca}-{producto.pk}',
+                fecha_registro=producto.fecha_creacion,
+                fecha_actualizacion=producto.fecha_creacion,
+            )
+            for producto in de_proveedor
+        ])
+        for producto, oferta in zip(de_proveedor, ofertas):
+            producto.producto_proveedor_id = oferta.pk
+        Producto.objects.bulk_update(de_proveedor, ['producto_proveedor'], batch_size=self.lote)
+
+    def _catalogos_personal(self):
+        Especialidad.objects.bulk_create([Especialidad(nombre=nombre) for nombre in ESPECIALIDADES], ignore_conflicts=True)
+        Cargo.objects.bulk_create([
+            Cargo(nombre=nombre, puede_agendar=agendar, puede_gestionar_inventario=inventario,
+                  puede_ver_compras=compras, puede_gestionar_empleados_servicios_proveedores=gestion)
+            for nombre, agendar, inventario, compras, gestion in CARGOS
+        ], ignore_conflicts=True)
+        especialidades = list(Especialidad.objects.filter(nombre__in=ESPECIALIDADES).values_list('id', flat=True))
+        cargos = list(Cargo.objects.values_list('id', flat=True))
+        return especialidades, cargos
+
+    def _empleados(self, cantidad, especialidades, cargos):
+        usuarios = self._crear(User, [
+            User(username=f'empleado_{self.marca}_{i}', email=f'empleado{i}.{self.marca}@biofresco.cl',
+                 is_staff=True, password='!')
+            for i in range(cantidad)
+        ])
+        empleados = self._crear(Empleado, [
+            Empleado(
+                nombre=self.rng.choice(NOMBRES),
+                apellido=self.rng.choice(APELLIDOS),
+                email=usuario.email,
+                telefono=self._telefono(),
+                experiencia_anos=self.rng.randint(0, 20),
+                fecha_contrato=self._fecha().date(),
+                sueldo=Decimal(self.rng.randrange(550000, 1500000, 10000)),
+                cargo_id=self.rng.choice(cargos) if cargos else None,
+                user=usuario,
+                activo=self.rng.random() < 0.9,
+            )
+            for usuario in usuarios
+        ])
+        relacion = Empleado.especialidades.through
+        relacion.objects.bulk_create([
+            relacion(empleado_id=empleado.pk, especialidad_id=especialidad)
+            for empleado in empleados
+            for especialidad in self.rng.sample(especialidades, self.rng.randint(1, min(3, len(especialidades))))
+        ], batch_size=self.lote)
+        return [e.pk for e in empleados if e.activo] or [e.pk for e in empleados]
+
+    def _servicios(self, cantidad, especialidades):
+        servicios = self._crear(Servicio, [
+            Servicio(
+                nombre=f'{SERVICIOS[i % len(SERVICIOS)]}{"" if i < len(SERVICIOS) else f" {i // len(SERVICIOS) + 1}"}',
+                descripcion='Servicio generado para pruebas de rendimiento',
+                precio=Decimal(self.rng.randrange(3000, 40000, 500)),
+                duracion_minutos=self.rng.choice([30, 30, 45, 60, 90]),
+            )
+            for i in range(cantidad)
+        ])
+        relacion = Servicio.especialidades_requeridas.through
+        relacion.objects.bulk_create([
+            relacion(servicio_id=servicio.pk, especialidad_id=especialidad)
+            for servicio in servicios
+            for especialidad in self.rng.sample(especialidades, self.rng.randint(1, 2))
+        ])
+        return servicios
+
+    # ------------------------------------------------------------------
+    # Movimientos
+
+    def _entradas(self, cantidad, proveedores, usuarios):
+        def filas():
+            for _ in range(cantidad):
+                producto = self._producto_popular()
+                costo = producto.costo_promedio_actual * Decimal(str(round(self.rng.uniform(0.85, 1.15), 2)))
+                yield (
+                    producto.pk,
+                    producto.proveedor_habitual_id or self.rng.choice(proveedores),
+                    self._cantidad(30),
+                    costo.quantize(Decimal('0.01')),
+                    f'F-{self.rng.randint(100000, 999999)}' if self.rng.random() < 0.8 else None,
+                    None,
+                    self._fecha(),
+                    self.rng.choice(usuarios).pk,
+                )
+        self._cargar(EntradaInventario, ['producto_id', 'proveedor_id', 'cantidad', 'precio_unitario', 'numero_factura',
+                                         'observaciones', 'fecha_entrada', 'usuario_registro_id'], filas())
+
+    def _compras(self, cantidad):
+        def filas():
+            for _ in range(cantidad):
+                producto = self._producto_popular()
+                nombre = self._nombre_persona()
+                yield (
+                    producto.pk,
+                    self._cantidad(3),
+                    producto.precio,
+                    nombre,
+                    f'{nombre.split()[0].lower()}{self.rng.randint(1, 9999)}@correo.cl',
+                    self._telefono(),
+                    self.rng.choice(CIUDADES),
+                    self._fecha(),
+                )
+        self._cargar(Compras, ['producto_id', 'cantidad', 'precio_unitario', 'nombre_cliente', 'email_cliente',
+                               'telefono_cliente', 'ciudad_cliente', 'fecha_compra'], filas())
+
+    def _solicitudes(self, cantidad, proveedores, usuarios):
+        estados = ['borrador', 'enviada', 'aceptada', 'en_proceso', 'completada', 'cancelada']
+        pesos = list(accumulate([5, 10, 5, 10, 60, 10]))
+        objetos = []
+        for _ in range(cantidad):
+            producto = self._producto_popular()
+            estado = estados[self._elegir(pesos)]
+            fecha = self._fecha()
+            cantidad_pedida = self._cantidad(50)
+            precio = producto.costo_promedio_actual
+            completada = estado == 'completada'
+            objetos.append(SolicitudCompra(
+                producto_id=producto.pk,
+                proveedor_id=producto.proveedor_habitual_id or self.rng.choice(proveedores),
+                cantidad=cantidad_pedida,
+                precio_unitario=precio,
+                costo_total=precio * cantidad_pedida,
+                estado=estado,
+                fecha_solicitud=fecha,
+                fecha_aceptacion=fecha + timedelta(days=1) if estado in ('aceptada', 'en_proceso', 'completada') else None,
+                fecha_completada=fecha + timedelta(days=4) if completada else None,
+                fecha_recepcion=fecha + timedelta(days=4) if completada else None,
+                cantidad_recibida=cantidad_pedida if completada else None,
+                precio_final=precio if completada else None,
+                usuario_solicitante=self.rng.choice(usuarios),
+            ))
+        self._crear(SolicitudCompra, objetos)
+
+    def _citas(self, cantidad, empleados, servicios):
+        """Citas sin dobles reservas: un estilista no tiene dos citas a la misma hora"""
+        ocupados = set(
+            ServicioRealizado.objects.filter(estilista_id__in=empleados, hora__isnull=False)
+            .values_list('estilista_id', 'fecha_servicio', 'hora')
+        )
+        hoy = timezone.localdate()
+        horas = [time(h, m) for h in range(9, 19) for m in (0, 30)]
+        citas = []
+        intentos = 0
+        while len(citas) < cantidad and intentos < cantidad * 5:
+            intentos += 1
+            # 90% en el pasado, 10% agendadas a futuro
+            dia = hoy + timedelta(days=self.rng.randint(1, 30)) if self.rng.random() < 0.1 else self._fecha().date()
+            clave = (self.rng.choice(empleados), dia, self.rng.choice(horas))
+            if clave in ocupados:
+                continue
+            ocupados.add(clave)
+            servicio = self.rng.choice(servicios)
+            nombre = self._nombre_persona()
+            if dia > hoy:
+                estado = 'pendiente'
+            else:
+                estado = 'completado' if self.rng.random() < 0.92 else 'pendiente'
+            citas.append(ServicioRealizado(
+                servicio_id=servicio.pk, estilista_id=clave[0], fecha_servicio=dia, hora=clave[2],
+                costo=servicio.precio, estado=estado, nombre_cliente=nombre,
+                email_cliente=f'{nombre.split()[0].lower()}{self.rng.randint(1, 9999)}@correo.cl',
+                telefono_cliente=self._telefono(),
+                fecha_registro=timezone.make_aware(datetime.combine(min(dia, hoy), time(9))),
+            ))
+        self._crear(ServicioRealizado, citas)
+
+    def _auditorias(self, cantidad, productos, usuarios):
+        """Auditorías mensuales sobre una muestra de productos, casi todas completadas"""
+        tipos = ['desaparecido', 'vencido', 'merma', 'sobrante', 'otro']
+        for i in range(cantidad):
+            inicio = self.medianoches[max(0, len(self.medianoches) - 1 - i * 30)] + timedelta(hours=9)
+            completada = i > 0 or self.rng.random() < 0.5
+            auditoria = AuditoriaInventario.objects.create(
+                fecha_auditoria=inicio.date(),
+                estado='completada' if completada else 'en_proceso',
+                fecha_completada=inicio + timedelta(hours=6) if completada else None,
+                usuario=self.rng.choice(usuarios),
+            )
+            muestra = self.rng.sample(productos, min(len(productos), self.rng.randint(50, 500)))
+            detalles = []
+            for producto in muestra:
+                revisado = completada or self.rng.random() < 0.6
+                diferencia = 0
+                if revisado and self.rng.random() < 0.15:
+                    diferencia = self.rng.choice([-1, -1, -1, 1]) * self._cantidad(3)
+                sistema = self._cantidad(40)
+                detalles.append(DetalleAuditoria(
+                    auditoria=auditoria, producto=producto, cantidad_sistema=sistema,
+                    conteo_fisico=max(0, sistema + diferencia), diferencia=max(-sistema, diferencia),
+                    tipo_discrepancia=self.rng.choice(tipos) if diferencia else 'sin_cambios',
+                    revisado=revisado, fecha_revision=inicio + timedelta(hours=3) if revisado else None,
+                ))
+            self._crear(DetalleAuditoria, detalles)
+
+    def _historial(self, cantidad, usuarios):
+        tipos = [valor for valor, _etiqueta in HistorialAccion.TipoModelo.choices]
+        acciones = [valor for valor, _etiqueta in HistorialAccion.Accion.choices]
+        pesos_acciones = list(accumulate([30, 60, 10]))
+
+        def filas():
+            for _ in range(cantidad):
+                tipo = self.rng.choice(tipos)
+                yield (
+                    acciones[self._elegir(pesos_acciones)],
+                    tipo,
+                    f'{tipo.replace("_", " ").title()} {self.rng.randint(1, 99999)}',
+                    'Registro generado para pruebas de rendimiento',
+                    self.rng.choice(usuarios).pk,
+                    self._fecha(),
+                    self.rng.randint(1, 99999),
+                )
+        self._cargar(HistorialAccion, ['accion', 'tipo_modelo', 'nombre_objeto', 'descripcion', 'usuario_id',
+                                       'fecha', 'objeto_id'], filas())
+
+    def _recalcular_stock(self, primer_id, ultimo_id):
+        """Stock = entradas - ventas (sin negativos) y costo promedio de las entradas"""
+        entradas = EntradaInventario.objects.filter(producto=OuterRef('pk')).values('producto')
+        ventas = Compras.objects.filter(producto=OuterRef('pk')).values('producto')
+        with transaction.atomic():
+            Producto.objects.filter(pk__gte=primer_id, pk__lte=ultimo_id).update(
+                cantidad=Greatest(
+                    Coalesce(Subquery(entradas.annotate(t=Sum('cantidad')).values('t')), Value(0))
+                    - Coalesce(Subquery(ventas.annotate(t=Sum('cantidad')).values('t')), Value(0)),
+                    Value(0),
+                    output_field=IntegerField(),
+                ),
+            )
+            Producto.objects.filter(pk__gte=primer_id, pk__lte=ultimo_id, entradas__isnull=False).update(
+                costo_promedio_actual=Subquery(entradas.annotate(p=Avg('precio_unitario')).values('p')[:1]),
+            )
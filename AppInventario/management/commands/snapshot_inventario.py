@@ -0,0 +1,87 @@
+"""
+Genera el snapshot diario de stock y valorización por producto.
+
+Pensado para ejecutarse cada noche (cron / systemd timer), por ejemplo:
+
+    5 0 * * * python manage.py snapshot_inventario --ayer
+
+Sin opciones genera la foto del día de hoy con el stock actual. Con --fecha o
+--desde/--hasta reconstruye días pasados descontando los movimientos
+posteriores. Re-ejecutarlo para un mismo día reemplaza la foto existente.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from AppInventario.models import SnapshotInventario
+from AppInventario import reportes
+
+
+class Command(BaseCommand):
+    help = 'Genera el snapshot diario de stock y valorización de inventario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día a generar (YYYY-MM-DD). Por defecto hoy.')
+        parser.add_argument('--ayer', action='store_true', help='Generar el snapshot del día anterior')
+        parser.add_argument('--desde', help='Inicio del rango a generar (YYYY-MM-DD)')
+        parser.add_argument('--hasta', help='Fin del rango a generar (YYYY-MM-DD), por defecto hoy')
+        parser.add_argument('--lote', type=int, default=1000, help='Tamaño de lote para bulk_create')
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        try:
+            if options['desde']:
+                desde = self._parsear_fecha(options['desde'])
+                hasta = self._parsear_fecha(options['hasta']) if options['hasta'] else hoy
+            else:
+                if options['fecha']:
+                    desde = self._parsear_fecha(options['fecha'])
+                elif options['ayer']:
+                    desde = hoy - timedelta(days=1)
+                else:
+                    desde = hoy
+                hasta = desde
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato YYYY-MM-DD')
+
+        if desde > hasta:
+            raise CommandError('La fecha inicial no puede ser posterior a la final')
+        if hasta > hoy:
+            raise CommandError('No se pueden generar snapshots de fechas futuras')
+
+        fecha = desde
+        while fecha <= hasta:
+            total = self._generar(fecha, options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'Snapshot {fecha.isoformat()}: {total} productos'))
+            fecha += timedelta(days=1)
+
+    def _parsear_fecha(self, valor):
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+
+    def _generar(self, fecha, lote):
+        corte = reportes.corte_del_dia(fecha)
+        snapshots = []
+        for producto_id, cantidad, costo in reportes.stock_desde_actual(corte):
+            costo = Decimal(str(costo or 0))
+            cantidad = int(cantidad or 0)
+            snapshots.append(SnapshotInventario(
+                producto_id=producto_id,
+                fecha=fecha,
+                fecha_corte=corte,
+                cantidad=cantidad,
+                costo_promedio=costo,
+                valor=costo * cantidad,
+            ))
+
+        with transaction.atomic():
+            SnapshotInventario.objects.bulk_create(
+                snapshots,
+                batch_size=lote,
+                update_conflicts=True,
+                unique_fields=['producto', 'fecha'],
+                update_fields=['fecha_corte', 'cantidad', 'costo_promedio', 'valor'],
+            )
+        return len(snapshots)
@@ -0,0 +1,168 @@
+"""
+Instrumentación por petición: consultas SQL, tiempo de SQL, consultas
+duplicadas (posibles N+1) y tiempo de renderizado de plantillas.
+
+MetricasMiddleware (middleware.py) abre una Medicion por petición y la deja en
+una ContextVar; el execute_wrapper de cada conexión y el backend de plantillas
+DjangoTemplatesMedidos acumulan sobre ella. Al terminar, la medición se publica
+como cabecera Server-Timing, como una línea JSON en el logger
+'AppInventario.metricas' y en un agregado por vista que se consulta en
+/panel-admin/metricas/.
+
+El agregado es por proceso y en memoria: guarda las últimas
+METRICAS_MUESTRAS_POR_VISTA muestras de cada vista en un deque y calcula los
+percentiles solo al consultarlo, para que el costo por petición sea mínimo.
+"""
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+# Cantidad de consultas duplicadas que se reportan por petición
+MAX_DUPLICADAS = 5
+
+_medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class Medicion:
+    """Acumulador de una petición"""
+    __slots__ = ('inicio', 'consultas', 'sql_segundos', 'render_segundos', 'sentencias')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sql_segundos = 0.0
+        self.render_segundos = 0.0
+        self.sentencias = Counter()
+
+    def duplicadas(self):
+        """[(huella, repeticiones)] de las sentencias ejecutadas más de una vez"""
+        return [
+            (huella_sql(sql), veces)
+            for sql, veces in self.sentencias.most_common(MAX_DUPLICADAS)
+            if veces > 1
+        ]
+
+
+def huella_sql(sql):
+    """Huella legible de una sentencia parametrizada (los valores ya van como %s)"""
+    sql = ' '.join(sql.split())
+    return sql if len(sql) <= 120 else sql[:117] + '...'
+
+
+def iniciar():
+    medicion = Medicion()
+    return medicion, _medicion_actual.set(medicion)
+
+
+def finalizar(token):
+    _medicion_actual.reset(token)
+
+
+def medicion_actual():
+    return _medicion_actual.get()
+
+
+def registrar_consulta(execute, sql, params, many, context):
+    """execute_wrapper: cuenta y cronometra cada consulta de la petición en curso"""
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.sql_segundos += time.perf_counter() - inicio
+        medicion.consultas += 1
+        medicion.sentencias[sql] += 1
+
+
+class PlantillaMedida:
+    """Envoltura de Template que suma el tiempo de render a la medición en curso"""
+
+    def __init__(self, plantilla):
+        self.plantilla = plantilla
+
+    def __getattr__(self, nombre):
+        return getattr(self.plantilla, nombre)
+
+    def render(self, context=None, request=None):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return self.plantilla.render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return self.plantilla.render(context, request)
+        finally:
+            medicion.render_segundos += time.perf_counter() - inicio
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    """
+    Backend de plantillas de Django que mide el render de nivel superior. Los
+    {% include %} se renderizan dentro de la misma llamada, así que no se
+    cuentan dos veces.
+    """
+
+    def from_string(self, template_code):
+        return PlantillaMedida(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name))
+
+
+# ---------------------------------------------------------------------------
+# Agregado por vista (en memoria, por proceso)
+
+_muestras = {}
+_lock = threading.Lock()
+
+
+def registrar_muestra(vista, total_ms, consultas, sql_ms, render_ms):
+    maximo = getattr(settings, 'METRICAS_MUESTRAS_POR_VISTA', 500)
+    with _lock:
+        cola = _muestras.get(vista)
+        if cola is None:
+            cola = _muestras[vista] = deque(maxlen=maximo)
+        cola.append((total_ms, consultas, sql_ms, render_ms))
+
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not ordenados:
+        return 0.0
+    indice = min(len(ordenados), max(1, math.ceil(p / 100 * len(ordenados)))) - 1
+    return ordenados[indice]
+
+
+def resumen_por_vista():
+    """Lista de dicts con p50/p95/p99 de duración y promedios por vista, de la más lenta a la más rápida"""
+    with _lock:
+        copia = {vista: list(cola) for vista, cola in _muestras.items()}
+
+    filas = []
+    for vista, muestras in copia.items():
+        n = len(muestras)
+        duraciones = sorted(m[0] for m in muestras)
+        filas.append({
+            'vista': vista,
+            'muestras': n,
+            'p50_ms': round(percentil(duraciones, 50), 1),
+            'p95_ms': round(percentil(duraciones, 95), 1),
+            'p99_ms': round(percentil(duraciones, 99), 1),
+            'consultas_promedio': round(sum(m[1] for m in muestras) / n, 1),
+            'consultas_max': max(m[1] for m in muestras),
+            'sql_promedio_ms': round(sum(m[2] for m in muestras) / n, 1),
+            'render_promedio_ms': round(sum(m[3] for m in muestras) / n, 1),
+        })
+    filas.sort(key=lambda fila: fila['p95_ms'], reverse=True)
+    return filas
+
+
+def reiniciar():
+    with _lock:
+        _muestras.clear()
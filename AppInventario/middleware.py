@@ -0,0 +1,171 @@
+"""
+Middlewares de AppInventario.
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import catalogos, consultas_lentas, metricas, perfilador, prometheus
+from .decorators import COOKIE_PRIMARIA
+from .routers import replica_disponible
+
+
+def es_media(request):
+    """Las peticiones a MEDIA_URL solo sirven un archivo y no necesitan catálogos, perfilado ni registro de SQL"""
+    return request.path_info.startswith(settings.MEDIA_URL)
+
+
+class PrimariaTrasEscrituraMiddleware:
+    """
+    Tras una petición que escribe (POST, PUT, PATCH, DELETE) deja una cookie de
+    corta duración para que las vistas @usar_replica del mismo navegador lean de
+    la primaria durante REPLICA_PIN_SEGUNDOS, mientras la réplica se pone al día.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and replica_disponible():
+            response.set_cookie(
+                COOKIE_PRIMARIA, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SEGUNDOS', 5),
+                httponly=True,
+                samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
+
+
+class CatalogosMiddleware:
+    """
+    Las versiones de los catálogos en memoria (catalogos.py) se consultan una
+    sola vez por petición, en el primer uso.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if es_media(request):
+            return self.get_response(request)
+        token = catalogos.iniciar_peticion()
+        try:
+            return self.get_response(request)
+        finally:
+            catalogos.terminar_peticion(token)
+
+
+logger_metricas = logging.getLogger('AppInventario.metricas')
+
+
+class MetricasMiddleware:
+    """
+    Mide cada petición (consultas, tiempo de SQL, duplicadas y render; ver
+    metricas.py) y la publica como cabecera Server-Timing, línea de log JSON,
+    muestra del agregado por vista y series de /metrics (prometheus.py). Debe
+    ir primero en MIDDLEWARE para incluir las consultas de sesión y
+    autenticación.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = getattr(settings, 'METRICAS_ACTIVAS', True)
+
+    def __call__(self, request):
+        if not self.activo:
+            return self.get_response(request)
+
+        medicion, token = metricas.iniciar()
+        try:
+            with ExitStack() as wrappers:
+                for alias in connections:
+                    wrappers.enter_context(connections[alias].execute_wrapper(metricas.registrar_consulta))
+                response = self.get_response(request)
+        finally:
+            metricas.finalizar(token)
+
+        total_ms = (time.perf_counter() - medicion.inicio) * 1000
+        sql_ms = medicion.sql_segundos * 1000
+        render_ms = medicion.render_segundos * 1000
+        vista = request.resolver_match.view_name if request.resolver_match else 'sin_ruta'
+
+        response['Server-Timing'] = (
+            f'db;dur={sql_ms:.1f};desc="{medicion.consultas} consultas", '
+            f'render;dur={render_ms:.1f}, total;dur={total_ms:.1f}'
+        )
+        metricas.registrar_muestra(vista, total_ms, medicion.consultas, sql_ms, render_ms)
+        prometheus.observar_peticion(vista, request.method, response.status_code, total_ms / 1000, medicion.consultas)
+
+        if logger_metricas.isEnabledFor(logging.INFO):
+            logger_metricas.info(json.dumps({
+                'vista': vista,
+                'metodo': request.method,
+                'ruta': request.path,
+                'estado': response.status_code,
+                'total_ms': round(total_ms, 1),
+                'consultas': medicion.consultas,
+                'sql_ms': round(sql_ms, 1),
+                'render_ms': round(render_ms, 1),
+                'duplicadas': medicion.duplicadas(),
+            }, ensure_ascii=False))
+        return response
+
+
+class PerfiladorMiddleware:
+    """
+    Ejecuta bajo el perfilador las peticiones que lo piden (staff con
+    ?perfilar=1 o X-Perfilar: 1) o que caen en el muestreo; ver perfilador.py.
+    Va después de AuthenticationMiddleware para conocer al usuario.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        motivo = None if es_media(request) else perfilador.motivo_perfilado(request)
+        if motivo is None:
+            return self.get_response(request)
+        return perfilador.perfilar(request, self.get_response, motivo)
+
+
+class ConsultasLentasMiddleware:
+    """
+    Anota las consultas que superan CONSULTAS_LENTAS_UMBRAL_MS con su vista y
+    origen, y al terminar la respuesta las guarda con una muestra de planes de
+    ejecución (ver consultas_lentas.py).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = getattr(settings, 'CONSULTAS_LENTAS_ACTIVAS', True)
+
+    def __call__(self, request):
+        if not self.activo or es_media(request):
+            return self.get_response(request)
+
+        tokens = consultas_lentas.iniciar()
+        try:
+            with ExitStack() as wrappers:
+                for alias in connections:
+                    wrappers.enter_context(connections[alias].execute_wrapper(consultas_lentas.registrar_consulta))
+                response = self.get_response(request)
+        finally:
+            pendientes = consultas_lentas.finalizar(tokens)
+
+        if pendientes:
+            try:
+                consultas_lentas.guardar(pendientes)
+            except Exception:
+                # El registro de consultas lentas nunca debe romper la respuesta
+                logging.getLogger(__name__).exception('No se pudieron guardar las consultas lentas')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.activo and request.resolver_match and not es_media(request):
+            consultas_lentas.asignar_vista(request.resolver_match.view_name)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0046_historialaccion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entradainventario',
+            index=models.Index(fields=['producto', 'fecha_entrada'], name='entrada_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compras',
+            index=models.Index(fields=['producto', 'fecha_compra'], name='compra_producto_fecha_idx'),
+        ),
+    ]
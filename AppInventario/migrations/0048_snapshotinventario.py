@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0047_kardex_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotInventario',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('fecha_corte', models.DateTimeField(help_text='Instante exacto que representa la foto (fin del día local)', verbose_name='Fecha de Corte')),
+                ('cantidad', models.IntegerField(verbose_name='Cantidad')),
+                ('costo_promedio', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Costo Promedio')),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='AppInventario.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Inventario',
+                'verbose_name_plural': 'Snapshots de Inventario',
+                'ordering': ['-fecha', 'producto'],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'fecha'), name='snapshot_producto_fecha_unico')],
+                'indexes': [models.Index(fields=['fecha'], include=('valor', 'cantidad'), name='snapshot_fecha_valor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0048_snapshotinventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Rutas de las versiones WebP redimensionadas (generadas automáticamente)', verbose_name='Variantes de Imagen'),
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Rutas de las versiones WebP redimensionadas (generadas automáticamente)', verbose_name='Variantes de Imagen'),
+        ),
+        migrations.AddField(
+            model_name='empleado',
+            name='foto_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Rutas de las versiones WebP redimensionadas (generadas automáticamente)', verbose_name='Variantes de Foto'),
+        ),
+    ]
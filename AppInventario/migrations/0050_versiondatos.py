@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0049_variantes_imagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionDatos',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('modelo', models.CharField(help_text='Etiqueta app_label.modelo', max_length=100, unique=True, verbose_name='Modelo')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Versión')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Versión de Datos',
+                'verbose_name_plural': 'Versiones de Datos',
+                'ordering': ['modelo'],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:02
+
+import AppInventario.storage
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0050_versiondatos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilPeticion',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('metodo', models.CharField(max_length=10, verbose_name='Método')),
+                ('url', models.TextField(verbose_name='URL')),
+                ('vista', models.CharField(blank=True, default='', max_length=200, verbose_name='Vista')),
+                ('estado', models.PositiveSmallIntegerField(verbose_name='Estado HTTP')),
+                ('motivo', models.CharField(help_text='solicitado (cabecera o parámetro) o muestreo', max_length=20, verbose_name='Motivo')),
+                ('duracion_ms', models.FloatField(verbose_name='Duración (ms)')),
+                ('cantidad_consultas', models.PositiveIntegerField(default=0, verbose_name='Consultas')),
+                ('sql_ms', models.FloatField(default=0, verbose_name='Tiempo SQL (ms)')),
+                ('consultas', models.JSONField(blank=True, default=list, help_text='[{sql, ms}] en orden de ejecución', verbose_name='Consultas SQL')),
+                ('archivo_pstats', models.FileField(blank=True, storage=AppInventario.storage.almacenamiento_perfiles, upload_to='pstats', verbose_name='Archivo pstats')),
+                ('archivo_speedscope', models.FileField(blank=True, storage=AppInventario.storage.almacenamiento_perfiles, upload_to='speedscope', verbose_name='Archivo speedscope')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='perfiles_peticion', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Perfil de Petición',
+                'verbose_name_plural': 'Perfiles de Peticiones',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0051_perfilpeticion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsultaLenta',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('huella', models.CharField(db_index=True, help_text='SHA-1 de la sentencia normalizada', max_length=40, verbose_name='Huella')),
+                ('sql', models.TextField(help_text='Sentencia normalizada, sin parámetros', verbose_name='SQL')),
+                ('duracion_ms', models.FloatField(verbose_name='Duración (ms)')),
+                ('vista', models.CharField(blank=True, default='', max_length=200, verbose_name='Vista')),
+                ('origen', models.CharField(blank=True, default='', help_text='archivo:línea del código que ejecutó la consulta', max_length=300, verbose_name='Origen')),
+                ('alias', models.CharField(default='default', max_length=50, verbose_name='Base de datos')),
+                ('plan', models.TextField(blank=True, help_text='EXPLAIN (ANALYZE, BUFFERS), solo en las consultas muestreadas', null=True, verbose_name='Plan')),
+            ],
+            options={
+                'verbose_name': 'Consulta Lenta',
+                'verbose_name_plural': 'Consultas Lentas',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
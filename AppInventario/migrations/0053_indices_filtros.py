@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 16:40
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0052_consultalenta'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'tipo_producto'], name='producto_activo_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('cantidad__lt', models.F('stock_minimo'))), fields=['activo', 'cantidad'], name='producto_bajo_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='zona',
+            index=models.Index(django.db.models.functions.text.Upper('nombre'), name='zona_nombre_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviciorealizado',
+            index=models.Index(fields=['estilista', 'fecha_servicio', 'estado'], name='servicio_estilista_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviciorealizado',
+            index=models.Index(condition=models.Q(('estado', 'completado')), fields=['-fecha_servicio'], name='servicio_completado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entradainventario',
+            index=models.Index(fields=['-fecha_entrada'], name='entrada_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compras',
+            index=models.Index(fields=['-fecha_compra'], name='compra_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudcompra',
+            index=models.Index(fields=['estado', '-fecha_solicitud'], name='solicitud_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detalleauditoria',
+            index=models.Index(fields=['auditoria', 'revisado'], name='detalle_auditoria_revisado_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:05
+
+from django.db import migrations
+
+# Deben coincidir con busqueda.CAMPOS_INDEXADOS
+CAMPOS_INDEXADOS = {
+    'producto': ('nombre', 'descripcion'),
+    'proveedores': ('nombre', 'contacto', 'email', 'ciudad', 'telefono'),
+    'productoproveedor': ('nombre', 'codigo_producto'),
+    'empleado': ('nombre', 'apellido', 'email'),
+    'cargo': ('nombre',),
+    'especialidad': ('nombre',),
+    'servicio': ('nombre',),
+    'compras': ('nombre_cliente', 'email_cliente'),
+}
+
+# unaccent() es STABLE (depende del search_path) y no se puede indexar; con el
+# diccionario fijo el resultado es inmutable
+CREAR_F_UNACCENT = """
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+"""
+
+
+def _nombre_indice(tabla, campo):
+    return f'busq_{tabla}_{campo}_trgm'
+
+
+def crear_busqueda(apps, schema_editor):
+    # Solo PostgreSQL; en SQLite (desarrollo) la búsqueda usa __icontains
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    schema_editor.execute(CREAR_F_UNACCENT)
+    for tabla, campos in CAMPOS_INDEXADOS.items():
+        for campo in campos:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {_nombre_indice(tabla, campo)} '
+                f'ON "AppInventario_{tabla}" USING gin (UPPER(f_unaccent("{campo}")) gin_trgm_ops)'
+            )
+
+
+def eliminar_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for tabla, campos in CAMPOS_INDEXADOS.items():
+        for campo in campos:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {_nombre_indice(tabla, campo)}')
+    # Las extensiones se dejan instaladas: pueden usarlas otras bases u objetos
+    schema_editor.execute('DROP FUNCTION IF EXISTS f_unaccent(text)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0053_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_busqueda, eliminar_busqueda),
+    ]
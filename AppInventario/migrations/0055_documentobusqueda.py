@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:40
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+# Español sin acentos: unaccent antes del stemmer (la extensión se instala en 0054)
+CREAR_CONFIGURACION = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_sin_acentos') THEN
+        CREATE TEXT SEARCH CONFIGURATION es_sin_acentos (COPY = pg_catalog.spanish);
+        ALTER TEXT SEARCH CONFIGURATION es_sin_acentos
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$
+"""
+
+
+def crear_indice_vector(apps, schema_editor):
+    # Solo PostgreSQL; en SQLite el buscador filtra con __icontains
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREAR_CONFIGURACION)
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS documento_busqueda_vector_gin '
+        'ON "AppInventario_documentobusqueda" USING gin (vector)'
+    )
+
+
+def eliminar_indice_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS documento_busqueda_vector_gin')
+    schema_editor.execute('DROP TEXT SEARCH CONFIGURATION IF EXISTS es_sin_acentos')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0054_busqueda_trigramas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('producto', 'Producto'), ('producto_proveedor', 'Producto de Proveedor'), ('proveedor', 'Proveedor'), ('empleado', 'Empleado'), ('servicio', 'Servicio')], max_length=30, verbose_name='Tipo')),
+                ('objeto_id', models.PositiveIntegerField(verbose_name='ID del Registro')),
+                ('titulo', models.CharField(max_length=300, verbose_name='Título')),
+                ('detalle', models.CharField(blank=True, default='', max_length=300, verbose_name='Detalle')),
+                ('texto', models.TextField(blank=True, default='', help_text='Resto del contenido buscable', verbose_name='Texto')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+            ],
+            options={
+                'verbose_name': 'Documento de Búsqueda',
+                'verbose_name_plural': 'Documentos de Búsqueda',
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='documento_busqueda_registro_unico')],
+            },
+        ),
+        migrations.RunPython(crear_indice_vector, eliminar_indice_vector),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+def calcular_etiquetas(apps, schema_editor):
+    # Misma etiqueta que Empleado.construir_etiqueta()
+    Empleado = apps.get_model('AppInventario', 'Empleado')
+    empleados = Empleado.objects.select_related('cargo').prefetch_related('especialidades')
+    for empleado in empleados.iterator(chunk_size=500):
+        ap = f" {empleado.apellido}" if empleado.apellido else ''
+        cargo_name = f" ({empleado.cargo.nombre})" if empleado.cargo else ''
+        especialidades = sorted(esp.nombre for esp in empleado.especialidades.all())[:3]
+        if especialidades:
+            esp = f" - {', '.join(especialidades)}"
+        else:
+            esp = f" - {empleado.especialidad}" if empleado.especialidad else ''
+        etiqueta = f"{empleado.nombre}{ap}{cargo_name}{esp}"[:300]
+        Empleado.objects.filter(pk=empleado.pk).update(etiqueta=etiqueta)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0055_documentobusqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empleado',
+            name='etiqueta',
+            field=models.CharField(blank=True, default='', editable=False, max_length=300, verbose_name='Etiqueta'),
+        ),
+        migrations.RunPython(calcular_etiquetas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:40
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_contadores(apps, schema_editor):
+    # Mismo cálculo que contadores.recontar()
+    Empleado = apps.get_model('AppInventario', 'Empleado')
+    Especialidad = apps.get_model('AppInventario', 'Especialidad')
+    Cargo = apps.get_model('AppInventario', 'Cargo')
+    Proveedores = apps.get_model('AppInventario', 'Proveedores')
+    ProductoProveedor = apps.get_model('AppInventario', 'ProductoProveedor')
+    SolicitudCompra = apps.get_model('AppInventario', 'SolicitudCompra')
+
+    def conteo(relacionado, campo):
+        filas = (
+            relacionado.objects.filter(**{campo: OuterRef('pk')})
+            .order_by().values(campo).annotate(total=Count('pk')).values('total')
+        )
+        return Coalesce(Subquery(filas, output_field=IntegerField()), Value(0))
+
+    Especialidad.objects.update(cantidad_empleados=conteo(Empleado.especialidades.through, 'especialidad'))
+    Cargo.objects.update(cantidad_empleados=conteo(Empleado, 'cargo'))
+    Proveedores.objects.update(
+        cantidad_productos=conteo(ProductoProveedor, 'proveedor'),
+        cantidad_solicitudes=conteo(SolicitudCompra, 'proveedor'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppInventario', '0056_empleado_etiqueta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cargo',
+            name='cantidad_empleados',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Empleados'),
+        ),
+        migrations.AddField(
+            model_name='especialidad',
+            name='cantidad_empleados',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Empleados'),
+        ),
+        migrations.AddField(
+            model_name='proveedores',
+            name='cantidad_productos',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Productos'),
+        ),
+        migrations.AddField(
+            model_name='proveedores',
+            name='cantidad_solicitudes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Solicitudes de Compra'),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
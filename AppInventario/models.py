@@ -1,10 +1,15 @@
-from django.db import models
+from django.db import DatabaseError, models, router, transaction
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
-from django.db.models import Count, Q, Sum
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Upper
 from django.conf import settings
 from django.utils import timezone
 
+from . import contadores
+from .storage import almacenamiento_perfiles
+
 # Create your models here.
 class Producto(models.Model):
     TIPO_PRODUCTO_CHOICES = [
@@ -29,6 +34,7 @@ class Producto(models.Model):
     stock_minimo = models.IntegerField(default=10, verbose_name='Stock Mínimo', help_text='Cantidad mínima antes de alertar')
     costo_promedio_actual = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='Costo Promedio Actual', help_text='Costo promedio de compra actual')
     imagen = models.ImageField(upload_to='libros/', verbose_name='Imagen', null=True, blank=True)
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Variantes de Imagen', help_text='Rutas de las versiones WebP redimensionadas (generadas automáticamente)')
     descripcion = models.TextField(verbose_name='Descripción', null=True, blank=True)
     unidad_medida = models.CharField(max_length=50, verbose_name='Unidad de Medida', null=True, blank=True, help_text='Ej: kg, unidades, cajas')
     zona = models.ForeignKey('Zona', on_delete=models.SET_NULL, null=True, blank=True, related_name='productos', verbose_name='Zona', help_text='Zona o ubicación donde se almacena el producto')
@@ -85,6 +91,18 @@ class Producto(models.Model):
             # Si no existe producto en inventario, retornar 0
             return 0
 
+    class Meta:
+        indexes = [
+            # Filtros del inventario por estado y tipo
+            models.Index(fields=['activo', 'tipo_producto'], name='producto_activo_tipo_idx'),
+            # Alertas de bajo stock: solo se indexan las filas que están bajo el mínimo
+            models.Index(
+                fields=['activo', 'cantidad'],
+                condition=Q(cantidad__lt=F('stock_minimo')),
+                name='producto_bajo_stock_idx',
+            ),
+        ]
+
     def __str__(self):
         fila = 'Nombre:' + self.nombre + ' - Descripción: ' + (self.descripcion or '')
         return fila
@@ -134,12 +152,48 @@ class Zona(models.Model):
         verbose_name = 'Zona'
         verbose_name_plural = 'Zonas'
         ordering = ['nombre']
+        indexes = [
+            # nombre__iexact al crear zonas compara UPPER(nombre)
+            models.Index(Upper('nombre'), name='zona_nombre_upper_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
 
 
-class Proveedores(models.Model):
+class ConContadores(models.Model):
+    """
+    Catálogo con contadores de relaciones (ver contadores.py). Al actualizar
+    una fila existente sin update_fields se guardan todos los campos cargados
+    menos los contadores, que solo cambian las señales con UPDATE ... contador
+    + n. Si la fila ya no existe, el save() vuelve a insertarla como uno normal.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        campos = contadores.campos_sin_contadores(
+            self, kwargs.get('update_fields'), kwargs.get('force_insert', False),
+        )
+        if campos is kwargs.get('update_fields') or kwargs.get('force_update'):
+            kwargs['update_fields'] = campos
+            super().save(*args, **kwargs)
+            return
+        try:
+            # Savepoint propio: el fallo deja la transacción externa utilizable
+            with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+                super().save(*args, **{**kwargs, 'update_fields': campos})
+        except DatabaseError as error:
+            # Con update_fields Django falla si el UPDATE no encontró la fila (p. ej. se
+            # eliminó): un save() normal la insertaría, así que se repite sin restringir.
+            # Los errores de la base llegan como subclases (IntegrityError, ...) y se propagan.
+            if type(error) is not DatabaseError:
+                raise
+            super().save(*args, **kwargs)
+
+
+class Proveedores(ConContadores):
     id = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=200)
     contacto = models.CharField(max_length=100, null=True, blank=True)
@@ -148,6 +202,9 @@ class Proveedores(models.Model):
     direccion = models.TextField(null=True, blank=True)
     ciudad = models.CharField(max_length=100, null=True, blank=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
+    # Contadores mantenidos por las señales (ver contadores.py)
+    cantidad_productos = models.PositiveIntegerField(default=0, editable=False, verbose_name='Productos')
+    cantidad_solicitudes = models.PositiveIntegerField(default=0, editable=False, verbose_name='Solicitudes de Compra')
 
     class Meta:
         verbose_name_plural = 'Proveedores'
@@ -180,12 +237,14 @@ class ProductoProveedor(models.Model):
         return f"{self.nombre} - {self.proveedor.nombre}"
 
 
-class Especialidad(models.Model):
+class Especialidad(ConContadores):
     """Modelo para gestionar las especialidades de los empleados."""
     id = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=200, unique=True, verbose_name='Nombre')
     descripcion = models.TextField(null=True, blank=True, verbose_name='Descripción')
     activo = models.BooleanField(default=True)  # ✅ AGREGAR ESTE CAMPO
+    # Empleados con esta especialidad, mantenido por las señales (ver contadores.py)
+    cantidad_empleados = models.PositiveIntegerField(default=0, editable=False, verbose_name='Empleados')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
@@ -197,7 +256,7 @@ class Especialidad(models.Model):
         return self.nombre
 
 
-class Cargo(models.Model):
+class Cargo(ConContadores):
     id = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=100, unique=True)
     descripcion = models.TextField(null=True, blank=True)
@@ -206,6 +265,8 @@ class Cargo(models.Model):
     puede_ver_compras = models.BooleanField(default=False, help_text="Puede ver historial de compras")
     puede_gestionar_empleados_servicios_proveedores = models.BooleanField(default=False, help_text="Puede gestionar empleados, servicios, proveedores y especialidades")
     activo = models.BooleanField(default=True)
+    # Empleados con este cargo, mantenido por las señales (ver contadores.py)
+    cantidad_empleados = models.PositiveIntegerField(default=0, editable=False, verbose_name='Empleados')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -236,21 +297,32 @@ class Empleado(models.Model):
     # Relación con User de Django para permitir inicio de sesión
     user = models.OneToOneField(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='empleado')
     foto = models.ImageField(upload_to='empleados/fotos/', verbose_name='Foto de Perfil', null=True, blank=True)
+    foto_variantes = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Variantes de Foto', help_text='Rutas de las versiones WebP redimensionadas (generadas automáticamente)')
+    # Texto de __str__ guardado para listar empleados sin consultar cargo ni especialidades.
+    # Lo recalculan save() y las señales de especialidades y cargos (signals.py)
+    etiqueta = models.CharField(max_length=300, blank=True, default='', editable=False, verbose_name='Etiqueta')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
+    # Campos propios que forman parte de la etiqueta
+    CAMPOS_ETIQUETA = ('nombre', 'apellido', 'cargo', 'especialidad')
+
     class Meta:
         verbose_name_plural = 'Empleados'
 
     def __str__(self):
+        return self.etiqueta or self.construir_etiqueta()
+
+    def construir_etiqueta(self):
+        """Nombre, cargo y hasta 3 especialidades (consulta cargo y especialidades si no están precargados)"""
         ap = f" {self.apellido}" if self.apellido else ''
         cargo_name = f" ({self.cargo.nombre})" if self.cargo else ''
-        if self.especialidades.exists():
-            especialidades_str = ', '.join([esp.nombre for esp in self.especialidades.all()[:3]])
-            esp = f" - {especialidades_str}"
+        especialidades = [esp.nombre for esp in self.especialidades.all()[:3]] if self.pk else []
+        if especialidades:
+            esp = f" - {', '.join(especialidades)}"
         else:
             esp = f" - {self.especialidad}" if self.especialidad else ''
-        return f"{self.nombre}{ap}{cargo_name}{esp}"
+        return f"{self.nombre}{ap}{cargo_name}{esp}"[:300]
 
     def clean(self):
         # validación de máximo 3 especialidades
@@ -261,6 +333,14 @@ class Empleado(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()
         is_new = self.pk is None
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.etiqueta = self.construir_etiqueta()
+        elif set(update_fields) & set(self.CAMPOS_ETIQUETA):
+            self.etiqueta = self.construir_etiqueta()
+            kwargs['update_fields'] = list(set(update_fields) | {'etiqueta'})
+
         super().save(*args, **kwargs)
         accion = EmpleadoHistorial.Accion.CREADO if is_new else EmpleadoHistorial.Accion.ACTUALIZADO
         descripcion = 'Empleado registrado en el sistema.' if is_new else 'Datos del empleado actualizados.'
@@ -344,6 +424,16 @@ class ServicioRealizado(models.Model):
 
     class Meta:
         verbose_name_plural = 'Servicios Realizados'
+        indexes = [
+            # Agenda y horas ocupadas por estilista y día
+            models.Index(fields=['estilista', 'fecha_servicio', 'estado'], name='servicio_estilista_fecha_idx'),
+            # Historial e ingresos: solo servicios completados
+            models.Index(
+                fields=['-fecha_servicio'],
+                condition=Q(estado='completado'),
+                name='servicio_completado_fecha_idx',
+            ),
+        ]
 
     def __str__(self):
         fecha_str = self.fecha_servicio.strftime("%d/%m/%Y") if self.fecha_servicio else ''
@@ -367,6 +457,11 @@ class EntradaInventario(models.Model):
         verbose_name = 'Entrada de Inventario'
         verbose_name_plural = 'Entradas de Inventario'
         ordering = ['-fecha_entrada']
+        indexes = [
+            models.Index(fields=['producto', 'fecha_entrada'], name='entrada_producto_fecha_idx'),
+            # Listado ordenado por fecha y filtros por rango de fechas
+            models.Index(fields=['-fecha_entrada'], name='entrada_fecha_idx'),
+        ]
 
     def __str__(self):
         return f'Entrada: {self.cantidad} x {self.producto.nombre} - {self.fecha_entrada.strftime("%d/%m/%Y")}'
@@ -421,6 +516,10 @@ class Compras(models.Model):
 
     class Meta:
         verbose_name_plural = 'Compras'
+        indexes = [
+            models.Index(fields=['producto', 'fecha_compra'], name='compra_producto_fecha_idx'),
+            models.Index(fields=['-fecha_compra'], name='compra_fecha_idx'),
+        ]
 
     def clean(self):
         """Validar que al menos uno de los productos esté presente"""
@@ -468,6 +567,7 @@ class Servicio(models.Model):
     precio = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     duracion_minutos = models.PositiveIntegerField(null=True, blank=True, help_text='Duración estimada en minutos')
     imagen = models.ImageField(upload_to='servicios/', verbose_name='Imagen', null=True, blank=True)
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Variantes de Imagen', help_text='Rutas de las versiones WebP redimensionadas (generadas automáticamente)')
     activo = models.BooleanField(default=True)
     # Especialidades requeridas para realizar este servicio
     especialidades_requeridas = models.ManyToManyField(Especialidad, blank=True, related_name='servicios', help_text='Especialidades necesarias para realizar este servicio')
@@ -558,6 +658,9 @@ class SolicitudCompra(models.Model):
         verbose_name = 'Solicitud de Compra'
         verbose_name_plural = 'Solicitudes de Compra'
         ordering = ['-fecha_solicitud']
+        indexes = [
+            models.Index(fields=['estado', '-fecha_solicitud'], name='solicitud_estado_fecha_idx'),
+        ]
     
     def __str__(self):
         return f'Solicitud #{self.id} - {self.producto.nombre} - {self.get_estado_display()}'
@@ -772,6 +875,10 @@ class DetalleAuditoria(models.Model):
         verbose_name_plural = 'Detalles de Auditoría'
         ordering = ['producto__nombre']
         unique_together = ('auditoria', 'producto')
+        indexes = [
+            # Conteo de revisados/pendientes por auditoría
+            models.Index(fields=['auditoria', 'revisado'], name='detalle_auditoria_revisado_idx'),
+        ]
     
     def __str__(self):
         return f'{self.producto.nombre} - Sistema: {self.cantidad_sistema}, Físico: {self.conteo_fisico}'
@@ -866,3 +973,142 @@ class HistorialAccion(models.Model):
         return categorias.get(self.tipo_modelo, 'Sistema')
 
 
+class SnapshotInventario(models.Model):
+    """
+    Foto diaria del stock y su valorización por producto.
+    La genera el comando `snapshot_inventario` (programado cada noche) y permite
+    responder consultas a una fecha pasada sin recorrer todo el historial.
+    """
+    id = models.AutoField(primary_key=True)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='snapshots', verbose_name='Producto')
+    fecha = models.DateField(verbose_name='Fecha')
+    fecha_corte = models.DateTimeField(verbose_name='Fecha de Corte', help_text='Instante exacto que representa la foto (fin del día local)')
+    cantidad = models.IntegerField(verbose_name='Cantidad')
+    costo_promedio = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='Costo Promedio')
+    valor = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Valor')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Snapshot de Inventario'
+        verbose_name_plural = 'Snapshots de Inventario'
+        ordering = ['-fecha', 'producto']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='snapshot_producto_fecha_unico'),
+        ]
+        indexes = [
+            # Valorización de todo el catálogo a una fecha (cierre de mes) con un solo índice
+            models.Index(fields=['fecha'], include=['valor', 'cantidad'], name='snapshot_fecha_valor_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.producto.nombre} - {self.fecha.strftime("%d/%m/%Y")}: {self.cantidad}'
+
+
+class VersionDatos(models.Model):
+    """
+    Contador de versión por modelo. Se incrementa (vía señales) cada vez que se
+    guarda o elimina un registro del modelo y sirve para invalidar cachés y
+    construir ETags sin consultar los datos.
+    """
+    id = models.AutoField(primary_key=True)
+    modelo = models.CharField(max_length=100, unique=True, verbose_name='Modelo', help_text='Etiqueta app_label.modelo')
+    version = models.BigIntegerField(default=0, verbose_name='Versión')
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Versión de Datos'
+        verbose_name_plural = 'Versiones de Datos'
+        ordering = ['modelo']
+
+    def __str__(self):
+        return f'{self.modelo} v{self.version}'
+
+
+class PerfilPeticion(models.Model):
+    """
+    Perfil de una petición ejecutada bajo el perfilador (ver perfilador.py):
+    estadísticas de cProfile (pstats), muestreo de pilas en formato speedscope
+    y la lista de consultas SQL con su duración.
+    """
+    id = models.AutoField(primary_key=True)
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name='Fecha')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='perfiles_peticion', verbose_name='Usuario')
+    metodo = models.CharField(max_length=10, verbose_name='Método')
+    url = models.TextField(verbose_name='URL')
+    vista = models.CharField(max_length=200, blank=True, default='', verbose_name='Vista')
+    estado = models.PositiveSmallIntegerField(verbose_name='Estado HTTP')
+    motivo = models.CharField(max_length=20, verbose_name='Motivo', help_text='solicitado (cabecera o parámetro) o muestreo')
+    duracion_ms = models.FloatField(verbose_name='Duración (ms)')
+    cantidad_consultas = models.PositiveIntegerField(default=0, verbose_name='Consultas')
+    sql_ms = models.FloatField(default=0, verbose_name='Tiempo SQL (ms)')
+    consultas = models.JSONField(default=list, blank=True, verbose_name='Consultas SQL', help_text='[{sql, ms}] en orden de ejecución')
+    archivo_pstats = models.FileField(storage=almacenamiento_perfiles, upload_to='pstats', blank=True, verbose_name='Archivo pstats')
+    archivo_speedscope = models.FileField(storage=almacenamiento_perfiles, upload_to='speedscope', blank=True, verbose_name='Archivo speedscope')
+
+    class Meta:
+        verbose_name = 'Perfil de Petición'
+        verbose_name_plural = 'Perfiles de Peticiones'
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f'{self.metodo} {self.url} ({self.duracion_ms:.0f} ms)'
+
+
+class ConsultaLenta(models.Model):
+    """
+    Consulta que superó CONSULTAS_LENTAS_UMBRAL_MS durante una petición (ver
+    consultas_lentas.py). La tabla es un buffer circular: se conservan las
+    últimas CONSULTAS_LENTAS_MAXIMO filas.
+    """
+    id = models.BigAutoField(primary_key=True)
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name='Fecha')
+    huella = models.CharField(max_length=40, db_index=True, verbose_name='Huella', help_text='SHA-1 de la sentencia normalizada')
+    sql = models.TextField(verbose_name='SQL', help_text='Sentencia normalizada, sin parámetros')
+    duracion_ms = models.FloatField(verbose_name='Duración (ms)')
+    vista = models.CharField(max_length=200, blank=True, default='', verbose_name='Vista')
+    origen = models.CharField(max_length=300, blank=True, default='', verbose_name='Origen', help_text='archivo:línea del código que ejecutó la consulta')
+    alias = models.CharField(max_length=50, default='default', verbose_name='Base de datos')
+    plan = models.TextField(null=True, blank=True, verbose_name='Plan', help_text='EXPLAIN (ANALYZE, BUFFERS), solo en las consultas muestreadas')
+
+    class Meta:
+        verbose_name = 'Consulta Lenta'
+        verbose_name_plural = 'Consultas Lentas'
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f'{self.duracion_ms:.0f} ms - {self.vista or "sin vista"}'
+
+
+class DocumentoBusqueda(models.Model):
+    """
+    Documento desnormalizado del buscador global (ver indice_busqueda.py). Se
+    mantiene con señales a partir del registro de origen (tipo, objeto_id).
+    """
+    TIPO_CHOICES = [
+        ('producto', 'Producto'),
+        ('producto_proveedor', 'Producto de Proveedor'),
+        ('proveedor', 'Proveedor'),
+        ('empleado', 'Empleado'),
+        ('servicio', 'Servicio'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES, verbose_name='Tipo')
+    objeto_id = models.PositiveIntegerField(verbose_name='ID del Registro')
+    titulo = models.CharField(max_length=300, verbose_name='Título')
+    detalle = models.CharField(max_length=300, blank=True, default='', verbose_name='Detalle')
+    texto = models.TextField(blank=True, default='', verbose_name='Texto', help_text='Resto del contenido buscable')
+    activo = models.BooleanField(default=True, verbose_name='Activo')
+    # Solo se llena en PostgreSQL; el índice GIN se crea en la migración 0055
+    vector = SearchVectorField(null=True, editable=False)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')
+
+    class Meta:
+        verbose_name = 'Documento de Búsqueda'
+        verbose_name_plural = 'Documentos de Búsqueda'
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='documento_busqueda_registro_unico'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_tipo_display()}: {self.titulo}'
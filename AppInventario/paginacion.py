@@ -0,0 +1,315 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+En lugar de OFFSET, cada página continúa desde la última fila de la anterior:
+el cursor lleva los valores de las columnas de orden de esa fila y la página
+siguiente se pide con
+
+    WHERE col1 >= v1 AND (col1 > v1 OR (col1 = v1 AND col2 > v2) ...)
+    ORDER BY col1, col2 ... LIMIT n
+
+(con < y <= en las columnas descendentes). La cota sobre la primera columna es
+la que el planificador convierte en un rango del índice del orden, así que la
+página 1000 cuesta lo mismo que la 1; el OR solo descarta los empates.
+El orden debe terminar en una columna única (normalmente el id) y sus columnas
+no deben ser nulas.
+
+El cursor viaja en la URL (?cursor=...) codificado en base64 y trae además el
+número de página, solo para mostrarlo. Un cursor inválido o manipulado vuelve a
+la primera página.
+
+El total de filas se calcula solo si el template lo usa. Se puede pasar ya
+calculado (p. ej. desde el aggregate de estadísticas de la vista) y, con
+`estimar`, en PostgreSQL y sin filtros se toma de las estadísticas de pg_class
+en lugar de COUNT(*).
+
+Si el queryset llega ordenado de otra forma (p. ej. por relevancia de una
+búsqueda, ver busqueda.filtrar) no hay columnas con las que construir el cursor
+y se pagina por desplazamiento como antes; el cursor guarda entonces el OFFSET.
+"""
+import base64
+import datetime
+import json
+import math
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+PARAMETRO = 'cursor'
+
+# Bajo este número de filas estimadas se cuenta de verdad: es barato y exacto
+MINIMO_ESTIMADO = 10000
+
+
+class _Codificador(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder recorta a milisegundos; el cursor necesita el valor exacto
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def codificar(datos):
+    texto = json.dumps(datos, cls=_Codificador, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar(cursor):
+    """Retorna el dict del cursor o None si no es válido"""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        datos = json.loads(texto)
+    except (ValueError, TypeError):
+        return None
+    return datos if isinstance(datos, dict) else None
+
+
+def _invertir(orden):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden]
+
+
+def _valor(objeto, ruta):
+    for parte in ruta.split('__'):
+        objeto = getattr(objeto, parte)
+    return objeto
+
+
+def _campo(modelo, ruta):
+    """Campo del modelo al final de `ruta` (p. ej. 'proveedor__nombre'); None si es una anotación"""
+    opts = modelo._meta
+    campo = None
+    try:
+        for parte in ruta.split('__'):
+            campo = opts.get_field(parte)
+            if campo.is_relation:
+                opts = campo.related_model._meta
+    except FieldDoesNotExist:
+        return None
+    return campo
+
+
+def _despues_de(orden, valores):
+    """
+    Filas que van después de `valores` en `orden`:
+    a >= va AND ((a > va) OR (a = va AND b > vb) OR ...) con el sentido de cada
+    columna. La cota sobre `a` es redundante para el resultado pero es la que
+    permite recorrer el índice desde el cursor en lugar de filtrar desde el
+    principio.
+    """
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        comparacion = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f'{nombre}__{comparacion}': valor})
+        iguales[nombre] = valor
+    primero = orden[0]
+    cota = Q(**{f"{primero.lstrip('-')}__{'lte' if primero.startswith('-') else 'gte'}": valores[0]})
+    return cota & condicion
+
+
+def estimar_total(queryset):
+    """
+    Filas estimadas de la tabla según pg_class (actualizado por ANALYZE /
+    autovacuum). None si no se puede estimar: otro motor, queryset filtrado o
+    tabla sin estadísticas todavía.
+    """
+    conexion = connections[queryset.db]
+    if conexion.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)',
+            [conexion.ops.quote_name(queryset.model._meta.db_table)],
+        )
+        fila = cursor.fetchone()
+    if not fila or fila[0] is None or fila[0] < 0:
+        return None
+    return fila[0]
+
+
+class PaginadorKeyset:
+    """
+    Pagina `queryset` en `orden` (lista de campos como en order_by, terminada en
+    una columna única). `count` y `num_pages` se calculan al primer uso.
+    """
+
+    def __init__(self, queryset, por_pagina, orden, total=None, estimar=False):
+        self.por_pagina = int(por_pagina)
+        self.orden = list(orden)
+        self.total = total
+        self.estimar = estimar
+        orden_actual = list(queryset.query.order_by)
+        # Un orden propio del queryset (relevancia) no sirve como cursor
+        self.por_desplazamiento = bool(orden_actual) and orden_actual != self.orden
+        self.queryset = queryset if self.por_desplazamiento else queryset.order_by(*self.orden)
+
+    @cached_property
+    def count(self):
+        if self.total is not None:
+            return self.total
+        if self.estimar:
+            estimado = estimar_total(self.queryset)
+            if estimado is not None and estimado >= MINIMO_ESTIMADO:
+                return estimado
+        return self.queryset.count()
+
+    @property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.por_pagina))
+
+    def pagina(self, cursor=None):
+        datos = decodificar(cursor) if cursor else None
+        if self.por_desplazamiento:
+            return self._pagina_desplazamiento(datos or {})
+        if datos and datos.get('u'):
+            return self._ultima_pagina()
+        valores = self._valores(datos.get('v')) if datos else None
+        if valores is None:
+            return self._primera_pagina()
+        numero = datos.get('p') if isinstance(datos.get('p'), int) else None
+        if datos.get('d') == 'a':
+            return self._pagina_anterior(valores, numero)
+        return self._pagina_siguiente(valores, numero)
+
+    def _valores(self, valores):
+        """Valores del cursor convertidos al tipo de cada columna; None si no calzan con el orden"""
+        if not isinstance(valores, list) or len(valores) != len(self.orden):
+            return None
+        convertidos = []
+        for ruta, valor in zip(self.orden, valores):
+            campo = _campo(self.queryset.model, ruta.lstrip('-'))
+            if valor is None:
+                return None
+            try:
+                convertidos.append(campo.to_python(valor) if campo is not None else valor)
+            except (ValidationError, TypeError, ValueError):
+                return None
+        return convertidos
+
+    def _cursor(self, objeto, direccion, numero):
+        valores = [_valor(objeto, campo.lstrip('-')) for campo in self.orden]
+        return codificar({'v': valores, 'd': direccion, 'p': numero})
+
+    def _primera_pagina(self):
+        filas = list(self.queryset[:self.por_pagina + 1])
+        return PaginaKeyset(self, filas[:self.por_pagina], 1, hay_siguiente=len(filas) > self.por_pagina, hay_anterior=False)
+
+    def _pagina_siguiente(self, valores, numero):
+        filas = list(self.queryset.filter(_despues_de(self.orden, valores))[:self.por_pagina + 1])
+        return PaginaKeyset(self, filas[:self.por_pagina], numero or 2, hay_siguiente=len(filas) > self.por_pagina, hay_anterior=True)
+
+    def _pagina_anterior(self, valores, numero):
+        inverso = _invertir(self.orden)
+        filas = list(self.queryset.filter(_despues_de(inverso, valores)).order_by(*inverso)[:self.por_pagina + 1])
+        hay_anterior = len(filas) > self.por_pagina
+        filas = filas[:self.por_pagina][::-1]
+        numero = numero if hay_anterior and numero else 1
+        return PaginaKeyset(self, filas, numero, hay_siguiente=True, hay_anterior=hay_anterior)
+
+    def _ultima_pagina(self):
+        filas = list(self.queryset.order_by(*_invertir(self.orden))[:self.por_pagina + 1])
+        hay_anterior = len(filas) > self.por_pagina
+        filas = filas[:self.por_pagina][::-1]
+        return PaginaKeyset(self, filas, self.num_pages if hay_anterior else 1, hay_siguiente=False, hay_anterior=hay_anterior)
+
+    def _pagina_desplazamiento(self, datos):
+        desplazamiento = datos.get('o') if isinstance(datos.get('o'), int) and datos.get('o') > 0 else 0
+        if datos.get('u'):
+            desplazamiento = (self.num_pages - 1) * self.por_pagina
+        filas = list(self.queryset[desplazamiento:desplazamiento + self.por_pagina + 1])
+        numero = desplazamiento // self.por_pagina + 1
+        return PaginaKeyset(
+            self, filas[:self.por_pagina], numero,
+            hay_siguiente=len(filas) > self.por_pagina, hay_anterior=desplazamiento > 0, desplazamiento=desplazamiento,
+        )
+
+
+class PaginaKeyset:
+    """
+    Página de PaginadorKeyset. Se itera como una lista y ofrece lo que usaban
+    los templates de la página de Django (has_next, number, paginator.count...)
+    más las URLs de navegación con los filtros de la petición. La vista puede
+    reemplazar object_list por filas ya procesadas (p. ej. eventos del historial).
+    """
+
+    def __init__(self, paginador, filas, numero, hay_siguiente, hay_anterior, desplazamiento=None):
+        self.paginator = paginador
+        self.object_list = filas
+        # Filas originales para armar los cursores aunque la vista reemplace object_list
+        self._filas = filas
+        self.number = numero
+        self._hay_siguiente = hay_siguiente
+        self._hay_anterior = hay_anterior
+        self._desplazamiento = desplazamiento
+        self.parametros = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    def has_next(self):
+        return self._hay_siguiente
+
+    def has_previous(self):
+        return self._hay_anterior
+
+    def has_other_pages(self):
+        return self._hay_siguiente or self._hay_anterior
+
+    @property
+    def cursor_siguiente(self):
+        if not self._hay_siguiente:
+            return None
+        if self._desplazamiento is not None:
+            return codificar({'o': self._desplazamiento + self.paginator.por_pagina})
+        return self.paginator._cursor(self._filas[-1], 's', self.number + 1)
+
+    @property
+    def cursor_anterior(self):
+        if not self._hay_anterior:
+            return None
+        if self._desplazamiento is not None:
+            return codificar({'o': max(0, self._desplazamiento - self.paginator.por_pagina)})
+        return self.paginator._cursor(self._filas[0], 'a', self.number - 1)
+
+    def _url(self, cursor):
+        parametros = self.parametros.copy() if self.parametros is not None else QueryDict(mutable=True)
+        for nombre in (PARAMETRO, 'page'):
+            parametros.pop(nombre, None)
+        if cursor:
+            parametros[PARAMETRO] = cursor
+        return f'?{parametros.urlencode()}'
+
+    @property
+    def url_primera(self):
+        return self._url(None)
+
+    @property
+    def url_anterior(self):
+        return self._url(self.cursor_anterior) if self._hay_anterior else None
+
+    @property
+    def url_siguiente(self):
+        return self._url(self.cursor_siguiente) if self._hay_siguiente else None
+
+    @property
+    def url_ultima(self):
+        return self._url(codificar({'u': 1}))
+
+
+def paginar(request, queryset, orden, por_pagina, total=None, estimar=False):
+    """Página pedida en request.GET['cursor'] (la primera si no hay), con las URLs de navegación"""
+    paginador = PaginadorKeyset(queryset, por_pagina, orden, total=total, estimar=estimar)
+    pagina = paginador.pagina(request.GET.get(PARAMETRO))
+    pagina.parametros = request.GET
+    return pagina
@@ -0,0 +1,212 @@
+"""
+Perfilado de peticiones a demanda.
+
+Un usuario staff puede pedir que una petición se ejecute bajo el perfilador
+agregando ?perfilar=1 a la URL o la cabecera X-Perfilar: 1. Además, con
+PERFILADOR_MUESTREO > 0 se perfila esa fracción de todas las peticiones, para
+atrapar lentitudes que solo le ocurren a ciertos usuarios.
+
+Cada petición perfilada guarda un PerfilPeticion con:
+  - las estadísticas de cProfile (archivo .pstats, se abre con pstats o snakeviz),
+  - un muestreo de la pila del hilo cada PERFILADOR_INTERVALO_MS en formato
+    speedscope (https://www.speedscope.app), que muestra dónde se fue el tiempo
+    real incluyendo esperas de I/O,
+  - las consultas SQL en orden con su duración (sin parámetros, que pueden
+    traer datos personales),
+  - URL, usuario, estado y tiempos.
+
+Los perfiles se listan en /panel-admin/perfiles/ y se conservan los últimos
+PERFILES_MAXIMO.
+"""
+import cProfile
+import json
+import logging
+import marshal
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+PARAMETRO = 'perfilar'
+CABECERA = 'X-Perfilar'
+
+
+class Muestreador(threading.Thread):
+    """Toma la pila de un hilo cada `intervalo` segundos y cuenta las pilas repetidas"""
+
+    def __init__(self, hilo_id, intervalo):
+        super().__init__(daemon=True, name='perfilador-muestreo')
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.detener = threading.Event()
+        self.muestras = Counter()
+
+    def run(self):
+        while not self.detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append((codigo.co_name, codigo.co_filename, codigo.co_firstlineno))
+                frame = frame.f_back
+            if pila:
+                pila.reverse()
+                self.muestras[tuple(pila)] += 1
+
+
+def a_speedscope(muestras, intervalo_ms, nombre):
+    """Convierte las pilas muestreadas al formato de archivo de speedscope (perfil 'sampled')"""
+    indices = {}
+    frames = []
+    pilas = []
+    pesos = []
+    for pila, veces in muestras.items():
+        indices_pila = []
+        for funcion, archivo, linea in pila:
+            clave = (funcion, archivo, linea)
+            if clave not in indices:
+                indices[clave] = len(frames)
+                frames.append({'name': funcion, 'file': archivo, 'line': linea})
+            indices_pila.append(indices[clave])
+        pilas.append(indices_pila)
+        pesos.append(veces * intervalo_ms)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'exporter': 'Inventario perfilador',
+        'name': nombre,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': nombre,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(pesos),
+            'samples': pilas,
+            'weights': pesos,
+        }],
+    }
+
+
+def motivo_perfilado(request):
+    """'solicitado', 'muestreo' o None si la petición no se perfila"""
+    if not getattr(settings, 'PERFILADOR_ACTIVO', True):
+        return None
+    if request.path.startswith(reverse('perfiles_lista')):
+        return None
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_staff and (
+        request.GET.get(PARAMETRO) == '1' or request.headers.get(CABECERA) == '1'
+    ):
+        return 'solicitado'
+    muestreo = getattr(settings, 'PERFILADOR_MUESTREO', 0)
+    if muestreo and random.random() < muestreo:
+        return 'muestreo'
+    return None
+
+
+def perfilar(request, get_response, motivo):
+    """Ejecuta la petición bajo cProfile y el muestreador y guarda el perfil"""
+    intervalo_ms = getattr(settings, 'PERFILADOR_INTERVALO_MS', 5)
+    maximo_consultas = getattr(settings, 'PERFILADOR_MAX_CONSULTAS', 1000)
+    consultas = []
+    totales = {'consultas': 0, 'sql_segundos': 0.0}
+
+    def registrar_consulta(execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            totales['consultas'] += 1
+            totales['sql_segundos'] += duracion
+            if len(consultas) < maximo_consultas:
+                consultas.append({'sql': sql, 'ms': round(duracion * 1000, 3)})
+
+    perfil = cProfile.Profile()
+    muestreador = Muestreador(threading.get_ident(), intervalo_ms / 1000)
+    inicio = time.perf_counter()
+    with ExitStack() as wrappers:
+        for alias in connections:
+            wrappers.enter_context(connections[alias].execute_wrapper(registrar_consulta))
+        muestreador.start()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Python 3.12+ admite un solo perfilador activo por proceso: otra
+            # petición se está perfilando en paralelo
+            ocupado = True
+        else:
+            ocupado = False
+            try:
+                response = get_response(request)
+            finally:
+                perfil.disable()
+        finally:
+            muestreador.detener.set()
+            muestreador.join()
+    if ocupado:
+        logger.info('Perfilador ocupado: %s se atiende sin perfilar', request.path)
+        return get_response(request)
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+
+    try:
+        registro = guardar_perfil(request, response, motivo, perfil, muestreador, intervalo_ms,
+                                  duracion_ms, consultas, totales)
+        response['X-Perfil'] = str(registro.id)
+    except Exception:
+        # El perfilado nunca debe romper la petición que se está perfilando
+        logger.exception('No se pudo guardar el perfil de %s', request.path)
+    return response
+
+
+def guardar_perfil(request, response, motivo, perfil, muestreador, intervalo_ms, duracion_ms, consultas, totales):
+    from .models import PerfilPeticion
+
+    usuario = getattr(request, 'user', None)
+    vista = request.resolver_match.view_name if request.resolver_match else ''
+    base = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+
+    perfil.create_stats()
+    registro = PerfilPeticion(
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+        metodo=request.method,
+        url=request.get_full_path()[:2000],
+        vista=vista,
+        estado=response.status_code,
+        motivo=motivo,
+        duracion_ms=round(duracion_ms, 2),
+        cantidad_consultas=totales['consultas'],
+        sql_ms=round(totales['sql_segundos'] * 1000, 2),
+        consultas=consultas,
+    )
+    # Mismo formato que Profile.dump_stats(), legible con pstats.Stats(ruta)
+    registro.archivo_pstats.save(f'{base}.pstats', ContentFile(marshal.dumps(perfil.stats)), save=False)
+    speedscope = a_speedscope(muestreador.muestras, intervalo_ms, f'{request.method} {request.path}')
+    registro.archivo_speedscope.save(
+        f'{base}.speedscope.json', ContentFile(json.dumps(speedscope).encode('utf-8')), save=False
+    )
+    registro.save()
+    depurar_antiguos()
+    return registro
+
+
+def depurar_antiguos():
+    """Elimina los perfiles (y sus archivos) que exceden PERFILES_MAXIMO"""
+    from .models import PerfilPeticion
+
+    maximo = getattr(settings, 'PERFILES_MAXIMO', 200)
+    for antiguo in PerfilPeticion.objects.order_by('-fecha', '-id')[maximo:]:
+        for archivo in (antiguo.archivo_pstats, antiguo.archivo_speedscope):
+            if archivo:
+                archivo.delete(save=False)
+        antiguo.delete()
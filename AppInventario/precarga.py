@@ -0,0 +1,90 @@
+"""
+Políticas de precarga de los listados.
+
+Cada listado declara aquí qué relaciones trae junto con sus filas
+(select_related para ForeignKey, prefetch_related para ManyToMany) y, en las
+tablas grandes, qué columnas carga (only). Con la política aplicada el costo de
+una página no depende de cuántas filas muestre: `presupuesto` es la cantidad
+máxima de consultas de la vista completa (permisos, totales, página y
+selectores) y lo verifica `manage.py presupuesto_consultas` contra la base
+actual.
+
+Si un template empieza a usar otra relación o columna de la fila, debe
+agregarse a la política; si no, cada fila vuelve a hacer su propia consulta.
+"""
+POLITICAS = {
+    'solicitudes_compra_lista': {
+        'select_related': ('producto', 'proveedor'),
+        'presupuesto': 3,
+    },
+    'entradas_lista': {
+        'select_related': ('producto', 'proveedor', 'usuario_registro'),
+        'only': (
+            'id', 'cantidad', 'precio_unitario', 'numero_factura', 'fecha_entrada',
+            'producto__nombre', 'proveedor__nombre',
+            'usuario_registro__username', 'usuario_registro__first_name', 'usuario_registro__last_name',
+        ),
+        'presupuesto': 3,
+    },
+    'salidas_lista': {
+        'select_related': ('producto', 'producto_proveedor', 'proveedor'),
+        'presupuesto': 3,
+    },
+    'servicios_historial': {
+        'select_related': ('servicio', 'estilista__cargo'),
+        'presupuesto': 4,
+    },
+    'estilistas_lista': {
+        'select_related': ('cargo',),
+        'presupuesto': 2,
+    },
+}
+
+
+def aplicar(vista, queryset):
+    """Aplica a `queryset` la política declarada para `vista`"""
+    politica = POLITICAS[vista]
+    if politica.get('select_related'):
+        queryset = queryset.select_related(*politica['select_related'])
+    if politica.get('prefetch_related'):
+        queryset = queryset.prefetch_related(*politica['prefetch_related'])
+    if politica.get('only'):
+        queryset = queryset.only(*politica['only'])
+    return queryset
+
+
+def medir(vista, usuario, parametros=None, factor=1):
+    """
+    Ejecuta `vista` como petición AJAX GET de `usuario` y retorna la cantidad
+    de consultas (en todas las bases). La vista se llama sin middleware, así
+    que no se cuentan sesión ni autenticación. Con `factor` las páginas son
+    `factor` veces más grandes que las de la vista.
+    """
+    from contextlib import ExitStack
+    from unittest import mock
+
+    from django.core.paginator import Paginator
+    from django.db import connections
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+
+    from . import paginacion, views
+
+    class PaginadorAmpliado(Paginator):
+        def __init__(self, object_list, per_page, *args, **kwargs):
+            super().__init__(object_list, int(per_page) * factor, *args, **kwargs)
+
+    class PaginadorKeysetAmpliado(paginacion.PaginadorKeyset):
+        def __init__(self, queryset, por_pagina, *args, **kwargs):
+            super().__init__(queryset, int(por_pagina) * factor, *args, **kwargs)
+
+    request = RequestFactory().get('/', parametros or {}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+    request.user = usuario
+    with ExitStack() as pila:
+        capturas = [pila.enter_context(CaptureQueriesContext(conexion)) for conexion in connections.all()]
+        pila.enter_context(mock.patch.object(views, 'Paginator', PaginadorAmpliado))
+        pila.enter_context(mock.patch.object(paginacion, 'PaginadorKeyset', PaginadorKeysetAmpliado))
+        respuesta = getattr(views, vista)(request)
+        if not getattr(respuesta, 'streaming', False):
+            respuesta.content
+    return sum(len(captura) for captura in capturas)
@@ -0,0 +1,347 @@
+"""
+Métricas en formato de texto de Prometheus para /metrics.
+
+Cada proceso (worker de gunicorn, uwsgi, etc.) acumula sus contadores e
+histogramas en memoria y los vuelca cada METRICAS_PROMETHEUS_VOLCADO segundos a
+un archivo propio en METRICAS_PROMETHEUS_DIR (por defecto en /dev/shm, memoria
+compartida). Al exportar se suman los archivos de todos los procesos, así que
+cualquier worker puede responder el scrape con los totales. Los gauges de
+proceso solo cuentan si el proceso sigue vivo.
+
+Para que los totales no retrocedan, los contadores e histogramas de un proceso
+terminado se suman a acumulado.json y su archivo se elimina; así el directorio
+no crece con cada reciclaje de workers (max_requests) o despliegue. Lo hace el
+scrape que encuentra el archivo, bajo un bloqueo entre procesos, y también un
+proceso nuevo que recibe el pid de uno terminado cuyo archivo sigue ahí.
+
+Las métricas de negocio (productos con bajo stock, auditorías abiertas, etc.)
+son gauges calculados con agregados en caché por METRICAS_NEGOCIO_TTL segundos:
+las tablas se recorren como máximo una vez por periodo, escriba quien escriba
+el inventario entretanto. Los valores pueden tener hasta ese atraso.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, F, Q
+
+from . import bloqueos, imagenes
+
+BUCKETS_DURACION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 5, 10, 25, 50, 100, 250, 500)
+
+AYUDA = {
+    'inventario_http_peticiones_total': ('counter', 'Peticiones HTTP atendidas por nombre de URL, método y estado'),
+    'inventario_http_duracion_segundos': ('histogram', 'Duración de las peticiones HTTP por nombre de URL'),
+    'inventario_http_consultas_sql': ('histogram', 'Consultas SQL por petición y nombre de URL'),
+    'inventario_movimientos_stock_total': ('counter', 'Movimientos de stock registrados por tipo'),
+    'inventario_movimientos_stock_unidades_total': ('counter', 'Unidades movidas por tipo de movimiento'),
+    'inventario_tareas_imagen_pendientes': ('gauge', 'Variantes de imagen en cola o en proceso'),
+    'inventario_db_pool_conexiones': ('gauge', 'Conexiones del pool de base de datos por estado'),
+    'inventario_db_conexiones': ('gauge', 'Sesiones abiertas en el servidor de base de datos por estado'),
+    'inventario_productos_activos': ('gauge', 'Productos activos'),
+    'inventario_productos_bajo_stock': ('gauge', 'Productos con cantidad menor al stock mínimo'),
+    'inventario_productos_sin_stock': ('gauge', 'Productos activos sin stock'),
+    'inventario_auditorias_abiertas': ('gauge', 'Auditorías de inventario en proceso'),
+    'inventario_solicitudes_compra_pendientes': ('gauge', 'Solicitudes de compra enviadas, aceptadas o en proceso'),
+}
+
+ARCHIVO_ACUMULADO = 'acumulado.json'
+PREFIJO_PROCESO = 'proceso-'
+
+_lock = threading.Lock()
+_contadores = defaultdict(float)
+_histogramas = {}
+_ultimo_volcado = 0.0
+# Identifica a este proceso aunque el pid se reutilice
+_inicio = time.time()
+_archivo_revisado = False
+
+
+def _reiniciar_tras_fork():
+    # Un worker recién creado no debe volver a publicar lo que contó el proceso padre
+    global _contadores, _histogramas, _lock, _ultimo_volcado, _inicio, _archivo_revisado
+    _lock = threading.Lock()
+    _contadores = defaultdict(float)
+    _histogramas = {}
+    _ultimo_volcado = 0.0
+    _inicio = time.time()
+    _archivo_revisado = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+
+def directorio():
+    ruta = getattr(settings, 'METRICAS_PROMETHEUS_DIR', None)
+    if not ruta:
+        base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        ruta = os.path.join(base, 'inventario-metricas')
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def _etiquetas(etiquetas):
+    return tuple(sorted((clave, str(valor)) for clave, valor in etiquetas.items()))
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    with _lock:
+        _contadores[(nombre, _etiquetas(etiquetas))] += valor
+    _volcar_si_corresponde()
+
+
+def observar(nombre, valor, buckets=BUCKETS_DURACION, **etiquetas):
+    clave = (nombre, _etiquetas(etiquetas))
+    with _lock:
+        histograma = _histogramas.get(clave)
+        if histograma is None:
+            # Conteo por bucket (no acumulado), suma y cantidad de observaciones
+            histograma = _histogramas[clave] = [list(buckets), [0] * len(buckets), 0.0, 0]
+        for posicion, limite in enumerate(histograma[0]):
+            if valor <= limite:
+                histograma[1][posicion] += 1
+                break
+        histograma[2] += valor
+        histograma[3] += 1
+    _volcar_si_corresponde()
+
+
+def observar_peticion(vista, metodo, estado, duracion_segundos, consultas):
+    """Registra una petición atendida (lo llama MetricasMiddleware)"""
+    incrementar('inventario_http_peticiones_total', vista=vista, metodo=metodo, estado=estado)
+    observar('inventario_http_duracion_segundos', duracion_segundos, vista=vista)
+    observar('inventario_http_consultas_sql', consultas, buckets=BUCKETS_CONSULTAS, vista=vista)
+
+
+def _gauges_proceso():
+    gauges = [('inventario_tareas_imagen_pendientes', (), imagenes.tareas_pendientes())]
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None or not hasattr(pool, 'get_stats'):
+            continue
+        estadisticas = pool.get_stats()
+        tamano = estadisticas.get('pool_size', 0)
+        disponibles = estadisticas.get('pool_available', 0)
+        for estado, valor in (('en_uso', tamano - disponibles), ('disponible', disponibles),
+                              ('esperando', estadisticas.get('requests_waiting', 0))):
+            gauges.append(('inventario_db_pool_conexiones', (('alias', alias), ('estado', estado)), valor))
+    return gauges
+
+
+def _volcar_si_corresponde():
+    if time.monotonic() - _ultimo_volcado >= getattr(settings, 'METRICAS_PROMETHEUS_VOLCADO', 5):
+        volcar()
+
+
+def _bloqueo():
+    return bloqueos.archivo(os.path.join(directorio(), '.bloqueo'))
+
+
+def _escribir(ruta, datos):
+    """Escribe `datos` como JSON en `ruta` con reemplazo atómico"""
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo)
+    os.replace(temporal, ruta)
+
+
+def _leer(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+def volcar():
+    """Escribe el estado de este proceso en su archivo (reemplazo atómico)"""
+    global _ultimo_volcado, _archivo_revisado
+    with _lock:
+        _ultimo_volcado = time.monotonic()
+        datos = {
+            'pid': os.getpid(),
+            'inicio': _inicio,
+            'contadores': [[nombre, etiquetas, valor] for (nombre, etiquetas), valor in _contadores.items()],
+            'histogramas': [[nombre, etiquetas, h] for (nombre, etiquetas), h in _histogramas.items()],
+        }
+    datos['gauges'] = [list(gauge) for gauge in _gauges_proceso()]
+    ruta = os.path.join(directorio(), f'{PREFIJO_PROCESO}{os.getpid()}.json')
+    if not _archivo_revisado:
+        # Un proceso terminado con el mismo pid pudo dejar su archivo: se acumula antes de pisarlo
+        _archivo_revisado = True
+        with _bloqueo():
+            anterior = _leer(ruta)
+            if anterior is not None and anterior.get('inicio') != _inicio:
+                _acumular([anterior], [ruta])
+    _escribir(ruta, datos)
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _sumar(datos, contadores, histogramas):
+    """Suma los contadores e histogramas de un archivo a los totales"""
+    for nombre, etiquetas, valor in datos.get('contadores', ()):
+        contadores[(nombre, tuple(map(tuple, etiquetas)))] += valor
+    for nombre, etiquetas, (buckets, conteos, suma, cantidad) in datos.get('histogramas', ()):
+        clave = (nombre, tuple(map(tuple, etiquetas)))
+        if clave not in histogramas:
+            histogramas[clave] = [buckets, [0] * len(buckets), 0.0, 0]
+        acumulado = histogramas[clave]
+        acumulado[1] = [a + b for a, b in zip(acumulado[1], conteos)]
+        acumulado[2] += suma
+        acumulado[3] += cantidad
+
+
+def _acumular(terminados, rutas):
+    """
+    Suma los archivos de procesos terminados a acumulado.json y los elimina.
+    Se llama con el bloqueo tomado, para que ningún scrape los cuente dos veces.
+    """
+    ruta_acumulado = os.path.join(directorio(), ARCHIVO_ACUMULADO)
+    contadores = defaultdict(float)
+    histogramas = {}
+    for datos in [_leer(ruta_acumulado) or {}] + list(terminados):
+        _sumar(datos, contadores, histogramas)
+    _escribir(ruta_acumulado, {
+        'contadores': [[nombre, etiquetas, valor] for (nombre, etiquetas), valor in contadores.items()],
+        'histogramas': [[nombre, etiquetas, h] for (nombre, etiquetas), h in histogramas.items()],
+    })
+    for ruta in rutas:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+def _leer_procesos():
+    """Suma los archivos de todos los procesos: (contadores, histogramas, gauges)"""
+    contadores = defaultdict(float)
+    histogramas = {}
+    gauges = defaultdict(float)
+    ruta = directorio()
+    with _bloqueo():
+        vivos, terminados, rutas_terminados = [], [], []
+        for nombre_archivo in os.listdir(ruta):
+            if not (nombre_archivo.startswith(PREFIJO_PROCESO) and nombre_archivo.endswith('.json')):
+                continue
+            ruta_archivo = os.path.join(ruta, nombre_archivo)
+            datos = _leer(ruta_archivo)
+            if datos is None:
+                continue
+            if datos['pid'] == os.getpid() or _proceso_vivo(datos['pid']):
+                vivos.append(datos)
+            else:
+                terminados.append(datos)
+                rutas_terminados.append(ruta_archivo)
+        if terminados:
+            _acumular(terminados, rutas_terminados)
+        acumulado = _leer(os.path.join(ruta, ARCHIVO_ACUMULADO))
+
+    for datos in vivos + ([acumulado] if acumulado else []):
+        _sumar(datos, contadores, histogramas)
+    for datos in vivos:
+        for nombre, etiquetas, valor in datos['gauges']:
+            gauges[(nombre, tuple(map(tuple, etiquetas)))] += valor
+    return contadores, histogramas, gauges
+
+
+def indicadores_negocio():
+    """Gauges de negocio desde un agregado en caché con vencimiento fijo"""
+    def calcular():
+        from .models import Producto, AuditoriaInventario, SolicitudCompra
+        productos = Producto.objects.aggregate(
+            activos=Count('id', filter=Q(activo=True)),
+            bajo_stock=Count('id', filter=Q(cantidad__lt=F('stock_minimo'))),
+            sin_stock=Count('id', filter=Q(activo=True, cantidad__lte=0)),
+        )
+        return {
+            'inventario_productos_activos': productos['activos'],
+            'inventario_productos_bajo_stock': productos['bajo_stock'],
+            'inventario_productos_sin_stock': productos['sin_stock'],
+            'inventario_auditorias_abiertas': AuditoriaInventario.objects.filter(estado='en_proceso').count(),
+            'inventario_solicitudes_compra_pendientes': SolicitudCompra.objects.filter(
+                estado__in=['enviada', 'aceptada', 'en_proceso']
+            ).count(),
+        }
+
+    return cache.get_or_set('metricas:negocio', calcular, getattr(settings, 'METRICAS_NEGOCIO_TTL', 60))
+
+
+def conexiones_base_datos():
+    """Sesiones del servidor PostgreSQL por estado, en caché por unos segundos"""
+    conexion = connections['default']
+    if conexion.vendor != 'postgresql':
+        return {}
+
+    def calcular():
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                "SELECT coalesce(state, 'desconocido'), count(*) FROM pg_stat_activity "
+                "WHERE datname = current_database() GROUP BY 1"
+            )
+            return dict(cursor.fetchall())
+
+    return cache.get_or_set('metricas:db:conexiones', calcular, 15)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatear_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in pares) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+def exportar():
+    """Texto en formato de exposición de Prometheus (versión 0.0.4)"""
+    volcar()
+    contadores, histogramas, gauges = _leer_procesos()
+    for nombre, valor in indicadores_negocio().items():
+        gauges[(nombre, ())] = valor
+    for estado, valor in conexiones_base_datos().items():
+        gauges[('inventario_db_conexiones', (('estado', estado),))] = valor
+
+    series = defaultdict(list)
+    for (nombre, etiquetas), valor in sorted(contadores.items()):
+        series[nombre].append(f'{nombre}{_formatear_etiquetas(etiquetas)} {_numero(valor)}')
+    for (nombre, etiquetas), valor in sorted(gauges.items()):
+        series[nombre].append(f'{nombre}{_formatear_etiquetas(etiquetas)} {_numero(valor)}')
+    for (nombre, etiquetas), (buckets, conteos, suma, cantidad) in sorted(histogramas.items()):
+        acumulado = 0
+        for limite, conteo in zip(buckets, conteos):
+            acumulado += conteo
+            series[nombre].append(f'{nombre}_bucket{_formatear_etiquetas(etiquetas, [("le", limite)])} {acumulado}')
+        series[nombre].append(f'{nombre}_bucket{_formatear_etiquetas(etiquetas, [("le", "+Inf")])} {cantidad}')
+        series[nombre].append(f'{nombre}_sum{_formatear_etiquetas(etiquetas)} {_numero(suma)}')
+        series[nombre].append(f'{nombre}_count{_formatear_etiquetas(etiquetas)} {cantidad}')
+
+    lineas = []
+    for nombre in sorted(series):
+        tipo, ayuda = AYUDA.get(nombre, ('untyped', nombre))
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        lineas.extend(series[nombre])
+    return '\n'.join(lineas) + '\n'
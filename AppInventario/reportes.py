@@ -0,0 +1,338 @@
+"""
+Consultas de reportes de inventario.
+
+El kardex se construye en la base de datos como un UNION ALL de todos los
+movimientos de stock (entradas, recepciones de solicitudes de compra, salidas
+por compras de clientes y ajustes de auditoría) y el saldo acumulado se calcula
+con SUM() OVER, de modo que nunca se recorre el historial completo en Python.
+
+Las consultas "a una fecha" parten del snapshot diario más cercano
+(SnapshotInventario) y le suman solo los movimientos posteriores a ese corte.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Producto, EntradaInventario, Compras, AuditoriaInventario, DetalleAuditoria, SnapshotInventario
+
+
+# Orden de desempate cuando dos movimientos tienen la misma fecha
+ORDEN_ENTRADA = 1
+ORDEN_SALIDA = 2
+ORDEN_AJUSTE = 3
+
+TIPOS_MOVIMIENTO = {
+    'entrada': 'Entrada',
+    'recepcion': 'Recepción de Solicitud',
+    'salida': 'Salida / Venta',
+    'ajuste': 'Ajuste de Auditoría',
+}
+
+# Las recepciones de solicitudes de compra se registran como EntradaInventario
+# (ver solicitudes_compra_verificar_recepcion), se identifican por su observación
+# para no contarlas dos veces.
+PREFIJO_RECEPCION = 'Recepción de Solicitud de Compra #'
+
+COLUMNAS_KARDEX = [
+    'movimiento_id', 'orden', 'tipo', 'producto_id', 'fecha', 'cantidad',
+    'precio_unitario', 'referencia', 'producto_nombre', 'saldo', 'saldo_producto',
+]
+
+
+def _sql_movimientos(filtro, posicion=None):
+    """
+    Retorna el SQL del UNION ALL de movimientos.
+    `filtro` es una condición sobre la columna producto_id que se repite en cada
+    rama para que el planificador use los índices (producto, fecha) de cada tabla.
+    Con `posicion` ('>' o '<=') cada rama se limita además a los movimientos
+    posteriores (o hasta) un cursor (fecha, orden, id), con una cota sobre la
+    fecha que el índice puede usar; ver _params_movimientos.
+    """
+    entrada = EntradaInventario._meta.db_table
+    compras = Compras._meta.db_table
+    auditoria = AuditoriaInventario._meta.db_table
+    detalle = DetalleAuditoria._meta.db_table
+
+    def cursor(fecha, orden, movimiento_id):
+        if posicion is None:
+            return ''
+        cota = '>=' if posicion == '>' else '<='
+        return f'AND {fecha} {cota} %s AND ({fecha}, {orden}, {movimiento_id}) {posicion} (%s, %s, %s)'
+
+    return f"""
+        SELECT e.id AS movimiento_id, {ORDEN_ENTRADA} AS orden,
+               CASE WHEN e.observaciones LIKE '{PREFIJO_RECEPCION}%%' THEN 'recepcion' ELSE 'entrada' END AS tipo,
+               e.producto_id, e.fecha_entrada AS fecha, e.cantidad AS cantidad,
+               e.precio_unitario AS precio_unitario, e.numero_factura AS referencia
+        FROM "{entrada}" e
+        WHERE e.producto_id {filtro} {cursor('e.fecha_entrada', ORDEN_ENTRADA, 'e.id')}
+        UNION ALL
+        SELECT c.id, {ORDEN_SALIDA}, 'salida', c.producto_id, c.fecha_compra, -c.cantidad,
+               c.precio_unitario, c.nombre_cliente
+        FROM "{compras}" c
+        WHERE c.producto_id {filtro} {cursor('c.fecha_compra', ORDEN_SALIDA, 'c.id')}
+        UNION ALL
+        SELECT d.id, {ORDEN_AJUSTE}, 'ajuste', d.producto_id, a.fecha_completada, d.diferencia,
+               NULL, d.tipo_discrepancia
+        FROM "{detalle}" d
+        INNER JOIN "{auditoria}" a ON a.id = d.auditoria_id
+        WHERE d.producto_id {filtro} {cursor('a.fecha_completada', ORDEN_AJUSTE, 'd.id')}
+          AND a.estado = 'completada' AND d.revisado AND d.diferencia <> 0
+    """
+
+
+def _params_movimientos(params_filtro, cursor=None):
+    """Parámetros de _sql_movimientos: los del filtro y, con cursor, la cota y la posición, por rama"""
+    por_rama = list(params_filtro)
+    if cursor:
+        por_rama += [cursor[0], *cursor]
+    return por_rama * 3
+
+
+def _filtro_alcance(producto_id=None, zona_id=None):
+    """Retorna (sql, params) del filtro de alcance por producto o por zona"""
+    if producto_id is not None:
+        return '= %s', [producto_id]
+    if zona_id is not None:
+        return f'IN (SELECT id FROM "{Producto._meta.db_table}" WHERE zona_id = %s)', [zona_id]
+    raise ValueError('Se requiere un producto o una zona para el kardex')
+
+
+def _filtro_productos(producto_ids=None):
+    """Retorna (sql, params) para una lista opcional de productos (None = todos)"""
+    if producto_ids is None:
+        return 'IS NOT NULL', []
+    producto_ids = [int(pid) for pid in producto_ids] or [0]
+    return 'IN (' + ', '.join(['%s'] * len(producto_ids)) + ')', producto_ids
+
+
+def _conexion_lectura():
+    """Conexión de lectura según el router (la réplica dentro de vistas @usar_replica)"""
+    return connections[router.db_for_read(Producto)]
+
+
+def codificar_cursor(movimiento):
+    """Serializa la posición de un movimiento para usarla en la URL"""
+    fecha = movimiento['fecha']
+    fecha = fecha.isoformat() if isinstance(fecha, datetime) else str(fecha)
+    return f"{fecha}_{movimiento['orden']}_{movimiento['movimiento_id']}"
+
+
+def decodificar_cursor(valor):
+    """Retorna (fecha, orden, id) o None si el cursor no es válido"""
+    if not valor:
+        return None
+    try:
+        fecha, orden, movimiento_id = valor.rsplit('_', 2)
+        fecha = parse_datetime(fecha.replace(' ', '+'))
+        if fecha is None:
+            return None
+        return fecha, int(orden), int(movimiento_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _saldos_previos(filtro, params_filtro, cursor):
+    """Saldo de cada producto con los movimientos hasta `cursor` inclusive: {producto_id: saldo}"""
+    sql = f"""
+        SELECT producto_id, SUM(cantidad)
+        FROM ({_sql_movimientos(filtro, '<=')}) m
+        GROUP BY producto_id
+    """
+    with _conexion_lectura().cursor() as cursor_db:
+        cursor_db.execute(sql, _params_movimientos(params_filtro, cursor))
+        return {producto_id: int(saldo or 0) for producto_id, saldo in cursor_db.fetchall()}
+
+
+def obtener_kardex(producto_id=None, zona_id=None, cursor=None, limite=50, saldos=None):
+    """
+    Retorna una página del kardex ordenada cronológicamente.
+
+    La paginación es por keyset: `cursor` es la posición (fecha, orden, id) del
+    último movimiento de la página anterior, y cada rama del UNION ALL se limita
+    a los movimientos posteriores antes de ordenar. El saldo de cada fila es el
+    saldo al inicio de la página más SUM() OVER sobre la página, tanto para el
+    alcance completo (producto o zona) como por producto.
+
+    `saldos` es el saldo por producto al inicio de la página ({producto_id:
+    saldo}); si no se entrega se calcula con un SUM agrupado sobre los
+    movimientos previos al cursor. Se actualiza con los saldos al final de la
+    página, para pedir la siguiente sin volver a sumar el historial (ver
+    iterar_kardex).
+
+    Returns:
+        (movimientos, siguiente_cursor) donde movimientos es una lista de dicts.
+    """
+    filtro, params_filtro = _filtro_alcance(producto_id, zona_id)
+    if saldos is None:
+        saldos = _saldos_previos(filtro, params_filtro, cursor) if cursor else {}
+
+    sql = f"""
+        WITH pagina AS (
+            SELECT * FROM ({_sql_movimientos(filtro, '>' if cursor else None)}) m
+            ORDER BY fecha, orden, movimiento_id
+            LIMIT %s
+        )
+        SELECT p.movimiento_id, p.orden, p.tipo, p.producto_id, p.fecha, p.cantidad,
+               p.precio_unitario, p.referencia, pr.nombre,
+               SUM(p.cantidad) OVER (
+                   ORDER BY p.fecha, p.orden, p.movimiento_id
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW),
+               SUM(p.cantidad) OVER (
+                   PARTITION BY p.producto_id
+                   ORDER BY p.fecha, p.orden, p.movimiento_id
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+        FROM pagina p
+        INNER JOIN "{Producto._meta.db_table}" pr ON pr.id = p.producto_id
+        ORDER BY p.fecha, p.orden, p.movimiento_id
+    """
+    # Se pide una fila extra para saber si existe una página siguiente
+    params = _params_movimientos(params_filtro, cursor) + [limite + 1]
+
+    with _conexion_lectura().cursor() as cursor_db:
+        cursor_db.execute(sql, params)
+        filas = cursor_db.fetchall()
+
+    iniciales = dict(saldos)
+    saldo_inicial = sum(iniciales.values())
+    movimientos = []
+    for fila in filas[:limite]:
+        movimiento = dict(zip(COLUMNAS_KARDEX, fila))
+        if isinstance(movimiento['fecha'], str):
+            movimiento['fecha'] = parse_datetime(movimiento['fecha'])
+        movimiento['tipo_display'] = TIPOS_MOVIMIENTO.get(movimiento['tipo'], movimiento['tipo'])
+        movimiento['saldo'] = saldo_inicial + int(movimiento['saldo'])
+        movimiento['saldo_producto'] = iniciales.get(movimiento['producto_id'], 0) + int(movimiento['saldo_producto'])
+        saldos[movimiento['producto_id']] = movimiento['saldo_producto']
+        movimientos.append(movimiento)
+
+    siguiente = codificar_cursor(movimientos[-1]) if len(filas) > limite else None
+    return movimientos, siguiente
+
+
+def iterar_kardex(producto_id=None, zona_id=None, tamano_lote=1000):
+    """
+    Recorre el kardex completo por lotes (para exportaciones). Los saldos pasan
+    de un lote al siguiente, así que ningún lote vuelve a sumar los anteriores.
+    """
+    cursor = None
+    saldos = {}
+    while True:
+        movimientos, siguiente = obtener_kardex(producto_id, zona_id, cursor, tamano_lote, saldos=saldos)
+        yield from movimientos
+        if not siguiente:
+            break
+        cursor = decodificar_cursor(siguiente)
+
+
+# ========== STOCK Y VALORIZACIÓN A UNA FECHA ==========
+
+def corte_del_dia(fecha):
+    """Instante en que termina `fecha` en la zona horaria local (inicio del día siguiente)"""
+    corte = datetime.combine(fecha + timedelta(days=1), time.min)
+    if settings.USE_TZ:
+        corte = timezone.make_aware(corte)
+    return corte
+
+
+def stock_desde_actual(corte, producto_ids=None):
+    """
+    Reconstruye el stock a `corte` partiendo de Producto.cantidad y descontando
+    los movimientos posteriores. Una sola consulta agrupada.
+
+    Returns:
+        Lista de tuplas (producto_id, cantidad, costo_promedio).
+    """
+    filtro, params_filtro = _filtro_productos(producto_ids)
+    sql = f"""
+        WITH movimientos AS ({_sql_movimientos(filtro)})
+        SELECT p.id, p.cantidad - COALESCE(SUM(m.cantidad), 0), p.costo_promedio_actual
+        FROM "{Producto._meta.db_table}" p
+        LEFT JOIN movimientos m ON m.producto_id = p.id AND m.fecha >= %s
+        WHERE p.id {filtro}
+        GROUP BY p.id, p.cantidad, p.costo_promedio_actual
+    """
+    with _conexion_lectura().cursor() as cursor_db:
+        cursor_db.execute(sql, _params_movimientos(params_filtro) + [corte] + params_filtro)
+        return cursor_db.fetchall()
+
+
+def stock_a_fecha(fecha, producto_ids=None):
+    """
+    Stock y valorización de cada producto al cierre de `fecha`.
+
+    Para cada producto toma el snapshot más cercano anterior o igual a la fecha y
+    le suma los movimientos entre el corte del snapshot y el fin del día pedido.
+    Los productos sin snapshot previo se reconstruyen desde el stock actual.
+    El costo promedio es el vigente en el snapshot usado.
+
+    Returns:
+        Lista de dicts con producto_id, cantidad, costo_promedio, valor y origen
+        ('snapshot' o 'actual').
+    """
+    corte = corte_del_dia(fecha)
+    filtro, params_filtro = _filtro_productos(producto_ids)
+    snapshot = SnapshotInventario._meta.db_table
+    sql = f"""
+        WITH movimientos AS ({_sql_movimientos(filtro)}),
+        base AS (
+            SELECT s.producto_id, s.cantidad, s.costo_promedio, s.fecha_corte
+            FROM "{snapshot}" s
+            WHERE s.producto_id {filtro}
+              AND s.fecha = (
+                  SELECT MAX(s2.fecha) FROM "{snapshot}" s2
+                  WHERE s2.producto_id = s.producto_id AND s2.fecha <= %s
+              )
+        )
+        SELECT b.producto_id, b.cantidad + COALESCE(SUM(m.cantidad), 0), b.costo_promedio
+        FROM base b
+        LEFT JOIN movimientos m
+               ON m.producto_id = b.producto_id AND m.fecha >= b.fecha_corte AND m.fecha < %s
+        GROUP BY b.producto_id, b.cantidad, b.costo_promedio
+    """
+    with _conexion_lectura().cursor() as cursor_db:
+        cursor_db.execute(sql, _params_movimientos(params_filtro) + params_filtro + [fecha, corte])
+        filas = [fila + ('snapshot',) for fila in cursor_db.fetchall()]
+
+    con_snapshot = {fila[0] for fila in filas}
+    pendientes = None if producto_ids is None else [pid for pid in producto_ids if int(pid) not in con_snapshot]
+    if pendientes is None or pendientes:
+        filas += [
+            fila + ('actual',) for fila in stock_desde_actual(corte, pendientes)
+            if fila[0] not in con_snapshot
+        ]
+
+    resultado = []
+    for producto_id, cantidad, costo, origen in filas:
+        costo = Decimal(str(costo or 0))
+        resultado.append({
+            'producto_id': producto_id,
+            'cantidad': int(cantidad or 0),
+            'costo_promedio': costo,
+            'valor': costo * int(cantidad or 0),
+            'origen': origen,
+        })
+    return resultado
+
+
+def valorizacion_a_fecha(fecha):
+    """
+    Valorización de todo el catálogo según el snapshot de `fecha` (p. ej. cierre
+    de mes). Es una única consulta sobre el índice (fecha, valor, cantidad).
+    """
+    totales = SnapshotInventario.objects.filter(fecha=fecha).aggregate(
+        valor_total=Sum('valor'),
+        cantidad_total=Sum('cantidad'),
+        productos=Count('id'),
+    )
+    return {
+        'fecha': fecha,
+        'valor_total': totales['valor_total'] or Decimal('0'),
+        'cantidad_total': totales['cantidad_total'] or 0,
+        'productos': totales['productos'],
+    }
@@ -0,0 +1,47 @@
+"""
+Router de base de datos con réplica de solo lectura.
+
+Por defecto todo va a `default`. Las vistas de listados, reportes y exportación
+decoradas con @usar_replica (decorators.py) leen desde el alias `replica`
+mientras se ejecutan; las escrituras siempre van a la primaria. Si `replica` no
+está configurada en DATABASES el router no hace nada.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+
+ALIAS_REPLICA = 'replica'
+
+# True mientras se ejecuta una vista (o su respuesta en streaming) que puede leer de la réplica
+_leer_de_replica = ContextVar('leer_de_replica', default=False)
+
+
+def replica_disponible():
+    return ALIAS_REPLICA in settings.DATABASES
+
+
+def activar_replica():
+    """Activa la lectura desde la réplica en el contexto actual; retorna el token para restaurarlo"""
+    return _leer_de_replica.set(replica_disponible())
+
+
+def restaurar_replica(token):
+    _leer_de_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _leer_de_replica.get():
+            return ALIAS_REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Ambos alias contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación, no por migraciones
+        return db != ALIAS_REPLICA
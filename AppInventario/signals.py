@@ -0,0 +1,279 @@
+"""
+Señales de AppInventario. Se conectan en AppinventarioConfig.ready().
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Producto, ProductoProveedor, Proveedores, Servicio, Empleado, Especialidad, Cargo, EntradaInventario, Compras, SolicitudCompra
+from .storage import AlmacenamientoPorContenido
+from . import catalogos, contadores, imagenes, indice_busqueda, prometheus, versiones
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Servicio)
+@receiver(post_save, sender=Empleado)
+def programar_variantes_imagen(sender, instance, raw=False, **kwargs):
+    """Regenera las variantes WebP cuando cambia la imagen o foto del registro"""
+    if raw:
+        return
+    if imagenes.variantes_desactualizadas(instance):
+        imagenes.programar_variantes(instance)
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Servicio)
+@receiver(post_delete, sender=Empleado)
+def liberar_media(sender, instance, **kwargs):
+    """
+    Al eliminar un registro libera su imagen y variantes. El storage por
+    contenido solo borra el archivo si ningún otro registro lo referencia.
+    """
+    campo, campo_variantes = imagenes.CAMPOS_IMAGEN[sender]
+    archivo = getattr(instance, campo)
+    if not archivo or not isinstance(archivo.storage, AlmacenamientoPorContenido):
+        return
+    nombres = [archivo.name] + [
+        variante['ruta'] for variante in (getattr(instance, campo_variantes) or {}).values()
+        if isinstance(variante, dict) and variante.get('ruta')
+    ]
+    storage = archivo.storage
+
+    def borrar():
+        for nombre in nombres:
+            storage.delete(nombre)
+
+    transaction.on_commit(borrar)
+
+
+# Apps cuyos modelos llevan contador de versión de datos (ver versiones.py)
+APPS_VERSIONADAS = {'AppInventario', 'auth'}
+
+# Campos cuyo guardado por sí solo no cambia lo que se muestra: cada login
+# guarda User.last_login y no debe invalidar las cachés de todos los usuarios
+CAMPOS_SIN_VERSION = {
+    'auth.user': {'last_login'},
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def marcar_version_datos(sender, raw=False, update_fields=None, **kwargs):
+    """Incrementa la versión de datos del modelo al confirmar la transacción"""
+    if raw or sender._meta.app_label not in APPS_VERSIONADAS:
+        return
+    ignorados = CAMPOS_SIN_VERSION.get(sender._meta.label_lower)
+    if ignorados and update_fields and set(update_fields) <= ignorados:
+        return
+    versiones.marcar_cambio(sender)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def descartar_versiones_catalogos(sender, raw=False, **kwargs):
+    """La petición que modifica un catálogo vuelve a leer su versión (ver catalogos.py)"""
+    if not raw and sender in catalogos.MODELOS:
+        catalogos.descartar_versiones()
+
+
+@receiver(m2m_changed, sender=Empleado.especialidades.through)
+@receiver(m2m_changed, sender=Servicio.especialidades_requeridas.through)
+def marcar_version_m2m(sender, instance, action, model, **kwargs):
+    """Los cambios en relaciones M2M no disparan post_save de ninguno de los extremos"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        versiones.marcar_cambio(type(instance))
+        versiones.marcar_cambio(model)
+
+
+@receiver(post_save, sender=EntradaInventario)
+@receiver(post_save, sender=Compras)
+def contar_movimiento_stock(sender, instance, created=False, raw=False, **kwargs):
+    """Cuenta las entradas y ventas confirmadas para /metrics (entradas por minuto, etc.)"""
+    if raw or not created:
+        return
+    tipo = 'entrada' if sender is EntradaInventario else 'venta'
+    cantidad = instance.cantidad
+
+    def contar():
+        prometheus.incrementar('inventario_movimientos_stock_total', tipo=tipo)
+        prometheus.incrementar('inventario_movimientos_stock_unidades_total', cantidad, tipo=tipo)
+
+    transaction.on_commit(contar)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=ProductoProveedor)
+@receiver(post_save, sender=Proveedores)
+@receiver(post_save, sender=Empleado)
+@receiver(post_save, sender=Servicio)
+def actualizar_documento_busqueda(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Mantiene el documento del buscador global en la misma transacción que el registro"""
+    if raw or not indice_busqueda.requiere_reindexar(indice_busqueda.tipo_de_modelo(sender), update_fields):
+        return
+    if sender is Proveedores:
+        indice_busqueda.indexar_proveedor(instance)
+    else:
+        indice_busqueda.indexar(instance)
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=ProductoProveedor)
+@receiver(post_delete, sender=Proveedores)
+@receiver(post_delete, sender=Empleado)
+@receiver(post_delete, sender=Servicio)
+def eliminar_documento_busqueda(sender, instance, **kwargs):
+    indice_busqueda.desindexar(instance)
+
+
+# ========== ETIQUETA Y DOCUMENTO DE BÚSQUEDA DE EMPLEADO ==========
+
+# Campo de Empleado que apunta a cada modelo que aparece en la etiqueta y en el documento
+RELACIONES_ETIQUETA = {Cargo: 'cargo', Especialidad: 'especialidades'}
+
+
+def actualizar_etiquetas_empleados(empleados):
+    """
+    Recalcula Empleado.etiqueta de `empleados` (queryset) con dos consultas de
+    lectura y un UPDATE por empleado cuya etiqueta cambió. No pasa por save()
+    para no registrar historial ni reindexar el buscador.
+    """
+    cambios = False
+    for empleado in empleados.select_related('cargo').prefetch_related('especialidades'):
+        etiqueta = empleado.construir_etiqueta()
+        if etiqueta != empleado.etiqueta:
+            Empleado.objects.filter(pk=empleado.pk).update(etiqueta=etiqueta)
+            cambios = True
+    if cambios:
+        versiones.marcar_cambio(Empleado)
+
+
+def refrescar_empleados(empleados):
+    """Etiqueta y documento del buscador de `empleados` tras un cambio en su cargo o sus especialidades"""
+    actualizar_etiquetas_empleados(empleados)
+    indice_busqueda.indexar_varios('empleado', empleados)
+
+
+@receiver(m2m_changed, sender=Empleado.especialidades.through)
+def actualizar_etiqueta_por_especialidades(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # Tras el clear() ya no se sabe qué empleados tenían la especialidad
+        instance._empleados_etiqueta = list(instance.empleado_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        ids = [instance.pk]
+    elif action == 'post_clear':
+        ids = getattr(instance, '_empleados_etiqueta', [])
+    else:
+        ids = pk_set or []
+    refrescar_empleados(Empleado.objects.filter(pk__in=ids))
+
+
+@receiver(post_save, sender=Cargo)
+@receiver(post_save, sender=Especialidad)
+def actualizar_etiqueta_por_nombre(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """Un cargo o especialidad renombrado cambia la etiqueta y el documento de sus empleados"""
+    if raw or created or (update_fields is not None and 'nombre' not in update_fields):
+        return
+    refrescar_empleados(Empleado.objects.filter(**{RELACIONES_ETIQUETA[sender]: instance}))
+
+
+@receiver(pre_delete, sender=Cargo)
+@receiver(pre_delete, sender=Especialidad)
+def recordar_empleados_etiqueta(sender, instance, **kwargs):
+    # SET_NULL del cargo y el borrado de filas M2M no envían señales de Empleado
+    instance._empleados_etiqueta = list(
+        Empleado.objects.filter(**{RELACIONES_ETIQUETA[sender]: instance}).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Cargo)
+@receiver(post_delete, sender=Especialidad)
+def actualizar_etiqueta_por_eliminacion(sender, instance, **kwargs):
+    ids = getattr(instance, '_empleados_etiqueta', [])
+    if ids:
+        refrescar_empleados(Empleado.objects.filter(pk__in=ids))
+
+
+# ========== CONTADORES DE RELACIONES ==========
+
+# Modelo con ForeignKey contada -> (campo, modelo contado, contador). Ver contadores.py
+CONTADORES_FK = {
+    Empleado: (('cargo', Cargo, 'cantidad_empleados'),),
+    ProductoProveedor: (('proveedor', Proveedores, 'cantidad_productos'),),
+    SolicitudCompra: (('proveedor', Proveedores, 'cantidad_solicitudes'),),
+}
+
+
+@receiver(pre_save, sender=Empleado)
+@receiver(pre_save, sender=ProductoProveedor)
+@receiver(pre_save, sender=SolicitudCompra)
+def recordar_relaciones_contadas(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Guarda a qué registros apuntaba la fila antes del save (una consulta, solo al editar)"""
+    if raw:
+        return
+    campos = [
+        campo for campo, _modelo, _contador in CONTADORES_FK[sender]
+        if update_fields is None or {campo, f'{campo}_id'} & set(update_fields)
+    ]
+    anteriores = {}
+    if campos and not instance._state.adding:
+        anteriores = sender.objects.filter(pk=instance.pk).values(*[f'{campo}_id' for campo in campos]).first() or {}
+    instance._relaciones_contadas = {campo: anteriores.get(f'{campo}_id') for campo in campos}
+
+
+@receiver(post_save, sender=Empleado)
+@receiver(post_save, sender=ProductoProveedor)
+@receiver(post_save, sender=SolicitudCompra)
+def ajustar_contadores_fk(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anteriores = instance.__dict__.pop('_relaciones_contadas', {})
+    for campo, modelo, contador in CONTADORES_FK[sender]:
+        if campo in anteriores:
+            contadores.ajustar_fk(modelo, contador, anteriores[campo], getattr(instance, f'{campo}_id'))
+
+
+@receiver(post_delete, sender=Empleado)
+@receiver(post_delete, sender=ProductoProveedor)
+@receiver(post_delete, sender=SolicitudCompra)
+def descontar_contadores_fk(sender, instance, origin=None, **kwargs):
+    for campo, modelo, contador in CONTADORES_FK[sender]:
+        anterior = getattr(instance, f'{campo}_id')
+        # Filas borradas en cascada junto con el registro contado: no hay nada que descontar
+        if isinstance(origin, modelo) and origin.pk == anterior:
+            continue
+        contadores.ajustar_fk(modelo, contador, anterior, None)
+
+
+@receiver(m2m_changed, sender=Empleado.especialidades.through)
+def ajustar_empleados_por_especialidad(sender, instance, action, reverse, pk_set, **kwargs):
+    """Especialidad.cantidad_empleados en add/remove/clear desde cualquiera de los dos extremos"""
+    relacion = instance.empleado_set if reverse else instance.especialidades
+    if action == 'pre_remove':
+        # pk_set trae los ids pedidos, estén o no en la relación
+        instance._quitados_contador = set(relacion.filter(pk__in=pk_set).values_list('pk', flat=True))
+    elif action == 'pre_clear' and not reverse:
+        instance._quitados_contador = set(relacion.values_list('pk', flat=True))
+    elif action == 'post_clear' and reverse:
+        Especialidad.objects.filter(pk=instance.pk).update(cantidad_empleados=0)
+    elif action == 'post_add':
+        cambios = {instance.pk: len(pk_set)} if reverse else dict.fromkeys(pk_set, 1)
+        contadores.sumar(Especialidad, 'cantidad_empleados', cambios)
+    elif action in ('post_remove', 'post_clear'):
+        quitados = instance.__dict__.pop('_quitados_contador', set())
+        cambios = {instance.pk: -len(quitados)} if reverse else dict.fromkeys(quitados, -1)
+        contadores.sumar(Especialidad, 'cantidad_empleados', cambios)
+
+
+@receiver(pre_delete, sender=Empleado)
+def recordar_especialidades_contadas(sender, instance, **kwargs):
+    # Las filas M2M del empleado se borran sin m2m_changed
+    instance._especialidades_contadas = list(instance.especialidades.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Empleado)
+def descontar_especialidades(sender, instance, **kwargs):
+    ids = instance.__dict__.pop('_especialidades_contadas', [])
+    contadores.sumar(Especialidad, 'cantidad_empleados', dict.fromkeys(ids, -1))
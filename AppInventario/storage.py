@@ -0,0 +1,132 @@
+"""
+Almacenamiento de media direccionado por contenido.
+
+Cada archivo se guarda como contenido/<aa>/<sha256><ext>, de modo que subir dos
+veces la misma imagen (aunque sea desde modelos distintos) ocupa un solo archivo.
+Como un archivo puede estar referenciado por varios registros de Producto,
+Servicio y Empleado (imagen original o variante WebP), solo se borra cuando ya
+no queda ninguna referencia en la base de datos. Los archivos que quedan
+huérfanos los elimina `manage.py media_gc`.
+
+Un save() que reutiliza un archivo existente y un delete() que ve cero
+referencias pueden cruzarse: el registro nuevo todavía no está confirmado
+cuando el delete cuenta. Para que no quede apuntando a un archivo borrado, ambos
+trabajan bajo el mismo bloqueo entre procesos, save() renueva la fecha de
+modificación del archivo que reutiliza, y ni delete() ni media_gc borran
+archivos modificados hace menos de MEDIA_GRACIA_SEGUNDOS (quedan para una
+pasada posterior de media_gc).
+"""
+import hashlib
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Q
+
+from . import bloqueos
+
+CARPETA_CONTENIDO = 'contenido'
+
+# Archivo de bloqueo de save/delete/media_gc, dentro de la carpeta de contenido
+ARCHIVO_BLOQUEO = f'{CARPETA_CONTENIDO}/.bloqueo'
+
+# (app_label.Modelo, campo de imagen, campo JSON de variantes)
+REFERENCIAS_MEDIA = (
+    ('AppInventario.Producto', 'imagen', 'imagen_variantes'),
+    ('AppInventario.Servicio', 'imagen', 'imagen_variantes'),
+    ('AppInventario.Empleado', 'foto', 'foto_variantes'),
+)
+
+
+def hash_contenido(archivo):
+    """SHA-256 del contenido de un archivo, leído por bloques"""
+    sha = hashlib.sha256()
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    for bloque in archivo.chunks() if hasattr(archivo, 'chunks') else iter(lambda: archivo.read(65536), b''):
+        sha.update(bloque)
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    return sha.hexdigest()
+
+
+def nombre_por_hash(sha, nombre_original):
+    """Nombre direccionado por contenido conservando la extensión original"""
+    extension = os.path.splitext(nombre_original)[1].lower()
+    return f'{CARPETA_CONTENIDO}/{sha[:2]}/{sha}{extension}'
+
+
+def gracia_segundos():
+    """Antigüedad mínima de un archivo sin referencias para borrarlo"""
+    return getattr(settings, 'MEDIA_GRACIA_SEGUNDOS', 60 * 60)
+
+
+def reciente(ruta, gracia=None, ahora=None):
+    """Indica si el archivo en `ruta` se modificó hace menos de `gracia` segundos (gracia_segundos())"""
+    try:
+        modificado = os.path.getmtime(ruta)
+    except OSError:
+        return False
+    gracia = gracia_segundos() if gracia is None else gracia
+    return (ahora or time.time()) - modificado < gracia
+
+
+def _filtro_referencias(nombre, campo, campo_variantes):
+    from .imagenes import VARIANTES
+    filtro = Q(**{campo: nombre})
+    for variante, _lado in VARIANTES:
+        filtro |= Q(**{f'{campo_variantes}__{variante}__ruta': nombre})
+    return filtro
+
+
+def contar_referencias(nombre):
+    """Cantidad de registros que usan `nombre` como imagen o como variante"""
+    total = 0
+    for etiqueta, campo, campo_variantes in REFERENCIAS_MEDIA:
+        modelo = apps.get_model(etiqueta)
+        total += modelo.objects.filter(_filtro_referencias(nombre, campo, campo_variantes)).count()
+    return total
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+    """FileSystemStorage que nombra los archivos por su hash y los deduplica"""
+
+    def bloqueo(self):
+        """Bloqueo entre procesos de save(), delete() y media_gc"""
+        return bloqueos.archivo(self.path(ARCHIVO_BLOQUEO))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        nombre = nombre_por_hash(hash_contenido(content), name)
+        with self.bloqueo():
+            if self.exists(nombre):
+                # Mismo contenido ya almacenado: se reutiliza sin volver a escribir.
+                # La fecha nueva lo protege de un delete() hasta que se confirme el registro
+                os.utime(self.path(nombre))
+                return nombre
+            return super().save(nombre, content, max_length=max_length)
+
+    def delete(self, name):
+        if not name:
+            return super().delete(name)
+        with self.bloqueo():
+            # Otro registro puede seguir usando el mismo archivo, o estar por confirmarse
+            if contar_referencias(name) > 0 or reciente(self.path(name)):
+                return
+            super().delete(name)
+
+
+def almacenamiento_perfiles():
+    """
+    Storage de los perfiles de peticiones (PerfilPeticion). Va fuera de
+    MEDIA_ROOT porque incluye SQL y rutas internas: solo se descargan desde el
+    panel de staff.
+    """
+    from django.conf import settings
+    return FileSystemStorage(location=getattr(settings, 'PERFILES_DIR', os.path.join(settings.BASE_DIR, 'perfiles')))
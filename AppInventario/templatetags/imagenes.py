@@ -0,0 +1,48 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from AppInventario.imagenes import VARIANTES
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagen_responsive(archivo, variantes=None, tamano='thumb', alt='', sizes='', clase='', estilo='', **atributos):
+    """
+    Renderiza un <img> con srcset de las variantes WebP y carga diferida.
+    Si las variantes aún no se generaron usa la imagen original.
+    Los argumentos extra se agregan como atributos (p. ej. id='avatar-img').
+
+    Uso: {% imagen_responsive producto.imagen producto.imagen_variantes 'thumb' alt=producto.nombre sizes='48px' %}
+    """
+    if not archivo:
+        return ''
+
+    attrs = {'alt': alt, 'loading': 'lazy', 'decoding': 'async'}
+    if clase:
+        attrs['class'] = clase
+    if estilo:
+        attrs['style'] = estilo
+    attrs.update(atributos)
+
+    variantes = variantes or {}
+    disponibles = [
+        (nombre, variantes[nombre]) for nombre, _lado in VARIANTES
+        if isinstance(variantes.get(nombre), dict)
+    ]
+    if variantes.get('origen') != archivo.name or not disponibles:
+        attrs['src'] = archivo.url
+        return format_html('<img{}>', flatatt(attrs))
+
+    storage = archivo.storage
+    # Si el tamaño pedido no existe (original chico) se usa la variante más grande disponible
+    elegida = dict(disponibles).get(tamano, disponibles[-1][1])
+    attrs.update({
+        'src': storage.url(elegida['ruta']),
+        'srcset': ', '.join(f"{storage.url(v['ruta'])} {v['ancho']}w" for _nombre, v in disponibles),
+        'sizes': sizes or f"{elegida['ancho']}px",
+        'width': elegida['ancho'],
+        'height': elegida['alto'],
+    })
+    return format_html('<img{}>', flatatt(attrs))
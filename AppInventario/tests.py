@@ -1,3 +1,795 @@
-from django.test import TestCase
+import cProfile
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import FileResponse, HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import catalogos, contadores, indice_busqueda, paginacion, perfilador, precarga, prometheus, reportes, versiones
+from .forms import EmpleadoForm, ProductoForm
+from .management.commands import media_gc
+from .models import (
+    AuditoriaInventario, Compras, DetalleAuditoria, DocumentoBusqueda, Empleado, EntradaInventario, Especialidad, Producto, ProductoProveedor, Proveedores, SnapshotInventario, SolicitudCompra,
+    Zona,
+)
+
+
+class PresupuestoConsultasFormulariosTest(TestCase):
+    """
+    Consultas que cuesta construir, renderizar y validar los formularios más usados.
+    Si un cambio sube alguno de estos números, revisar antes de ajustar el test.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Confirma las versiones de datos como lo haría el commit (los catálogos las usan)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.zonas = [Zona.objects.create(nombre=f'Zona {numero}') for numero in range(5)]
+            cls.proveedor = Proveedores.objects.create(nombre='Proveedor Uno')
+            cls.productos_proveedor = [
+                ProductoProveedor.objects.create(proveedor=cls.proveedor, nombre=f'Insumo {numero}', codigo_producto=f'INS-{numero}')
+                for numero in range(5)
+            ]
+            cls.producto = Producto.objects.create(
+                nombre='Insumo 0', tipo_producto='proveedor', producto_proveedor=cls.productos_proveedor[0],
+                proveedor_habitual=cls.proveedor, cantidad=5, precio=1000, zona=cls.zonas[0],
+            )
+            cls.usuario = User.objects.create_user('existente', 'existente@gmail.com', 'clave-segura')
+            cls.empleado = Empleado.objects.create(nombre='Ana', email='ana@gmail.com', user=cls.usuario)
+
+    def setUp(self):
+        cache.clear()
+        catalogos.limpiar()
+
+    def _calentar_cache(self):
+        ProductoForm().as_p()
+        EmpleadoForm().as_p()
+
+    def test_producto_form_nuevo(self):
+        # Versiones de los catálogos + recorrido de las zonas (catálogo frío)
+        with self.assertNumQueries(2):
+            ProductoForm().as_p()
+        # Con el catálogo en memoria solo se consultan las versiones
+        with self.assertNumQueries(1):
+            ProductoForm().as_p()
+
+    def test_catalogo_refleja_cambios(self):
+        ProductoForm().as_p()
+        zona = self.zonas[0]
+        zona.nombre = 'Zona Renombrada'
+        with self.captureOnCommitCallbacks(execute=True):
+            zona.save()
+            # Antes del commit la transacción ya ve su propio cambio
+            self.assertIn('Zona Renombrada', [fila.nombre for fila in catalogos.activos(Zona)])
+        # Después del commit la versión cambió y se vuelve a leer el catálogo
+        opciones = [etiqueta for _valor, etiqueta in ProductoForm().fields['zona'].choices]
+        self.assertIn('Zona Renombrada', opciones)
+
+    def test_producto_form_editar(self):
+        self._calentar_cache()
+        producto = Producto.objects.get(pk=self.producto.pk)
+        # Versiones de catálogos, producto de proveedor de la instancia, productos del
+        # proveedor (select) y la opción elegida de cada autocompletar de proveedor
+        with self.assertNumQueries(5):
+            ProductoForm(instance=producto).as_p()
+
+    def test_producto_form_validar_producto_de_proveedor(self):
+        self._calentar_cache()
+        datos = {
+            'tipo_producto': 'proveedor',
+            'proveedor_seleccionado': self.proveedor.pk,
+            'producto_proveedor': self.productos_proveedor[1].pk,
+            'cantidad': 3,
+            'precio': 1500,
+            'zona': self.zonas[1].pk,
+        }
+        # Versiones de catálogos, proveedor, producto de proveedor (con su proveedor),
+        # zona y producto duplicado
+        with self.assertNumQueries(5):
+            form = ProductoForm(data=datos)
+            self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['proveedor_habitual'], self.proveedor)
+
+    def test_empleado_form_nuevo(self):
+        with self.assertNumQueries(2):
+            EmpleadoForm().as_p()
+        with self.assertNumQueries(1):
+            EmpleadoForm().as_p()
+
+    def test_empleado_form_validar_con_usuario(self):
+        self._calentar_cache()
+        datos = {
+            'nombre': 'Berta',
+            'email': 'berta@gmail.com',
+            'experiencia_anos': 2,
+            'activo': True,
+            'crear_usuario': True,
+            'username': 'berta',
+            'password': 'clave-segura',
+            'password_confirm': 'clave-segura',
+        }
+        # Versiones de catálogos, email de empleado (clean_email y unicidad) y
+        # username/email de usuario en una sola consulta
+        with self.assertNumQueries(4):
+            form = EmpleadoForm(data=datos)
+            self.assertTrue(form.is_valid(), form.errors)
+
+    def test_empleado_form_username_en_uso(self):
+        datos = {
+            'nombre': 'Carla',
+            'email': 'carla@gmail.com',
+            'experiencia_anos': 0,
+            'crear_usuario': True,
+            'username': 'existente',
+            'password': 'clave-segura',
+            'password_confirm': 'clave-segura',
+        }
+        form = EmpleadoForm(data=datos)
+        self.assertFalse(form.is_valid())
+        self.assertIn('Este nombre de usuario ya está en uso', form.non_field_errors())
+
+    def test_empleado_form_editar_conserva_su_usuario(self):
+        datos = {
+            'nombre': 'Ana',
+            'email': 'ana@gmail.com',
+            'experiencia_anos': 1,
+            'crear_usuario': True,
+            'username': 'existente',
+        }
+        form = EmpleadoForm(data=datos, instance=self.empleado)
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class PresupuestoConsultasListadosTest(TestCase):
+    """
+    Los listados con política de precarga cuestan lo mismo con páginas de 6
+    filas que de 60. Sobre la base completa: manage.py presupuesto_consultas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Confirma las versiones de datos como lo haría el commit (los catálogos las usan)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.usuario = User.objects.create_superuser('admin', 'admin@gmail.com', 'clave-segura')
+            zona = Zona.objects.create(nombre='Bodega')
+            proveedor = Proveedores.objects.create(nombre='Proveedor Uno')
+            for numero in range(30):
+                producto = Producto.objects.create(
+                    nombre=f'Producto {numero}', cantidad=10, precio=1000, zona=zona, proveedor_habitual=proveedor,
+                )
+                EntradaInventario.objects.create(
+                    producto=producto, proveedor=proveedor, cantidad=2, precio_unitario=500, usuario_registro=cls.usuario,
+                )
+                Compras.objects.create(producto=producto, proveedor=proveedor, cantidad=1, precio_unitario=1000)
+                Empleado.objects.create(nombre=f'Empleado {numero}', email=f'empleado{numero}@gmail.com')
+
+    def test_listados_dentro_del_presupuesto(self):
+        for vista in ('entradas_lista', 'salidas_lista', 'estilistas_lista'):
+            with self.subTest(vista=vista):
+                consultas = precarga.medir(vista, self.usuario)
+                self.assertLessEqual(consultas, precarga.POLITICAS[vista]['presupuesto'])
+                self.assertEqual(precarga.medir(vista, self.usuario, factor=10), consultas)
+
+    def test_inventario_estadisticas_en_una_consulta(self):
+        cache.clear()
+        catalogos.limpiar()
+        # Versiones de catálogos, zonas, versiones de Producto y Zona, estadísticas
+        # con los conteos por categoría y zona, y página
+        self.assertEqual(precarga.medir('inventario_lista', self.usuario), 5)
+        # Con la caché caliente y las zonas en memoria: versiones y página
+        self.assertEqual(precarga.medir('inventario_lista', self.usuario), 3)
+
+
+class EtiquetaEmpleadoTest(TestCase):
+    """Empleado.etiqueta se mantiene al día y permite listar empleados con una consulta"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidades = [Especialidad.objects.create(nombre=nombre) for nombre in ('Caja', 'Bodega', 'Reparto', 'Ventas')]
+        cls.empleado = Empleado.objects.create(nombre='Ana', apellido='Pérez', email='ana@gmail.com', especialidad='Caja')
+
+    def test_listar_empleados_en_una_consulta(self):
+        for numero in range(5):
+            empleado = Empleado.objects.create(nombre=f'Empleado {numero}', email=f'empleado{numero}@gmail.com')
+            empleado.especialidades.set(self.especialidades[:2])
+        with self.assertNumQueries(1):
+            etiquetas = [str(empleado) for empleado in Empleado.objects.all()]
+        self.assertIn('Empleado 0 - Bodega, Caja', etiquetas)
+
+    def test_etiqueta_sigue_a_las_especialidades(self):
+        self.assertEqual(str(self.empleado), 'Ana Pérez - Caja')
+        self.empleado.especialidades.set(self.especialidades)
+        self.empleado.refresh_from_db()
+        self.assertEqual(self.empleado.etiqueta, 'Ana Pérez - Bodega, Caja, Reparto')
+
+        self.especialidades[1].nombre = 'Almacén'
+        self.especialidades[1].save()
+        self.empleado.refresh_from_db()
+        self.assertEqual(self.empleado.etiqueta, 'Ana Pérez - Almacén, Caja, Reparto')
+
+        self.especialidades[0].delete()
+        self.empleado.refresh_from_db()
+        self.assertEqual(self.empleado.etiqueta, 'Ana Pérez - Almacén, Reparto, Ventas')
+
+
+class ContadoresRelacionesTest(TestCase):
+    """Las señales mantienen los contadores de los catálogos igual que recontar()"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidades = [Especialidad.objects.create(nombre=nombre) for nombre in ('Caja', 'Bodega', 'Reparto')]
+        cls.proveedores = [Proveedores.objects.create(nombre=nombre) for nombre in ('Proveedor Uno', 'Proveedor Dos')]
+        cls.producto = Producto.objects.create(nombre='Producto', cantidad=1, precio=1000)
+
+    def _contadores(self):
+        especialidades = dict(Especialidad.objects.values_list('nombre', 'cantidad_empleados'))
+        proveedores = {
+            nombre: (productos, solicitudes)
+            for nombre, productos, solicitudes in Proveedores.objects.values_list('nombre', 'cantidad_productos', 'cantidad_solicitudes')
+        }
+        return especialidades, proveedores
+
+    def assertIgualARecontar(self):
+        mantenidos = self._contadores()
+        contadores.recontar()
+        self.assertEqual(mantenidos, self._contadores())
+
+    def test_empleados_por_especialidad(self):
+        caja, bodega, reparto = self.especialidades
+        ana = Empleado.objects.create(nombre='Ana', email='ana@gmail.com')
+        berta = Empleado.objects.create(nombre='Berta', email='berta@gmail.com')
+        ana.especialidades.set([caja, bodega])
+        berta.especialidades.add(caja)
+        # Quitar una especialidad que el empleado no tiene no descuenta
+        berta.especialidades.remove(caja, reparto)
+        reparto.empleado_set.add(ana, berta)
+        self.assertEqual(self._contadores()[0], {'Caja': 1, 'Bodega': 1, 'Reparto': 2})
+        self.assertIgualARecontar()
+
+        bodega.empleado_set.clear()
+        ana.delete()
+        self.assertEqual(self._contadores()[0], {'Caja': 0, 'Bodega': 0, 'Reparto': 1})
+        self.assertIgualARecontar()
+
+    def test_productos_y_solicitudes_por_proveedor(self):
+        uno, dos = self.proveedores
+        productos = [
+            ProductoProveedor.objects.create(proveedor=uno, nombre=f'Insumo {numero}', codigo_producto=f'INS-{numero}')
+            for numero in range(3)
+        ]
+        SolicitudCompra.objects.create(producto=self.producto, proveedor=dos, cantidad=1, precio_unitario=10, costo_total=10)
+        productos[0].proveedor = dos
+        productos[0].save()
+        productos[1].delete()
+        self.assertEqual(self._contadores()[1], {'Proveedor Uno': (1, 0), 'Proveedor Dos': (1, 1)})
+        self.assertIgualARecontar()
+
+        # El borrado en cascada de la solicitud descuenta al proveedor que queda
+        self.producto.delete()
+        self.assertEqual(self._contadores()[1], {'Proveedor Uno': (1, 0), 'Proveedor Dos': (1, 0)})
+
+    def test_recontar_corrige_cambios_sin_senales(self):
+        ProductoProveedor.objects.bulk_create([ProductoProveedor(proveedor=self.proveedores[0], nombre='Insumo')])
+        self.assertEqual(Proveedores.objects.get(pk=self.proveedores[0].pk).cantidad_productos, 0)
+        contadores.recontar([Proveedores])
+        self.assertEqual(Proveedores.objects.get(pk=self.proveedores[0].pk).cantidad_productos, 1)
+
+    def test_save_con_instancia_vieja_no_pisa_contadores(self):
+        uno = Proveedores.objects.get(pk=self.proveedores[0].pk)
+        caja = Especialidad.objects.get(pk=self.especialidades[0].pk)
+        ProductoProveedor.objects.create(proveedor=uno, nombre='Insumo', codigo_producto='INS-1')
+        Empleado.objects.create(nombre='Ana', email='ana@gmail.com').especialidades.add(caja)
+
+        uno.telefono = '123'
+        uno.save()
+        caja.descripcion = 'Atiende la caja'
+        caja.save()
+        self.assertEqual(Proveedores.objects.get(pk=uno.pk).cantidad_productos, 1)
+        self.assertEqual(Proveedores.objects.get(pk=uno.pk).telefono, '123')
+        self.assertEqual(Especialidad.objects.get(pk=caja.pk).cantidad_empleados, 1)
+        self.assertEqual(Especialidad.objects.get(pk=caja.pk).descripcion, 'Atiende la caja')
+
+    def test_save_con_campos_diferidos_o_fila_eliminada(self):
+        caja = Especialidad.objects.only('nombre').get(pk=self.especialidades[0].pk)
+        caja.nombre = 'Cajas'
+        # Sobre la especialidad solo el UPDATE: los campos diferidos no se cargan uno por uno
+        with CaptureQueriesContext(connection) as consultas:
+            caja.save()
+        propias = [c['sql'] for c in consultas if c['sql'].split(' WHERE ')[0].endswith('"AppInventario_especialidad"') or 'UPDATE "AppInventario_especialidad"' in c['sql']]
+        self.assertEqual(len(propias), 1)
+        self.assertTrue(propias[0].startswith('UPDATE "AppInventario_especialidad" SET "nombre" = '))
+        self.assertEqual(Especialidad.objects.get(pk=caja.pk).nombre, 'Cajas')
+
+        bodega = Especialidad.objects.get(pk=self.especialidades[1].pk)
+        Especialidad.objects.filter(pk=bodega.pk).delete()
+        bodega.descripcion = 'Recreada'
+        bodega.save()
+        self.assertEqual(Especialidad.objects.get(pk=bodega.pk).descripcion, 'Recreada')
+
+    def test_eliminar_revisa_empleados_aunque_el_contador_este_desfasado(self):
+        caja = self.especialidades[0]
+        ana = Empleado.objects.create(nombre='Ana', email='ana@gmail.com')
+        # Sin señales: el contador queda en 0
+        Empleado.especialidades.through.objects.bulk_create([
+            Empleado.especialidades.through(empleado=ana, especialidad=caja),
+        ])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@gmail.com', 'clave-segura'))
+        self.client.post(reverse('especialidades_eliminar', args=[caja.pk]))
+        self.assertTrue(Especialidad.objects.filter(pk=caja.pk).exists())
+
+
+class AuditoriaAdminTest(TestCase):
+    """El listado del admin cuenta detalles con subconsultas; las demás vistas no los cuentan"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@gmail.com', 'clave-segura'))
+        self.auditoria = AuditoriaInventario.objects.create(fecha_auditoria=timezone.localdate())
+        for numero in range(3):
+            producto = Producto.objects.create(nombre=f'Producto {numero}', cantidad=5, precio=1000)
+            DetalleAuditoria.objects.create(auditoria=self.auditoria, producto=producto, cantidad_sistema=5, revisado=numero < 2)
+
+    def test_conteos_solo_en_el_listado(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('admin:AppInventario_auditoriainventario_changelist') + '?o=5')
+        fila = response.context['cl'].result_list[0]
+        self.assertEqual((fila.total_detalles, fila.detalles_revisados), (3, 2))
+        self.assertFalse([c['sql'] for c in consultas if 'GROUP BY "AppInventario_auditoriainventario"' in c['sql']])
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('admin:AppInventario_auditoriainventario_change', args=[self.auditoria.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([c['sql'] for c in consultas if 'COUNT(' in c['sql']])
+
+
+class VersionesDatosTest(TestCase):
+    """Qué escrituras incrementan la versión de datos de un modelo"""
+
+    def _version(self, modelo):
+        etiqueta = versiones.etiqueta_modelo(modelo)
+        return versiones.obtener_versiones([etiqueta])[etiqueta]
+
+    def test_login_no_invalida_las_caches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario = User.objects.create_user('ana', 'ana@gmail.com', 'clave-segura')
+        antes = self._version(User)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.login(username='ana', password='clave-segura'))
+        self.assertEqual(self._version(User), antes)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario.first_name = 'Ana'
+            usuario.save()
+        self.assertEqual(self._version(User), antes + 1)
+
+    def test_cambio_despues_de_un_savepoint_revertido(self):
+        antes = self._version(Especialidad), self._version(Zona)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Especialidad.objects.create(nombre='Caja')
+                raise RuntimeError
+            # El callback registrado dentro del savepoint se descartó; este cambio registra otro
+            Zona.objects.create(nombre='Bodega')
+        self.assertEqual(self._version(Zona), antes[1] + 1)
+
+
+class KardexTest(TestCase):
+    """Los saldos del kardex no dependen de dónde corta cada página o lote"""
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create_user('bodega', 'bodega@gmail.com', 'clave-segura')
+        proveedor = Proveedores.objects.create(nombre='Proveedor Uno')
+        cls.productos = [Producto.objects.create(nombre=f'Producto {numero}', cantidad=0, precio=1000) for numero in range(2)]
+        for numero in range(7):
+            producto = cls.productos[numero % 2]
+            EntradaInventario.objects.create(
+                producto=producto, proveedor=proveedor, cantidad=10 + numero, precio_unitario=500, usuario_registro=usuario,
+            )
+            if numero % 3 == 0:
+                Compras.objects.create(producto=producto, proveedor=proveedor, cantidad=numero + 1, precio_unitario=1000)
+
+    def _saldos(self, movimientos):
+        return [(movimiento['movimiento_id'], movimiento['tipo'], movimiento['saldo'], movimiento['saldo_producto']) for movimiento in movimientos]
+
+    def test_saldos_entre_lotes(self):
+        for producto in self.productos:
+            with self.subTest(producto=producto.nombre):
+                completo, siguiente = reportes.obtener_kardex(producto_id=producto.id, limite=100)
+                self.assertIsNone(siguiente)
+                self.assertEqual(completo[-1]['saldo'], sum(movimiento['cantidad'] for movimiento in completo))
+                for tamano_lote in (1, 2, 3):
+                    lotes = list(reportes.iterar_kardex(producto_id=producto.id, tamano_lote=tamano_lote))
+                    self.assertEqual(self._saldos(lotes), self._saldos(completo))
+
+    def test_pagina_con_cursor_calcula_el_saldo_inicial(self):
+        zona = Zona.objects.create(nombre='Bodega')
+        Producto.objects.filter(pk__in=[producto.pk for producto in self.productos]).update(zona=zona)
+        completo, _ = reportes.obtener_kardex(zona_id=zona.id, limite=100)
+        primera, siguiente = reportes.obtener_kardex(zona_id=zona.id, limite=4)
+        segunda, _ = reportes.obtener_kardex(zona_id=zona.id, cursor=reportes.decodificar_cursor(siguiente), limite=4)
+        self.assertEqual(self._saldos(primera + segunda), self._saldos(completo[:8]))
+        # Los saldos por producto siguen a cada producto, no al total de la zona
+        self.assertNotEqual([m['saldo'] for m in completo], [m['saldo_producto'] for m in completo])
+
+
+class ValorizacionMensualTest(TestCase):
+    """api_valorizacion_mensual valida el mes y no inventa ceros sin snapshot"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('staff', 'staff@gmail.com', 'clave-segura', is_staff=True)
+        producto = Producto.objects.create(nombre='Producto', cantidad=4, precio=1000)
+        cierre = datetime.date(2025, 11, 30)
+        SnapshotInventario.objects.create(
+            producto=producto, fecha=cierre, cantidad=4, costo_promedio=500, valor=2000,
+            fecha_corte=timezone.make_aware(datetime.datetime.combine(cierre, datetime.time.max)),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _pedir(self, **parametros):
+        return self.client.get(reverse('api_valorizacion_mensual'), parametros)
+
+    def test_mes_con_snapshot(self):
+        respuesta = self._pedir(anio=2025, mes=11)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(Decimal(respuesta.json()['valor_total']), 2000)
+
+    def test_mes_invalido(self):
+        for mes in (0, 13, 'x'):
+            with self.subTest(mes=mes):
+                self.assertEqual(self._pedir(anio=2025, mes=mes).status_code, 400)
+
+    def test_mes_sin_snapshot(self):
+        respuesta = self._pedir(anio=2025, mes=10)
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertTrue(respuesta.json()['sin_snapshot'])
+
+
+class MetricasPrometheusTest(TestCase):
+    """/metrics exige token por defecto y no recorre tablas en cada scrape"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sin_token_ni_ips_rechaza_localhost(self):
+        respuesta = self.client.get(reverse('metricas_prometheus'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(respuesta.status_code, 403)
+
+    @override_settings(METRICAS_PROMETHEUS_TOKEN='secreto')
+    def test_con_token(self):
+        url = reverse('metricas_prometheus')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        respuesta = self.client.get(url, HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn(b'inventario_productos_activos', respuesta.content)
+
+    def test_procesos_terminados_se_acumulan(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        proceso = subprocess.Popen(['true'])
+        proceso.wait()
+        terminado = os.path.join(directorio, f'proceso-{proceso.pid}.json')
+        with open(terminado, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                'pid': proceso.pid,
+                'contadores': [['inventario_movimientos_stock_total', [['tipo', 'entrada']], 3]],
+                'histogramas': [],
+                'gauges': [['inventario_tareas_imagen_pendientes', [], 7]],
+            }, archivo)
+
+        with self.settings(METRICAS_PROMETHEUS_DIR=directorio):
+            for _ in range(2):
+                contadores, _histogramas, gauges = prometheus._leer_procesos()
+                self.assertEqual(contadores[('inventario_movimientos_stock_total', (('tipo', 'entrada'),))], 3)
+                self.assertNotIn(7, gauges.values())
+        self.assertFalse(os.path.exists(terminado))
+        self.assertTrue(os.path.exists(os.path.join(directorio, prometheus.ARCHIVO_ACUMULADO)))
+
+    def test_indicadores_negocio_no_dependen_de_escrituras(self):
+        prometheus.indicadores_negocio()
+        Producto.objects.create(nombre='Producto', cantidad=1, precio=1000)
+        with self.assertNumQueries(0):
+            prometheus.indicadores_negocio()
+
+
+class PerfiladorOcupadoTest(TestCase):
+    """Con otro perfilador activo (Python 3.12+) la petición se atiende sin perfilar"""
+
+    def test_atiende_sin_perfilar(self):
+        request = RequestFactory().get('/')
+        hilos = threading.active_count()
+        ocupado = ValueError('Another profiling tool is already active')
+        with mock.patch.object(cProfile.Profile, 'enable', side_effect=ocupado):
+            respuesta = perfilador.perfilar(request, lambda request: HttpResponse('ok'), 'manual')
+        self.assertEqual(respuesta.content, b'ok')
+        self.assertNotIn('X-Perfil', respuesta)
+        # El muestreador quedó detenido
+        self.assertEqual(threading.active_count(), hilos)
+
+
+class IndiceBusquedaTest(TestCase):
+    """Los documentos del buscador siguen a los datos de otros modelos que muestran"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Caja')
+        cls.empleado = Empleado.objects.create(nombre='Ana', email='ana@gmail.com')
+        cls.proveedor = Proveedores.objects.create(nombre='Proveedor Uno')
+        cls.insumo = ProductoProveedor.objects.create(proveedor=cls.proveedor, nombre='Insumo', codigo_producto='INS-1')
+
+    def _documento(self, tipo, objeto_id):
+        return DocumentoBusqueda.objects.get(tipo=tipo, objeto_id=objeto_id)
+
+    def test_empleado_sigue_a_sus_especialidades(self):
+        self.empleado.especialidades.add(self.especialidad)
+        self.assertEqual(self._documento('empleado', self.empleado.pk).detalle, 'Caja')
+        self.especialidad.nombre = 'Bodega'
+        self.especialidad.save()
+        self.assertEqual(self._documento('empleado', self.empleado.pk).detalle, 'Bodega')
+        self.especialidad.delete()
+        self.assertEqual(self._documento('empleado', self.empleado.pk).detalle, '')
+
+    def test_proveedor_reindexa_productos_solo_si_cambia_el_nombre(self):
+        documento = self._documento('producto_proveedor', self.insumo.pk)
+        self.proveedor.ciudad = 'Talca'
+        self.proveedor.save()
+        self.assertEqual(self._documento('producto_proveedor', self.insumo.pk).pk, documento.pk)
+        self.assertIn('Talca', self._documento('proveedor', self.proveedor.pk).detalle)
+
+        self.proveedor.nombre = 'Proveedor Renombrado'
+        self.proveedor.save()
+        self.assertIn('Proveedor Renombrado', self._documento('producto_proveedor', self.insumo.pk).detalle)
+        self.assertEqual(indice_busqueda.indexar(self.proveedor), 'Proveedor Renombrado')
+
+
+class PaginadorKeysetTest(TestCase):
+    """Navegación por cursor, cursores inválidos y paginación por desplazamiento"""
+
+    ORDEN = ['nombre', 'id']
+
+    @classmethod
+    def setUpTestData(cls):
+        # Nombres repetidos: el id desempata y ninguna fila se repite ni se pierde entre páginas
+        for numero in range(7):
+            Producto.objects.create(nombre=f'Producto {numero // 2}', cantidad=numero, precio=1000 - numero)
+        cls.ids = list(Producto.objects.order_by(*cls.ORDEN).values_list('id', flat=True))
+
+    def _paginador(self, queryset=None):
+        return paginacion.PaginadorKeyset(queryset if queryset is not None else Producto.objects.all(), 3, self.ORDEN)
+
+    def _ids(self, pagina):
+        return [producto.id for producto in pagina]
+
+    def test_pagina_siguiente(self):
+        primera = self._paginador().pagina()
+        self.assertEqual(self._ids(primera), self.ids[:3])
+        self.assertEqual(primera.number, 1)
+        self.assertFalse(primera.has_previous())
+        self.assertTrue(primera.has_next())
+
+        # Una consulta por página, sin COUNT
+        with self.assertNumQueries(1):
+            segunda = self._paginador().pagina(primera.cursor_siguiente)
+        self.assertEqual(self._ids(segunda), self.ids[3:6])
+        self.assertEqual(segunda.number, 2)
+        self.assertTrue(segunda.has_previous())
+
+        tercera = self._paginador().pagina(segunda.cursor_siguiente)
+        self.assertEqual(self._ids(tercera), self.ids[6:])
+        self.assertEqual(tercera.number, 3)
+        self.assertFalse(tercera.has_next())
+        self.assertIsNone(tercera.cursor_siguiente)
+
+    def test_pagina_anterior(self):
+        segunda = self._paginador().pagina(self._paginador().pagina().cursor_siguiente)
+        tercera = self._paginador().pagina(segunda.cursor_siguiente)
+
+        anterior = self._paginador().pagina(tercera.cursor_anterior)
+        self.assertEqual(self._ids(anterior), self.ids[3:6])
+        self.assertEqual(anterior.number, 2)
+        self.assertTrue(anterior.has_previous())
+        self.assertTrue(anterior.has_next())
+
+        primera = self._paginador().pagina(anterior.cursor_anterior)
+        self.assertEqual(self._ids(primera), self.ids[:3])
+        self.assertEqual(primera.number, 1)
+        self.assertFalse(primera.has_previous())
+
+    def test_ultima_pagina(self):
+        ultima = self._paginador().pagina(paginacion.codificar({'u': 1}))
+        self.assertEqual(self._ids(ultima), self.ids[-3:])
+        self.assertEqual(ultima.number, 3)
+        self.assertFalse(ultima.has_next())
+        self.assertTrue(ultima.has_previous())
+        # Desde la última se puede volver sin saltarse filas
+        anterior = self._paginador().pagina(ultima.cursor_anterior)
+        self.assertEqual(self._ids(anterior), self.ids[1:4])
+
+    def test_cota_sobre_la_primera_columna(self):
+        # Sin la cota la consulta recorre el índice desde el inicio y filtra: O(desplazamiento)
+        primera = self._paginador().pagina()
+        with CaptureQueriesContext(connection) as consultas:
+            self._paginador().pagina(primera.cursor_siguiente)
+        tabla = Producto._meta.db_table
+        self.assertIn(f'WHERE ("{tabla}"."nombre" >= ', consultas[0]['sql'])
+
+        queryset = Producto.objects.filter(paginacion._despues_de(['-precio', '-id'], [995, self.ids[0]]))
+        self.assertIn(f'"{tabla}"."precio" <= ', str(queryset.query).split(' OR ')[0])
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        cursores = [
+            'no es base64 !!',
+            paginacion.codificar([1, 2]),
+            paginacion.codificar({'v': ['Producto 1']}),
+            paginacion.codificar({'v': [None, self.ids[2]], 'd': 's', 'p': 2}),
+            paginacion.codificar({'v': ['Producto 1', 'no-es-un-id'], 'd': 's', 'p': 2}),
+        ]
+        for cursor in cursores:
+            with self.subTest(cursor=cursor):
+                pagina = self._paginador().pagina(cursor)
+                self.assertEqual(self._ids(pagina), self.ids[:3])
+                self.assertEqual(pagina.number, 1)
+                self.assertFalse(pagina.has_previous())
+
+    def test_desplazamiento_con_orden_propio(self):
+        # Un orden distinto al del paginador (p. ej. relevancia) pagina por OFFSET
+        queryset = Producto.objects.order_by('-precio')
+        ids = list(queryset.values_list('id', flat=True))
+        paginador = self._paginador(queryset)
+        self.assertTrue(paginador.por_desplazamiento)
+
+        primera = paginador.pagina()
+        self.assertEqual(self._ids(primera), ids[:3])
+        self.assertEqual(paginacion.decodificar(primera.cursor_siguiente), {'o': 3})
+
+        segunda = self._paginador(queryset).pagina(primera.cursor_siguiente)
+        self.assertEqual(self._ids(segunda), ids[3:6])
+        self.assertEqual(segunda.number, 2)
+
+        ultima = self._paginador(queryset).pagina(paginacion.codificar({'u': 1}))
+        self.assertEqual(self._ids(ultima), ids[6:])
+        self.assertEqual(ultima.number, 3)
+        self.assertFalse(ultima.has_next())
+
+        # Un desplazamiento negativo o de otro tipo vuelve al inicio
+        for cursor in (paginacion.codificar({'o': -3}), paginacion.codificar({'o': '3'})):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self._ids(self._paginador(queryset).pagina(cursor)), ids[:3])
+
+
+def _png(color):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (40, 40), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class MediaPorContenidoTest(TestCase):
+    """Archivos compartidos por contenido: borrado por referencias y media_gc"""
+
+    def setUp(self):
+        raiz = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, raiz, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=raiz, MEDIA_GRACIA_SEGUNDOS=0, IMAGENES_VARIANTES_SINCRONO=True)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _producto(self, nombre, **campos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Producto.objects.create(nombre=nombre, cantidad=1, precio=1000, **campos)
+
+    def _envejecer(self, nombre):
+        os.utime(default_storage.path(nombre), (0, 0))
+
+    def test_archivo_compartido_se_borra_con_la_ultima_referencia(self):
+        uno = self._producto('Uno', imagen=SimpleUploadedFile('uno.png', _png('red')))
+        dos = self._producto('Dos', imagen=SimpleUploadedFile('dos.png', _png('red')))
+        self.assertEqual(uno.imagen.name, dos.imagen.name)
+        self.assertTrue(uno.imagen.name.startswith('contenido/'))
+        uno.refresh_from_db()
+        variantes = [variante['ruta'] for variante in uno.imagen_variantes.values() if isinstance(variante, dict)]
+        self.assertTrue(variantes)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            uno.delete()
+        for nombre in [dos.imagen.name] + variantes:
+            self.assertTrue(default_storage.exists(nombre), nombre)
+
+        dos.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            dos.delete()
+        for nombre in [dos.imagen.name] + variantes:
+            self.assertFalse(default_storage.exists(nombre), nombre)
+
+    def test_reutilizar_un_archivo_lo_protege_del_borrado(self):
+        nombre = default_storage.save('libros/uno.png', ContentFile(_png('blue')))
+        self._envejecer(nombre)
+        # Otro registro, aún sin confirmar, sube el mismo contenido
+        self.assertEqual(default_storage.save('libros/otro.png', ContentFile(_png('blue'))), nombre)
+        with self.settings(MEDIA_GRACIA_SEGUNDOS=60):
+            default_storage.delete(nombre)
+        self.assertTrue(default_storage.exists(nombre))
+
+    def _archivo_viejo(self, nombre, contenido):
+        ruta = default_storage.path(nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as archivo:
+            archivo.write(contenido)
+        self._envejecer(nombre)
+
+    def test_media_gc(self):
+        self._archivo_viejo('libros/antigua.png', _png('green'))
+        self._archivo_viejo('huerfano.txt', b'viejo')
+        producto = self._producto('Antiguo')
+        Producto.objects.filter(pk=producto.pk).update(imagen='libros/antigua.png')
+        # Recién subido: su registro puede no estar confirmado todavía
+        nueva = default_storage.save('libros/nueva.png', ContentFile(_png('white')))
+
+        call_command('media_gc', gracia_minutos=10, stdout=StringIO())
+
+        producto.refresh_from_db()
+        self.assertTrue(producto.imagen.name.startswith('contenido/'))
+        self.assertTrue(default_storage.exists(producto.imagen.name))
+        self.assertFalse(default_storage.exists('libros/antigua.png'))
+        self.assertFalse(default_storage.exists('huerfano.txt'))
+        self.assertTrue(default_storage.exists(nueva))
+
+    def test_media_gc_revertido_conserva_los_originales(self):
+        self._archivo_viejo('libros/antigua.png', _png('green'))
+        producto = self._producto('Antiguo')
+        Producto.objects.filter(pk=producto.pk).update(imagen='libros/antigua.png')
+        original = media_gc.Command._deduplicar_modelo
+
+        def fallar_despues_de_producto(comando, modelo, *args):
+            if modelo is not Producto:
+                raise RuntimeError('falla a mitad de la transacción')
+            return original(comando, modelo, *args)
+
+        with mock.patch.object(media_gc.Command, '_deduplicar_modelo', fallar_despues_de_producto):
+            with self.assertRaises(RuntimeError):
+                call_command('media_gc', stdout=StringIO())
+        producto.refresh_from_db()
+        self.assertEqual(producto.imagen.name, 'libros/antigua.png')
+        self.assertTrue(default_storage.exists('libros/antigua.png'))
+
+    def test_servir_media_por_rangos(self):
+        nombre = default_storage.save('otros/datos.bin', ContentFile(bytes(range(100))))
+        url = settings.MEDIA_URL + nombre
+
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+        response.close()
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(95, 100)))
+        response.close()
+
+        response = self.client.get(url, HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
@@ -1,7 +1,8 @@
+import re
+
 from . import views
 from django.conf import settings
-from django.contrib.staticfiles.urls import static
-from django.urls import path
+from django.urls import path, re_path
 
 urlpatterns = [
     path('login/', views.user_login, name='login'),
@@ -44,6 +45,13 @@ urlpatterns = [
     
     # Panel administrador (no usar prefijo 'admin/' para evitar conflicto con el admin de Django)
     path('panel-admin/', views.admin_panel, name='admin_panel'),
+    path('panel-admin/metricas/', views.metricas_panel, name='metricas_panel'),
+    path('metrics', views.metricas_prometheus, name='metricas_prometheus'),
+    path('panel-admin/perfiles/', views.perfiles_lista, name='perfiles_lista'),
+    path('panel-admin/perfiles/<int:id>/', views.perfil_detalle, name='perfil_detalle'),
+    path('panel-admin/perfiles/<int:id>/<str:formato>/', views.perfil_descargar, name='perfil_descargar'),
+    path('panel-admin/consultas-lentas/', views.consultas_lentas_lista, name='consultas_lentas_lista'),
+    path('panel-admin/consultas-lentas/<str:huella>/', views.consulta_lenta_detalle, name='consulta_lenta_detalle'),
     path('historial-completo/', views.historial_completo, name='historial_completo'),
     path('admin/upload-avatar/', views.upload_avatar, name='upload_avatar'),
     path('servicios/horas-ocupadas/', views.obtener_horas_ocupadas, name='obtener_horas_ocupadas'),
@@ -86,6 +94,9 @@ urlpatterns = [
     path('inventario/activar/<int:id>/', views.inventario_activar, name='inventario_activar'),
     path('inventario/suspender/<int:id>/', views.inventario_suspender, name='inventario_suspender'),
     path('inventario/toggle-estado/<int:id>/', views.inventario_toggle_estado, name='inventario_toggle_estado'),
+    path('inventario/kardex/', views.kardex, name='kardex'),
+    path('api/reportes/stock-a-fecha/', views.api_stock_a_fecha, name='api_stock_a_fecha'),
+    path('api/reportes/valorizacion-mensual/', views.api_valorizacion_mensual, name='api_valorizacion_mensual'),
     path('api/inventario/productos-proveedor/', views.inventario_productos_proveedor_ajax, name='inventario_productos_proveedor_ajax'),
     path('api/inventario/cantidad-producto-proveedor/', views.inventario_cantidad_producto_proveedor_ajax, name='inventario_cantidad_producto_proveedor_ajax'),
     path('api/entradas/productos-proveedor/', views.entradas_productos_por_proveedor_ajax, name='entradas_productos_por_proveedor_ajax'),
@@ -94,6 +105,8 @@ urlpatterns = [
     # Rutas Zonas (AJAX)
     path('api/zonas/crear/', views.zona_crear_ajax, name='zona_crear_ajax'),
     path('api/zonas/lista/', views.zonas_lista_ajax, name='zonas_lista_ajax'),
+    path('api/buscar/', views.api_buscar, name='api_buscar'),
+    path('api/autocompletar/<str:modelo>/', views.api_autocompletar, name='api_autocompletar'),
     
     # Rutas Auditoría de Inventario
     path('auditoria/', views.auditoria_lista, name='auditoria_lista'),
@@ -107,4 +120,6 @@ urlpatterns = [
     path('api/auditoria/marcar-revisado/<int:detalle_id>/', views.auditoria_marcar_revisado, name='auditoria_marcar_revisado'),
     path('api/auditoria/actualizar-conteo/<int:detalle_id>/', views.auditoria_actualizar_conteo_ajax, name='auditoria_actualizar_conteo_ajax'),
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Media (imágenes subidas): ETag, Cache-Control, Range y X-Accel-Redirect
+    re_path(r'^%s(?P<ruta>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), views.servir_media, name='servir_media'),
+]
\ No newline at end of file
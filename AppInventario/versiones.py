@@ -0,0 +1,95 @@
+"""
+Contadores de versión de datos por modelo (tabla VersionDatos).
+
+Las señales de signals.py llaman a marcar_cambio() en cada save/delete; el
+incremento se aplica al confirmar la transacción (una sola vez por modelo y
+transacción) para no bloquear la fila del contador mientras dura la escritura.
+Las cachés y ETags se construyen a partir de obtener_versiones().
+"""
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from django.db.models import F
+
+from .models import VersionDatos
+
+# Modelos que no se versionan (tablas internas o de solo lectura para reportes)
+MODELOS_EXCLUIDOS = {
+    'AppInventario.versiondatos',
+    'AppInventario.snapshotinventario',
+    'AppInventario.perfilpeticion',
+    'AppInventario.consultalenta',
+    'AppInventario.documentobusqueda',
+}
+
+
+def etiqueta_modelo(modelo):
+    """Etiqueta usada como clave del contador (p. ej. 'AppInventario.producto')"""
+    return modelo._meta.label_lower
+
+
+def incrementar_versiones(etiquetas):
+    """Incrementa los contadores indicados creando los que no existan"""
+    etiquetas = sorted(set(etiquetas))
+    if not etiquetas:
+        return
+    VersionDatos.objects.bulk_create(
+        [VersionDatos(modelo=etiqueta) for etiqueta in etiquetas],
+        ignore_conflicts=True,
+    )
+    VersionDatos.objects.filter(modelo__in=etiquetas).update(version=F('version') + 1)
+
+
+def _confirmar_pendientes():
+    conexion = transaction.get_connection()
+    etiquetas = getattr(conexion, 'versiones_pendientes', None) or set()
+    conexion.versiones_pendientes = None
+    conexion.versiones_callbacks = None
+    incrementar_versiones(etiquetas)
+
+
+def marcar_cambio(modelo):
+    """Registra que `modelo` cambió; el contador se incrementa al hacer commit"""
+    etiqueta = etiqueta_modelo(modelo)
+    if etiqueta in MODELOS_EXCLUIDOS:
+        return
+
+    conexion = transaction.get_connection()
+    if not conexion.in_atomic_block:
+        incrementar_versiones([etiqueta])
+        return
+
+    # `versiones_callbacks` es la lista de callbacks de la conexión cuando se
+    # registró _confirmar_pendientes. Django la reemplaza al confirmar, al
+    # revertir y al revertir un savepoint: si ya no es la misma, el callback pudo
+    # descartarse y se registra otro. Todos vacían el mismo conjunto, así que
+    # un callback de más no incrementa dos veces.
+    if getattr(conexion, 'versiones_callbacks', None) is not conexion.run_on_commit:
+        if getattr(conexion, 'versiones_pendientes', None) is None:
+            conexion.versiones_pendientes = set()
+        transaction.on_commit(_confirmar_pendientes)
+        conexion.versiones_callbacks = conexion.run_on_commit
+    conexion.versiones_pendientes.add(etiqueta)
+
+
+def obtener_versiones(etiquetas):
+    """Retorna {etiqueta: version} con una sola consulta (0 si nunca cambió)"""
+    versiones = dict.fromkeys(etiquetas, 0)
+    versiones.update(VersionDatos.objects.filter(modelo__in=list(etiquetas)).values_list('modelo', 'version'))
+    return versiones
+
+
+def en_cache(clave, modelos, calcular, timeout=DEFAULT_TIMEOUT):
+    """
+    Resultado de calcular() guardado en la caché mientras no cambie ninguno de
+    `modelos`. Con la caché caliente cuesta una consulta (las versiones).
+    """
+    etiquetas = sorted(etiqueta_modelo(modelo) for modelo in modelos)
+    versiones = obtener_versiones(etiquetas)
+    firma = '.'.join(str(versiones[etiqueta]) for etiqueta in etiquetas)
+    clave = f'versionado:{clave}:{firma}'
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave, valor, timeout)
+    return valor
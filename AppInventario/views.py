@@ -8,7 +8,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_http_methods
-from django.db.models import Count, Q, F
+from django.db.models import Count, DecimalField, Q, F, Prefetch, Sum, Avg, Max, prefetch_related_objects
 from django.db import transaction
 from django.utils import timezone
 from django.utils.timezone import make_aware, is_naive, localtime
@@ -23,6 +23,14 @@ def _normalize_timestamp(value):
     return localtime(value)
 
 
+def _inicio_del_dia(fecha):
+    """
+    Medianoche local de `fecha` como datetime aware. Filtrar un DateTimeField con
+    un rango desde/hasta esta hora (en vez de __date) permite usar sus índices.
+    """
+    return make_aware(datetime.combine(fecha, datetime.min.time()))
+
+
 def registrar_accion_historial(accion, tipo_modelo, nombre_objeto, usuario=None, descripcion=None, objeto_id=None):
     """
     Función helper para registrar una acción en el historial del sistema.
@@ -95,10 +103,33 @@ def _get_recent_system_activity():
     
     return eventos
 from datetime import date, datetime, timedelta
+import csv
+import hashlib
+import hmac
+import io
 import json
 
-from .models import Producto, Proveedores, ServicioRealizado, Compras, Servicio, Empleado, Especialidad, Cargo, ProductoProveedor, EntradaInventario, SolicitudCompra, Zona, AuditoriaInventario, DetalleAuditoria, EmpleadoHistorial, HistorialAccion
+import mimetypes
+import os
+import posixpath
+import pstats
+import re
+from collections import Counter
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.text import slugify
+from django.views.decorators.http import require_safe
+
+from .models import Producto, Proveedores, ServicioRealizado, Compras, Servicio, Empleado, Especialidad, Cargo, ProductoProveedor, EntradaInventario, SolicitudCompra, Zona, AuditoriaInventario, DetalleAuditoria, EmpleadoHistorial, HistorialAccion, PerfilPeticion, ConsultaLenta, DocumentoBusqueda
 from .forms import ProductoForm, EmpleadoForm, ProductoProveedorForm, EntradaInventarioForm, SolicitudCompraForm, VerificacionRecepcionForm, AuditoriaInventarioForm, DetalleAuditoriaForm
+from . import busqueda, catalogos, indice_busqueda, metricas, paginacion, precarga, prometheus, reportes, versiones
+from .decorators import fragmento_cacheado, usar_replica
 from django.contrib.auth.models import User
 from django.contrib.auth import login as auth_login
 
@@ -374,6 +405,8 @@ def password_reset_confirm(request):
 # ========== CRUD EMPLEADOS (ADMIN) ==========
 
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(Empleado, Cargo, Especialidad)
 def estilistas_lista(request):
     if not request.user.is_staff:
         messages.error(request, 'Acceso denegado')
@@ -388,31 +421,20 @@ def estilistas_lista(request):
                 return redirect('admin_panel')
         except Empleado.DoesNotExist:
             pass  # Si no es empleado, permitir acceso (es staff)
-    estilistas = Empleado.objects.all().order_by('nombre', 'apellido')
+    estilistas = precarga.aplicar('estilistas_lista', Empleado.objects.all()).order_by('nombre', 'id')
     
     # Filtros
     nombre_filtro = request.GET.get('nombre', '').strip()
     cargo_filtro = request.GET.get('cargo', '').strip()
     
     if nombre_filtro:
-        estilistas = estilistas.filter(
-            Q(nombre__icontains=nombre_filtro) | 
-            Q(apellido__icontains=nombre_filtro) |
-            Q(email__icontains=nombre_filtro)
-        )
+        estilistas = busqueda.filtrar(estilistas, ['nombre', 'apellido', 'email'], nombre_filtro)
     
     if cargo_filtro:
-        estilistas = estilistas.filter(cargo__nombre__icontains=cargo_filtro)
+        estilistas = busqueda.filtrar(estilistas, ['cargo__nombre'], cargo_filtro, ordenar=False)
     
-    # Paginación - 7 elementos por página
-    paginator = Paginator(estilistas, 7)
-    page = request.GET.get('page', 1)
-    try:
-        estilistas = paginator.page(page)
-    except PageNotAnInteger:
-        estilistas = paginator.page(1)
-    except EmptyPage:
-        estilistas = paginator.page(paginator.num_pages)
+    # Paginación por cursor - 7 elementos por página
+    estilistas = paginacion.paginar(request, estilistas, ['nombre', 'id'], 7)
     
     context = {
         'estilistas': estilistas,
@@ -814,6 +836,8 @@ def estilistas_eliminar(request, id):
 # ========== CRUD ESPECIALIDADES ==========
 
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(Especialidad, Empleado)
 def especialidades_lista(request):
     """Lista de especialidades disponibles."""
     if not request.user.is_staff:
@@ -843,6 +867,7 @@ def especialidades_lista(request):
         
         especialidades = Especialidad.objects.all().order_by('nombre')
     
+    # cantidad_empleados es una columna de la especialidad, mantenida por las señales (contadores.py)
     # Paginación - 6 elementos por página
     paginator = Paginator(especialidades, 6)
     page = request.GET.get('page', 1)
@@ -853,14 +878,6 @@ def especialidades_lista(request):
     except EmptyPage:
         especialidades = paginator.page(paginator.num_pages)
     
-    # Contar empleados por especialidad
-    for especialidad in especialidades:
-        # Usar empleado_set porque es el related_name por defecto de ManyToManyField
-        try:
-            especialidad.cantidad_empleados = especialidad.empleado_set.count()
-        except Exception:
-            especialidad.cantidad_empleados = 0
-    
     return render(request, 'especialidades/index.html', {'especialidades': especialidades})
 
 
@@ -1028,11 +1045,11 @@ def especialidades_eliminar(request, id):
     
     if request.method == 'POST':
         nombre = especialidad.nombre
-        # Verificar si hay empleados con esta especialidad
-        try:
+        # Verificar si hay empleados con esta especialidad; EXISTS por si la
+        # columna quedó desfasada (ver contadores.py)
+        cantidad_empleados = especialidad.cantidad_empleados
+        if not cantidad_empleados and especialidad.empleado_set.exists():
             cantidad_empleados = especialidad.empleado_set.count()
-        except Exception:
-            cantidad_empleados = 0
         
         if cantidad_empleados > 0:
             messages.error(request, f'No se puede eliminar la especialidad "{nombre}" porque tiene {cantidad_empleados} empleado(s) asignado(s). Primero desasigna la especialidad de los empleados.')
@@ -1056,20 +1073,17 @@ def especialidades_eliminar(request, id):
         return redirect('especialidades_lista')
     
     # GET: mostrar confirmación
-    try:
-        cantidad_empleados = especialidad.empleado_set.count()
-    except Exception:
-        cantidad_empleados = 0
-    
     return render(request, 'especialidades/eliminar_confirm.html', {
         'especialidad': especialidad,
-        'cantidad_empleados': cantidad_empleados
+        'cantidad_empleados': especialidad.cantidad_empleados
     })
 
 
 # ========== CRUD CARGOS ==========
 
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(Cargo, Empleado)
 def cargos_lista(request):
     """Lista de cargos disponibles. Solo para superusuarios."""
     if not request.user.is_staff:
@@ -1081,6 +1095,7 @@ def cargos_lista(request):
         messages.error(request, 'Solo los administradores pueden gestionar roles y permisos')
         return redirect('admin_panel')
     
+    # cantidad_empleados es una columna del cargo, mantenida por las señales (contadores.py)
     cargos = Cargo.objects.all().order_by('nombre')
     
     # Paginación - 6 elementos por página
@@ -1093,13 +1108,6 @@ def cargos_lista(request):
     except EmptyPage:
         cargos = paginator.page(paginator.num_pages)
     
-    # Contar empleados por cargo
-    for cargo in cargos:
-        try:
-            cargo.cantidad_empleados = cargo.empleados.count()
-        except Exception:
-            cargo.cantidad_empleados = 0
-    
     # Verificar si es petición AJAX
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return render(request, 'cargos/index_fragment.html', {'cargos': cargos})
@@ -1289,11 +1297,11 @@ def cargos_eliminar(request, id):
     
     if request.method == 'POST':
         nombre = cargo.nombre
-        # Verificar si hay empleados con este cargo
-        try:
+        # Verificar si hay empleados con este cargo; EXISTS por si la columna
+        # quedó desfasada (ver contadores.py)
+        cantidad_empleados = cargo.cantidad_empleados
+        if not cantidad_empleados and cargo.empleados.exists():
             cantidad_empleados = cargo.empleados.count()
-        except Exception:
-            cantidad_empleados = 0
         
         if cantidad_empleados > 0:
             messages.error(request, f'No se puede eliminar el cargo "{nombre}" porque tiene {cantidad_empleados} empleado(s) asignado(s). Primero cambia el cargo de los empleados.')
@@ -1317,14 +1325,9 @@ def cargos_eliminar(request, id):
         return redirect('cargos_lista')
     
     # GET: mostrar confirmación
-    try:
-        cantidad_empleados = cargo.empleados.count()
-    except Exception:
-        cantidad_empleados = 0
-    
     return render(request, 'cargos/eliminar_confirm.html', {
         'cargo': cargo,
-        'cantidad_empleados': cantidad_empleados
+        'cantidad_empleados': cargo.cantidad_empleados
     })
 
 
@@ -1436,6 +1439,8 @@ def admin_panel(request):
 
 
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(HistorialAccion, User)
 def historial_completo(request):
     """Vista para mostrar el historial completo de acciones del sistema con paginación y filtros."""
     if not request.user.is_staff:
@@ -1443,7 +1448,7 @@ def historial_completo(request):
         return redirect('inicio')
     
     # Obtener todas las acciones del historial
-    acciones = HistorialAccion.objects.select_related('usuario').order_by('-fecha')
+    acciones = HistorialAccion.objects.select_related('usuario').order_by('-fecha', '-id')
     
     # Filtros
     fecha_desde = request.GET.get('fecha_desde', '').strip()
@@ -1456,7 +1461,7 @@ def historial_completo(request):
     if fecha_desde:
         try:
             fecha_desde_obj = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-            acciones = acciones.filter(fecha__date__gte=fecha_desde_obj)
+            acciones = acciones.filter(fecha__gte=_inicio_del_dia(fecha_desde_obj))
         except ValueError:
             pass
     
@@ -1465,7 +1470,7 @@ def historial_completo(request):
             fecha_hasta_obj = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
             # Incluir todo el día hasta las 23:59:59
             fecha_hasta_obj = fecha_hasta_obj + timedelta(days=1)
-            acciones = acciones.filter(fecha__date__lt=fecha_hasta_obj)
+            acciones = acciones.filter(fecha__lt=_inicio_del_dia(fecha_hasta_obj))
         except ValueError:
             pass
     
@@ -1482,9 +1487,13 @@ def historial_completo(request):
         except ValueError:
             pass
     
-    # Convertir acciones a formato de eventos para el template
+    # Paginación por cursor - 6 elementos por página. Sin filtros el total se
+    # estima con las estadísticas de la tabla
+    eventos_paginados = paginacion.paginar(request, acciones, ['-fecha', '-id'], 6, estimar=True)
+    
+    # Convertir las acciones de la página a formato de eventos para el template
     eventos = []
-    for accion in acciones:
+    for accion in eventos_paginados:
         timestamp = _normalize_timestamp(accion.fecha)
         if not timestamp:
             continue
@@ -1521,16 +1530,7 @@ def historial_completo(request):
             'tipo_modelo': accion.tipo_modelo,
         })
     
-    # Paginación - 6 elementos por página
-    paginator = Paginator(eventos, 6)
-    page = request.GET.get('page', 1)
-    
-    try:
-        eventos_paginados = paginator.page(page)
-    except PageNotAnInteger:
-        eventos_paginados = paginator.page(1)
-    except EmptyPage:
-        eventos_paginados = paginator.page(paginator.num_pages)
+    eventos_paginados.object_list = eventos
     
     # Obtener opciones para los filtros
     tipos_modelo = HistorialAccion.TipoModelo.choices
@@ -1547,7 +1547,7 @@ def historial_completo(request):
         'tipos_modelo': tipos_modelo,
         'acciones_choices': acciones_choices,
         'usuarios': usuarios,
-        'total_eventos': paginator.count,
+        'total_eventos': eventos_paginados.paginator.count,
     }
     
     # Detectar si es petición AJAX
@@ -1563,7 +1563,7 @@ def servicios_publicos(request):
     """Vista pública para mostrar servicios ofrecidos por la clínica de forma informativa."""
     # Leer servicios desde la base de datos si existen (muestra solo activos)
     # Servicio ya importado a nivel de módulo
-    qs = Servicio.objects.filter(activo=True).order_by('nombre')
+    qs = catalogos.activos(Servicio)
     servicios_info = []
     for s in qs:
         servicios_info.append({
@@ -1758,13 +1758,11 @@ def servicios_crear(request):
         messages.error(request, 'Acceso denegado')
         return redirect('inicio')
 
-    proveedores = Proveedores.objects.all()
-    productos = Producto.objects.all()
-    servicios = Servicio.objects.filter(activo=True)
+    servicios = catalogos.activos(Servicio)
     # Solo empleados con especialidades activas pueden aparecer en crear servicios
     empleados = Empleado.objects.filter(activo=True).annotate(
         num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
-    ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
+    ).filter(num_especialidades__gt=0).distinct().prefetch_related('especialidades').order_by('nombre')
 
     if request.method == 'POST':
         descripcion = request.POST.get('descripcion') or ''
@@ -1793,8 +1791,6 @@ def servicios_crear(request):
             except (Proveedores.DoesNotExist, ValueError):
                 messages.error(request, 'Proveedor seleccionado no válido')
                 return render(request, 'servicios/crear.html', {
-                    'proveedores': proveedores,
-                    'productos': productos,
                     'servicios': servicios,
                     'empleados': empleados,
                 })
@@ -1806,8 +1802,6 @@ def servicios_crear(request):
             except (Producto.DoesNotExist, ValueError):
                 messages.error(request, 'Producto seleccionado no válido')
                 return render(request, 'servicios/crear.html', {
-                    'proveedores': proveedores,
-                    'productos': productos,
                     'servicios': servicios,
                     'empleados': empleados,
                 })
@@ -1821,8 +1815,6 @@ def servicios_crear(request):
             except (Servicio.DoesNotExist, ValueError):
                 messages.error(request, 'Servicio seleccionado no válido')
                 return render(request, 'servicios/crear.html', {
-                    'proveedores': proveedores,
-                    'productos': productos,
                     'servicios': servicios,
                     'empleados': empleados,
                 })
@@ -1836,8 +1828,6 @@ def servicios_crear(request):
             except ValueError:
                 messages.error(request, 'Costo inválido. Debe ser un número.')
                 return render(request, 'servicios/crear.html', {
-                    'proveedores': proveedores,
-                    'productos': productos,
                     'servicios': servicios,
                     'empleados': empleados,
                 })
@@ -1857,8 +1847,6 @@ def servicios_crear(request):
         if missing:
             messages.error(request, 'Faltan datos por ingresar: ' + ', '.join(missing))
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -1875,8 +1863,6 @@ def servicios_crear(request):
                 if fecha_servicio_obj < hoy:
                     messages.error(request, 'La fecha de la cita no puede ser anterior a hoy.')
                     return render(request, 'servicios/crear.html', {
-                        'proveedores': proveedores,
-                        'productos': productos,
                         'servicios': servicios,
                         'empleados': empleados,
                     })
@@ -1884,8 +1870,6 @@ def servicios_crear(request):
                 if fecha_servicio_obj > fecha_maxima:
                     messages.error(request, 'La fecha de la cita no puede ser más de 1 mes en el futuro.')
                     return render(request, 'servicios/crear.html', {
-                        'proveedores': proveedores,
-                        'productos': productos,
                         'servicios': servicios,
                         'empleados': empleados,
                     })
@@ -1895,8 +1879,6 @@ def servicios_crear(request):
                 if dia_semana == 6:
                     messages.error(request, 'Los domingos la clínica está cerrada. Por favor selecciona otro día.')
                     return render(request, 'servicios/crear.html', {
-                        'proveedores': proveedores,
-                        'productos': productos,
                         'servicios': servicios,
                         'empleados': empleados,
                     })
@@ -1911,8 +1893,6 @@ def servicios_crear(request):
                         if not es_valido:
                             messages.error(request, mensaje_error)
                             return render(request, 'servicios/crear.html', {
-                                'proveedores': proveedores,
-                                'productos': productos,
                                 'servicios': servicios,
                                 'empleados': empleados,
                             })
@@ -1950,16 +1930,12 @@ def servicios_crear(request):
                                 hora_minima_str = f"{hora_minima_hora}:{str(hora_minima_minuto).zfill(2)}"
                                 messages.error(request, f'Si la cita es para hoy, la hora debe ser posterior a la hora actual. La hora mínima permitida es {hora_minima_str}.')
                                 return render(request, 'servicios/crear.html', {
-                                    'proveedores': proveedores,
-                                    'productos': productos,
                                     'servicios': servicios,
                                     'empleados': empleados,
                                 })
                     except ValueError:
                         messages.error(request, 'Hora inválida. Formato correcto: HH:MM')
                         return render(request, 'servicios/crear.html', {
-                            'proveedores': proveedores,
-                            'productos': productos,
                             'servicios': servicios,
                             'empleados': empleados,
                         })
@@ -1968,8 +1944,6 @@ def servicios_crear(request):
             except ValueError:
                 messages.error(request, 'Fecha inválida. Formato correcto: YYYY-MM-DD')
                 return render(request, 'servicios/crear.html', {
-                    'proveedores': proveedores,
-                    'productos': productos,
                     'servicios': servicios,
                     'empleados': empleados,
                 })
@@ -1978,8 +1952,6 @@ def servicios_crear(request):
         if fecha_val is None:
             messages.error(request, 'La fecha del servicio es obligatoria')
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -1988,8 +1960,6 @@ def servicios_crear(request):
         if servicio_obj is None:
             messages.error(request, 'Debe seleccionar un servicio')
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -1998,8 +1968,6 @@ def servicios_crear(request):
         if not empleado_id or str(empleado_id).strip() == '':
             messages.error(request, 'Debe seleccionar un estilista')
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -2019,16 +1987,12 @@ def servicios_crear(request):
                 if not tiene_especialidad:
                     messages.error(request, f'El empleado seleccionado no tiene las especialidades requeridas para realizar el servicio "{servicio_obj.nombre}".')
                     return render(request, 'servicios/crear.html', {
-                        'proveedores': proveedores,
-                        'productos': productos,
                         'servicios': servicios,
                         'empleados': empleados,
                     })
         except (Empleado.DoesNotExist, ValueError):
             messages.error(request, 'Estilista seleccionado no válido')
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -2037,8 +2001,6 @@ def servicios_crear(request):
         if estilista_obj is None:
             messages.error(request, 'No se pudo obtener el estilista seleccionado')
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -2079,8 +2041,6 @@ def servicios_crear(request):
         if not nombre_cliente or nombre_cliente.strip() == '':
             messages.error(request, 'El nombre del cliente es obligatorio')
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -2089,8 +2049,6 @@ def servicios_crear(request):
         if not email_cliente or email_cliente.strip() == '':
             messages.error(request, 'El email del cliente es obligatorio')
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -2099,8 +2057,6 @@ def servicios_crear(request):
         if not telefono_cliente or telefono_cliente.strip() == '':
             messages.error(request, 'El teléfono del cliente es obligatorio')
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -2128,8 +2084,6 @@ def servicios_crear(request):
             if cita_existente:
                 messages.error(request, f'El especialista {estilista_obj.nombre} ya tiene una cita agendada para el {fecha_val.strftime("%d/%m/%Y")} a las {hora_obj_final.strftime("%H:%M")}. Por favor selecciona otra fecha u hora.')
                 return render(request, 'servicios/crear.html', {
-                    'proveedores': proveedores,
-                    'productos': productos,
                     'servicios': servicios,
                     'empleados': empleados,
                 })
@@ -2157,8 +2111,6 @@ def servicios_crear(request):
             logger.error(f'Error al crear servicio: {traceback.format_exc()}')
             
             return render(request, 'servicios/crear.html', {
-                'proveedores': proveedores,
-                'productos': productos,
                 'servicios': servicios,
                 'empleados': empleados,
                 'clientes': clientes_activos
@@ -2166,8 +2118,6 @@ def servicios_crear(request):
         return redirect('admin_panel')
     
     return render(request, 'servicios/crear.html', {
-        'proveedores': proveedores,
-        'productos': productos,
         'servicios': servicios,
         'empleados': empleados,
         'clientes': clientes_activos
@@ -2195,13 +2145,16 @@ def _preparar_contexto_agendar(empleados, servicios, admin_mode=False):
             'especialidades_ids': especialidades_ids
         })
     
+    # Especialidades activas de todos los empleados en una sola consulta
+    empleados = list(empleados)
+    prefetch_related_objects(empleados, Prefetch('especialidades', queryset=Especialidad.objects.filter(activo=True), to_attr='especialidades_activas'))
     empleados_json = []
     for empleado in empleados:
         empleados_json.append({
             'id': empleado.id,
             'nombre': empleado.nombre + (' ' + empleado.apellido if empleado.apellido else ''),
-            'especialidades_ids': list(empleado.especialidades.filter(activo=True).values_list('id', flat=True)),
-            'especialidades': ', '.join([esp.nombre for esp in empleado.especialidades.filter(activo=True)[:3]])
+            'especialidades_ids': [esp.id for esp in empleado.especialidades_activas],
+            'especialidades': ', '.join([esp.nombre for esp in empleado.especialidades_activas[:3]])
         })
     
     return {
@@ -2248,7 +2201,7 @@ def agendar_cita(request):
             empleados = Empleado.objects.filter(activo=True).annotate(
                 num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
             ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-            servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+            servicios = catalogos.activos(Servicio)
             return render(request, 'servicios/agendar.html', _preparar_contexto_agendar(empleados, servicios, False))
         # Validación servidor: evitar pasar cadena vacía a DateField/hora
         if not fecha_servicio or fecha_servicio.strip() == '' or not hora or hora.strip() == '':
@@ -2258,7 +2211,7 @@ def agendar_cita(request):
             empleados = Empleado.objects.filter(activo=True).annotate(
                 num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
             ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-            servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+            servicios = catalogos.activos(Servicio)
             return render(request, 'servicios/agendar.html', _preparar_contexto_agendar(empleados, servicios, False))
         
         # Validar fecha: debe ser desde hoy hasta máximo 1 mes
@@ -2273,7 +2226,7 @@ def agendar_cita(request):
                     empleados = Empleado.objects.filter(activo=True).annotate(
                         num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                     ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                    servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                    servicios = catalogos.activos(Servicio)
                     cliente_prefill = None
                     try:
                         cliente_prefill = request.user.cliente
@@ -2286,7 +2239,7 @@ def agendar_cita(request):
                     empleados = Empleado.objects.filter(activo=True).annotate(
                         num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                     ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                    servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                    servicios = catalogos.activos(Servicio)
                     cliente_prefill = None
                     try:
                         cliente_prefill = request.user.cliente
@@ -2301,7 +2254,7 @@ def agendar_cita(request):
                     empleados = Empleado.objects.filter(activo=True).annotate(
                         num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                     ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                    servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                    servicios = catalogos.activos(Servicio)
                     cliente_prefill = None
                     try:
                         cliente_prefill = request.user.cliente
@@ -2321,7 +2274,7 @@ def agendar_cita(request):
                             empleados = Empleado.objects.filter(activo=True).annotate(
                                 num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                             ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                            servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                            servicios = catalogos.activos(Servicio)
                             cliente_prefill = None
                             try:
                                 cliente_prefill = request.user.cliente
@@ -2331,7 +2284,7 @@ def agendar_cita(request):
                             empleados = Empleado.objects.filter(activo=True).annotate(
                                 num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                             ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                            servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                            servicios = catalogos.activos(Servicio)
                             cliente_prefill = None
                             try:
                                 cliente_prefill = request.user.cliente
@@ -2371,7 +2324,7 @@ def agendar_cita(request):
                                 empleados = Empleado.objects.filter(activo=True).annotate(
                                     num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                                 ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                                servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                                servicios = catalogos.activos(Servicio)
                                 cliente_prefill = None
                                 try:
                                     cliente_prefill = request.user.cliente
@@ -2383,7 +2336,7 @@ def agendar_cita(request):
                         empleados = Empleado.objects.filter(activo=True).annotate(
                             num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                         ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                        servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                        servicios = catalogos.activos(Servicio)
                         cliente_prefill = None
                         try:
                             cliente_prefill = request.user.cliente
@@ -2395,7 +2348,7 @@ def agendar_cita(request):
                 empleados = Empleado.objects.filter(activo=True).annotate(
                     num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                 ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                servicios = catalogos.activos(Servicio)
                 cliente_prefill = None
                 try:
                     cliente_prefill = request.user.cliente
@@ -2438,7 +2391,7 @@ def agendar_cita(request):
                 empleados = Empleado.objects.filter(activo=True).annotate(
                     num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                 ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                servicios = catalogos.activos(Servicio)
                 cliente_prefill = None
                 try:
                     cliente_prefill = request.user.cliente
@@ -2464,7 +2417,7 @@ def agendar_cita(request):
                     empleados = Empleado.objects.filter(activo=True).annotate(
                         num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                     ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                    servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                    servicios = catalogos.activos(Servicio)
                     cliente_prefill = None
                     try:
                         cliente_prefill = request.user.cliente
@@ -2499,7 +2452,7 @@ def agendar_cita(request):
                 empleados = Empleado.objects.filter(activo=True).annotate(
                     num_especialidades=Count('especialidades', filter=Q(especialidades__activo=True))
                 ).filter(num_especialidades__gt=0).distinct().order_by('nombre')
-                servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                servicios = catalogos.activos(Servicio)
                 return render(request, 'servicios/agendar.html', _preparar_contexto_agendar(empleados, servicios, False))
             # re-raise unexpected exceptions
             raise
@@ -2565,7 +2518,7 @@ def servicios_editar(request, id):
             empleados = Empleado.objects.filter(activo=True).order_by('nombre')
             if servicio.estilista and servicio.estilista not in empleados:
                 empleados = list(empleados) + [servicio.estilista]
-            servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+            servicios = catalogos.activos(Servicio)
             return render(request, 'servicios/editar.html', {
                 'servicio': servicio,
                 'empleados': empleados,
@@ -2597,7 +2550,7 @@ def servicios_editar(request, id):
                 empleados = Empleado.objects.filter(activo=True).order_by('nombre')
                 if servicio.estilista and servicio.estilista not in empleados:
                     empleados = list(empleados) + [servicio.estilista]
-                servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                servicios = catalogos.activos(Servicio)
                 return render(request, 'servicios/editar.html', {
                     'servicio': servicio,
                     'empleados': empleados,
@@ -2617,7 +2570,7 @@ def servicios_editar(request, id):
                     empleados = Empleado.objects.filter(activo=True).order_by('nombre')
                     if servicio.estilista and servicio.estilista not in empleados:
                         empleados = list(empleados) + [servicio.estilista]
-                    servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                    servicios = catalogos.activos(Servicio)
                     return render(request, 'servicios/editar.html', {
                         'servicio': servicio,
                         'empleados': empleados,
@@ -2641,7 +2594,7 @@ def servicios_editar(request, id):
                     empleados = Empleado.objects.filter(activo=True).order_by('nombre')
                     if servicio.estilista and servicio.estilista not in empleados:
                         empleados = list(empleados) + [servicio.estilista]
-                    servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                    servicios = catalogos.activos(Servicio)
                     return render(request, 'servicios/editar.html', {
                         'servicio': servicio,
                         'empleados': empleados,
@@ -2668,7 +2621,7 @@ def servicios_editar(request, id):
                 empleados = Empleado.objects.filter(activo=True).order_by('nombre')
                 if servicio.estilista and servicio.estilista not in empleados:
                     empleados = list(empleados) + [servicio.estilista]
-                servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                servicios = catalogos.activos(Servicio)
                 return render(request, 'servicios/editar.html', {
                     'servicio': servicio,
                     'empleados': empleados,
@@ -2690,7 +2643,7 @@ def servicios_editar(request, id):
                 empleados = Empleado.objects.filter(activo=True).order_by('nombre')
                 if servicio.estilista and servicio.estilista not in empleados:
                     empleados = list(empleados) + [servicio.estilista]
-                servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+                servicios = catalogos.activos(Servicio)
                 return render(request, 'servicios/editar.html', {
                     'servicio': servicio,
                     'empleados': empleados,
@@ -2711,7 +2664,7 @@ def servicios_editar(request, id):
     if servicio.estilista and servicio.estilista not in empleados:
         empleados = list(empleados) + [servicio.estilista]
     
-    servicios = Servicio.objects.filter(activo=True).order_by('nombre')
+    servicios = catalogos.activos(Servicio)
     # Si el servicio actual no está activo, agregarlo a la lista
     if servicio.servicio and servicio.servicio not in servicios:
         servicios = list(servicios) + [servicio.servicio]
@@ -2861,6 +2814,7 @@ def producto_precio_ajax(request):
 
 
 @login_required(login_url='login')
+@usar_replica
 def servicios_historial(request):
     """Vista para mostrar el historial de servicios completados (ventas)."""
     # Solo staff puede ver el historial
@@ -2883,7 +2837,7 @@ def servicios_historial(request):
             pass  # Si no es empleado, permitir acceso (es staff)
     
     # Filtrar solo servicios completados
-    servicios = ServicioRealizado.objects.filter(estado='completado')
+    servicios = precarga.aplicar('servicios_historial', ServicioRealizado.objects.filter(estado='completado'))
     
     # Filtros por rango de fechas
     fecha_desde = request.GET.get('fecha_desde')
@@ -2924,14 +2878,15 @@ def servicios_historial(request):
     servicios = servicios.order_by('-fecha_servicio', '-hora')
     
     # Obtener todos los servicios disponibles para el selector
-    servicios_disponibles = Servicio.objects.filter(activo=True).order_by('nombre')
+    servicios_disponibles = catalogos.activos(Servicio)
     
     # Obtener todos los empleados para el selector
     empleados_disponibles = Empleado.objects.filter(activo=True).order_by('nombre')
     
-    # Estadísticas
-    total_servicios = servicios.count()
-    total_ingresos = sum(servicio.costo for servicio in servicios)
+    # Estadísticas en una sola consulta
+    totales = servicios.aggregate(total_servicios=Count('id'), total_ingresos=Sum('costo'))
+    total_servicios = totales['total_servicios']
+    total_ingresos = totales['total_ingresos'] or 0
     
     context = {
         'servicios': servicios,
@@ -2950,13 +2905,15 @@ def servicios_historial(request):
 # ========== GESTIÓN DE EXISTENCIAS - ENTRADAS ==========
 
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(EntradaInventario, Producto, Proveedores, User)
 def entradas_lista(request):
     """Lista de entradas de inventario"""
     if not request.user.is_staff:
         messages.error(request, 'Acceso denegado')
         return redirect('inicio')
     
-    entradas = EntradaInventario.objects.all().order_by('-fecha_entrada')
+    entradas = precarga.aplicar('entradas_lista', EntradaInventario.objects.all()).order_by('-fecha_entrada', '-id')
     
     # Filtros
     producto_filtro = request.GET.get('producto', '').strip()
@@ -2965,15 +2922,15 @@ def entradas_lista(request):
     fecha_hasta = request.GET.get('fecha_hasta', '').strip()
     
     if producto_filtro:
-        entradas = entradas.filter(producto__nombre__icontains=producto_filtro)
+        entradas = busqueda.filtrar(entradas, ['producto__nombre'], producto_filtro)
     
     if proveedor_filtro:
-        entradas = entradas.filter(proveedor__nombre__icontains=proveedor_filtro)
+        entradas = busqueda.filtrar(entradas, ['proveedor__nombre'], proveedor_filtro, ordenar=not producto_filtro)
     
     if fecha_desde:
         try:
             fecha_desde_obj = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-            entradas = entradas.filter(fecha_entrada__date__gte=fecha_desde_obj)
+            entradas = entradas.filter(fecha_entrada__gte=_inicio_del_dia(fecha_desde_obj))
         except ValueError:
             pass
     
@@ -2981,24 +2938,22 @@ def entradas_lista(request):
         try:
             fecha_hasta_obj = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
             fecha_hasta_obj = fecha_hasta_obj + timedelta(days=1)
-            entradas = entradas.filter(fecha_entrada__date__lt=fecha_hasta_obj)
+            entradas = entradas.filter(fecha_entrada__lt=_inicio_del_dia(fecha_hasta_obj))
         except ValueError:
             pass
     
-    # Calcular totales antes de paginar (de todos los resultados)
-    total_entradas = entradas.count()
-    total_cantidad = sum(entrada.cantidad for entrada in entradas)
-    total_valor = sum(float(entrada.cantidad * entrada.precio_unitario) for entrada in entradas)
+    # Calcular totales antes de paginar (de todos los resultados, en una sola consulta)
+    totales = entradas.aggregate(
+        total_entradas=Count('id'),
+        total_cantidad=Sum('cantidad'),
+        total_valor=Sum(F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=18, decimal_places=2)),
+    )
+    total_entradas = totales['total_entradas']
+    total_cantidad = totales['total_cantidad'] or 0
+    total_valor = float(totales['total_valor'] or 0)
     
-    # Paginación - 6 elementos por página
-    paginator = Paginator(entradas, 6)
-    page = request.GET.get('page', 1)
-    try:
-        entradas = paginator.page(page)
-    except PageNotAnInteger:
-        entradas = paginator.page(1)
-    except EmptyPage:
-        entradas = paginator.page(paginator.num_pages)
+    # Paginación por cursor - 6 elementos por página
+    entradas = paginacion.paginar(request, entradas, ['-fecha_entrada', '-id'], 6, total=total_entradas)
     
     # Agregar total calculado a cada entrada para el template
     for entrada in entradas:
@@ -3223,7 +3178,162 @@ def entradas_eliminar(request, id):
     return render(request, 'entradas/eliminar_confirm.html', {'entrada': entrada})
 
 
+# ========== KARDEX ==========
+
+@login_required(login_url='login')
+@usar_replica
+def kardex(request):
+    """
+    Kardex de movimientos de stock por producto o por zona, con saldo acumulado.
+    Paginado por cursor (?cursor=...) y exportable a CSV (?formato=csv).
+    """
+    if not request.user.is_staff:
+        messages.error(request, 'Acceso denegado')
+        return redirect('inicio')
+
+    producto_id = request.GET.get('producto', '').strip()
+    zona_id = request.GET.get('zona', '').strip()
+    producto = None
+    zona = None
+
+    if producto_id.isdigit():
+        producto = Producto.objects.select_related('zona').filter(id=producto_id).first()
+    elif zona_id.isdigit():
+        zona = Zona.objects.filter(id=zona_id).first()
+
+    alcance = {
+        'producto_id': producto.id if producto else None,
+        'zona_id': zona.id if zona else None,
+    }
+
+    if (producto or zona) and request.GET.get('formato') == 'csv':
+        return _kardex_exportar_csv(producto or zona, alcance)
+
+    movimientos = []
+    siguiente_cursor = None
+    cursor = reportes.decodificar_cursor(request.GET.get('cursor', '').strip())
+    if producto or zona:
+        movimientos, siguiente_cursor = reportes.obtener_kardex(cursor=cursor, limite=50, **alcance)
+
+    context = {
+        'producto': producto,
+        'zona': zona,
+        'zonas': catalogos.activos(Zona),
+        'movimientos': movimientos,
+        'siguiente_cursor': siguiente_cursor,
+        'es_primera_pagina': cursor is None,
+    }
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return render(request, 'kardex/lista_fragment.html', context)
+    else:
+        return render(request, 'kardex/lista.html', context)
+
+
+class _EchoBuffer:
+    """Buffer mínimo para que csv.writer escriba directamente en la respuesta"""
+    def write(self, value):
+        return value
+
+
+def _kardex_exportar_csv(objeto, alcance):
+    """Exporta el kardex completo en streaming, leyendo por lotes con cursor"""
+    writer = csv.writer(_EchoBuffer())
+
+    def filas():
+        yield '\ufeff'
+        yield writer.writerow(['Fecha', 'Tipo', 'Producto', 'Cantidad', 'Precio Unitario', 'Referencia', 'Saldo', 'Saldo Producto'])
+        for movimiento in reportes.iterar_kardex(**alcance):
+            fecha = movimiento['fecha']
+            yield writer.writerow([
+                localtime(fecha).strftime('%d/%m/%Y %H:%M') if fecha and not is_naive(fecha) else fecha,
+                movimiento['tipo_display'],
+                movimiento['producto_nombre'],
+                movimiento['cantidad'],
+                movimiento['precio_unitario'] if movimiento['precio_unitario'] is not None else '',
+                movimiento['referencia'] or '',
+                movimiento['saldo'],
+                movimiento['saldo_producto'],
+            ])
+
+    nombre = slugify(objeto.nombre) or 'kardex'
+    response = StreamingHttpResponse(filas(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="kardex-{nombre}.csv"'
+    return response
+
+
+@login_required(login_url='login')
+@usar_replica
+def api_stock_a_fecha(request):
+    """
+    API AJAX: stock y valorización al cierre de una fecha (?fecha=YYYY-MM-DD).
+    Acepta ?producto=<id> (repetible) para limitar la consulta.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Acceso denegado'}, status=403)
+
+    try:
+        fecha = datetime.strptime(request.GET.get('fecha', '').strip(), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Fecha inválida, use el formato YYYY-MM-DD'}, status=400)
+    if fecha > timezone.localdate():
+        return JsonResponse({'success': False, 'error': 'La fecha no puede ser futura'}, status=400)
+
+    producto_ids = [pid for pid in request.GET.getlist('producto') if pid.isdigit()] or None
+    stock = reportes.stock_a_fecha(fecha, producto_ids)
+    nombres = dict(Producto.objects.filter(id__in=[s['producto_id'] for s in stock]).values_list('id', 'nombre'))
+
+    return JsonResponse({
+        'success': True,
+        'fecha': fecha.isoformat(),
+        'valor_total': str(sum(s['valor'] for s in stock)),
+        'productos': [{
+            'id': s['producto_id'],
+            'nombre': nombres.get(s['producto_id'], ''),
+            'cantidad': s['cantidad'],
+            'costo_promedio': str(s['costo_promedio']),
+            'valor': str(s['valor']),
+            'origen': s['origen'],
+        } for s in stock],
+    })
+
+
+@login_required(login_url='login')
+@usar_replica
+def api_valorizacion_mensual(request):
+    """API AJAX: valorización del catálogo al cierre de un mes (?anio=2025&mes=11)"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Acceso denegado'}, status=403)
+
+    try:
+        anio = int(request.GET.get('anio', ''))
+        mes = int(request.GET.get('mes', ''))
+        if not 1 <= mes <= 12:
+            raise ValueError(mes)
+        primer_dia_siguiente = date(anio + mes // 12, mes % 12 + 1, 1)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Año o mes inválido'}, status=400)
+
+    valorizacion = reportes.valorizacion_a_fecha(primer_dia_siguiente - timedelta(days=1))
+    if not valorizacion['productos']:
+        # Sin snapshot de ese día los totales en cero no serían datos reales
+        return JsonResponse({
+            'success': False,
+            'sin_snapshot': True,
+            'fecha': valorizacion['fecha'].isoformat(),
+            'error': f'No hay snapshot del inventario para el {valorizacion["fecha"].strftime("%d/%m/%Y")}',
+        }, status=404)
+    return JsonResponse({
+        'success': True,
+        'fecha': valorizacion['fecha'].isoformat(),
+        'valor_total': str(valorizacion['valor_total']),
+        'cantidad_total': valorizacion['cantidad_total'],
+        'productos': valorizacion['productos'],
+    })
+
+
 @login_required(login_url='login')
+@usar_replica
 def salidas_lista(request):
     """Lista de salidas de inventario (compras/facturas)"""
     if not request.user.is_staff:
@@ -3231,7 +3341,7 @@ def salidas_lista(request):
         return redirect('inicio')
     
     # Reutilizar la vista de compras_lista pero con otro template
-    compras = Compras.objects.all()
+    compras = precarga.aplicar('salidas_lista', Compras.objects.all())
     
     # Filtros por rango de fechas
     fecha_desde = request.GET.get('fecha_desde')
@@ -3240,7 +3350,7 @@ def salidas_lista(request):
     if fecha_desde:
         try:
             fecha_desde_obj = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-            compras = compras.filter(fecha_compra__date__gte=fecha_desde_obj)
+            compras = compras.filter(fecha_compra__gte=_inicio_del_dia(fecha_desde_obj))
         except ValueError:
             pass
     
@@ -3248,28 +3358,22 @@ def salidas_lista(request):
         try:
             fecha_hasta_obj = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
             fecha_hasta_obj = fecha_hasta_obj + timedelta(days=1)
-            compras = compras.filter(fecha_compra__date__lt=fecha_hasta_obj)
+            compras = compras.filter(fecha_compra__lt=_inicio_del_dia(fecha_hasta_obj))
         except ValueError:
             pass
     
-    compras = compras.order_by('-fecha_compra')
+    compras = compras.order_by('-fecha_compra', '-id')
     
-    # Calcular totales antes de paginar
-    total_compras = compras.count()
-    compras_list = list(compras)
-    for compra in compras_list:
-        compra.total = compra.cantidad * compra.precio_unitario
-    total_ingresos = sum(compra.total for compra in compras_list)
+    # Calcular totales antes de paginar (una sola consulta, sin cargar las compras)
+    totales = compras.aggregate(
+        total_compras=Count('id'),
+        total_ingresos=Sum(F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=18, decimal_places=2)),
+    )
+    total_compras = totales['total_compras']
+    total_ingresos = totales['total_ingresos'] or 0
     
-    # Paginación - 6 elementos por página
-    paginator = Paginator(compras, 6)
-    page = request.GET.get('page', 1)
-    try:
-        compras = paginator.page(page)
-    except PageNotAnInteger:
-        compras = paginator.page(1)
-    except EmptyPage:
-        compras = paginator.page(paginator.num_pages)
+    # Paginación por cursor - 6 elementos por página
+    compras = paginacion.paginar(request, compras, ['-fecha_compra', '-id'], 6, total=total_compras)
     
     # Calcular total por compra para la página actual
     for compra in compras:
@@ -3293,13 +3397,15 @@ def salidas_lista(request):
 # ========== GESTIÓN DE SOLICITUDES DE COMPRA ==========
 
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(SolicitudCompra, Producto, Proveedores)
 def solicitudes_compra_lista(request):
     """Lista de solicitudes de compra"""
     if not request.user.is_staff:
         messages.error(request, 'Acceso denegado')
         return redirect('inicio')
     
-    solicitudes = SolicitudCompra.objects.all().order_by('-fecha_solicitud')
+    solicitudes = precarga.aplicar('solicitudes_compra_lista', SolicitudCompra.objects.all()).order_by('-fecha_solicitud', '-id')
     
     # Filtros
     estado_filtro = request.GET.get('estado', '').strip()
@@ -3310,27 +3416,27 @@ def solicitudes_compra_lista(request):
         solicitudes = solicitudes.filter(estado=estado_filtro)
     
     if producto_filtro:
-        solicitudes = solicitudes.filter(producto__nombre__icontains=producto_filtro)
+        solicitudes = busqueda.filtrar(solicitudes, ['producto__nombre'], producto_filtro)
     
     if proveedor_filtro:
-        solicitudes = solicitudes.filter(proveedor__nombre__icontains=proveedor_filtro)
-    
-    # Estadísticas (antes de paginar)
-    total_solicitudes = solicitudes.count()
-    solicitudes_borrador = solicitudes.filter(estado='borrador').count()
-    solicitudes_pendientes = solicitudes.filter(estado__in=['enviada', 'aceptada', 'en_proceso']).count()
-    solicitudes_completadas = solicitudes.filter(estado='completada').count()
-    costo_total_pendiente = sum(float(s.costo_total) for s in solicitudes.filter(estado__in=['aceptada', 'en_proceso']))
-    
-    # Paginación - 6 elementos por página
-    paginator = Paginator(solicitudes, 6)
-    page = request.GET.get('page', 1)
-    try:
-        solicitudes = paginator.page(page)
-    except PageNotAnInteger:
-        solicitudes = paginator.page(1)
-    except EmptyPage:
-        solicitudes = paginator.page(paginator.num_pages)
+        solicitudes = busqueda.filtrar(solicitudes, ['proveedor__nombre'], proveedor_filtro, ordenar=not producto_filtro)
+    
+    # Estadísticas (antes de paginar, en una sola consulta)
+    totales = solicitudes.aggregate(
+        total_solicitudes=Count('id'),
+        solicitudes_borrador=Count('id', filter=Q(estado='borrador')),
+        solicitudes_pendientes=Count('id', filter=Q(estado__in=['enviada', 'aceptada', 'en_proceso'])),
+        solicitudes_completadas=Count('id', filter=Q(estado='completada')),
+        costo_total_pendiente=Sum('costo_total', filter=Q(estado__in=['aceptada', 'en_proceso'])),
+    )
+    total_solicitudes = totales['total_solicitudes']
+    solicitudes_borrador = totales['solicitudes_borrador']
+    solicitudes_pendientes = totales['solicitudes_pendientes']
+    solicitudes_completadas = totales['solicitudes_completadas']
+    costo_total_pendiente = float(totales['costo_total_pendiente'] or 0)
+    
+    # Paginación por cursor - 6 elementos por página
+    solicitudes = paginacion.paginar(request, solicitudes, ['-fecha_solicitud', '-id'], 6, total=total_solicitudes)
     
     context = {
         'solicitudes': solicitudes,
@@ -3549,6 +3655,8 @@ def solicitudes_compra_detalle(request, id):
 # ========== CRUD PROVEEDORES (ADMIN) ==========
 
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(Proveedores, ProductoProveedor)
 def proveedores_lista(request):
     """Lista de proveedores."""
     if not request.user.is_staff:
@@ -3566,7 +3674,7 @@ def proveedores_lista(request):
         except Empleado.DoesNotExist:
             pass  # Si no es empleado, permitir acceso (es staff)
     
-    proveedores = Proveedores.objects.all().order_by('nombre')
+    proveedores = Proveedores.objects.all().order_by('nombre', 'id')
     
     # Filtros
     nombre_filtro = request.GET.get('nombre', '').strip()
@@ -3575,30 +3683,24 @@ def proveedores_lista(request):
     email_filtro = request.GET.get('email', '').strip()
     ciudad_filtro = request.GET.get('ciudad', '').strip()
     
+    # Solo el filtro por nombre define el orden por relevancia
     if nombre_filtro:
-        proveedores = proveedores.filter(nombre__icontains=nombre_filtro)
+        proveedores = busqueda.filtrar(proveedores, ['nombre'], nombre_filtro)
     
     if contacto_filtro:
-        proveedores = proveedores.filter(contacto__icontains=contacto_filtro)
+        proveedores = busqueda.filtrar(proveedores, ['contacto'], contacto_filtro, ordenar=False)
     
     if telefono_filtro:
-        proveedores = proveedores.filter(telefono__icontains=telefono_filtro)
+        proveedores = busqueda.filtrar(proveedores, ['telefono'], telefono_filtro, ordenar=False)
     
     if email_filtro:
-        proveedores = proveedores.filter(email__icontains=email_filtro)
+        proveedores = busqueda.filtrar(proveedores, ['email'], email_filtro, ordenar=False)
     
     if ciudad_filtro:
-        proveedores = proveedores.filter(ciudad__icontains=ciudad_filtro)
+        proveedores = busqueda.filtrar(proveedores, ['ciudad'], ciudad_filtro, ordenar=False)
     
-    # Paginación - 6 elementos por página
-    paginator = Paginator(proveedores, 6)
-    page = request.GET.get('page', 1)
-    try:
-        proveedores = paginator.page(page)
-    except PageNotAnInteger:
-        proveedores = paginator.page(1)
-    except EmptyPage:
-        proveedores = paginator.page(paginator.num_pages)
+    # Paginación por cursor - 6 elementos por página
+    proveedores = paginacion.paginar(request, proveedores, ['nombre', 'id'], 6)
     
     context = {
         'proveedores': proveedores,
@@ -3834,6 +3936,8 @@ def proveedores_eliminar(request, id):
 # ========== CRUD PRODUCTOS DE PROVEEDORES (ADMIN) ==========
 
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(ProductoProveedor, Proveedores, Producto)
 def productos_proveedor_lista(request):
     """Lista de productos de proveedores."""
     if not request.user.is_staff:
@@ -3851,7 +3955,7 @@ def productos_proveedor_lista(request):
         except Empleado.DoesNotExist:
             pass  # Si no es empleado, permitir acceso (es staff)
     
-    productos_proveedor = ProductoProveedor.objects.all().select_related('proveedor', 'producto').order_by('proveedor__nombre', 'nombre')
+    productos_proveedor = ProductoProveedor.objects.all().select_related('proveedor', 'producto').order_by('proveedor__nombre', 'nombre', 'id')
     
     # Filtros
     nombre_filtro = request.GET.get('nombre', '').strip()
@@ -3860,10 +3964,10 @@ def productos_proveedor_lista(request):
     proveedor_filtro = None
     
     if nombre_filtro:
-        productos_proveedor = productos_proveedor.filter(nombre__icontains=nombre_filtro)
+        productos_proveedor = busqueda.filtrar(productos_proveedor, ['nombre'], nombre_filtro)
     
     if codigo_filtro:
-        productos_proveedor = productos_proveedor.filter(codigo_producto__icontains=codigo_filtro)
+        productos_proveedor = busqueda.filtrar(productos_proveedor, ['codigo_producto'], codigo_filtro, ordenar=not nombre_filtro)
     
     if proveedor_id:
         try:
@@ -3872,17 +3976,10 @@ def productos_proveedor_lista(request):
         except ValueError:
             pass
     
-    proveedores = Proveedores.objects.all().order_by('nombre')
+    proveedores = catalogos.obtener(Proveedores)
     
-    # Paginación - 6 elementos por página
-    paginator = Paginator(productos_proveedor, 6)
-    page = request.GET.get('page', 1)
-    try:
-        productos_proveedor = paginator.page(page)
-    except PageNotAnInteger:
-        productos_proveedor = paginator.page(1)
-    except EmptyPage:
-        productos_proveedor = paginator.page(paginator.num_pages)
+    # Paginación por cursor - 6 elementos por página
+    productos_proveedor = paginacion.paginar(request, productos_proveedor, ['proveedor__nombre', 'nombre', 'id'], 6)
     
     context = {
         'productos_proveedor': productos_proveedor,
@@ -3948,7 +4045,7 @@ def productos_proveedor_crear(request):
                         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                             return JsonResponse({'success': False, 'errors': {'codigo_producto': [error_msg]}}, status=400)
                         messages.error(request, error_msg)
-                        proveedores = Proveedores.objects.all().order_by('nombre')
+                        proveedores = catalogos.obtener(Proveedores)
                         context = {
                             'proveedores': proveedores,
                             'proveedor_id': proveedor_id,
@@ -4005,7 +4102,7 @@ def productos_proveedor_crear(request):
                     return JsonResponse({'success': False, 'errors': {'__all__': [error_msg]}}, status=400)
                 messages.error(request, error_msg)
     
-    proveedores = Proveedores.objects.all().order_by('nombre')
+    proveedores = catalogos.obtener(Proveedores)
     context = {
         'proveedores': proveedores
     }
@@ -4074,7 +4171,7 @@ def productos_proveedor_editar(request, id):
                         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                             return JsonResponse({'success': False, 'errors': {'codigo_producto': [error_msg]}}, status=400)
                         messages.error(request, error_msg)
-                        proveedores = Proveedores.objects.all().order_by('nombre')
+                        proveedores = catalogos.obtener(Proveedores)
                         context = {
                             'producto_proveedor': producto_proveedor,
                             'proveedores': proveedores
@@ -4124,7 +4221,7 @@ def productos_proveedor_editar(request, id):
                     return JsonResponse({'success': False, 'errors': {'__all__': [error_msg]}}, status=400)
                 messages.error(request, error_msg)
     
-    proveedores = Proveedores.objects.all().order_by('nombre')
+    proveedores = catalogos.obtener(Proveedores)
     context = {
         'producto_proveedor': producto_proveedor,
         'proveedores': proveedores
@@ -4179,7 +4276,95 @@ def productos_proveedor_eliminar(request, id):
 
 # ========== CRUD INVENTARIO UNIFICADO ==========
 
+FILTROS_INVENTARIO = ('tipo', 'nombre', 'estado', 'categoria', 'zona')
+
+# Condición de cada estado del filtro (y de las tarjetas de estadísticas)
+ESTADOS_INVENTARIO = {
+    # Activo: activo=True, cantidad >= stock_minimo, cantidad > 0
+    'activo': Q(activo=True, cantidad__gte=F('stock_minimo'), cantidad__gt=0),
+    # Bajo Stock: activo=True, cantidad < stock_minimo, cantidad > 0
+    'bajo_stock': Q(activo=True, cantidad__lt=F('stock_minimo'), cantidad__gt=0),
+    # Agotado: activo=True, cantidad = 0
+    'agotado': Q(activo=True, cantidad=0),
+    # Inactivo: activo=False
+    'inactivo': Q(activo=False),
+}
+
+
+def _condiciones_inventario(filtros):
+    """
+    Q de los filtros de categoría y zona, los que tienen conteo por opción en
+    los selectores (Q() si el filtro no se usa o no es válido).
+    """
+    condiciones = {'categoria': Q(), 'zona': Q()}
+    if filtros['categoria']:
+        condiciones['categoria'] = Q(categoria=filtros['categoria'])
+    if filtros['zona']:
+        try:
+            condiciones['zona'] = Q(zona_id=int(filtros['zona']))
+        except (ValueError, TypeError):
+            pass
+    return condiciones
+
+
+def _filtrar_inventario(productos, filtros, excepto=(), ordenar=True):
+    """
+    Aplica los filtros del listado de inventario salvo los de `excepto` (las
+    estadísticas aplican categoría y zona dentro de cada conteo). Con `ordenar`
+    la búsqueda por nombre ordena por relevancia.
+    """
+    if filtros['tipo'] and 'tipo' not in excepto:
+        productos = productos.filter(tipo_producto=filtros['tipo'])
+    
+    if filtros['nombre'] and 'nombre' not in excepto:
+        productos = busqueda.filtrar(productos, ['nombre'], filtros['nombre'], ordenar=ordenar)
+    
+    if filtros['estado'] in ESTADOS_INVENTARIO and 'estado' not in excepto:
+        productos = productos.filter(ESTADOS_INVENTARIO[filtros['estado']])
+    
+    for clave, condicion in _condiciones_inventario(filtros).items():
+        if clave not in excepto:
+            productos = productos.filter(condicion)
+    return productos
+
+
+def _estadisticas_inventario(filtros, zonas):
+    """
+    Tarjetas de estadísticas del inventario y conteos por categoría y por zona
+    de `zonas`, en una consulta con agregados condicionales. Cada conteo de un
+    selector ignora su propio filtro, para mostrar cuántos productos habría al
+    cambiarlo. Se guarda en la caché por combinación de filtros mientras no
+    cambien Producto ni Zona.
+    """
+    def calcular():
+        condiciones = _condiciones_inventario(filtros)
+        filtrados = condiciones['categoria'] & condiciones['zona']
+        agregados = {
+            'total': Count('id', filter=filtrados),
+            'propios': Count('id', filter=filtrados & Q(tipo_producto='propio')),
+            'proveedor': Count('id', filter=filtrados & Q(tipo_producto='proveedor')),
+            'bajo_stock': Count('id', filter=filtrados & ESTADOS_INVENTARIO['bajo_stock']),
+            'agotados': Count('id', filter=filtrados & ESTADOS_INVENTARIO['agotado']),
+        }
+        for valor, _ in Producto.CATEGORIA_CHOICES:
+            agregados[f'categoria_{valor}'] = Count('id', filter=Q(categoria=valor) & condiciones['zona'])
+        for zona_id in zonas:
+            agregados[f'zona_{zona_id}'] = Count('id', filter=Q(zona_id=zona_id) & condiciones['categoria'])
+        
+        fila = _filtrar_inventario(
+            Producto.objects.all(), filtros, excepto=('categoria', 'zona'), ordenar=False,
+        ).aggregate(**agregados)
+        estadisticas = {clave: fila[clave] for clave in ('total', 'propios', 'proveedor', 'bajo_stock', 'agotados')}
+        estadisticas['por_categoria'] = {valor: fila[f'categoria_{valor}'] for valor, _ in Producto.CATEGORIA_CHOICES}
+        estadisticas['por_zona'] = {zona_id: fila[f'zona_{zona_id}'] for zona_id in zonas}
+        return estadisticas
+    
+    firma = hashlib.sha1('&'.join(f'{clave}={filtros[clave]}' for clave in FILTROS_INVENTARIO).encode('utf-8')).hexdigest()
+    return versiones.en_cache(f'inventario_lista:{firma}', [Producto, Zona], calcular)
+
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(Producto, Zona, ProductoProveedor, Proveedores)
 def inventario_lista(request):
     """Lista de productos del inventario unificado"""
     if not request.user.is_staff:
@@ -4189,81 +4374,51 @@ def inventario_lista(request):
     # Verificar permisos (simplificado - solo verificar si es staff)
     # La verificación de permisos por cargo se puede agregar después si es necesario
     
-    # Mostrar todos los productos (activos e inactivos) para que los suspendidos sigan visibles
-    productos = Producto.objects.all().select_related('producto_proveedor', 'proveedor_habitual', 'producto_proveedor__proveedor', 'zona').order_by('-id')
-    
     # Filtros
-    tipo_filtro = request.GET.get('tipo', '').strip()
-    nombre_filtro = request.GET.get('nombre', '').strip()
-    estado_filtro = request.GET.get('estado', '').strip()
-    categoria_filtro = request.GET.get('categoria', '').strip()
-    zona_filtro = request.GET.get('zona', '').strip()
-    
-    if tipo_filtro:
-        productos = productos.filter(tipo_producto=tipo_filtro)
+    filtros = {clave: request.GET.get(clave, '').strip() for clave in FILTROS_INVENTARIO}
+    tipo_filtro = filtros['tipo']
+    nombre_filtro = filtros['nombre']
+    estado_filtro = filtros['estado']
+    categoria_filtro = filtros['categoria']
+    zona_filtro = filtros['zona']
     
-    if nombre_filtro:
-        productos = productos.filter(nombre__icontains=nombre_filtro)
+    # Mostrar todos los productos (activos e inactivos) para que los suspendidos sigan visibles
+    productos = _filtrar_inventario(
+        Producto.objects.all().select_related('producto_proveedor', 'proveedor_habitual', 'producto_proveedor__proveedor', 'zona').order_by('-id'),
+        filtros,
+    )
     
-    # Filtro por categoría
-    if categoria_filtro:
-        productos = productos.filter(categoria=categoria_filtro)
+    # Zonas activas para el filtro
+    zonas = catalogos.activos(Zona)
     
-    # Filtro por estado
-    if estado_filtro:
-        if estado_filtro == 'activo':
-            # Activo: activo=True, cantidad >= stock_minimo, cantidad > 0
-            productos = productos.filter(activo=True, cantidad__gte=F('stock_minimo'), cantidad__gt=0)
-        elif estado_filtro == 'bajo_stock':
-            # Bajo Stock: activo=True, cantidad < stock_minimo, cantidad > 0
-            productos = productos.filter(activo=True, cantidad__lt=F('stock_minimo'), cantidad__gt=0)
-        elif estado_filtro == 'agotado':
-            # Agotado: activo=True, cantidad = 0
-            productos = productos.filter(activo=True, cantidad=0)
-        elif estado_filtro == 'inactivo':
-            # Inactivo: activo=False
-            productos = productos.filter(activo=False)
-    
-    if zona_filtro:
-        try:
-            zona_id = int(zona_filtro)
-            productos = productos.filter(zona_id=zona_id)
-        except (ValueError, TypeError):
-            pass
+    # Estadísticas y conteos por categoría y zona (una consulta de versiones con la caché caliente)
+    estadisticas = _estadisticas_inventario(filtros, [zona.id for zona in zonas])
+    total_productos = estadisticas['total']
     
-    # Estadísticas
-    total_productos = productos.count()
-    productos_propios = productos.filter(tipo_producto='propio').count()
-    productos_proveedor_count = productos.filter(tipo_producto='proveedor').count()
-    productos_bajo_stock = productos.filter(activo=True, cantidad__lt=F('stock_minimo'), cantidad__gt=0).count()
-    productos_agotados = productos.filter(activo=True, cantidad=0).count()
+    for zona in zonas:
+        zona.total_productos = estadisticas['por_zona'].get(zona.id, 0)
+    categorias = [
+        (valor, etiqueta, estadisticas['por_categoria'].get(valor, 0))
+        for valor, etiqueta in Producto.CATEGORIA_CHOICES
+    ]
     
-    # Obtener zonas activas para el filtro
-    zonas = Zona.objects.filter(activo=True).order_by('nombre')
-    
-    # Paginación - 5 elementos por página
-    paginator = Paginator(productos, 5)
-    page = request.GET.get('page', 1)
-    try:
-        productos = paginator.page(page)
-    except PageNotAnInteger:
-        productos = paginator.page(1)
-    except EmptyPage:
-        productos = paginator.page(paginator.num_pages)
+    # Paginación por cursor - 5 elementos por página
+    productos = paginacion.paginar(request, productos, ['-id'], 5, total=total_productos)
     
     context = {
         'productos': productos,
         'total_productos': total_productos,
-        'productos_propios': productos_propios,
-        'productos_proveedor': productos_proveedor_count,
-        'productos_bajo_stock': productos_bajo_stock,
-        'productos_agotados': productos_agotados,
+        'productos_propios': estadisticas['propios'],
+        'productos_proveedor': estadisticas['proveedor'],
+        'productos_bajo_stock': estadisticas['bajo_stock'],
+        'productos_agotados': estadisticas['agotados'],
         'tipo_filtro': tipo_filtro,
         'nombre_filtro': nombre_filtro,
         'estado_filtro': estado_filtro,
         'categoria_filtro': categoria_filtro,
         'zona_filtro': zona_filtro,
         'zonas': zonas,
+        'categorias': categorias,
     }
     
     # Detectar si es petición AJAX
@@ -4364,10 +4519,10 @@ def inventario_crear(request):
     
     # Obtener proveedores para el formulario de proveedor
     from .models import Proveedores
-    proveedores = Proveedores.objects.all().order_by('nombre')
+    proveedores = catalogos.obtener(Proveedores)
     
     # Obtener zonas activas
-    zonas = Zona.objects.filter(activo=True).order_by('nombre')
+    zonas = catalogos.activos(Zona)
     
     context = {
         'form': form, 
@@ -4505,10 +4660,10 @@ def inventario_editar(request, id):
     
     # Obtener proveedores para el formulario de proveedor
     from .models import Proveedores
-    proveedores = Proveedores.objects.all().order_by('nombre')
+    proveedores = catalogos.obtener(Proveedores)
     
     # Obtener zonas activas
-    zonas = Zona.objects.filter(activo=True).order_by('nombre')
+    zonas = catalogos.activos(Zona)
     
     context = {
         'form': form,
@@ -4729,12 +4884,74 @@ def zonas_lista_ajax(request):
     if not request.user.is_staff:
         return JsonResponse({'success': False, 'error': 'Acceso denegado'}, status=403)
     
-    zonas = Zona.objects.filter(activo=True).order_by('nombre')
+    zonas = catalogos.activos(Zona)
     zonas_data = [{'id': zona.id, 'nombre': zona.nombre} for zona in zonas]
     
     return JsonResponse({'success': True, 'zonas': zonas_data})
 
 
+@login_required(login_url='login')
+def api_buscar(request):
+    """
+    API AJAX del buscador global: ?q=texto (y opcional ?por_tipo=5).
+    Retorna los mejores resultados agrupados por tipo (producto, proveedor,
+    empleado, servicio...) con el enlace a su edición.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Acceso denegado'}, status=403)
+
+    texto = request.GET.get('q', '').strip()
+    if len(texto) < 2:
+        return JsonResponse({'success': True, 'q': texto, 'grupos': []})
+    try:
+        por_tipo = min(max(int(request.GET.get('por_tipo', 5)), 1), 20)
+    except ValueError:
+        por_tipo = 5
+
+    tipos = indice_busqueda.tipos()
+    etiquetas = dict(DocumentoBusqueda.TIPO_CHOICES)
+    grupos = {}
+    for resultado in indice_busqueda.buscar(texto, por_tipo):
+        tipo = resultado['tipo']
+        grupo = grupos.setdefault(tipo, {'tipo': tipo, 'etiqueta': etiquetas.get(tipo, tipo), 'resultados': []})
+        grupo['resultados'].append({
+            'id': resultado['objeto_id'],
+            'titulo': resultado['titulo'],
+            'detalle': resultado['detalle'],
+            'url': reverse(tipos[tipo][3], args=[resultado['objeto_id']]),
+            'relevancia': round(resultado['relevancia'] or 0, 4),
+        })
+
+    # Los grupos con el mejor resultado más relevante primero
+    ordenados = sorted(grupos.values(), key=lambda grupo: -grupo['resultados'][0]['relevancia'])
+    return JsonResponse({'success': True, 'q': texto, 'grupos': ordenados})
+
+
+@login_required(login_url='login')
+def api_autocompletar(request, modelo):
+    """
+    API AJAX de los widgets AutocompleteSelect: ?q=prefijo&pagina=1 y los
+    filtros propios de cada modelo (p. ej. ?proveedor=<id>).
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Acceso denegado'}, status=403)
+    if modelo not in busqueda.fuentes_autocompletar():
+        return JsonResponse({'success': False, 'error': 'Modelo no disponible'}, status=404)
+
+    try:
+        pagina = max(int(request.GET.get('pagina', 1)), 1)
+    except ValueError:
+        pagina = 1
+    filtros = {clave: valor for clave, valor in request.GET.items() if clave not in ('q', 'pagina')}
+    opciones, hay_mas = busqueda.autocompletar(modelo, request.GET.get('q', ''), pagina, filtros)
+    return JsonResponse({
+        'success': True,
+        'resultados': [{'id': pk, 'texto': texto} for pk, texto in opciones],
+        'pagina': pagina,
+        'hay_mas': hay_mas,
+    })
+
+
 @login_required(login_url='login')
 def inventario_suspender(request, id):
     """Suspender (inactivar) un producto del inventario (mantener para compatibilidad)"""
@@ -4948,6 +5165,8 @@ def entradas_productos_inventario_por_proveedor_ajax(request):
 # ========== AUDITORÍA DE INVENTARIO ==========
 
 @login_required(login_url='login')
+@usar_replica
+@fragmento_cacheado(AuditoriaInventario, DetalleAuditoria, Zona, User)
 def auditoria_lista(request):
     """Lista de auditorías de inventario (Historial completo)"""
     try:
@@ -4955,7 +5174,7 @@ def auditoria_lista(request):
             messages.error(request, 'Acceso denegado')
             return redirect('inicio')
         
-        auditorias = AuditoriaInventario.objects.all().select_related('usuario').order_by('-fecha_creacion')
+        auditorias = AuditoriaInventario.objects.all().select_related('usuario').order_by('-fecha_creacion', '-id')
         
         # Filtros
         estado_filtro = request.GET.get('estado', '').strip()
@@ -4985,15 +5204,8 @@ def auditoria_lista(request):
         completadas = auditorias.filter(estado='completada').count()
         canceladas = auditorias.filter(estado='cancelada').count()
         
-        # Paginación - 6 elementos por página
-        paginator = Paginator(auditorias, 6)
-        page = request.GET.get('page', 1)
-        try:
-            auditorias = paginator.page(page)
-        except PageNotAnInteger:
-            auditorias = paginator.page(1)
-        except EmptyPage:
-            auditorias = paginator.page(paginator.num_pages)
+        # Paginación por cursor - 6 elementos por página
+        auditorias = paginacion.paginar(request, auditorias, ['-fecha_creacion', '-id'], 6, total=total_auditorias)
         
         context = {
             'auditorias': auditorias,
@@ -5450,4 +5662,301 @@ def auditoria_eliminar(request, id):
         print(f"Error en auditoria_eliminar: {str(e)}")
         print(traceback.format_exc())
         return redirect('auditoria_lista')
-# ========== SERVICIOS ==========
\ No newline at end of file
+# ========== SERVICIOS ==========
+
+# ========== MÉTRICAS ==========
+
+@login_required(login_url='login')
+def metricas_panel(request):
+    """
+    Percentiles de duración (p50/p95/p99) y promedio de consultas por vista,
+    sobre las últimas muestras de este proceso. ?formato=json para consumo externo.
+    """
+    if not request.user.is_staff:
+        messages.error(request, 'Acceso denegado')
+        return redirect('inicio')
+
+    vistas = metricas.resumen_por_vista()
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({'success': True, 'pid': os.getpid(), 'vistas': vistas})
+
+    context = {
+        'vistas': vistas,
+        'pid': os.getpid(),
+        'muestras_por_vista': getattr(settings, 'METRICAS_MUESTRAS_POR_VISTA', 500),
+    }
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return render(request, 'paginas/metricas_fragment.html', context)
+    return render(request, 'paginas/metricas.html', context)
+
+
+def _scrape_autorizado(request):
+    token = getattr(settings, 'METRICAS_PROMETHEUS_TOKEN', '')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICAS_PROMETHEUS_IPS', [])
+
+
+@require_safe
+def metricas_prometheus(request):
+    """
+    Métricas en formato de exposición de Prometheus (ver prometheus.py). No usa
+    sesión: con METRICAS_PROMETHEUS_TOKEN exige el token; sin él solo acepta las
+    IPs de METRICAS_PROMETHEUS_IPS, vacía por defecto (responde 403).
+    """
+    if not _scrape_autorizado(request):
+        return HttpResponse('Acceso denegado\n', status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(prometheus.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ========== PERFILES ==========
+
+@login_required(login_url='login')
+def perfiles_lista(request):
+    """Perfiles de peticiones guardados por el perfilador (ver perfilador.py)"""
+    if not request.user.is_staff:
+        messages.error(request, 'Acceso denegado')
+        return redirect('inicio')
+
+    perfiles = PerfilPeticion.objects.select_related('usuario').defer('consultas')
+    vista = request.GET.get('vista', '').strip()
+    if vista:
+        perfiles = perfiles.filter(vista__icontains=vista)
+
+    context = {
+        'perfiles': perfiles,
+        'vista': vista,
+        'muestreo': getattr(settings, 'PERFILADOR_MUESTREO', 0),
+    }
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return render(request, 'paginas/perfiles_fragment.html', context)
+    return render(request, 'paginas/perfiles.html', context)
+
+
+@login_required(login_url='login')
+def perfil_detalle(request, id):
+    """Funciones más costosas (cProfile) y consultas SQL de una petición perfilada"""
+    if not request.user.is_staff:
+        messages.error(request, 'Acceso denegado')
+        return redirect('inicio')
+
+    try:
+        perfil = PerfilPeticion.objects.select_related('usuario').get(id=id)
+    except PerfilPeticion.DoesNotExist:
+        messages.error(request, 'Perfil no encontrado')
+        return redirect('perfiles_lista')
+
+    resumen = ''
+    if perfil.archivo_pstats:
+        salida = io.StringIO()
+        try:
+            estadisticas = pstats.Stats(perfil.archivo_pstats.path, stream=salida)
+            estadisticas.strip_dirs().sort_stats('cumulative').print_stats(40)
+            resumen = salida.getvalue()
+        except (OSError, ValueError, EOFError, TypeError):
+            resumen = 'No se pudo leer el archivo pstats'
+
+    consultas = sorted(perfil.consultas, key=lambda consulta: consulta['ms'], reverse=True)
+    context = {
+        'perfil': perfil,
+        'resumen': resumen,
+        'consultas_lentas': consultas[:50],
+        'consultas_repetidas': [
+            {'sql': sql, 'veces': veces}
+            for sql, veces in Counter(consulta['sql'] for consulta in perfil.consultas).most_common(10)
+            if veces > 1
+        ],
+    }
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return render(request, 'paginas/perfil_detalle_fragment.html', context)
+    return render(request, 'paginas/perfil_detalle.html', context)
+
+
+@login_required(login_url='login')
+def perfil_descargar(request, id, formato):
+    """Descarga el perfil como .pstats o como JSON de speedscope"""
+    if not request.user.is_staff:
+        messages.error(request, 'Acceso denegado')
+        return redirect('inicio')
+
+    try:
+        perfil = PerfilPeticion.objects.get(id=id)
+    except PerfilPeticion.DoesNotExist:
+        raise Http404('Perfil no encontrado')
+
+    if formato not in ('pstats', 'speedscope'):
+        raise Http404('Formato no disponible')
+    archivo = perfil.archivo_pstats if formato == 'pstats' else perfil.archivo_speedscope
+    if not archivo:
+        raise Http404('Archivo no encontrado')
+    try:
+        contenido = archivo.open('rb')
+    except OSError:
+        raise Http404('Archivo no encontrado')
+    return FileResponse(contenido, as_attachment=True, filename=posixpath.basename(archivo.name))
+
+
+# ========== CONSULTAS LENTAS ==========
+
+@login_required(login_url='login')
+def consultas_lentas_lista(request):
+    """Consultas lentas agrupadas por sentencia normalizada, de mayor a menor tiempo total"""
+    if not request.user.is_staff:
+        messages.error(request, 'Acceso denegado')
+        return redirect('inicio')
+
+    consultas = ConsultaLenta.objects.all()
+    vista = request.GET.get('vista', '').strip()
+    if vista:
+        consultas = consultas.filter(vista__icontains=vista)
+
+    grupos = list(
+        consultas.values('huella')
+        .annotate(veces=Count('id'), total_ms=Sum('duracion_ms'), promedio_ms=Avg('duracion_ms'),
+                  maximo_ms=Max('duracion_ms'), ultima=Max('fecha'))
+        .order_by('-total_ms')[:50]
+    )
+    # Un ejemplo por huella (el más reciente con plan si lo hay) para mostrar SQL, vista y origen
+    ejemplos = {}
+    for consulta in ConsultaLenta.objects.filter(huella__in=[g['huella'] for g in grupos]).order_by('huella', '-fecha'):
+        actual = ejemplos.get(consulta.huella)
+        if actual is None or (consulta.plan and not actual.plan):
+            ejemplos[consulta.huella] = consulta
+    for grupo in grupos:
+        grupo['ejemplo'] = ejemplos.get(grupo['huella'])
+
+    context = {
+        'grupos': grupos,
+        'vista': vista,
+        'umbral_ms': getattr(settings, 'CONSULTAS_LENTAS_UMBRAL_MS', 200),
+        'total_registros': ConsultaLenta.objects.count(),
+    }
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return render(request, 'paginas/consultas_lentas_fragment.html', context)
+    return render(request, 'paginas/consultas_lentas.html', context)
+
+
+@login_required(login_url='login')
+def consulta_lenta_detalle(request, huella):
+    """Últimas ejecuciones lentas de una sentencia, con sus planes de ejecución"""
+    if not request.user.is_staff:
+        messages.error(request, 'Acceso denegado')
+        return redirect('inicio')
+
+    ejecuciones = list(ConsultaLenta.objects.filter(huella=huella).order_by('-fecha')[:30])
+    if not ejecuciones:
+        messages.error(request, 'Consulta no encontrada')
+        return redirect('consultas_lentas_lista')
+
+    context = {
+        'consulta': ejecuciones[0],
+        'ejecuciones': ejecuciones,
+        'planes': [e for e in ejecuciones if e.plan][:5],
+    }
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return render(request, 'paginas/consulta_lenta_detalle_fragment.html', context)
+    return render(request, 'paginas/consulta_lenta_detalle.html', context)
+
+
+# ========== MEDIA ==========
+
+_RANGO_BYTES = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _ArchivoRango:
+    """
+    Vista de solo lectura sobre `largo` bytes de `archivo` desde `inicio`, para
+    entregarla a FileResponse. Expone fileno() para que el servidor WSGI pueda
+    usar sendfile desde la posición actual acotado por Content-Length (gunicorn
+    lo hace así); read() nunca devuelve bytes fuera del rango.
+    """
+
+    def __init__(self, archivo, inicio, largo):
+        archivo.seek(inicio)
+        self.archivo = archivo
+        self.restante = largo
+
+    def read(self, tamano=-1):
+        if tamano is None or tamano < 0 or tamano > self.restante:
+            tamano = self.restante
+        bloque = self.archivo.read(tamano)
+        self.restante -= len(bloque)
+        return bloque
+
+    def fileno(self):
+        return self.archivo.fileno()
+
+    def close(self):
+        self.archivo.close()
+
+
+@require_safe
+def servir_media(request, ruta):
+    """
+    Sirve los archivos de MEDIA_ROOT.
+
+    Si hay un proxy delante configurado se le delega el envío:
+      - MEDIA_ACCEL_REDIRECT_PREFIX (nginx): location interna que apunta a MEDIA_ROOT, p. ej.
+            location /media-interna/ { internal; alias /ruta/a/imagenes/; }
+      - MEDIA_X_SENDFILE = True (Apache mod_xsendfile / lighttpd)
+    Si no, responde con FileResponse (sendfile del servidor WSGI) con ETag,
+    Last-Modified, Cache-Control largo y soporte de Range. Este camino está
+    pensado para desarrollo y despliegues pequeños: en producción los archivos
+    los sirve el proxy. Los middlewares de catálogos, perfilado y consultas
+    lentas no se aplican a estas rutas (ver middleware.es_media).
+    """
+    try:
+        ruta_archivo = safe_join(settings.MEDIA_ROOT, posixpath.normpath(ruta).lstrip('/'))
+    except SuspiciousFileOperation:
+        raise Http404('Archivo no encontrado')
+    if not os.path.isfile(ruta_archivo):
+        raise Http404('Archivo no encontrado')
+
+    estado = os.stat(ruta_archivo)
+    etag = f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+    # Los archivos por hash de contenido nunca cambian; el resto puede reemplazarse
+    if ruta.startswith('contenido/'):
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_SEGUNDOS}, immutable'
+    else:
+        cache_control = 'public, max-age=86400'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(estado.st_mtime))
+    if response is None:
+        tipo, codificacion = mimetypes.guess_type(ruta_archivo)
+        tipo = tipo or 'application/octet-stream'
+
+        if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            response = HttpResponse(content_type=tipo)
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(ruta.lstrip('/'))
+        elif settings.MEDIA_X_SENDFILE:
+            response = HttpResponse(content_type=tipo)
+            response['X-Sendfile'] = ruta_archivo
+        else:
+            rango = _RANGO_BYTES.match(request.headers.get('Range', '').strip())
+            if rango and rango.group(1) + rango.group(2) and request.headers.get('If-Range', etag) == etag:
+                tamano = estado.st_size
+                if rango.group(1):
+                    inicio = int(rango.group(1))
+                    fin = min(int(rango.group(2)), tamano - 1) if rango.group(2) else tamano - 1
+                else:
+                    # bytes=-N: los últimos N bytes
+                    inicio = max(tamano - int(rango.group(2)), 0)
+                    fin = tamano - 1
+                if inicio > fin or inicio >= tamano:
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = f'bytes */{tamano}'
+                    return response
+                archivo = _ArchivoRango(open(ruta_archivo, 'rb'), inicio, fin - inicio + 1)
+                response = FileResponse(archivo, status=206, content_type=tipo)
+                response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+                response['Content-Length'] = str(fin - inicio + 1)
+            else:
+                response = FileResponse(open(ruta_archivo, 'rb'), content_type=tipo)
+            response['Accept-Ranges'] = 'bytes'
+            if codificacion:
+                response['Content-Encoding'] = codificacion
+        response['Last-Modified'] = http_date(estado.st_mtime)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
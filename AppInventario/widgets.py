@@ -0,0 +1,79 @@
+"""
+Widgets de formulario.
+
+AutocompleteSelect reemplaza a forms.Select en los campos que apuntan a
+catálogos grandes (productos, productos de proveedor, proveedores): el HTML
+solo incluye la opción vacía y la seleccionada, y el resto se busca por prefijo
+en /api/autocompletar/<modelo>/ desde admin_ajax.js, que agrega el buscador
+sobre el <select>. La validación sigue siendo la del ModelChoiceField.
+
+SelectSoloSeleccion renderiza igual (opción vacía y seleccionada) pero sin el
+buscador, para los <select> cuyas opciones llena el JavaScript de la página
+desde su propio endpoint (p. ej. productos del proveedor en entradas).
+"""
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+from . import busqueda
+
+
+class SelectSoloSeleccion(forms.Select):
+    def etiqueta(self, objeto):
+        campo = getattr(self.choices, 'field', None)
+        return campo.label_from_instance(objeto) if campo is not None else str(objeto)
+
+    def optgroups(self, name, value, attrs=None):
+        """Solo la opción vacía y las seleccionadas, con una consulta por pk"""
+        opciones = []
+        campo = getattr(self.choices, 'field', None)
+        if campo is not None and campo.empty_label is not None:
+            opciones.append(self.create_option(name, '', campo.empty_label, not any(value), 0))
+
+        queryset = getattr(self.choices, 'queryset', None)
+        pks = []
+        if queryset is not None:
+            pk = queryset.model._meta.pk
+            for valor in value:
+                if valor in (None, ''):
+                    continue
+                try:
+                    pks.append(pk.to_python(valor))
+                except ValidationError:
+                    # Valores que no son un pk (p. ej. "pp_<id>" en entradas) no se muestran
+                    continue
+        if pks:
+            for objeto in queryset.filter(pk__in=pks):
+                opciones.append(self.create_option(name, objeto.pk, self.etiqueta(objeto), True, len(opciones)))
+        return [(None, opciones, 0)]
+
+
+class AutocompleteSelect(SelectSoloSeleccion):
+    def __init__(self, modelo, attrs=None, placeholder='Escriba para buscar...', depende_de=None):
+        """
+        `modelo` es una clave de busqueda.fuentes_autocompletar(). `depende_de`
+        es un dict {parámetro: id del campo} cuyos valores se envían como
+        filtro (p. ej. {'proveedor': 'id_proveedor_entrada'}).
+        """
+        super().__init__(attrs)
+        self.modelo = modelo
+        self.placeholder = placeholder
+        self.depende_de = depende_de or {}
+
+    def __deepcopy__(self, memo):
+        copia = super().__deepcopy__(memo)
+        copia.depende_de = dict(self.depende_de)
+        return copia
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocompletar-url'] = reverse('api_autocompletar', args=[self.modelo])
+        attrs['data-autocompletar-placeholder'] = self.placeholder
+        if self.depende_de:
+            attrs['data-autocompletar-depende'] = ','.join(
+                f'{parametro}:{campo}' for parametro, campo in self.depende_de.items()
+            )
+        return attrs
+
+    def etiqueta(self, objeto):
+        return busqueda.fuentes_autocompletar()[self.modelo]['etiqueta'](objeto)
@@ -41,20 +41,26 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'AppInventario.middleware.MetricasMiddleware',
+    'AppInventario.middleware.ConsultasLentasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'AppInventario.middleware.PerfiladorMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'AppInventario.middleware.PrimariaTrasEscrituraMiddleware',
+    'AppInventario.middleware.CatalogosMiddleware',
 ]
 
 ROOT_URLCONF = 'Inventario.urls'
 import os
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render (AppInventario/metricas.py)
+        'BACKEND': 'AppInventario.metricas.DjangoTemplatesMedidos',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,6 +89,23 @@ DATABASES = {
     }
 }
 
+# Réplica de solo lectura para listados, reportes y exportaciones (vistas con
+# @usar_replica). Se activa definiendo DB_REPLICA_HOST; para probar en local
+# basta otra base con una copia de los datos o una réplica en streaming.
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['AppInventario.routers.ReplicaRouter']
+
+# Segundos que las lecturas de un usuario siguen en la primaria tras escribir
+REPLICA_PIN_SEGUNDOS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,6 +154,92 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'imagenes')
 MEDIA_URL = '/imagenes/'
+
+# La media se guarda por hash de contenido (sin duplicados); ver AppInventario/storage.py
+STORAGES = {
+    'default': {
+        'BACKEND': 'AppInventario.storage.AlmacenamientoPorContenido',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Servicio de media (AppInventario.views.servir_media). En producción conviene
+# delegar el envío al proxy: MEDIA_ACCEL_REDIRECT_PREFIX para nginx
+# (location interna con alias a MEDIA_ROOT) o MEDIA_X_SENDFILE para Apache.
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+MEDIA_X_SENDFILE = os.environ.get('MEDIA_X_SENDFILE', '') == '1'
+MEDIA_CACHE_SEGUNDOS = 60 * 60 * 24 * 365
+# Los archivos sin referencias modificados hace menos que esto no se borran
+# (pueden pertenecer a un registro aún sin confirmar); ver AppInventario/storage.py
+MEDIA_GRACIA_SEGUNDOS = 60 * 60
+
+# Variantes WebP de imágenes (AppInventario/imagenes.py): se generan en hilos de
+# fondo al confirmar la transacción. En modo síncrono se generan en línea.
+IMAGENES_VARIANTES_WORKERS = 2
+IMAGENES_VARIANTES_SINCRONO = False
+
+# Métricas por petición (AppInventario/metricas.py): Server-Timing, log JSON y
+# percentiles por vista en /panel-admin/metricas/
+METRICAS_ACTIVAS = True
+METRICAS_MUESTRAS_POR_VISTA = 500
+
+# Endpoint /metrics para Prometheus (AppInventario/prometheus.py). Cada worker
+# vuelca sus series a METRICAS_PROMETHEUS_DIR (vacío: /dev/shm/inventario-metricas).
+# Con token, el scrape debe enviar "Authorization: Bearer <token>". Sin token
+# solo se acepta desde las IPs listadas, ninguna por defecto (/metrics responde
+# 403). Detrás de un proxy en el mismo servidor (nginx) todas las peticiones
+# llegan desde 127.0.0.1: no listar esa IP sin que el proxy bloquee /metrics
+# (location = /metrics { deny all; }).
+METRICAS_PROMETHEUS_DIR = os.environ.get('METRICAS_PROMETHEUS_DIR', '')
+METRICAS_PROMETHEUS_VOLCADO = 5
+METRICAS_PROMETHEUS_TOKEN = os.environ.get('METRICAS_PROMETHEUS_TOKEN', '')
+METRICAS_PROMETHEUS_IPS = []
+METRICAS_NEGOCIO_TTL = 60
+
+# Perfilador de peticiones (AppInventario/perfilador.py): staff con ?perfilar=1 o
+# cabecera X-Perfilar: 1, más una fracción de muestreo de todas las peticiones
+PERFILADOR_ACTIVO = True
+PERFILADOR_MUESTREO = float(os.environ.get('PERFILADOR_MUESTREO', '0'))
+PERFILADOR_INTERVALO_MS = 5
+PERFILADOR_MAX_CONSULTAS = 1000
+PERFILES_DIR = os.path.join(BASE_DIR, 'perfiles')
+PERFILES_MAXIMO = 200
+
+# Registro de consultas lentas (AppInventario/consultas_lentas.py), visible en
+# /panel-admin/consultas-lentas/
+CONSULTAS_LENTAS_ACTIVAS = True
+CONSULTAS_LENTAS_UMBRAL_MS = int(os.environ.get('CONSULTAS_LENTAS_UMBRAL_MS', '200'))
+CONSULTAS_LENTAS_EXPLAIN_MUESTREO = 0.1
+CONSULTAS_LENTAS_EXPLAIN_TIMEOUT_MS = 5000
+CONSULTAS_LENTAS_MAXIMO = 5000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'AppInventario.metricas': {
+            'handlers': ['console'],
+            'level': os.environ.get('METRICAS_LOG_NIVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Caché de fragmentos AJAX (AppInventario/decorators.py). Las entradas se
+# invalidan solas porque la clave incluye la versión de datos de cada modelo.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inventario',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Configuración de cookies para CSRF
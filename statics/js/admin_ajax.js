@@ -26,6 +26,8 @@
         initProfileDropdown();
         initNavToggle();
         initAvatarUpload();
+        initAutocompletar();
+        initScrollInfinito();
     });
 
     /**
@@ -353,6 +355,286 @@
         }
     }
 
+    /**
+     * Autocompletado remoto para los <select> con data-autocompletar-url
+     * (widgets.AutocompleteSelect). Agrega un buscador sobre el select; los
+     * resultados se piden por prefijo y página a /api/autocompletar/<modelo>/
+     * y se guardan en una caché LRU por usuario en sessionStorage.
+     */
+    const AUTOCOMPLETAR = {
+        selector: 'select[data-autocompletar-url]',
+        maxEntradas: 150,
+        ttlMs: 5 * 60 * 1000,
+        esperaMs: 250
+    };
+
+    const cacheAutocompletar = {
+        clave: function() {
+            return 'autocompletar:' + (document.body.dataset.usuario || 'anonimo');
+        },
+        leer: function() {
+            try {
+                return JSON.parse(sessionStorage.getItem(this.clave())) || [];
+            } catch (e) {
+                return [];
+            }
+        },
+        escribir: function(entradas) {
+            try {
+                sessionStorage.setItem(this.clave(), JSON.stringify(entradas));
+            } catch (e) {
+                // Sin espacio o sin sessionStorage: se sigue sin caché
+            }
+        },
+        obtener: function(url) {
+            const entradas = this.leer();
+            const indice = entradas.findIndex(function(entrada) { return entrada.url === url; });
+            if (indice === -1) {
+                return null;
+            }
+            const entrada = entradas.splice(indice, 1)[0];
+            if (Date.now() - entrada.fecha > AUTOCOMPLETAR.ttlMs) {
+                this.escribir(entradas);
+                return null;
+            }
+            // La más reciente queda al final
+            entradas.push(entrada);
+            this.escribir(entradas);
+            return entrada.datos;
+        },
+        guardar: function(url, datos) {
+            const entradas = this.leer().filter(function(entrada) { return entrada.url !== url; });
+            entradas.push({url: url, datos: datos, fecha: Date.now()});
+            this.escribir(entradas.slice(-AUTOCOMPLETAR.maxEntradas));
+        }
+    };
+
+    function initAutocompletar() {
+        mejorarSelectsAutocompletar(document);
+
+        // Los formularios llegan por AJAX (drawers, fragmentos)
+        if (window.MutationObserver) {
+            new MutationObserver(function(mutaciones) {
+                mutaciones.forEach(function(mutacion) {
+                    mutacion.addedNodes.forEach(function(nodo) {
+                        if (nodo.nodeType === 1) {
+                            mejorarSelectsAutocompletar(nodo);
+                        }
+                    });
+                });
+            }).observe(document.body, {childList: true, subtree: true});
+        }
+
+        let temporizador = null;
+        $(document).on('input', '.autocompletar-busqueda', function() {
+            const $input = $(this);
+            clearTimeout(temporizador);
+            temporizador = setTimeout(function() {
+                buscarAutocompletar($input, 1);
+            }, AUTOCOMPLETAR.esperaMs);
+        });
+
+        $(document).on('click', '.autocompletar-resultados [data-id]', function(e) {
+            e.preventDefault();
+            const $item = $(this);
+            const $resultados = $item.closest('.autocompletar-resultados');
+            const select = document.getElementById($resultados.data('para'));
+            if (select) {
+                let opcion = Array.from(select.options).find(function(o) { return o.value === String($item.data('id')); });
+                if (!opcion) {
+                    opcion = new Option($item.text(), $item.data('id'));
+                    select.appendChild(opcion);
+                }
+                select.value = opcion.value;
+                select.dispatchEvent(new Event('change', {bubbles: true}));
+            }
+            $resultados.empty().hide();
+            $resultados.prev('.autocompletar-busqueda').val('');
+        });
+
+        $(document).on('click', '.autocompletar-resultados .autocompletar-mas', function(e) {
+            e.preventDefault();
+            const $resultados = $(this).closest('.autocompletar-resultados');
+            buscarAutocompletar($resultados.prev('.autocompletar-busqueda'), ($resultados.data('pagina') || 1) + 1);
+        });
+
+        $(document).on('keydown', '.autocompletar-busqueda', function(e) {
+            if (e.key === 'Escape') {
+                $(this).next('.autocompletar-resultados').empty().hide();
+            } else if (e.key === 'Enter') {
+                // Enter elige el primer resultado en lugar de enviar el formulario
+                e.preventDefault();
+                $(this).next('.autocompletar-resultados').find('[data-id]').first().trigger('click');
+            }
+        });
+    }
+
+    function mejorarSelectsAutocompletar(raiz) {
+        const selects = raiz.matches && raiz.matches(AUTOCOMPLETAR.selector)
+            ? [raiz]
+            : raiz.querySelectorAll(AUTOCOMPLETAR.selector);
+        selects.forEach(function(select) {
+            const anterior = select.previousElementSibling;
+            if (!select.id || (anterior && anterior.classList.contains('autocompletar-resultados'))) {
+                return;
+            }
+            const $input = $('<input type="search" class="form-control form-control-sm mb-1 autocompletar-busqueda" autocomplete="off">')
+                .attr('placeholder', select.dataset.autocompletarPlaceholder || 'Escriba para buscar...')
+                .attr('data-para', select.id);
+            const $resultados = $('<div class="list-group mb-1 autocompletar-resultados" style="max-height: 240px; overflow-y: auto; display: none;"></div>')
+                .attr('data-para', select.id);
+            $(select).before($input, $resultados);
+        });
+    }
+
+    function urlAutocompletar(select, texto, pagina) {
+        const params = new URLSearchParams({q: texto, pagina: pagina});
+        (select.dataset.autocompletarDepende || '').split(',').forEach(function(dependencia) {
+            const partes = dependencia.split(':');
+            const campo = partes.length === 2 ? document.getElementById(partes[1]) : null;
+            if (campo && campo.value) {
+                params.set(partes[0], campo.value);
+            }
+        });
+        return select.dataset.autocompletarUrl + '?' + params.toString();
+    }
+
+    function buscarAutocompletar($input, pagina) {
+        const select = document.getElementById($input.data('para'));
+        const $resultados = $input.next('.autocompletar-resultados');
+        const texto = $.trim($input.val());
+        if (!select || !texto) {
+            $resultados.empty().hide();
+            return;
+        }
+        const url = urlAutocompletar(select, texto, pagina);
+
+        function mostrar(datos) {
+            // Descarta respuestas de una búsqueda que ya cambió
+            if ($.trim($input.val()) !== texto) {
+                return;
+            }
+            if (pagina === 1) {
+                $resultados.empty();
+            }
+            $resultados.find('.autocompletar-mas').remove();
+            datos.resultados.forEach(function(resultado) {
+                $('<a href="#" class="list-group-item list-group-item-action py-1"></a>')
+                    .attr('data-id', resultado.id)
+                    .text(resultado.texto)
+                    .appendTo($resultados);
+            });
+            if (datos.hay_mas) {
+                $('<a href="#" class="list-group-item list-group-item-action py-1 text-primary autocompletar-mas">Ver más...</a>')
+                    .appendTo($resultados);
+            }
+            if (!$resultados.children().length) {
+                $('<div class="list-group-item py-1 text-muted">Sin resultados</div>').appendTo($resultados);
+            }
+            $resultados.data('pagina', pagina).show();
+        }
+
+        const enCache = cacheAutocompletar.obtener(url);
+        if (enCache) {
+            mostrar(enCache);
+            return;
+        }
+        $.ajax({
+            url: url,
+            type: 'GET',
+            dataType: 'json',
+            headers: {
+                [CONFIG.ajaxHeader]: CONFIG.ajaxHeaderValue
+            },
+            success: function(datos) {
+                if (datos && datos.success) {
+                    cacheAutocompletar.guardar(url, datos);
+                    mostrar(datos);
+                }
+            }
+        });
+    }
+
+    /**
+     * Scroll infinito de los listados paginados por cursor
+     * (partials/pagination.html): al acercarse al marcador .scroll-infinito se
+     * pide la página siguiente y sus filas se agregan a la tabla actual.
+     */
+    const SCROLL_INFINITO = {
+        selector: '.scroll-infinito',
+        margen: '300px'
+    };
+
+    function initScrollInfinito() {
+        if (!window.IntersectionObserver) {
+            return;
+        }
+        const observador = new IntersectionObserver(function(entradas) {
+            entradas.forEach(function(entrada) {
+                if (entrada.isIntersecting) {
+                    observador.unobserve(entrada.target);
+                    cargarPaginaSiguiente(entrada.target);
+                }
+            });
+        }, {rootMargin: SCROLL_INFINITO.margen});
+
+        function observar(raiz) {
+            const marcadores = raiz.matches && raiz.matches(SCROLL_INFINITO.selector)
+                ? [raiz]
+                : raiz.querySelectorAll(SCROLL_INFINITO.selector);
+            marcadores.forEach(function(marcador) {
+                if (marcador.dataset.url) {
+                    observador.observe(marcador);
+                }
+            });
+        }
+
+        observar(document);
+
+        // Los listados llegan por AJAX
+        if (window.MutationObserver) {
+            new MutationObserver(function(mutaciones) {
+                mutaciones.forEach(function(mutacion) {
+                    mutacion.addedNodes.forEach(function(nodo) {
+                        if (nodo.nodeType === 1) {
+                            observar(nodo);
+                        }
+                    });
+                });
+            }).observe(document.body, {childList: true, subtree: true});
+        }
+    }
+
+    function cargarPaginaSiguiente(marcador) {
+        const $marcador = $(marcador);
+        const selectorFilas = $marcador.data('filas');
+        const $filas = $(CONFIG.contentSelector).find(selectorFilas).first();
+        if (!$filas.length) {
+            return;
+        }
+        $.ajax({
+            url: $marcador.data('url'),
+            type: 'GET',
+            headers: {
+                [CONFIG.ajaxHeader]: CONFIG.ajaxHeaderValue
+            },
+            dataType: 'html',
+            success: function(response) {
+                // Sin ejecutar los scripts del fragmento: ya están en la página
+                const $respuesta = $('<div></div>').append($.parseHTML(response, document, false));
+                $filas.append($respuesta.find(selectorFilas).first().children());
+                $(CONFIG.contentSelector).find('.paginacion-keyset').first()
+                    .replaceWith($respuesta.find('.paginacion-keyset').first());
+                // El marcador nuevo (con el cursor siguiente) lo observa el MutationObserver
+                $marcador.replaceWith($respuesta.find(SCROLL_INFINITO.selector).first());
+                $(document).trigger('contentLoaded');
+            },
+            error: function(xhr, status, error) {
+                console.error('Scroll infinito:', error);
+            }
+        });
+    }
+
     /**
      * Obtiene el valor de una cookie
      */
@@ -403,7 +685,7 @@
                     // Mostrar preview inmediato
                     const reader = new FileReader();
                     reader.onload = function(e) {
-                        $avatarImg.attr('src', e.target.result);
+                        $avatarImg.removeAttr('srcset').attr('src', e.target.result);
                     };
                     reader.readAsDataURL(file);
 
@@ -446,7 +728,7 @@
                             if (response && response.success) {
                                 // Actualizar imagen con la URL del servidor
                                 if (response.avatar_url) {
-                                    $avatarImg.attr('src', response.avatar_url + '?t=' + new Date().getTime());
+                                    $avatarImg.removeAttr('srcset').attr('src', response.avatar_url + '?t=' + new Date().getTime());
                                 }
                                 // Mostrar mensaje de éxito
                                 $avatar.find('.profile-avatar-overlay').html('<i class="fas fa-check"></i><span>¡Actualizado!</span>');